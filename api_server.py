@@ -9,19 +9,48 @@ import time
 import math
 import logging
 import re
+import functools
+import threading
 from uuid import uuid4
 from datetime import datetime
-from typing import Optional, List, Dict, Any, Iterator, Tuple
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Tuple
 from contextlib import contextmanager
 
-from fastapi import FastAPI, HTTPException, Depends, Query, Header, Request
+from fastapi import FastAPI, HTTPException, Depends, File, Query, Header, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
+from app.db.schema_catalog import SchemaCatalog, catalog_for as schema_catalog_for
+from app.db.sqlite_pool import RequestConnectionMiddleware, pool_for, pool_stats, pooled_connection
 from app.middleware.billing_middleware import BillingProtectionMiddleware
 from app.middleware.feature_middleware import FeatureGateMiddleware
 from app.middleware.tenant_middleware import TenantContextMiddleware
+from app.services.entitlement_cache import EntitlementCache, feature_allowed, invalidate_entitlements
 from app.services.billing_automation_service import suspend_overdue_subscriptions_conn
+from app.services.gps_buffer import GpsWriteBuffer
+from app.services import clientes_busca, clientes_lote, photo_store, photo_thumbnails
+from app.services.principal_cache import PrincipalCache
+from app.services.programacao_resumo import (
+    ROTA_CARGA_COLUMNS,
+    carga_raiz,
+    clear_pending as clear_resumo_pending,
+    codigo_key,
+    ensure_programacao_resumo_schema,
+    pending_keys as resumo_pending_keys,
+    read_resumos,
+    transferencias_totais,
+    upsert_resumos,
+)
+from app.services.reconcile_log import (
+    changes_between,
+    ensure_reconcile_log_schema,
+    high_water_mark,
+    last_seq,
+    prune as prune_reconcile_log,
+    set_high_water_mark,
+)
 from app.services.vehicle_limit_service import check_vehicle_limit, vehicle_usage_snapshot
 from app.utils.validators import (
     is_valid_cpf,
@@ -33,7 +62,7 @@ from app.utils.validators import (
     validate_placa,
 )
 from version import APP_VERSION
-from db_bootstrap import ensure_admin_user as ensure_admin_user_bootstrap, ensure_core_schema
+from db_bootstrap import ensure_admin_user as ensure_admin_user_bootstrap, ensure_core_schema, ensure_normalized_keys, normalized_key_expr
 from database_runtime import log_startup_diagnostics
 from runtime_config import apply_process_environment, ensure_runtime_files, load_app_config
 
@@ -77,6 +106,8 @@ CORS_ORIGINS = _cors_origins_from_env()
 CORS_ALLOW_CREDENTIALS = os.environ.get("ROTA_CORS_ALLOW_CREDENTIALS", "0").strip() in ("1", "true", "TRUE")
 ENABLE_ROTAS_ATIVAS_TODAS = os.environ.get("ROTA_ENABLE_ROTAS_ATIVAS_TODAS", "1").strip() in ("1", "true", "TRUE")
 ENABLE_START_GPS_GATE = os.environ.get("ROTA_ENABLE_START_GPS_GATE", "0").strip() in ("1", "true", "TRUE")
+# background | sync | off
+STARTUP_RECONCILE_MODE = os.environ.get("ROTA_STARTUP_RECONCILE", "background").strip().lower()
 
 app.add_middleware(
     CORSMiddleware,
@@ -87,14 +118,21 @@ app.add_middleware(
 )
 
 security = HTTPBearer()
+# principals autenticados por token (motorista/vendedor); invalidado nos endpoints de cadastro/acesso
+PRINCIPALS = PrincipalCache()
 
 # =========================================================
 # DB HELPERS
 # =========================================================
-@contextmanager
-def get_conn() -> Iterator[sqlite3.Connection]:
-    os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
+class _CatalogConnection(sqlite3.Connection):
+    """Conexao que carrega o catalogo de schema do banco aberto."""
+
+    schema_catalog: Optional[SchemaCatalog] = None
+
+
+def _open_conn(db_path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, factory=_CatalogConnection, check_same_thread=False)
     try:
         conn.execute("PRAGMA foreign_keys = ON")
         conn.execute("PRAGMA journal_mode = WAL")
@@ -103,21 +141,66 @@ def get_conn() -> Iterator[sqlite3.Connection]:
     except Exception:
         pass
     conn.row_factory = sqlite3.Row
-    try:
+    return conn
+
+
+@contextmanager
+def get_conn(db_path: Optional[str] = None) -> Iterator[sqlite3.Connection]:
+    """
+    Conexao do pool (PRAGMAs aplicados uma vez). Commit na saida e rollback em erro;
+    dentro de um request a mesma conexao atende auth e handler.
+    """
+    db_path = db_path or DB_PATH
+    with pooled_connection(pool_for(db_path, _open_conn)) as conn:
+        try:
+            catalog = schema_catalog_for(db_path)
+            catalog.sync(conn)
+            conn.schema_catalog = catalog
+        except sqlite3.Error:
+            logging.debug("Catalogo de schema indisponivel para %s", db_path, exc_info=True)
         yield conn
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
+
+
+def _schema_catalog(conn_or_cur: Any) -> Optional[SchemaCatalog]:
+    conn = getattr(conn_or_cur, "connection", conn_or_cur)
+    return getattr(conn, "schema_catalog", None)
+
+
+def refresh_schema_catalog(conn_or_cur: Any) -> None:
+    """Revalida o catalogo apos DDL executado na propria conexao."""
+    catalog = _schema_catalog(conn_or_cur)
+    if catalog is not None:
+        catalog.sync(getattr(conn_or_cur, "connection", conn_or_cur))
+
+
+def table_columns(conn_or_cur: Any, table: str) -> frozenset[str]:
+    """Colunas (minusculas) da tabela, resolvidas pelo catalogo quando disponivel."""
+    conn = getattr(conn_or_cur, "connection", conn_or_cur)
+    catalog = _schema_catalog(conn)
+    if catalog is not None:
+        return catalog.columns(conn, table)
+    rows = conn.execute(f"PRAGMA table_info({table})").fetchall() or []
+    return frozenset(str(r[1]).lower() for r in rows)
 
 
 def col_exists(conn: sqlite3.Connection, table: str, col: str) -> bool:
-    cur = conn.cursor()
-    cur.execute(f"PRAGMA table_info({table})")
-    cols = [r[1] for r in cur.fetchall()]
-    return col in cols
+    catalog = _schema_catalog(conn)
+    if catalog is not None:
+        return catalog.has_column(getattr(conn, "connection", conn), table, col)
+    return str(col or "").lower() in table_columns(conn, table)
+
+
+def schema_fragment(fn):
+    """Memoriza o SQL gerado por `fn(conn, *args)` por versao de schema."""
+
+    @functools.wraps(fn)
+    def wrapper(conn, *args):
+        catalog = _schema_catalog(conn)
+        if catalog is None:
+            return fn(conn, *args)
+        return catalog.fragment((fn.__name__,) + args, lambda: fn(conn, *args))
+
+    return wrapper
 
 
 def _default_company_id(cur: sqlite3.Cursor) -> int:
@@ -148,10 +231,34 @@ def _row_company_id(row: Any, default_company_id: int = 1) -> int:
 
 
 def table_exists(cur: sqlite3.Cursor, table: str) -> bool:
+    catalog = _schema_catalog(cur)
+    if catalog is not None:
+        return catalog.has_table(cur.connection, table)
     cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,))
     return bool(cur.fetchone())
 
 
+SQL_IN_CHUNK = 500
+_ULTIMO_KM_CANDIDATOS = 3
+
+
+def _chunks(values: List[Any], size: int = SQL_IN_CHUNK) -> Iterator[List[Any]]:
+    """Divide listas de parametros para clausulas IN sem estourar o limite do SQLite."""
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _escopo_in(column: str, values: Optional[Iterable[Any]]) -> List[Tuple[str, List[Any]]]:
+    """
+    Filtros " AND col IN (...)" em lotes para reconciliacoes incrementais.
+    values=None -> uma passada sem filtro (tabela inteira); vazio -> nenhuma passada.
+    """
+    if values is None:
+        return [("", [])]
+    wanted = sorted({str(v).strip() for v in values if str(v or "").strip()})
+    return [(f" AND {column} IN ({', '.join('?' for _ in chunk)})", list(chunk)) for chunk in _chunks(wanted)]
+
+
 def _ensure_fornecedor_perfis_schema(cur: sqlite3.Cursor) -> None:
     cur.execute(
         """
@@ -277,6 +384,10 @@ def _fetch_nf_compra_by_numero(cur: sqlite3.Cursor, nf_numero: str) -> Optional[
     numero = _normalize_nf_numero(nf_numero)
     if not numero:
         return None
+    if col_exists(cur, "compras_nfe", "numero_key"):
+        numero_where = "c.numero_key=?"
+    else:
+        numero_where = "REPLACE(REPLACE(REPLACE(TRIM(COALESCE(c.numero,'')), '.', ''), '-', ''), '/', '')=?"
     cur.execute(
         f"""
         SELECT c.*,
@@ -288,7 +399,7 @@ def _fetch_nf_compra_by_numero(cur: sqlite3.Cursor, nf_numero: str) -> Optional[
                 (c.fornecedor_id IS NOT NULL AND f.id=c.fornecedor_id)
                 OR (TRIM(COALESCE(c.fornecedor_documento,''))<>'' AND TRIM(COALESCE(f.documento,''))=TRIM(COALESCE(c.fornecedor_documento,'')))
             )
-         WHERE REPLACE(REPLACE(REPLACE(TRIM(COALESCE(c.numero,'')), '.', ''), '-', ''), '/', '')=?
+         WHERE {numero_where}
          ORDER BY c.id DESC
          LIMIT 1
         """,
@@ -364,6 +475,11 @@ def _ensure_clientes_columns(cur: sqlite3.Cursor) -> set[str]:
             cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_clientes_cod ON clientes(cod_cliente)")
     except Exception:
         logging.debug("Indice unico de clientes(cod_cliente) nao criado; mantendo schema legado.", exc_info=True)
+    try:
+        clientes_busca.ensure_clientes_busca(cur)
+    except sqlite3.Error:
+        logging.debug("Indice de busca de clientes (FTS5) nao criado; busca usa LIKE.", exc_info=True)
+    refresh_schema_catalog(cur)
     return cols
 
 
@@ -609,7 +725,45 @@ def _split_people_tokens(raw: str) -> List[str]:
     return [p.strip() for p in txt.split("|") if p.strip()]
 
 
-def _resolve_ajudante_primeiro_nome(cur: Optional[sqlite3.Cursor], raw: Any) -> str:
+def _load_equipe_nomes_index(cur: sqlite3.Cursor) -> Dict[str, Dict[str, Any]]:
+    """
+    Carrega ajudantes e equipes uma unica vez para resolver os nomes de varias
+    rotas sem consultar o banco a cada linha.
+    """
+    index: Dict[str, Dict[str, Any]] = {"ajudantes": {}, "equipes": {}, "equipes_codigo": {}}
+    try:
+        cur.execute("SELECT id, nome, sobrenome FROM ajudantes ORDER BY id")
+        for row in cur.fetchall() or []:
+            key = _clean_text(row["id"]).upper()
+            if key and key not in index["ajudantes"]:
+                index["ajudantes"][key] = _first_name(row["nome"]) or _first_name(row["sobrenome"])
+    except Exception:
+        logging.debug("Falha ao carregar ajudantes para indice de equipes", exc_info=True)
+    try:
+        cols_eq = table_columns(cur, "equipes")
+        cand_cols = [c for c in ("ajudante1", "ajudante2", "ajudante_1", "ajudante_2") if c in cols_eq]
+        if cand_cols:
+            cur.execute(f"SELECT id, codigo, {', '.join(cand_cols)} FROM equipes ORDER BY id")
+            for row in cur.fetchall() or []:
+                membros = {c: row[c] for c in cand_cols}
+                id_key = _clean_text(row["id"]).upper()
+                codigo_key = _clean_text(row["codigo"]).upper()
+                if id_key:
+                    index["equipes"].setdefault(id_key, membros)
+                if codigo_key:
+                    index["equipes"].setdefault(codigo_key, membros)
+                    index["equipes_codigo"].setdefault(codigo_key, membros)
+    except Exception:
+        logging.debug("Falha ao carregar equipes para indice de equipes", exc_info=True)
+    return index
+
+
+def _resolve_ajudante_primeiro_nome(
+    cur: Optional[sqlite3.Cursor],
+    raw: Any,
+    nomes_index: Optional[Dict[str, Dict[str, Any]]] = None,
+    _depth: int = 0,
+) -> str:
     value = _clean_text(raw)
     if not value:
         return ""
@@ -618,11 +772,27 @@ def _resolve_ajudante_primeiro_nome(cur: Optional[sqlite3.Cursor], raw: Any) ->
     if len(parts) > 1:
         resolved_parts = []
         for p in parts:
-            rp = _resolve_ajudante_primeiro_nome(cur, p)
+            rp = _resolve_ajudante_primeiro_nome(cur, p, nomes_index, _depth)
             if rp and rp not in resolved_parts:
                 resolved_parts.append(rp)
         return " / ".join(resolved_parts)
 
+    if nomes_index is not None:
+        key = value.upper()
+        resolved = nomes_index["ajudantes"].get(key)
+        if resolved:
+            return resolved
+        membros = nomes_index["equipes"].get(key)
+        if membros and _depth < 3:
+            nomes_eq: List[str] = []
+            for membro in membros.values():
+                n = _resolve_ajudante_primeiro_nome(cur, membro, nomes_index, _depth + 1)
+                if n and n not in nomes_eq:
+                    nomes_eq.append(n)
+            if nomes_eq:
+                return " / ".join(nomes_eq)
+        return _first_name(value)
+
     if cur is not None:
         # Novo modelo: equipe guarda ids de ajudantes.
         try:
@@ -698,12 +868,16 @@ def _apply_equipe_nome(row: Dict[str, Any], equipes_map: Dict[str, str], cur: Op
     return row
 
 
-def _format_equipe_ajudantes(row: Dict[str, Any], cur: Optional[sqlite3.Cursor] = None) -> str:
+def _format_equipe_ajudantes(
+    row: Dict[str, Any],
+    cur: Optional[sqlite3.Cursor] = None,
+    nomes_index: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> str:
     if row is None:
         return ""
     names = []
     for key in ("ajudante1", "ajudante_1", "ajudante2", "ajudante_2"):
-        candidate = _resolve_ajudante_primeiro_nome(cur, row.get(key))
+        candidate = _resolve_ajudante_primeiro_nome(cur, row.get(key), nomes_index)
         if candidate:
             names.append(candidate)
     if names:
@@ -712,10 +886,20 @@ def _format_equipe_ajudantes(row: Dict[str, Any], cur: Optional[sqlite3.Cursor]
     # Fallback robusto: quando "equipe" vier como codigo (ex.: EQP-01),
     # tenta resolver na tabela equipes para retornar nomes dos ajudantes.
     equipe_raw = _clean_text(row.get("equipe"))
+    if equipe_raw and nomes_index is not None:
+        membros = nomes_index["equipes_codigo"].get(equipe_raw.upper())
+        if membros is not None:
+            nomes_eq = []
+            for membro in membros.values():
+                n = _resolve_ajudante_primeiro_nome(cur, membro, nomes_index)
+                if n and n not in nomes_eq:
+                    nomes_eq.append(n)
+            if nomes_eq:
+                return " / ".join(nomes_eq)
+        return _resolve_ajudante_primeiro_nome(cur, equipe_raw, nomes_index)
     if equipe_raw and cur is not None:
         try:
-            cur.execute("PRAGMA table_info(equipes)")
-            cols_eq = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+            cols_eq = table_columns(cur, "equipes")
             cand_cols = [c for c in ("ajudante1", "ajudante2", "ajudante_1", "ajudante_2") if c in cols_eq]
             if not cand_cols:
                 return _resolve_ajudante_primeiro_nome(cur, equipe_raw)
@@ -745,8 +929,12 @@ def _format_equipe_ajudantes(row: Dict[str, Any], cur: Optional[sqlite3.Cursor]
     return _resolve_ajudante_primeiro_nome(cur, equipe_raw)
 
 
-def _decorate_rota_row(row: Dict[str, Any], cur: Optional[sqlite3.Cursor] = None) -> Dict[str, Any]:
-    row["equipe_ajudantes"] = _format_equipe_ajudantes(row, cur)
+def _decorate_rota_row(
+    row: Dict[str, Any],
+    cur: Optional[sqlite3.Cursor] = None,
+    nomes_index: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    row["equipe_ajudantes"] = _format_equipe_ajudantes(row, cur, nomes_index)
     if row.get("equipe_ajudantes"):
         row["equipe"] = row["equipe_ajudantes"]
 
@@ -900,6 +1088,7 @@ def safe_float(value: Any, default: float = 0.0) -> float:
         return float(default)
 
 
+@schema_fragment
 def _local_rota_expr(conn: sqlite3.Connection) -> str:
     candidates: List[str] = []
     if col_exists(conn, "programacoes", "local_rota"):
@@ -914,6 +1103,7 @@ def _local_rota_expr(conn: sqlite3.Connection) -> str:
     return f"COALESCE({', '.join(candidates)}, '-') AS local_rota"
 
 
+@schema_fragment
 def _local_carregamento_expr(conn: sqlite3.Connection) -> str:
     candidates: List[str] = []
     if col_exists(conn, "programacoes", "local_carregamento"):
@@ -938,12 +1128,14 @@ def _local_carregamento_expr(conn: sqlite3.Connection) -> str:
     return f"COALESCE({', '.join(candidates)}, '-') AS local_carregamento"
 
 
+@schema_fragment
 def _media_carregada_expr(conn: sqlite3.Connection) -> str:
     if col_exists(conn, "programacoes", "media"):
         return "COALESCE(p.media, 0) AS media_carregada"
     return "0 AS media_carregada"
 
 
+@schema_fragment
 def _kg_carregado_expr(conn: sqlite3.Connection) -> str:
     candidates: List[str] = []
     if col_exists(conn, "programacoes", "kg_carregado"):
@@ -955,6 +1147,7 @@ def _kg_carregado_expr(conn: sqlite3.Connection) -> str:
     return f"COALESCE({', '.join(candidates)}, 0) AS kg_carregado"
 
 
+@schema_fragment
 def _caixas_carregadas_expr(conn: sqlite3.Connection) -> str:
     candidates: List[str] = []
     if col_exists(conn, "programacoes", "caixas_carregadas"):
@@ -968,6 +1161,7 @@ def _caixas_carregadas_expr(conn: sqlite3.Connection) -> str:
     return f"COALESCE({', '.join(candidates)}, 0) AS caixas_carregadas"
 
 
+@schema_fragment
 def _caixa_final_expr(conn: sqlite3.Connection) -> str:
     candidates: List[str] = []
     if col_exists(conn, "programacoes", "aves_caixa_final"):
@@ -979,20 +1173,71 @@ def _caixa_final_expr(conn: sqlite3.Connection) -> str:
     return f"COALESCE({', '.join(candidates)}, 0) AS caixa_final"
 
 
+@schema_fragment
+def _capacidade_cx_subquery(conn: sqlite3.Connection, prog_alias: str = "p") -> str:
+    """Capacidade do veiculo da rota: busca pela placa_key indexada e cai no modelo se nao achar."""
+    por_modelo = f"""(
+                    SELECT CAST(NULLIF(TRIM(v.capacidade_cx), '') AS INTEGER)
+                    FROM veiculos v
+                    WHERE UPPER(TRIM(v.modelo)) = UPPER(TRIM({prog_alias}.veiculo))
+                    LIMIT 1
+                )"""
+    if not (col_exists(conn, "veiculos", "placa_key") and col_exists(conn, "programacoes", "veiculo_key")):
+        return f"""(
+                    SELECT CAST(NULLIF(TRIM(v.capacidade_cx), '') AS INTEGER)
+                    FROM veiculos v
+                    WHERE UPPER(TRIM(v.placa)) = UPPER(TRIM({prog_alias}.veiculo))
+                       OR UPPER(TRIM(v.modelo)) = UPPER(TRIM({prog_alias}.veiculo))
+                    LIMIT 1
+                )"""
+    return f"""COALESCE(
+                (
+                    SELECT CAST(NULLIF(TRIM(v.capacidade_cx), '') AS INTEGER)
+                    FROM veiculos v
+                    WHERE v.placa_key = {prog_alias}.veiculo_key
+                    LIMIT 1
+                ),
+                {por_modelo}
+                )"""
+
+
+def _controle_join_on(cols_pi, cols_pc) -> str:
+    """Join item x controle; usa cod_cliente_key (indexada) quando as duas tabelas ja tem a coluna."""
+    if "cod_cliente_key" in cols_pi and "cod_cliente_key" in cols_pc:
+        return "pc.codigo_programacao = pi.codigo_programacao AND pc.cod_cliente_key = pi.cod_cliente_key"
+    return "pc.codigo_programacao = pi.codigo_programacao AND UPPER(TRIM(pc.cod_cliente)) = UPPER(TRIM(pi.cod_cliente))"
+
+
+def _programacao_key_sql(conn: sqlite3.Connection, prog_alias: str = "p") -> str:
+    if col_exists(conn, "programacoes", "codigo_programacao_key"):
+        return f"{prog_alias}.codigo_programacao_key"
+    return normalized_key_expr(f"{prog_alias}.codigo_programacao")
+
+
+@schema_fragment
 def _caixas_saldo_subquery(conn: sqlite3.Connection, prog_alias: str = "p") -> str:
+    """caixas_saldo da rota: le programacao_resumo e so calcula quando a linha esta pendente."""
+    calc = _caixas_saldo_calc_expr(conn, prog_alias)
+    if not table_exists(conn.cursor(), "programacao_resumo"):
+        return f"{calc} AS caixas_saldo"
+    return (
+        "COALESCE((SELECT r.caixas_saldo FROM programacao_resumo r "
+        f"WHERE r.codigo_programacao_key = {_programacao_key_sql(conn, prog_alias)}), {calc}) AS caixas_saldo"
+    )
+
+
+@schema_fragment
+def _caixas_saldo_calc_expr(conn: sqlite3.Connection, prog_alias: str = "p") -> str:
     cols_pi = set()
     cols_pc = set()
     cols_prog = set()
     try:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(programacoes)")
-        cols_prog = {r[1] for r in cur.fetchall() or []}
-        cur.execute("PRAGMA table_info(programacao_itens)")
-        cols_pi = {r[1] for r in cur.fetchall() or []}
-        cur.execute("PRAGMA table_info(programacao_itens_controle)")
-        cols_pc = {r[1] for r in cur.fetchall() or []}
+        cols_prog = table_columns(cur, "programacoes")
+        cols_pi = table_columns(cur, "programacao_itens")
+        cols_pc = table_columns(cur, "programacao_itens_controle")
     except Exception:
-        return "0 AS caixas_saldo"
+        return "0"
 
     has_pi_pedido = "pedido" in cols_pi
     has_pc_pedido = "pedido" in cols_pc
@@ -1005,7 +1250,7 @@ def _caixas_saldo_subquery(conn: sqlite3.Connection, prog_alias: str = "p") -> s
     has_pi_alt_tipo = "alteracao_tipo" in cols_pi
     has_pc_alt_tipo = "alteracao_tipo" in cols_pc
 
-    join_on = "pc.codigo_programacao = pi.codigo_programacao AND UPPER(TRIM(pc.cod_cliente)) = UPPER(TRIM(pi.cod_cliente))"
+    join_on = _controle_join_on(cols_pi, cols_pc)
     if has_pi_pedido and has_pc_pedido:
         join_on += " AND COALESCE(TRIM(pc.pedido),'') = COALESCE(TRIM(pi.pedido),'')"
 
@@ -1063,16 +1308,23 @@ def _caixas_saldo_subquery(conn: sqlite3.Connection, prog_alias: str = "p") -> s
     loaded_expr = f"COALESCE({', '.join(loaded_candidates)}, 0)" if loaded_candidates else "0"
 
     if table_exists(conn.cursor(), "transferencias"):
+        cols_t = table_columns(conn.cursor(), "transferencias")
+        if "codigo_programacao_key" in cols_prog and {"codigo_origem_key", "codigo_destino_key"} <= cols_t:
+            destino_match = f"t.codigo_destino_key = {prog_alias}.codigo_programacao_key"
+            origem_match = f"t.codigo_origem_key = {prog_alias}.codigo_programacao_key"
+        else:
+            destino_match = f"UPPER(TRIM(COALESCE(t.codigo_destino,''))) = UPPER(TRIM({prog_alias}.codigo_programacao))"
+            origem_match = f"UPPER(TRIM(COALESCE(t.codigo_origem,''))) = UPPER(TRIM({prog_alias}.codigo_programacao))"
         accepted_in_sql = f"""(
                     SELECT COALESCE(SUM(MAX(COALESCE(t.qtd_caixas,0) - COALESCE(t.qtd_convertida,0), 0)), 0)
                     FROM transferencias t
-                    WHERE UPPER(TRIM(COALESCE(t.codigo_destino,''))) = UPPER(TRIM({prog_alias}.codigo_programacao))
+                    WHERE {destino_match}
                       AND UPPER(TRIM(COALESCE(t.status,''))) = 'ACEITA'
                 )"""
         active_out_sql = f"""(
                     SELECT COALESCE(SUM(MAX(COALESCE(t.qtd_caixas,0) - COALESCE(t.qtd_convertida,0), 0)), 0)
                     FROM transferencias t
-                    WHERE UPPER(TRIM(COALESCE(t.codigo_origem,''))) = UPPER(TRIM({prog_alias}.codigo_programacao))
+                    WHERE {origem_match}
                       AND UPPER(TRIM(COALESCE(t.status,''))) IN ('PENDENTE','ACEITA')
                 )"""
     else:
@@ -1084,7 +1336,7 @@ def _caixas_saldo_subquery(conn: sqlite3.Connection, prog_alias: str = "p") -> s
         f"+ COALESCE({converted_item_saldo_sql},0) - COALESCE({active_out_sql},0), 0)"
     )
 
-    return f"""{saldo_real_sql} AS caixas_saldo"""
+    return saldo_real_sql
 
 
 def _ultimo_km_final_veiculo(cur: sqlite3.Cursor, veiculo: str, *, exclude_programacao: str = "") -> Dict[str, Any]:
@@ -1118,10 +1370,78 @@ def _ultimo_km_final_veiculo(cur: sqlite3.Cursor, veiculo: str, *, exclude_progr
     }
 
 
-def _attach_ultimo_km_veiculo(cur: sqlite3.Cursor, rota: Dict[str, Any]) -> Dict[str, Any]:
+def _ultimos_km_final_veiculos(cur: sqlite3.Cursor, pares: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """
+    Versao em lote de _ultimo_km_final_veiculo para pares (veiculo, programacao a excluir).
+    Busca os registros mais recentes de todos os veiculos em uma unica consulta.
+    """
+    pares_n = {
+        (str(v or "").strip().upper(), str(ex or "").strip().upper())
+        for v, ex in pares
+        if str(v or "").strip()
+    }
+    veiculos = sorted({v for v, _ in pares_n})
+    out: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    if not veiculos:
+        return out
+    candidatos: Dict[str, List[Tuple[float, str]]] = {v: [] for v in veiculos}
+    try:
+        veiculo_key = (
+            "veiculo_key" if col_exists(cur, "programacoes", "veiculo_key") else "UPPER(TRIM(COALESCE(veiculo,'')))"
+        )
+        for chunk in _chunks(veiculos):
+            cur.execute(
+                f"""
+                SELECT veiculo_key, km_final, codigo_programacao
+                FROM (
+                    SELECT
+                        {veiculo_key} AS veiculo_key,
+                        COALESCE(km_final, 0) AS km_final,
+                        COALESCE(codigo_programacao, '') AS codigo_programacao,
+                        ROW_NUMBER() OVER (
+                            PARTITION BY {veiculo_key}
+                            ORDER BY COALESCE(data_chegada, data_saida, data_criacao, data, '') DESC, id DESC
+                        ) AS rn
+                    FROM programacoes
+                    WHERE {veiculo_key} IN ({", ".join("?" for _ in chunk)})
+                      AND COALESCE(km_final, 0) > 0
+                )
+                WHERE rn <= ?
+                ORDER BY veiculo_key, rn
+                """,
+                tuple(chunk) + (_ULTIMO_KM_CANDIDATOS,),
+            )
+            for row in cur.fetchall() or []:
+                candidatos.setdefault(str(row["veiculo_key"]), []).append(
+                    (float(row["km_final"] or 0.0), str(row["codigo_programacao"] or "").strip().upper())
+                )
+    except Exception:
+        logging.debug("Falha ao consultar ultimo KM final em lote", exc_info=True)
+        return {(v, ex): _ultimo_km_final_veiculo(cur, v, exclude_programacao=ex) for v, ex in pares_n}
+
+    for v, ex in pares_n:
+        lista = candidatos.get(v) or []
+        escolhido = next((c for c in lista if c[1] != ex), None)
+        if escolhido is None and len(lista) >= _ULTIMO_KM_CANDIDATOS:
+            out[(v, ex)] = _ultimo_km_final_veiculo(cur, v, exclude_programacao=ex)
+            continue
+        out[(v, ex)] = {
+            "veiculo": v,
+            "km_final": escolhido[0] if escolhido else 0.0,
+            "codigo_programacao": escolhido[1] if escolhido else "",
+        }
+    return out
+
+
+def _attach_ultimo_km_veiculo(
+    cur: sqlite3.Cursor,
+    rota: Dict[str, Any],
+    ultimo: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
     veiculo = str((rota or {}).get("veiculo") or "").strip().upper()
     codigo = str((rota or {}).get("codigo_programacao") or "").strip().upper()
-    ultimo = _ultimo_km_final_veiculo(cur, veiculo, exclude_programacao=codigo)
+    if ultimo is None:
+        ultimo = _ultimo_km_final_veiculo(cur, veiculo, exclude_programacao=codigo)
     km_atual = safe_float((rota or {}).get("km_inicial"), 0.0)
     km_sugerido = km_atual if km_atual > 0 else safe_float(ultimo.get("km_final"), 0.0)
     rota["ultimo_km_veiculo"] = safe_float(ultimo.get("km_final"), 0.0)
@@ -1141,47 +1461,100 @@ def _transferencias_resumo(
     company_id: Optional[int] = None,
 ) -> Dict[str, int]:
     codigo = str(codigo_programacao or "").strip().upper()
-    out = {"transferencias_saida": 0, "transferencias_entrada": 0, "transferencias_pendentes": 0}
-    if not codigo:
-        return out
+    out = _transferencias_resumo_lote(cur, [codigo], company_id=company_id).get(codigo)
+    return out or {"transferencias_saida": 0, "transferencias_entrada": 0, "transferencias_pendentes": 0}
+
+
+def _transferencias_resumo_lote(
+    cur: sqlite3.Cursor,
+    codigos: List[str],
+    company_id: Optional[int] = None,
+) -> Dict[str, Dict[str, int]]:
+    """Resumo de transferencias (saida/entrada/pendentes) para varias rotas; le programacao_resumo."""
+    wanted = sorted({codigo_key(c) for c in codigos if codigo_key(c)})
+    result: Dict[str, Dict[str, int]] = {}
+    for codigo, row in read_resumos(cur, wanted).items():
+        if company_id is not None and row.get("company_id") is not None and int(row["company_id"]) != int(company_id):
+            continue
+        result[codigo] = {
+            "transferencias_saida": int(row["transferencias_saida"] or 0),
+            "transferencias_entrada": int(row["transferencias_entrada"] or 0),
+            "transferencias_pendentes": int(row["transferencias_pendentes"] or 0),
+        }
+    faltando = [codigo for codigo in wanted if codigo not in result]
+    if faltando:
+        result.update(_transferencias_resumo_lote_calc(cur, faltando, company_id=company_id))
+    return result
+
+
+def _transferencias_resumo_lote_calc(
+    cur: sqlite3.Cursor,
+    codigos: List[str],
+    company_id: Optional[int] = None,
+) -> Dict[str, Dict[str, int]]:
+    wanted = sorted({str(c or "").strip().upper() for c in codigos if str(c or "").strip()})
+    result = {
+        codigo: {"transferencias_saida": 0, "transferencias_entrada": 0, "transferencias_pendentes": 0}
+        for codigo in wanted
+    }
+    if not wanted:
+        return result
     try:
-        cur.execute("PRAGMA table_info(transferencias)")
-        cols_transferencias = {str(r[1]) for r in (cur.fetchall() or [])}
+        cols_transferencias = table_columns(cur, "transferencias")
         company_sql = ""
-        params: List[Any] = [codigo, codigo]
+        company_params: List[Any] = []
         if company_id is not None and "company_id" in cols_transferencias:
             company_sql = " AND COALESCE(company_id, ?) = ?"
-            params.extend([int(company_id or 1), int(company_id or 1)])
-        cur.execute(
-            """
-            SELECT codigo_origem, codigo_destino, qtd_caixas, qtd_convertida, status
-            FROM transferencias
-            WHERE (
-                UPPER(COALESCE(codigo_origem,''))=?
-                OR UPPER(COALESCE(codigo_destino,''))=?
+            company_params = [int(company_id or 1), int(company_id or 1)]
+        if {"codigo_origem_key", "codigo_destino_key"} <= cols_transferencias:
+            origem_key, destino_key = "codigo_origem_key", "codigo_destino_key"
+        else:
+            origem_key = "UPPER(TRIM(COALESCE(codigo_origem,'')))"
+            destino_key = "UPPER(TRIM(COALESCE(codigo_destino,'')))"
+        rows = []
+        for chunk in _chunks(wanted):
+            marks = ", ".join("?" for _ in chunk)
+            cur.execute(
+                f"""
+                SELECT rowid AS rid, {origem_key} AS origem_key, {destino_key} AS destino_key,
+                       qtd_caixas, qtd_convertida, status
+                FROM transferencias
+                WHERE ({origem_key} IN ({marks}) OR {destino_key} IN ({marks}))
+                {company_sql}
+                """,
+                tuple(chunk) + tuple(chunk) + tuple(company_params),
             )
-            """ + company_sql + """
-            """,
-            tuple(params),
-        )
-        for row in cur.fetchall() or []:
-            status_value = str(row["status"] or "").strip().upper()
-            if status_value in ("CANCELADA", "CANCELADO", "RECUSADA", "RECUSADO"):
-                continue
-            qtd = int(row["qtd_convertida"] or row["qtd_caixas"] or 0)
-            if qtd <= 0:
+            rows.extend(cur.fetchall() or [])
+    except Exception:
+        return result
+
+    vistos = set()
+    for row in rows:
+        if row["rid"] in vistos:
+            continue
+        vistos.add(row["rid"])
+        origem = str(row["origem_key"] or "")
+        destino = str(row["destino_key"] or "")
+        status_value = str(row["status"] or "").strip().upper()
+        if status_value in ("CANCELADA", "CANCELADO", "RECUSADA", "RECUSADO"):
+            continue
+        qtd = int(row["qtd_convertida"] or row["qtd_caixas"] or 0)
+        if qtd <= 0:
+            continue
+        for codigo in {origem, destino}:
+            out = result.get(codigo)
+            if out is None:
                 continue
             if status_value in ("", "PENDENTE", "ABERTA", "AGUARDANDO", "SOLICITADA"):
                 out["transferencias_pendentes"] += qtd
-            if str(row["codigo_origem"] or "").strip().upper() == codigo:
+            if origem == codigo:
                 out["transferencias_saida"] += qtd
-            if str(row["codigo_destino"] or "").strip().upper() == codigo:
+            if destino == codigo:
                 out["transferencias_entrada"] += qtd
-    except Exception:
-        return out
-    return out
+    return result
 
 
+@schema_fragment
 def _rotas_not_finalizadas_clause(conn: sqlite3.Connection, alias: str = "p") -> str:
     """
     Filtro defensivo para não exibir rotas já encerradas.
@@ -1206,6 +1579,17 @@ def _total_caixas_ativas_programacao(
     cur: sqlite3.Cursor,
     codigo_programacao: str,
     company_id: Optional[int] = None,
+) -> int:
+    row = read_resumos(cur, [codigo_programacao]).get(codigo_key(codigo_programacao))
+    if row is not None and (company_id is None or row.get("company_id") is None or int(row["company_id"]) == int(company_id)):
+        return int(row["caixas_ativas"] or 0)
+    return _total_caixas_ativas_calc(cur, codigo_programacao, company_id=company_id)
+
+
+def _total_caixas_ativas_calc(
+    cur: sqlite3.Cursor,
+    codigo_programacao: str,
+    company_id: Optional[int] = None,
 ) -> int:
     def _to_int_db(v: Any) -> int:
         try:
@@ -1223,10 +1607,8 @@ def _total_caixas_ativas_programacao(
         except Exception:
             return 0
 
-    cur.execute("PRAGMA table_info(programacao_itens)")
-    cols_pi = {row[1] for row in cur.fetchall() or []}
-    cur.execute("PRAGMA table_info(programacao_itens_controle)")
-    cols_pc = {row[1] for row in cur.fetchall() or []}
+    cols_pi = table_columns(cur, "programacao_itens")
+    cols_pc = table_columns(cur, "programacao_itens_controle")
 
     has_pi_pedido = "pedido" in cols_pi
     has_pc_pedido = "pedido" in cols_pc
@@ -1236,7 +1618,7 @@ def _total_caixas_ativas_programacao(
     has_pc_caixas_atual = "caixas_atual" in cols_pc
     has_pi_qnt_caixas = "qnt_caixas" in cols_pi
 
-    join_on = "pc.codigo_programacao = pi.codigo_programacao AND UPPER(TRIM(pc.cod_cliente)) = UPPER(TRIM(pi.cod_cliente))"
+    join_on = _controle_join_on(cols_pi, cols_pc)
     if has_pi_pedido and has_pc_pedido:
         join_on += " AND COALESCE(TRIM(pc.pedido),'') = COALESCE(TRIM(pi.pedido),'')"
     if company_id is not None and "company_id" in cols_pi:
@@ -1303,6 +1685,135 @@ def _total_caixas_ativas_programacao(
     return total_em_aberto
 
 
+def _refresh_programacao_resumo(conn: sqlite3.Connection, codigos: Optional[List[str]] = None) -> int:
+    """
+    Recalcula as linhas de programacao_resumo das rotas informadas (padrao: as pendentes,
+    marcadas pelos triggers). Rotas que nao existem mais saem do resumo.
+    Leitura, gravacao e limpeza das marcas rodam numa transacao de escrita (BEGIN IMMEDIATE
+    quando a conexao nao esta em uma): um write concorrente na mesma rota espera e remarca
+    a chave depois, em vez de ter a marca apagada com o resumo calculado antes dele.
+    """
+    cur = conn.cursor()
+    if not table_exists(cur, "programacao_resumo"):
+        return 0
+    iniciou = not conn.in_transaction
+    if iniciou:
+        cur.execute("BEGIN IMMEDIATE")
+    try:
+        total = _refresh_programacao_resumo_locked(conn, cur, codigos)
+    except BaseException:
+        if iniciou:
+            conn.rollback()
+        raise
+    if iniciou:
+        conn.commit()
+    return total
+
+
+def _refresh_programacao_resumo_locked(conn: sqlite3.Connection, cur: sqlite3.Cursor, codigos: Optional[List[str]]) -> int:
+    keys = sorted({codigo_key(c) for c in (codigos if codigos is not None else resumo_pending_keys(cur)) if codigo_key(c)})
+    if not keys:
+        clear_resumo_pending(cur, [])
+        return 0
+    cols_prog = table_columns(cur, "programacoes")
+    key_sql = _programacao_key_sql(conn, "p")
+    default_company_id = _default_company_id(cur)
+    company_expr = f"COALESCE(p.company_id, {default_company_id})" if "company_id" in cols_prog else str(default_company_id)
+    saldo_expr = _caixas_saldo_calc_expr(conn, "p")
+    carga_cols = [c for c in ROTA_CARGA_COLUMNS if c in cols_prog]
+    cols_t = table_columns(cur, "transferencias") if table_exists(cur, "transferencias") else set()
+    t_cols = ["codigo_origem", "codigo_destino", "qtd_caixas", "qtd_convertida", "status"]
+    t_select = ", ".join(
+        [c if c in cols_t else f"NULL AS {c}" for c in t_cols]
+        + ["snapshot" if "snapshot" in cols_t else "NULL AS snapshot", "company_id" if "company_id" in cols_t else "NULL AS company_id"]
+    )
+    origem_key = "codigo_origem_key" if "codigo_origem_key" in cols_t else normalized_key_expr("codigo_origem")
+    destino_key = "codigo_destino_key" if "codigo_destino_key" in cols_t else normalized_key_expr("codigo_destino")
+
+    total = 0
+    for chunk in _chunks(keys):
+        marks = ", ".join("?" for _ in chunk)
+        cur.execute(
+            f"""
+            SELECT {key_sql} AS chave, p.codigo_programacao, {company_expr} AS company_id, {saldo_expr} AS caixas_saldo
+            FROM programacoes p
+            WHERE {key_sql} IN ({marks})
+            """,
+            tuple(chunk),
+        )
+        rotas = {str(r["chave"]): dict(r) for r in (cur.fetchall() or [])}
+        transferencias: List[Dict[str, Any]] = []
+        if cols_t:
+            cur.execute(
+                f"SELECT {t_select} FROM transferencias WHERE {origem_key} IN ({marks}) OR {destino_key} IN ({marks})",
+                tuple(chunk) + tuple(chunk),
+            )
+            transferencias = [dict(r) for r in (cur.fetchall() or [])]
+        cargas: Dict[str, Dict[str, Any]] = {}
+        # rotas de origem e carga raiz: kg/caixas/preco para converter as caixas transferidas
+        referencias = sorted(
+            ({codigo_key(t["codigo_origem"]) for t in transferencias} | {carga_raiz(t["snapshot"], t["codigo_origem"]) for t in transferencias})
+            - {""}
+        )
+        if referencias and carga_cols:
+            for ref_chunk in _chunks(referencias):
+                cur.execute(
+                    f"SELECT {key_sql} AS chave, {', '.join('p.' + c for c in carga_cols)} FROM programacoes p "
+                    f"WHERE {key_sql} IN ({', '.join('?' for _ in ref_chunk)})",
+                    tuple(ref_chunk),
+                )
+                cargas.update({str(r["chave"]): dict(r) for r in (cur.fetchall() or [])})
+        totais = transferencias_totais(transferencias, cargas, {k: v["company_id"] for k, v in rotas.items()})
+        linhas = []
+        for chave, rota in rotas.items():
+            linha = {
+                "codigo_programacao_key": chave,
+                "codigo_programacao": rota["codigo_programacao"],
+                "company_id": rota["company_id"],
+                "caixas_saldo": int(rota["caixas_saldo"] or 0),
+                "caixas_ativas": _total_caixas_ativas_calc(cur, rota["codigo_programacao"]),
+            }
+            linha.update(totais.get(chave) or {})
+            linhas.append(linha)
+        removidas = [k for k in chunk if k not in rotas]
+        if removidas:
+            cur.executemany("DELETE FROM programacao_resumo WHERE codigo_programacao_key=?", [(k,) for k in removidas])
+        total += upsert_resumos(cur, linhas)
+        clear_resumo_pending(cur, chunk)
+    return total
+
+
+def rebuild_programacao_resumo(db_path: Optional[str] = None) -> Dict[str, Any]:
+    """Reconstroi programacao_resumo do zero (reconciliacao); retorna quantas rotas foram gravadas."""
+    inicio = time.perf_counter()
+    with get_conn(db_path) as conn:
+        cur = conn.cursor()
+        ensure_programacao_resumo_schema(cur)
+        cur.execute("DELETE FROM programacao_resumo")
+        cur.execute("DELETE FROM programacao_resumo_pendente")
+        cur.execute(f"SELECT {_programacao_key_sql(conn, 'p')} AS chave FROM programacoes p")
+        keys = [str(r["chave"]) for r in (cur.fetchall() or []) if str(r["chave"] or "").strip()]
+        rotas = _refresh_programacao_resumo(conn, keys)
+    return {"ok": True, "rotas": rotas, "duracao_ms": round((time.perf_counter() - inicio) * 1000, 1)}
+
+
+def _atualiza_programacao_resumo(fn):
+    """Depois de um write path bem-sucedido (ja commitado), recalcula as rotas pendentes do resumo."""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        result = fn(*args, **kwargs)
+        try:
+            with get_conn() as conn:
+                _refresh_programacao_resumo(conn)
+        except Exception:
+            logging.exception("Falha ao atualizar programacao_resumo; leituras usam o calculo direto")
+        return result
+
+    return wrapper
+
+
+@schema_fragment
 def _equipe_cols_expr(conn: sqlite3.Connection, alias: str = "e") -> str:
     def col_or_null(col: str) -> str:
         if col_exists(conn, "equipes", col):
@@ -1319,6 +1830,7 @@ def _equipe_cols_expr(conn: sqlite3.Connection, alias: str = "e") -> str:
     )
 
 
+@schema_fragment
 def _programacao_itens_select_expr(conn: sqlite3.Connection, alias: str = "pi") -> str:
     def col_or_null(col: str) -> str:
         if col_exists(conn, "programacao_itens", col):
@@ -1371,19 +1883,251 @@ def _haversine_m(lat1, lon1, lat2, lon2):
     return r * c
 
 
+# =========================================================
+# GPS: buffer write-behind + retencao
+# =========================================================
+GPS_FLUSH_MS = int(os.environ.get("ROTA_GPS_FLUSH_MS", "250") or 0)
+GPS_FLUSH_ROWS = int(os.environ.get("ROTA_GPS_FLUSH_ROWS", "500") or 500)
+GPS_BATCH_MAX = 1000
+GPS_RETENCAO_DIAS = int(os.environ.get("ROTA_GPS_RETENCAO_DIAS", "90") or 0)
+GPS_DETALHE_DIAS = int(os.environ.get("ROTA_GPS_DETALHE_DIAS", "7") or 0)
+GPS_AMOSTRA_SEG = int(os.environ.get("ROTA_GPS_AMOSTRA_SEG", "60") or 0)
+# a compactacao apaga historico: so roda no startup quando ligada explicitamente
+GPS_COMPACTAR_NO_STARTUP = os.environ.get("ROTA_GPS_COMPACTAR_NO_STARTUP", "0").strip() in ("1", "true", "TRUE")
+_GPS_IDEM_ENDPOINTS = ("gps", "clientes_controle")
+
+
+def _gps_gravar_lote(itens: List[Dict[str, Any]]) -> int:
+    """Writer do buffer: um INSERT em lote + marcas de idempotencia por banco, numa transacao so."""
+    por_banco: Dict[str, List[Dict[str, Any]]] = {}
+    for item in itens:
+        por_banco.setdefault(item["db_path"], []).append(item)
+    total = 0
+    for db_path, lote in por_banco.items():
+        with get_conn(db_path) as conn:
+            cur = conn.cursor()
+            gps_cols = ["codigo_programacao", "motorista", "lat", "lon", "speed", "accuracy", "recorded_at"]
+            if "company_id" in table_columns(cur, "rota_gps_pings"):
+                gps_cols.append("company_id")
+            cur.executemany(
+                f"INSERT INTO rota_gps_pings ({', '.join(gps_cols)}) VALUES ({', '.join('?' for _ in gps_cols)})",
+                [tuple(item["ping"][c] for c in gps_cols) for item in lote],
+            )
+            _gps_atualizar_posicao_atual(cur, [item["ping"] for item in lote])
+            marcas = [
+                (item["motorista_codigo"], item["ping"]["codigo_programacao"], endpoint, item["idem_key"], _now_iso())
+                for item in lote
+                if item.get("idem_key")
+                for endpoint in _GPS_IDEM_ENDPOINTS
+            ]
+            if marcas:
+                cur.executemany(
+                    """
+                    INSERT OR IGNORE INTO mobile_sync_idempotency
+                        (motorista_codigo, codigo_programacao, endpoint, idem_key, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    marcas,
+                )
+        total += len(lote)
+    return total
+
+
+def _gps_atualizar_posicao_atual(cur: sqlite3.Cursor, pings: List[Dict[str, Any]]) -> int:
+    """Upsert da ultima posicao por rota/empresa; ping mais antigo que o gravado nao sobrescreve."""
+    ultimos: Dict[Tuple[int, str], Dict[str, Any]] = {}
+    for ping in pings:
+        chave = (int(ping.get("company_id") or 1), str(ping["codigo_programacao"]))
+        atual = ultimos.get(chave)
+        if atual is None or str(ping["recorded_at"] or "") >= str(atual["recorded_at"] or ""):
+            ultimos[chave] = ping
+    if not ultimos:
+        return 0
+    cur.execute("SELECT COALESCE(MAX(versao), 0) FROM rota_posicao_atual")
+    versao = int((cur.fetchone() or [0])[0] or 0)
+    agora = _now_iso()
+    cur.executemany(
+        """
+        INSERT INTO rota_posicao_atual
+            (company_id, codigo_programacao, motorista, lat, lon, speed, accuracy, recorded_at, versao, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(company_id, codigo_programacao) DO UPDATE SET
+            motorista=excluded.motorista,
+            lat=excluded.lat,
+            lon=excluded.lon,
+            speed=excluded.speed,
+            accuracy=excluded.accuracy,
+            recorded_at=excluded.recorded_at,
+            versao=excluded.versao,
+            updated_at=excluded.updated_at
+        WHERE excluded.recorded_at >= COALESCE(rota_posicao_atual.recorded_at, '')
+        """,
+        [
+            (
+                company,
+                codigo,
+                ping["motorista"],
+                ping["lat"],
+                ping["lon"],
+                ping["speed"],
+                ping["accuracy"],
+                ping["recorded_at"],
+                versao + idx,
+                agora,
+            )
+            for idx, ((company, codigo), ping) in enumerate(ultimos.items(), start=1)
+        ],
+    )
+    return len(ultimos)
+
+
+_GPS_BUFFER = GpsWriteBuffer(_gps_gravar_lote, flush_ms=GPS_FLUSH_MS, flush_rows=GPS_FLUSH_ROWS)
+
+
+def _gps_flush_pendentes() -> None:
+    """Garante que leituras de GPS vejam os pings ainda no buffer."""
+    if _GPS_BUFFER.pending:
+        _GPS_BUFFER.flush()
+
+
+def _gps_idem_ja_vistos(
+    cur: sqlite3.Cursor,
+    motorista_codigo: str,
+    codigo_programacao: str,
+    keys: List[str],
+) -> set:
+    vistos = {k for k in keys if _GPS_BUFFER.is_pending((DB_PATH, motorista_codigo, codigo_programacao, k))}
+    restantes = sorted(set(keys) - vistos)
+    for chunk in _chunks(restantes):
+        cur.execute(
+            f"""
+            SELECT idem_key
+            FROM mobile_sync_idempotency
+            WHERE motorista_codigo=?
+              AND codigo_programacao=?
+              AND endpoint='gps'
+              AND idem_key IN ({", ".join("?" for _ in chunk)})
+            """,
+            (motorista_codigo, codigo_programacao, *chunk),
+        )
+        vistos.update(str(r[0]) for r in cur.fetchall() or [])
+    return vistos
+
+
+def _registrar_gps_pings(codigo_programacao: str, pings: List["RotaGpsPingIn"], m: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Valida a rota uma vez e enfileira os pings no buffer write-behind.
+    Pings com idempotency_key ja gravado (ou ainda no buffer) sao ignorados.
+    """
+    nome_motorista = (m["nome"] or "").strip()
+    codigo_motorista = (m.get("codigo") or "").strip().upper()
+    company_id = int(m.get("company_id") or 1)
+
+    with get_conn() as conn:
+        cur = conn.cursor()
+        keys = [str(p.idempotency_key or "").strip() for p in pings]
+        vistos = _gps_idem_ja_vistos(cur, codigo_motorista, codigo_programacao, [k for k in keys if k])
+        if keys and all(k and k in vistos for k in keys):
+            return {"recebidos": len(pings), "aceitos": 0, "deduplicados": len(pings)}
+
+        pr = _fetch_programacao_owned(cur, codigo_programacao, m, "p.id, p.status, p.carregamento_fechado")
+        if not pr:
+            raise HTTPException(status_code=404, detail="Rota nao encontrada para este motorista")
+
+    itens: List[Dict[str, Any]] = []
+    for ping, key in zip(pings, keys):
+        if key and key in vistos:
+            continue
+        ts = None
+        if ping.timestamp:
+            try:
+                ts = datetime.fromisoformat(ping.timestamp)
+            except Exception:
+                ts = None
+        if ts is None:
+            ts = datetime.now()
+        if key:
+            vistos.add(key)
+        itens.append(
+            {
+                "db_path": DB_PATH,
+                "motorista_codigo": codigo_motorista,
+                "idem_key": key,
+                "dedup_key": (DB_PATH, codigo_motorista, codigo_programacao, key) if key else None,
+                "ping": {
+                    "codigo_programacao": codigo_programacao,
+                    "motorista": nome_motorista,
+                    "lat": float(ping.lat),
+                    "lon": float(ping.lon),
+                    "speed": (float(ping.speed) if ping.speed is not None else None),
+                    "accuracy": (float(ping.accuracy) if ping.accuracy is not None else None),
+                    "recorded_at": ts.isoformat(timespec="seconds"),
+                    "company_id": company_id,
+                },
+            }
+        )
+    _GPS_BUFFER.add(itens)
+    return {"recebidos": len(pings), "aceitos": len(itens), "deduplicados": len(pings) - len(itens)}
+
+
+def compactar_gps_pings(
+    conn: sqlite3.Connection,
+    retencao_dias: int = GPS_RETENCAO_DIAS,
+    detalhe_dias: int = GPS_DETALHE_DIAS,
+    amostra_seg: int = GPS_AMOSTRA_SEG,
+) -> Dict[str, int]:
+    """
+    Retencao do historico GPS: apaga pings mais velhos que `retencao_dias` e, entre
+    `detalhe_dias` e a retencao, mantem um ping por rota a cada `amostra_seg` segundos.
+    recorded_at e ISO com 'T'; datetime(recorded_at) normaliza para comparar com o corte.
+    """
+    cur = conn.cursor()
+    out = {"removidos": 0, "reduzidos": 0}
+    if not table_exists(cur, "rota_gps_pings"):
+        return out
+    if retencao_dias > 0:
+        cur.execute("DELETE FROM rota_gps_pings WHERE datetime(recorded_at) < datetime('now', ?)", (f"-{int(retencao_dias)} days",))
+        out["removidos"] = max(cur.rowcount, 0)
+        if table_exists(cur, "rota_posicao_atual"):
+            cur.execute(
+                "DELETE FROM rota_posicao_atual WHERE datetime(recorded_at) < datetime('now', ?)",
+                (f"-{int(retencao_dias)} days",),
+            )
+    if detalhe_dias > 0 and amostra_seg > 0:
+        grupo_company = "company_id, " if col_exists(cur, "rota_gps_pings", "company_id") else ""
+        limite = f"-{int(detalhe_dias)} days"
+        cur.execute(
+            f"""
+            DELETE FROM rota_gps_pings
+            WHERE datetime(recorded_at) < datetime('now', ?)
+              AND id NOT IN (
+                  SELECT MIN(id)
+                  FROM rota_gps_pings
+                  WHERE datetime(recorded_at) < datetime('now', ?)
+                  GROUP BY {grupo_company}codigo_programacao, CAST(strftime('%s', recorded_at) AS INTEGER) / ?
+              )
+            """,
+            (limite, limite, int(amostra_seg)),
+        )
+        out["reduzidos"] = max(cur.rowcount, 0)
+    conn.commit()
+    return out
+
+
 def _gps_distance_last_minutes(
     cur,
     codigo_programacao: str,
     minutes: int = 15,
     company_id: Optional[int] = None,
 ) -> float:
-    cur.execute("PRAGMA table_info(rota_gps_pings)")
-    cols_gps = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+    _gps_flush_pendentes()
+    cols_gps = table_columns(cur, "rota_gps_pings")
     scope_sql = ""
     params: List[Any] = [codigo_programacao, f"-{minutes} minutes"]
     if company_id is not None and "company_id" in cols_gps:
-        scope_sql = " AND COALESCE(company_id, ?) = ?"
-        params.extend([int(company_id or 1), int(company_id or 1)])
+        # igualdade direta para usar idx_rota_gps_pings_rota_tempo
+        scope_sql = " AND company_id = ?"
+        params.append(int(company_id or 1))
     cur.execute(
         """
         SELECT lat, lon, recorded_at
@@ -1591,6 +2335,46 @@ def ensure_tables():
         cols_gps = {row[1] for row in cur.fetchall() or []}
         if "company_id" not in cols_gps:
             cur.execute("ALTER TABLE rota_gps_pings ADD COLUMN company_id INTEGER")
+        # leitura por rota em ordem de tempo + corte por idade (retencao/downsampling)
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_rota_gps_pings_rota_tempo "
+            "ON rota_gps_pings(company_id, codigo_programacao, recorded_at)"
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_rota_gps_pings_recorded_at ON rota_gps_pings(recorded_at)")
+        # ultima posicao por rota (monitoramento ao vivo); versao cresce a cada ping aceito
+        posicao_nova = not table_exists(cur, "rota_posicao_atual")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS rota_posicao_atual (
+                company_id INTEGER NOT NULL DEFAULT 1,
+                codigo_programacao TEXT NOT NULL,
+                motorista TEXT,
+                lat REAL NOT NULL,
+                lon REAL NOT NULL,
+                speed REAL DEFAULT NULL,
+                accuracy REAL DEFAULT NULL,
+                recorded_at TEXT,
+                versao INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT DEFAULT (datetime('now')),
+                PRIMARY KEY (company_id, codigo_programacao)
+            )
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_rota_posicao_atual_versao ON rota_posicao_atual(versao)")
+        if posicao_nova:
+            cur.execute("""
+                INSERT OR REPLACE INTO rota_posicao_atual
+                    (company_id, codigo_programacao, motorista, lat, lon, speed, accuracy, recorded_at, versao)
+                SELECT company_id, codigo_programacao, motorista, lat, lon, speed, accuracy, recorded_at, 1
+                FROM (
+                    SELECT COALESCE(company_id, 1) AS company_id, codigo_programacao, motorista,
+                           lat, lon, speed, accuracy, recorded_at,
+                           ROW_NUMBER() OVER (
+                               PARTITION BY COALESCE(company_id, 1), codigo_programacao
+                               ORDER BY recorded_at DESC, id DESC
+                           ) AS rn
+                    FROM rota_gps_pings
+                )
+                WHERE rn = 1
+            """)
         cur.execute("""
             CREATE TABLE IF NOT EXISTS rota_fotos (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -1619,6 +2403,7 @@ def ensure_tables():
         if "company_id" not in cols_fotos:
             cur.execute("ALTER TABLE rota_fotos ADD COLUMN company_id INTEGER")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_rota_fotos_prog_categoria ON rota_fotos(codigo_programacao, categoria)")
+        photo_store.ensure_photo_store_schema(cur)
 
         cur.execute("""
             CREATE TABLE IF NOT EXISTS roteiro_operacional (
@@ -2158,15 +2943,27 @@ def ensure_tables():
         cur.execute(
             "CREATE INDEX IF NOT EXISTS idx_avulsas_itens_avulsa ON programacoes_avulsas_itens(avulsa_id, ordem, id)"
         )
+        # chaves normalizadas tambem para as tabelas criadas acima (controle, transferencias)
+        ensure_normalized_keys(conn)
+        resumo_novo = ensure_programacao_resumo_schema(cur)
+        ensure_reconcile_log_schema(cur)
 
         conn.commit()
 
-def reconcile_transferencias_status() -> int:
+    if resumo_novo:
+        rebuild_programacao_resumo()
+    else:
+        with get_conn() as conn:
+            _refresh_programacao_resumo(conn)
+
+
+def reconcile_transferencias_status(codigos_origem: Optional[Iterable[str]] = None) -> int:
     """
     Recalcula status do pedido de origem com base em transferencias ativas
     (PENDENTE/ACEITA):
     - saldo > 0  -> ALTERADO
     - saldo == 0 -> CANCELADO
+    codigos_origem limita a passada as rotas de origem informadas (reconciliacao incremental).
     """
     fixed = 0
     now = datetime.now().isoformat(timespec="seconds")
@@ -2186,20 +2983,22 @@ def reconcile_transferencias_status() -> int:
     with get_conn() as conn:
         cur = conn.cursor()
 
-        cur.execute(
-            """
-            SELECT codigo_origem, cod_cliente, pedido, COALESCE(SUM(qtd_caixas), 0) AS qtd
-            FROM transferencias
-            WHERE UPPER(TRIM(COALESCE(status, ''))) IN ('PENDENTE', 'ACEITA')
-            GROUP BY codigo_origem, cod_cliente, pedido
-            """
-        )
-        grupos = cur.fetchall() or []
+        grupos = []
+        for escopo_sql, escopo_params in _escopo_in("codigo_origem", codigos_origem):
+            cur.execute(
+                f"""
+                SELECT codigo_origem, cod_cliente, pedido, COALESCE(SUM(qtd_caixas), 0) AS qtd
+                FROM transferencias
+                WHERE UPPER(TRIM(COALESCE(status, ''))) IN ('PENDENTE', 'ACEITA'){escopo_sql}
+                GROUP BY codigo_origem, cod_cliente, pedido
+                """,
+                tuple(escopo_params),
+            )
+            grupos.extend(cur.fetchall() or [])
         if not grupos:
             return 0
 
-        cur.execute("PRAGMA table_info(programacao_itens)")
-        cols_itens = {row[1] for row in (cur.fetchall() or [])}
+        cols_itens = table_columns(cur, "programacao_itens")
         has_pedido_col = "pedido" in cols_itens
 
         for g in grupos:
@@ -2305,16 +3104,16 @@ def reconcile_transferencias_status() -> int:
     return fixed
 
 
-def sanitize_status_operacional_legado() -> int:
+def sanitize_status_operacional_legado(ids: Optional[Iterable[Any]] = None) -> int:
     """
     Limpa status_operacional terminal herdado em rotas que ainda estao ativas.
     Evita cenário: status=ATIVA e status_operacional=FINALIZADA.
+    ids limita a passada as programacoes informadas (reconciliacao incremental).
     """
     fixed = 0
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(programacoes)")
-        cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "programacoes")
         if "status_operacional" not in cols:
             return 0
 
@@ -2330,28 +3129,30 @@ def sanitize_status_operacional_legado() -> int:
         if "finalizada_no_app" in cols:
             sets.append("finalizada_no_app=0")
 
-        sql = f"""
-            UPDATE programacoes
-               SET {", ".join(sets)}
-             WHERE UPPER(TRIM(COALESCE(status, ''))) NOT IN ('FINALIZADA', 'FINALIZADO', 'CANCELADA', 'CANCELADO')
-               AND UPPER(TRIM(COALESCE(status_operacional, ''))) IN ('FINALIZADA', 'FINALIZADO', 'CANCELADA', 'CANCELADO')
-        """
-        cur.execute(sql)
-        fixed = int(cur.rowcount or 0)
+        for escopo_sql, escopo_params in _escopo_in("id", ids):
+            sql = f"""
+                UPDATE programacoes
+                   SET {", ".join(sets)}
+                 WHERE UPPER(TRIM(COALESCE(status, ''))) NOT IN ('FINALIZADA', 'FINALIZADO', 'CANCELADA', 'CANCELADO')
+                   AND UPPER(TRIM(COALESCE(status_operacional, ''))) IN ('FINALIZADA', 'FINALIZADO', 'CANCELADA', 'CANCELADO')
+                   {escopo_sql}
+            """
+            cur.execute(sql, tuple(escopo_params))
+            fixed += int(cur.rowcount or 0)
         conn.commit()
     return fixed
 
 
-def sanitize_status_finalizacao_inconsistente() -> int:
+def sanitize_status_finalizacao_inconsistente(ids: Optional[Iterable[Any]] = None) -> int:
     """
     Corrige rotas marcadas como ativas/em entrega, mas com evidência de finalização.
     Regra: se data_chegada/hora_chegada/km_final já existem, status deve ser FINALIZADA.
+    ids limita a passada as programacoes informadas (reconciliacao incremental).
     """
     fixed = 0
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(programacoes)")
-        cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "programacoes")
         if not cols:
             return 0
         has_data_chegada = "data_chegada" in cols
@@ -2375,28 +3176,30 @@ def sanitize_status_finalizacao_inconsistente() -> int:
         if "finalizada_no_app" in cols:
             set_cols.append("finalizada_no_app=1")
 
-        sql = f"""
-            UPDATE programacoes
-               SET {", ".join(set_cols)}
-             WHERE UPPER(TRIM(COALESCE(status,''))) NOT IN ('FINALIZADA','FINALIZADO','CANCELADA','CANCELADO')
-               AND ({evid_sql})
-        """
-        cur.execute(sql)
-        fixed = int(cur.rowcount or 0)
+        for escopo_sql, escopo_params in _escopo_in("id", ids):
+            sql = f"""
+                UPDATE programacoes
+                   SET {", ".join(set_cols)}
+                 WHERE UPPER(TRIM(COALESCE(status,''))) NOT IN ('FINALIZADA','FINALIZADO','CANCELADA','CANCELADO')
+                   AND ({evid_sql})
+                   {escopo_sql}
+            """
+            cur.execute(sql, tuple(escopo_params))
+            fixed += int(cur.rowcount or 0)
         conn.commit()
     return fixed
 
 
-def reconcile_programacoes_motorista_links(company_id: Optional[int] = None) -> int:
+def reconcile_programacoes_motorista_links(company_id: Optional[int] = None, ids: Optional[Iterable[Any]] = None) -> int:
     """
     Preenche motorista_id/motorista_codigo/codigo_motorista em programacoes abertas,
     usando cadastro de motoristas. Evita roteamento incorreto no app mobile.
+    ids limita a passada as programacoes informadas (reconciliacao incremental).
     """
     fixed = 0
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(programacoes)")
-        cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "programacoes")
         if not cols:
             return 0
 
@@ -2450,19 +3253,21 @@ def reconcile_programacoes_motorista_links(company_id: Optional[int] = None) ->
             scope_sql = " AND COALESCE(company_id, ?) = ?"
             scope_params.extend([int(company_id or 1), int(company_id or 1)])
 
-        cur.execute(
-            f"""
-            SELECT {", ".join(select_parts)}
-            FROM programacoes
-            WHERE UPPER(TRIM(COALESCE(status,''))) NOT IN ('FINALIZADA','FINALIZADO','CANCELADA','CANCELADO')
-              AND ({missing_sql})
-              {scope_sql}
-            ORDER BY id DESC
-            LIMIT 5000
-            """,
-            tuple(scope_params),
-        )
-        rows = cur.fetchall() or []
+        rows = []
+        for escopo_sql, escopo_params in _escopo_in("id", ids):
+            cur.execute(
+                f"""
+                SELECT {", ".join(select_parts)}
+                FROM programacoes
+                WHERE UPPER(TRIM(COALESCE(status,''))) NOT IN ('FINALIZADA','FINALIZADO','CANCELADA','CANCELADO')
+                  AND ({missing_sql})
+                  {scope_sql}{escopo_sql}
+                ORDER BY id DESC
+                LIMIT 5000
+                """,
+                tuple(scope_params + escopo_params),
+            )
+            rows.extend(cur.fetchall() or [])
         for r in rows:
             pid = int(r["id"] or 0)
             row_company_id = int(r["company_id"] or company_id or 1)
@@ -2533,6 +3338,104 @@ def reconcile_programacoes_motorista_links(company_id: Optional[int] = None) ->
     return fixed
 
 
+def _escopo_transferencias_status(cur: sqlite3.Cursor, mudancas: Dict[str, set]) -> List[str]:
+    """Rotas de origem afetadas: transferencias alteradas + rotas com itens (re)gravados."""
+    codigos = set(mudancas.get("programacao_itens") or ())
+    for escopo_sql, escopo_params in _escopo_in("id", mudancas.get("transferencias") or ()):
+        cur.execute(f"SELECT DISTINCT codigo_origem FROM transferencias WHERE 1=1{escopo_sql}", tuple(escopo_params))
+        codigos.update(str(r[0] or "").strip() for r in (cur.fetchall() or []))
+    return sorted(c for c in codigos if c)
+
+
+# (nome, tabelas do reconcile_log, escopo a partir das mudancas, passada)
+# escopo None = passada completa (ex.: cadastro de motoristas mudou -> qualquer rota pode casar)
+_STARTUP_RECONCILERS = (
+    (
+        "transferencias_status",
+        ("transferencias", "programacao_itens"),
+        _escopo_transferencias_status,
+        lambda escopo: reconcile_transferencias_status(codigos_origem=escopo),
+    ),
+    (
+        "status_operacional_legado",
+        ("programacoes",),
+        lambda cur, mudancas: mudancas["programacoes"],
+        lambda escopo: sanitize_status_operacional_legado(ids=escopo),
+    ),
+    (
+        "finalizacao_inconsistente",
+        ("programacoes",),
+        lambda cur, mudancas: mudancas["programacoes"],
+        lambda escopo: sanitize_status_finalizacao_inconsistente(ids=escopo),
+    ),
+    (
+        "motorista_links",
+        ("programacoes", "motoristas"),
+        lambda cur, mudancas: None if mudancas["motoristas"] else mudancas["programacoes"],
+        lambda escopo: reconcile_programacoes_motorista_links(ids=escopo),
+    ),
+)
+
+
+def _reconciliacao_incremental(nome: str, tabelas: Tuple[str, ...], escopo_fn, passada) -> int:
+    """
+    Roda uma reconciliacao so sobre o que mudou desde o high-water mark gravado em
+    runtime_metadata (seq do reconcile_log). Sem mark (banco novo/antigo), faz a passada completa.
+    """
+    inicio = time.perf_counter()
+    with get_conn() as conn:
+        cur = conn.cursor()
+        hwm = high_water_mark(cur, nome)
+        ate = last_seq(cur)
+        escopo = None
+        if hwm is not None:
+            escopo = escopo_fn(cur, changes_between(cur, hwm, ate, tabelas))
+    if escopo is not None and not escopo:
+        fixed = 0
+    else:
+        fixed = passada(escopo)
+    with get_conn() as conn:
+        set_high_water_mark(conn.cursor(), nome, ate)
+    logging.info(
+        "Reconciliacao %s concluida. Ajustes: %s | modo: %s | %.1f ms",
+        nome,
+        fixed,
+        "completa" if escopo is None else f"incremental ({len(escopo)})",
+        (time.perf_counter() - inicio) * 1000,
+    )
+    return fixed
+
+
+def run_startup_reconcilers() -> Dict[str, Optional[int]]:
+    """Reconciliacoes (e retencao GPS, se ROTA_GPS_COMPACTAR_NO_STARTUP) do startup; cada passada falha isoladamente."""
+    inicio = time.perf_counter()
+    out: Dict[str, Optional[int]] = {}
+    for nome, tabelas, escopo_fn, passada in _STARTUP_RECONCILERS:
+        try:
+            out[nome] = _reconciliacao_incremental(nome, tabelas, escopo_fn, passada)
+        except Exception:
+            out[nome] = None
+            logging.exception("Falha na reconciliacao %s no startup", nome)
+    try:
+        with get_conn() as conn:
+            prune_reconcile_log(conn.cursor(), [item[0] for item in _STARTUP_RECONCILERS])
+    except Exception:
+        logging.exception("Falha ao limpar reconcile_log")
+    if GPS_COMPACTAR_NO_STARTUP:
+        try:
+            gps_inicio = time.perf_counter()
+            with get_conn() as conn:
+                gps = compactar_gps_pings(conn)
+            logging.info(
+                "Retencao GPS concluida. Removidos: %s | reduzidos: %s | %.1f ms",
+                gps["removidos"], gps["reduzidos"], (time.perf_counter() - gps_inicio) * 1000,
+            )
+        except Exception:
+            logging.exception("Falha na retencao de pings GPS no startup")
+    logging.info("Reconciliacoes de startup concluidas em %.1f ms", (time.perf_counter() - inicio) * 1000)
+    return out
+
+
 def _resolve_motorista_vinculo(
     cur: sqlite3.Cursor,
     motorista_nome: str = "",
@@ -2612,9 +3515,17 @@ def _resolve_motorista_vinculo(
     return nome, mot_id, codigo
 
 
+def warm_schema_catalog() -> Optional[int]:
+    """Carrega o catalogo de schema do DB_PATH atual e retorna a versao carregada."""
+    with get_conn() as conn:
+        catalog = _schema_catalog(conn)
+        return catalog.version if catalog is not None else None
+
+
 @app.on_event("startup")
 def _startup():
     ensure_tables()
+    logging.info("Catalogo de schema carregado | versao=%s", warm_schema_catalog())
     with sqlite3.connect(DB_PATH) as admin_conn:
         ensure_admin_user_bootstrap(
             admin_conn,
@@ -2622,26 +3533,20 @@ def _startup():
         )
     logging.info("Banco publicado inicializado | env=%s | db=%s | admin=%s", APP_CONFIG.app_env, DB_PATH, "configured" if os.environ.get("ROTA_ADMIN_PASS") or os.environ.get("ROTA_ADMIN_PASSWORD") else "generated")
     log_startup_diagnostics(DB_PATH, APP_CONFIG)
+    # background (padrao): a API ja aceita requests enquanto as reconciliacoes rodam
+    if STARTUP_RECONCILE_MODE == "sync":
+        run_startup_reconcilers()
+    elif STARTUP_RECONCILE_MODE != "off":
+        threading.Thread(target=run_startup_reconcilers, name="rota-startup-reconcile", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def _shutdown():
     try:
-        fixed = reconcile_transferencias_status()
-        logging.info("Reconciliacao de transferencias concluida. Itens ajustados: %s", fixed)
-    except Exception:
-        logging.exception("Falha na reconciliacao de transferencias no startup")
-    try:
-        fixed_st = sanitize_status_operacional_legado()
-        logging.info("Saneamento de status operacional legado concluido. Rotas ajustadas: %s", fixed_st)
-    except Exception:
-        logging.exception("Falha no saneamento de status operacional legado no startup")
-    try:
-        fixed_fin = sanitize_status_finalizacao_inconsistente()
-        logging.info("Saneamento de finalizacao inconsistente concluido. Rotas ajustadas: %s", fixed_fin)
-    except Exception:
-        logging.exception("Falha no saneamento de finalizacao inconsistente no startup")
-    try:
-        fixed_links = reconcile_programacoes_motorista_links()
-        logging.info("Reconciliacao de vinculos motorista/programacoes concluida. Rotas ajustadas: %s", fixed_links)
+        gravados = _GPS_BUFFER.close()
+        logging.info("Buffer GPS descarregado no shutdown. Pings gravados: %s", gravados)
     except Exception:
-        logging.exception("Falha na reconciliacao de vinculos motorista/programacoes no startup")
+        logging.exception("Falha ao descarregar buffer GPS no shutdown")
 
 # =========================================================
 # TOKEN HELPERS (HMAC + base64 urlsafe)
@@ -2817,39 +3722,57 @@ FEATURE_ENDPOINTS = {
 }
 
 
+def _plan_features_for_company(company_id: int) -> Dict[str, Any]:
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT p.features_json
+            FROM subscriptions s
+            JOIN plans p ON p.id = s.plan_id
+            WHERE s.company_id=? AND s.status IN ('active', 'trialing', 'past_due', 'suspended')
+            ORDER BY s.id DESC
+            LIMIT 1
+            """,
+            (int(company_id),),
+        )
+        row = cur.fetchone()
+    if not row:
+        return {}
+    try:
+        features = json.loads(str(row["features_json"] or "{}"))
+    except Exception:
+        features = {}
+    return features if isinstance(features, dict) else {}
+
+
+def _entitlements_for_company(company_id: int) -> Dict[str, Any]:
+    out = dict(_billing_context_for_company(company_id))
+    try:
+        out["features"] = _plan_features_for_company(company_id)
+    except Exception:
+        out["features"] = {}
+    return out
+
+
+# cache unico de features + status de cobranca por empresa (escopo = banco atual)
+ENTITLEMENTS = EntitlementCache(_entitlements_for_company, scope=lambda: DB_PATH)
+
+
 def _can_use_feature_for_company(company_id: int, feature_name: str) -> bool:
     feature_key = str(feature_name or "").strip()
     if not feature_key:
         return True
     try:
-        with get_conn() as conn:
-            cur = conn.cursor()
-            cur.execute(
-                """
-                SELECT p.features_json
-                FROM subscriptions s
-                JOIN plans p ON p.id = s.plan_id
-                WHERE s.company_id=? AND s.status IN ('active', 'trialing', 'past_due', 'suspended')
-                ORDER BY s.id DESC
-                LIMIT 1
-                """,
-                (int(company_id),),
-            )
-            row = cur.fetchone()
-            if not row:
-                return False
-            try:
-                features = json.loads(str(row["features_json"] or "{}"))
-            except Exception:
-                features = {}
-            return bool(isinstance(features, dict) and features.get(feature_key))
+        return feature_allowed(ENTITLEMENTS.get(company_id), feature_key)
     except Exception:
         return False
 
 
-app.add_middleware(BillingProtectionMiddleware, get_billing_context=_billing_context_for_company, audit_block=_audit_billing_block)
-app.add_middleware(FeatureGateMiddleware, endpoint_features=FEATURE_ENDPOINTS, can_use_feature=_can_use_feature_for_company)
+app.add_middleware(BillingProtectionMiddleware, entitlements=ENTITLEMENTS, audit_block=_audit_billing_block)
+app.add_middleware(FeatureGateMiddleware, endpoint_features=FEATURE_ENDPOINTS, entitlements=ENTITLEMENTS)
 app.add_middleware(TenantContextMiddleware, verify_token=verify_token)
+app.add_middleware(RequestConnectionMiddleware)
 
 def _motorista_app_role(row: Any) -> str:
     if row is None:
@@ -3023,6 +3946,10 @@ class RotaGpsPingIn(BaseModel):
     idempotency_key: Optional[str] = None
 
 
+class RotaGpsBatchIn(BaseModel):
+    pings: List[RotaGpsPingIn] = []
+
+
 class FinalizarRotaIn(BaseModel):
     data_chegada: str
     hora_chegada: str
@@ -3156,6 +4083,12 @@ class RotaDespesaIn(BaseModel):
     idempotency_key: Optional[str] = None
 
 
+class FotoUploadIn(BaseModel):
+    tamanho_bytes: int
+    sha256: Optional[str] = None
+    mime_type: Optional[str] = None
+
+
 class RotaAjudantesIn(BaseModel):
     ajudantes_anteriores: Optional[str] = None
     ajudantes_novos: str
@@ -3472,6 +4405,10 @@ def get_current_motorista(
     credentials: HTTPAuthorizationCredentials = Depends(security),
 ) -> Dict[str, Any]:
     token = credentials.credentials
+    cached = PRINCIPALS.get(DB_PATH, "motorista", token)
+    if cached is not None:
+        return cached
+    geracao = PRINCIPALS.generation()
 
     data = verify_token(token)
     if not data:
@@ -3486,8 +4423,7 @@ def get_current_motorista(
 
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(motoristas)")
-        cols_m = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols_m = table_columns(cur, "motoristas")
         default_company_id = _default_company_id(cur)
         select_parts = [
             "id",
@@ -3516,7 +4452,7 @@ def get_current_motorista(
             raise HTTPException(status_code=403, detail="Usuario sem perfil admin para o app do motorista")
         is_admin = perfil_app == "ADMIN" or perfil_token == "admin"
 
-    return {
+    principal = {
         "codigo": m["codigo"],
         "nome": m["nome"],
         "id": m["id"],
@@ -3524,12 +4460,18 @@ def get_current_motorista(
         "is_admin": is_admin,
         "perfil_app": perfil_app,
     }
+    PRINCIPALS.put(DB_PATH, "motorista", token, principal, codigo=m["codigo"], exp=data.get("exp"), generation=geracao)
+    return principal
 
 
 def get_current_vendedor(
     credentials: HTTPAuthorizationCredentials = Depends(security),
 ) -> Dict[str, Any]:
     token = credentials.credentials
+    cached = PRINCIPALS.get(DB_PATH, "vendedor", token)
+    if cached is not None:
+        return cached
+    geracao = PRINCIPALS.generation()
 
     data = verify_token(token)
     if not data:
@@ -3547,8 +4489,7 @@ def get_current_vendedor(
         cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='vendedores'")
         if not cur.fetchone():
             raise HTTPException(status_code=401, detail="Cadastro de vendedores indisponivel")
-        cur.execute("PRAGMA table_info(vendedores)")
-        cols_v = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols_v = table_columns(cur, "vendedores")
         default_company_id = _default_company_id(cur)
         company_expr = f"COALESCE(company_id, {default_company_id}) AS company_id" if "company_id" in cols_v else f"{default_company_id} AS company_id"
         cur.execute(
@@ -3571,7 +4512,9 @@ def get_current_vendedor(
         if token_company_id is not None and int(token_company_id) != row_company_id:
             raise HTTPException(status_code=403, detail="Token pertence a outra empresa")
 
-    return {"codigo": row["codigo"], "nome": row["nome"], "id": row["id"], "company_id": row_company_id}
+    principal = {"codigo": row["codigo"], "nome": row["nome"], "id": row["id"], "company_id": row_company_id}
+    PRINCIPALS.put(DB_PATH, "vendedor", token, principal, codigo=row["codigo"], exp=data.get("exp"), generation=geracao)
+    return principal
 
 
 def _require_admin_user(admin: Dict[str, Any]) -> None:
@@ -3658,7 +4601,9 @@ def admin_update_company_status(
                 ),
             )
         cur.execute("SELECT * FROM companies WHERE id=? LIMIT 1", (int(company_id),))
-        return {"ok": True, "company": row_to_dict(cur.fetchone())}
+        company = row_to_dict(cur.fetchone())
+    invalidate_entitlements(company_id)
+    return {"ok": True, "company": company}
 
 
 @app.get("/admin/companies/{company_id}/usage")
@@ -3884,7 +4829,9 @@ def admin_register_payment(
                 ),
             )
         cur.execute("SELECT * FROM payments WHERE id=? LIMIT 1", (int(payment_id),))
-        return {"ok": True, "payment": row_to_dict(cur.fetchone())}
+        registered = row_to_dict(cur.fetchone())
+    invalidate_entitlements(int(payment["company_id"]))
+    return {"ok": True, "payment": registered}
 
 
 @app.get("/admin/audit-logs")
@@ -3962,14 +4909,26 @@ def admin_run_overdue_check(
     _require_admin_user(admin)
     with get_conn() as conn:
         summary = suspend_overdue_subscriptions_conn(conn, grace_days=int(payload.grace_days or 0))
+    invalidate_entitlements()
     return {"ok": True, "summary": summary}
 
 
+@app.post("/admin/runtime/programacao-resumo/rebuild")
+def admin_rebuild_programacao_resumo(admin: Dict[str, Any] = Depends(get_current_motorista)):
+    _require_admin_user(admin)
+    return rebuild_programacao_resumo()
+
+
+@app.get("/admin/runtime/db-pool")
+def admin_db_pool_stats(admin: Dict[str, Any] = Depends(get_current_motorista)):
+    _require_admin_user(admin)
+    return {"pools": pool_stats(), "gps_buffer": _GPS_BUFFER.stats(), "principals": PRINCIPALS.stats()}
+
+
 def _admin_count_table(cur: sqlite3.Cursor, table: str, company_id: int) -> int:
     if not table_exists(cur, table):
         return 0
-    cur.execute(f"PRAGMA table_info({table})")
-    cols = {str(row[1]).lower() for row in (cur.fetchall() or [])}
+    cols = table_columns(cur, table)
     if "company_id" in cols:
         cur.execute(f'SELECT COUNT(*) FROM "{table}" WHERE company_id=?', (int(company_id),))
     else:
@@ -4104,6 +5063,7 @@ def admin_change_company_plan(
         )
         updated = row_to_dict(cur.fetchone())
 
+    invalidate_entitlements(company_id)
     return {"ok": True, "subscription": updated}
 
 
@@ -4117,8 +5077,7 @@ def _owner_filter_for_programacoes(
     Fallback por nome existe apenas para bancos legados sem coluna de vÃnculo.
     """
     cur = conn.cursor()
-    cur.execute("PRAGMA table_info(programacoes)")
-    cols = {r[1] for r in cur.fetchall() or []}
+    cols = table_columns(cur, "programacoes")
 
     conds: List[str] = []
     params: List[Any] = []
@@ -4211,8 +5170,7 @@ def _desktop_company_id(cur: sqlite3.Cursor, x_company_id: Optional[str] = None)
 def _company_scope_condition(cur: sqlite3.Cursor, table: str, company_id: Optional[int], alias: str = "") -> tuple[str, List[Any]]:
     if not company_id or not table_exists(cur, table):
         return "", []
-    cur.execute(f"PRAGMA table_info({table})")
-    cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+    cols = table_columns(cur, table)
     if "company_id" not in cols:
         return "", []
     prefix = f"{alias}." if alias else ""
@@ -4247,8 +5205,7 @@ def _company_id_for_programacao(
     company_id = int(fallback_company_id or _default_company_id(cur) or 1)
     if not table_exists(cur, "programacoes"):
         return company_id
-    cur.execute("PRAGMA table_info(programacoes)")
-    cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+    cols = table_columns(cur, "programacoes")
     if "company_id" not in cols:
         return company_id
     cur.execute(
@@ -4324,8 +5281,7 @@ def desktop_motoristas(
         cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='motoristas'")
         if not cur.fetchone():
             return []
-        cur.execute("PRAGMA table_info(motoristas)")
-        cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "motoristas")
         company_id = _desktop_company_id(cur, x_company_id)
         clauses: List[str] = []
         params: List[Any] = []
@@ -4369,8 +5325,7 @@ def desktop_vendedores(
         cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='vendedores'")
         if not cur.fetchone():
             return []
-        cur.execute("PRAGMA table_info(vendedores)")
-        cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "vendedores")
         company_id = _desktop_company_id(cur, x_company_id)
         where = "WHERE company_id=?" if "company_id" in cols else ""
         params = (company_id,) if "company_id" in cols else ()
@@ -4417,8 +5372,7 @@ def desktop_veiculos(
         cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='veiculos'")
         if not cur.fetchone():
             return []
-        cur.execute("PRAGMA table_info(veiculos)")
-        cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "veiculos")
         company_id = _desktop_company_id(cur, x_company_id)
         where = "WHERE company_id=?" if "company_id" in cols else ""
         params = (company_id,) if "company_id" in cols else ()
@@ -4456,8 +5410,7 @@ def desktop_ajudantes(
         cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='ajudantes'")
         if not cur.fetchone():
             return []
-        cur.execute("PRAGMA table_info(ajudantes)")
-        cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "ajudantes")
         company_id = _desktop_company_id(cur, x_company_id)
         clauses: List[str] = []
         params: List[Any] = []
@@ -4501,6 +5454,12 @@ def desktop_motoristas_upsert(
     _ok: bool = Depends(_require_desktop_secret),
     x_company_id: Optional[str] = Header(default=None, alias="X-Company-ID"),
 ):
+    resultado = _upsert_motorista_desktop(payload, x_company_id)
+    PRINCIPALS.invalidate("motorista", resultado.get("codigo"))
+    return resultado
+
+
+def _upsert_motorista_desktop(payload: DesktopMotoristaUpsertIn, x_company_id: Optional[str]) -> Dict[str, Any]:
     codigo = _clean_text(payload.codigo).upper()
     nome = _clean_text(payload.nome).upper()
     if not codigo or not nome:
@@ -4530,8 +5489,7 @@ def desktop_motoristas_upsert(
 
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(motoristas)")
-        cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "motoristas")
         if not cols:
             raise HTTPException(status_code=500, detail="Tabela motoristas indisponivel.")
 
@@ -4646,6 +5604,12 @@ def desktop_vendedores_upsert(
     _ok: bool = Depends(_require_desktop_secret),
     x_company_id: Optional[str] = Header(default=None, alias="X-Company-ID"),
 ):
+    resultado = _upsert_vendedor_desktop(payload, x_company_id)
+    PRINCIPALS.invalidate("vendedor", resultado.get("codigo"))
+    return resultado
+
+
+def _upsert_vendedor_desktop(payload: DesktopVendedorUpsertIn, x_company_id: Optional[str]) -> Dict[str, Any]:
     codigo = _clean_text(payload.codigo).upper()
     nome = _clean_text(payload.nome).upper()
     if not codigo or not nome:
@@ -4669,8 +5633,7 @@ def desktop_vendedores_upsert(
 
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(vendedores)")
-        cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "vendedores")
         if not cols:
             raise HTTPException(status_code=500, detail="Tabela vendedores indisponivel.")
 
@@ -4761,8 +5724,7 @@ def desktop_veiculos_upsert(
 
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(veiculos)")
-        cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "veiculos")
         if not cols:
             raise HTTPException(status_code=500, detail="Tabela veiculos indisponivel.")
 
@@ -4840,8 +5802,7 @@ def desktop_ajudantes_upsert(
 
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(ajudantes)")
-        cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "ajudantes")
         if not cols:
             raise HTTPException(status_code=500, detail="Tabela ajudantes indisponivel.")
 
@@ -5005,51 +5966,65 @@ def desktop_clientes_bulk_upsert(
 ):
     itens = payload.clientes or []
     if not itens:
-        return {"ok": True, "total": 0, "created": 0, "updated": 0, "falhas": []}
+        return {"ok": True, "total": 0, "created": 0, "updated": 0, "unchanged": 0, "falhas": []}
 
-    total = 0
-    created = 0
-    updated = 0
+    validos: List[Dict[str, Any]] = []
     falhas: List[Dict[str, Any]] = []
+    for idx, item in enumerate(itens, start=1):
+        linha = {
+            "cod_cliente": _clean_text(item.cod_cliente).upper(),
+            "nome_cliente": _clean_text(item.nome_cliente).upper(),
+            "endereco": _clean_text(item.endereco).upper(),
+            "telefone": _clean_text(item.telefone).upper(),
+            "vendedor": _clean_text(item.vendedor).upper(),
+        }
+        if not linha["cod_cliente"] or not linha["nome_cliente"]:
+            falhas.append(
+                {
+                    "index": idx,
+                    "cod_cliente": _clean_text(getattr(item, "cod_cliente", "")),
+                    "detail": "cod_cliente e nome_cliente sao obrigatorios.",
+                }
+            )
+            continue
+        validos.append(linha)
+    if falhas:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "message": "Falha ao salvar alguns clientes.",
+                "salvos": len(validos),
+                "total_falhas": len(falhas),
+                "falhas": falhas[:20],
+            },
+        )
+
     with get_conn() as conn:
         cur = conn.cursor()
         cols = _ensure_clientes_table(cur)
+        if not cols:
+            raise HTTPException(status_code=500, detail="Tabela clientes indisponivel.")
         company_id = _desktop_company_id(cur, x_company_id)
-        for idx, item in enumerate(itens, start=1):
-            try:
-                result = _desktop_cliente_upsert_cur(cur, item, cols=cols, company_id=company_id)
-                total += 1
-                created += int(result.get("created") or 0)
-                updated += int(result.get("updated") or 0)
-            except HTTPException as exc:
-                falhas.append(
-                    {
-                        "index": idx,
-                        "cod_cliente": _clean_text(getattr(item, "cod_cliente", "")),
-                        "detail": exc.detail,
-                    }
-                )
-            except Exception as exc:
-                logging.exception("Falha ao importar cliente em lote")
-                falhas.append(
-                    {
-                        "index": idx,
-                        "cod_cliente": _clean_text(getattr(item, "cod_cliente", "")),
-                        "detail": str(exc or "Falha inesperada."),
-                    }
-                )
+        escopo_id = (company_id or _default_company_id(cur)) if "company_id" in cols else None
+        resultado = clientes_lote.upsert_clientes_lote(cur, validos, company_id=escopo_id)
+        if resultado is not None:
+            return {
+                "ok": True,
+                "total": len(validos),
+                "created": resultado["criados"],
+                "updated": resultado["atualizados"],
+                "unchanged": resultado["inalterados"],
+                "falhas": [],
+            }
 
-        if falhas:
-            raise HTTPException(
-                status_code=400,
-                detail={
-                    "message": "Falha ao salvar alguns clientes.",
-                    "salvos": total,
-                    "total_falhas": len(falhas),
-                    "falhas": falhas[:20],
-                },
-            )
-    return {"ok": True, "total": total, "created": created, "updated": updated, "falhas": []}
+        # schema legado sem indice unico de clientes: grava linha a linha
+        created = 0
+        updated = 0
+        for item in itens:
+            result = _desktop_cliente_upsert_cur(cur, item, cols=cols, company_id=company_id)
+            created += int(result.get("created") or 0)
+            updated += int(result.get("updated") or 0)
+    return {"ok": True, "total": len(validos), "created": created, "updated": updated, "unchanged": 0, "falhas": []}
 
 
 @app.delete("/desktop/cadastros/motoristas/{codigo}")
@@ -5073,6 +6048,7 @@ def desktop_motoristas_delete(
             (cod, *scope_params),
         )
         deleted = int(cur.rowcount or 0)
+    PRINCIPALS.invalidate("motorista", cod)
     return {"ok": True, "codigo": cod, "deleted": deleted}
 
 
@@ -5097,6 +6073,7 @@ def desktop_vendedores_delete(
             (cod, *scope_params),
         )
         deleted = int(cur.rowcount or 0)
+    PRINCIPALS.invalidate("vendedor", cod)
     return {"ok": True, "codigo": cod, "deleted": deleted}
 
 
@@ -5174,13 +6151,15 @@ def desktop_clientes_delete(
 
 @app.get("/desktop/clientes/base")
 def desktop_clientes_base(
-    q: str = Query("", description="Busca por codigo/nome/cidade"),
+    q: str = Query("", description="Busca por codigo/nome/cidade/bairro/vendedor"),
     vendedor: str = Query("", description="Filtro por vendedor"),
     cidade: str = Query("", description="Filtro por cidade"),
     ordem: str = Query("nome", description="nome|codigo"),
     limit: int = Query(300, ge=1, le=1000),
+    cursor: str = Query("", description="Cursor da proxima pagina (header X-Next-Cursor)"),
     _ok: bool = Depends(_require_desktop_secret),
     x_company_id: Optional[str] = Header(default=None, alias="X-Company-ID"),
+    response: Response = None,
 ):
     with get_conn() as conn:
         cur = conn.cursor()
@@ -5201,20 +6180,20 @@ def desktop_clientes_base(
         col_preco = "preco" if "preco" in cols else "''"
         col_caixas = "caixas" if "caixas" in cols else "''"
 
-        term = (q or "").strip().upper()
         vend_f = (vendedor or "").strip().upper()
         cid_f = (cidade or "").strip().upper()
-        ordem_sql = (
-            "UPPER(TRIM(COALESCE(cod_cliente, ''))), UPPER(TRIM(COALESCE(nome_cliente, '')))"
-            if (ordem or "").strip().lower() == "codigo"
-            else "UPPER(TRIM(COALESCE(nome_cliente, ''))), UPPER(TRIM(COALESCE(cod_cliente, '')))"
-        )
-        like = f"%{term}%"
-        like_vend = f"%{vend_f}%"
-        like_cid = f"%{cid_f}%"
-        cur.execute(
-            f"""
-            SELECT
+        filtros: List[str] = [scope_sql] if scope_sql else []
+        params: List[Any] = list(scope_params)
+        if vend_f:
+            filtros.append(f"UPPER(TRIM(COALESCE({col_vend}, ''))) LIKE ?")
+            params.append(f"%{vend_f}%")
+        if cid_f:
+            filtros.append(f"UPPER(TRIM(COALESCE({col_cid}, ''))) LIKE ?")
+            params.append(f"%{cid_f}%")
+        rows, proximo = clientes_busca.buscar_clientes(
+            cur,
+            q,
+            colunas_sql=f"""
                 TRIM(COALESCE({col_cod}, '')) AS cod_cliente,
                 TRIM(COALESCE({col_nome}, '')) AS nome_cliente,
                 TRIM(COALESCE({col_end}, '')) AS endereco,
@@ -5224,38 +6203,22 @@ def desktop_clientes_base(
                 TRIM(COALESCE({col_vend}, '')) AS vendedor,
                 TRIM(COALESCE({col_preco}, '')) AS preco,
                 TRIM(COALESCE({col_caixas}, '')) AS caixas
-            FROM clientes
-            WHERE
-                (
-                    (? = '')
-                    OR UPPER(TRIM(COALESCE({col_cod}, ''))) LIKE ?
-                    OR UPPER(TRIM(COALESCE({col_nome}, ''))) LIKE ?
-                    OR UPPER(TRIM(COALESCE({col_cid}, ''))) LIKE ?
-                )
-            AND ((? = '') OR UPPER(TRIM(COALESCE({col_vend}, ''))) LIKE ?)
-            AND ((? = '') OR UPPER(TRIM(COALESCE({col_cid}, ''))) LIKE ?)
-            {f'AND {scope_sql}' if scope_sql else ''}
-            ORDER BY {ordem_sql}
-            LIMIT ?
             """,
-            (term, like, like, like, vend_f, like_vend, cid_f, like_cid, *scope_params, int(limit)),
-        )
-        out: List[Dict[str, Any]] = []
-        for r in cur.fetchall() or []:
-            out.append(
-                {
-                    "cod_cliente": str(r["cod_cliente"] or "").strip(),
-                    "nome_cliente": str(r["nome_cliente"] or "").strip(),
-                    "endereco": str(r["endereco"] or "").strip(),
-                    "telefone": str(r["telefone"] or "").strip(),
-                    "cidade": str(r["cidade"] or "").strip(),
-                    "bairro": str(r["bairro"] or "").strip(),
-                    "vendedor": str(r["vendedor"] or "").strip(),
-                    "preco": str(r["preco"] or "").strip(),
-                    "caixas": str(r["caixas"] or "").strip(),
-                }
-            )
-        return out
+            filtros_sql=filtros,
+            filtros_params=params,
+            ordem=ordem,
+            limit=int(limit),
+            cursor=cursor,
+        )
+        if proximo and response is not None:
+            response.headers["X-Next-Cursor"] = proximo
+        return [
+            {
+                chave: str(r[chave] or "").strip()
+                for chave in ("cod_cliente", "nome_cliente", "endereco", "telefone", "cidade", "bairro", "vendedor", "preco", "caixas")
+            }
+            for r in rows
+        ]
 
 
 @app.post("/desktop/programacoes/reconciliar-vinculos")
@@ -5271,6 +6234,7 @@ def desktop_reconciliar_vinculos_motorista(
 
 
 @app.post("/desktop/rotas/upsert")
+@_atualiza_programacao_resumo
 def desktop_rotas_upsert(
     payload: DesktopRotaUpsertIn,
     _ok: bool = Depends(_require_desktop_secret),
@@ -5282,8 +6246,7 @@ def desktop_rotas_upsert(
 
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(programacoes)")
-        cols_prog = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols_prog = table_columns(cur, "programacoes")
         company_id = _desktop_company_id(cur, x_company_id)
 
         data_criacao = (payload.data_criacao or datetime.now().strftime("%Y-%m-%d %H:%M:%S")).strip()
@@ -5651,8 +6614,7 @@ def desktop_rotas_upsert(
             )
 
         # Itens da programação: substitui snapshot no servidor.
-        cur.execute("PRAGMA table_info(programacao_itens)")
-        cols_itens = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols_itens = table_columns(cur, "programacao_itens")
         has_item_obs = "observacao" in cols_itens
         scope_itens, scope_itens_params = _company_scope_condition(cur, "programacao_itens", company_id)
         scope_itens_clause = f" AND {scope_itens}" if scope_itens else ""
@@ -5969,8 +6931,7 @@ def desktop_avulsa_conciliar(
         nf_oficial = str(row_prog["nf_numero"] or "").strip()
 
         # Itens da programação oficial (fonte de pedido/caixas/preço).
-        cur.execute("PRAGMA table_info(programacao_itens)")
-        cols_pi = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols_pi = table_columns(cur, "programacao_itens")
         has_obs = "observacao" in cols_pi
         select_obs = ", COALESCE(observacao,'') AS observacao" if has_obs else ", '' AS observacao"
         cur.execute(
@@ -6087,9 +7048,11 @@ def desktop_avulsa_conciliar(
 
 @app.get("/clientes/base")
 def listar_clientes_base(
-    q: str = Query("", description="Busca por código/nome/cidade"),
+    q: str = Query("", description="Busca por código/nome/cidade/bairro/vendedor"),
     limit: int = Query(200, ge=1, le=1000),
+    cursor: str = Query("", description="Cursor da próxima página (header X-Next-Cursor)"),
     m=Depends(get_current_motorista),
+    response: Response = None,
 ):
     with get_conn() as conn:
         cur = conn.cursor()
@@ -6100,40 +7063,26 @@ def listar_clientes_base(
         company_id = int((m or {}).get("company_id") or _default_company_id(cur))
         scope_sql, scope_params = _company_scope_condition(cur, "clientes", company_id)
 
-        term = (q or "").strip().upper()
-        like = f"%{term}%"
-        cur.execute(
-            f"""
-            SELECT
+        rows, proximo = clientes_busca.buscar_clientes(
+            cur,
+            q,
+            colunas_sql="""
                 TRIM(COALESCE(cod_cliente, '')) AS cod_cliente,
                 TRIM(COALESCE(nome_cliente, '')) AS nome_cliente,
                 TRIM(COALESCE(cidade, '')) AS cidade,
                 TRIM(COALESCE(vendedor, '')) AS vendedor
-            FROM clientes
-            WHERE
-                (
-                    (? = '')
-                    OR UPPER(TRIM(COALESCE(cod_cliente, ''))) LIKE ?
-                    OR UPPER(TRIM(COALESCE(nome_cliente, ''))) LIKE ?
-                    OR UPPER(TRIM(COALESCE(cidade, ''))) LIKE ?
-                )
-                {f'AND {scope_sql}' if scope_sql else ''}
-            ORDER BY UPPER(TRIM(COALESCE(nome_cliente, ''))), UPPER(TRIM(COALESCE(cod_cliente, '')))
-            LIMIT ?
             """,
-            (term, like, like, like, *scope_params, int(limit)),
-        )
-        out: List[Dict[str, Any]] = []
-        for r in cur.fetchall() or []:
-            out.append(
-                {
-                    "cod_cliente": (r["cod_cliente"] or "").strip(),
-                    "nome_cliente": (r["nome_cliente"] or "").strip(),
-                    "cidade": (r["cidade"] or "").strip(),
-                    "vendedor": (r["vendedor"] or "").strip(),
-                }
-            )
-        return out
+            filtros_sql=[scope_sql] if scope_sql else [],
+            filtros_params=scope_params,
+            limit=int(limit),
+            cursor=cursor,
+        )
+        if proximo and response is not None:
+            response.headers["X-Next-Cursor"] = proximo
+        return [
+            {chave: (r[chave] or "").strip() for chave in ("cod_cliente", "nome_cliente", "cidade", "vendedor")}
+            for r in rows
+        ]
 
 
 @app.post("/rotas/{codigo_programacao}/clientes/reserva")
@@ -6175,8 +7124,7 @@ def criar_cliente_reserva(
         if not cur.fetchone():
             raise HTTPException(status_code=500, detail="Tabela programacao_itens não encontrada.")
 
-        cur.execute("PRAGMA table_info(programacao_itens)")
-        cols = {r[1] for r in cur.fetchall() or []}
+        cols = table_columns(cur, "programacao_itens")
 
         has_pedido = "pedido" in cols
         has_status = "status_pedido" in cols
@@ -6369,8 +7317,7 @@ def autenticar_vendedor(payload: LoginIn, request: Request):
         v, auth_err = authenticate_vendedor(cur, codigo, senha)
         if v:
             try:
-                cur.execute("PRAGMA table_info(vendedores)")
-                cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+                cols = table_columns(cur, "vendedores")
                 set_parts: List[str] = []
                 params: List[Any] = []
                 if "ultimo_login_em" in cols:
@@ -6946,8 +7893,7 @@ def vendedor_pre_programacao_remover(
 def admin_listar_acesso_motoristas(_ok=Depends(_require_desktop_secret)):
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(motoristas)")
-        cols = {r[1] for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "motoristas")
 
         has_acesso = "acesso_liberado" in cols
         has_por = "acesso_liberado_por" in cols
@@ -7002,8 +7948,7 @@ def admin_set_acesso_motorista(
 
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(motoristas)")
-        cols = {r[1] for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "motoristas")
         if "acesso_liberado" not in cols:
             raise HTTPException(status_code=500, detail="Controle de acesso ainda não inicializado no banco.")
 
@@ -7029,15 +7974,16 @@ def admin_set_acesso_motorista(
         params.append(int(m["id"]))
         cur.execute(f"UPDATE motoristas SET {', '.join(sets)} WHERE id=?", tuple(params))
 
-        return {
-            "ok": True,
-            "codigo": str(m["codigo"] or "").strip().upper(),
-            "nome": str(m["nome"] or "").strip().upper(),
-            "acesso_liberado": liberado,
-            "acesso_liberado_por": admin_nome,
-            "acesso_liberado_em": ts,
-            "acesso_obs": motivo,
-        }
+    PRINCIPALS.invalidate("motorista", m["codigo"])
+    return {
+        "ok": True,
+        "codigo": str(m["codigo"] or "").strip().upper(),
+        "nome": str(m["nome"] or "").strip().upper(),
+        "acesso_liberado": liberado,
+        "acesso_liberado_por": admin_nome,
+        "acesso_liberado_em": ts,
+        "acesso_obs": motivo,
+    }
 
 
 @app.post("/admin/motoristas/senha/{codigo_motorista}")
@@ -7070,18 +8016,54 @@ def admin_set_senha_motorista(
         senha_hash = hash_password_pbkdf2(senha)
         cur.execute("UPDATE motoristas SET senha=? WHERE id=?", (senha_hash, int(m["id"])))
 
-        return {
-            "ok": True,
-            "codigo": str(m["codigo"] or "").strip().upper(),
-            "nome": str(m["nome"] or "").strip().upper(),
-            "senha_atualizada_por": admin_nome,
-            "motivo": motivo,
-        }
+    PRINCIPALS.invalidate("motorista", m["codigo"])
+    return {
+        "ok": True,
+        "codigo": str(m["codigo"] or "").strip().upper(),
+        "nome": str(m["nome"] or "").strip().upper(),
+        "senha_atualizada_por": admin_nome,
+        "motivo": motivo,
+    }
 
 
 # =========================================================
 # âœ… ROTAS ATIVAS (TODAS) - SEM FILTRAR POR MOTORISTA
 # =========================================================
+def _enriquecer_rotas_ativas(
+    cur: sqlite3.Cursor,
+    rows: List[sqlite3.Row],
+    company_id: int,
+) -> List[Dict[str, Any]]:
+    """
+    Decora as rotas ativas com equipe, substituicao pendente, ultimo KM do veiculo
+    e resumo de transferencias usando uma consulta agrupada por enriquecimento.
+    """
+    nomes_index = _load_equipe_nomes_index(cur)
+    rotas = [_decorate_rota_row(row_to_dict(r), cur, nomes_index) for r in rows]
+    codigos = [str(d.get("codigo_programacao") or "").strip() for d in rotas]
+    pendentes = _pending_substituicoes_lote(cur, codigos, company_id=company_id)
+    ultimos_km = _ultimos_km_final_veiculos(
+        cur,
+        [(d.get("veiculo"), d.get("codigo_programacao")) for d in rotas],
+    )
+    resumos = _transferencias_resumo_lote(cur, codigos, company_id=company_id)
+    vazio = {"veiculo": "", "km_final": 0.0, "codigo_programacao": ""}
+
+    response_rows = []
+    for d, codigo in zip(rotas, codigos):
+        pend_sub = bool(codigo) and codigo in pendentes
+        d["substituicao_pendente"] = 1 if pend_sub else 0
+        d["status_operacional"] = _status_operacional_especial(d, pend_substituicao=pend_sub)
+        chave_km = (str(d.get("veiculo") or "").strip().upper(), codigo.upper())
+        d = _attach_ultimo_km_veiculo(cur, d, ultimos_km.get(chave_km, vazio))
+        d.update(
+            resumos.get(codigo.upper())
+            or {"transferencias_saida": 0, "transferencias_entrada": 0, "transferencias_pendentes": 0}
+        )
+        response_rows.append(d)
+    return response_rows
+
+
 @app.get("/rotas/ativas_todas", response_model=List[RotaAtivaOut])
 def listar_rotas_ativas_todas(m=Depends(get_current_motorista)):
     """
@@ -7150,13 +8132,7 @@ def listar_rotas_ativas_todas(m=Depends(get_current_motorista)):
                 COALESCE(p.usuario_criacao, '') AS usuario_criacao,
                 COALESCE(p.usuario_ultima_edicao, '') AS usuario_ultima_edicao,
                 p.total_caixas,
-                (
-                    SELECT CAST(NULLIF(TRIM(v.capacidade_cx), '') AS INTEGER)
-                    FROM veiculos v
-                    WHERE UPPER(TRIM(v.placa)) = UPPER(TRIM(p.veiculo))
-                       OR UPPER(TRIM(v.modelo)) = UPPER(TRIM(p.veiculo))
-                    LIMIT 1
-                ) AS capacidade_cx,
+                """ + _capacidade_cx_subquery(conn, "p") + """ AS capacidade_cx,
                 """ + caixas_saldo_expr + """
             FROM programacoes p
             LEFT JOIN equipes e
@@ -7170,17 +8146,7 @@ def listar_rotas_ativas_todas(m=Depends(get_current_motorista)):
             company_params,
         )
         rows = cur.fetchall()
-        response_rows = []
-        company_id = int(m.get("company_id") or 1)
-        for r in rows:
-            d = _decorate_rota_row(row_to_dict(r), cur)
-            codigo = str(d.get("codigo_programacao") or "").strip()
-            pend_sub = _has_pending_substituicao(cur, codigo, company_id=company_id) if codigo else False
-            d["substituicao_pendente"] = 1 if pend_sub else 0
-            d["status_operacional"] = _status_operacional_especial(d, pend_substituicao=pend_sub)
-            d = _attach_ultimo_km_veiculo(cur, d)
-            d.update(_transferencias_resumo(cur, codigo, company_id=company_id))
-            response_rows.append(d)
+        response_rows = _enriquecer_rotas_ativas(cur, rows, company_id=int(m.get("company_id") or 1))
 
     return response_rows
 
@@ -7241,13 +8207,7 @@ def rotas_ativas(m=Depends(get_current_motorista)):
                 COALESCE(p.usuario_criacao, '') AS usuario_criacao,
                 COALESCE(p.usuario_ultima_edicao, '') AS usuario_ultima_edicao,
                 p.total_caixas,
-                (
-                    SELECT CAST(NULLIF(TRIM(v.capacidade_cx), '') AS INTEGER)
-                    FROM veiculos v
-                    WHERE UPPER(TRIM(v.placa)) = UPPER(TRIM(p.veiculo))
-                       OR UPPER(TRIM(v.modelo)) = UPPER(TRIM(p.veiculo))
-                    LIMIT 1
-                ) AS capacidade_cx,
+                """ + _capacidade_cx_subquery(conn, "p") + """ AS capacidade_cx,
                 """ + caixas_saldo_expr + """
             FROM programacoes p
             LEFT JOIN equipes e
@@ -7261,17 +8221,7 @@ def rotas_ativas(m=Depends(get_current_motorista)):
             owner_params,
         )
         rows = cur.fetchall()
-        response_rows = []
-        company_id = int(m.get("company_id") or 1)
-        for r in rows:
-            d = _decorate_rota_row(row_to_dict(r), cur)
-            codigo = str(d.get("codigo_programacao") or "").strip()
-            pend_sub = _has_pending_substituicao(cur, codigo, company_id=company_id) if codigo else False
-            d["substituicao_pendente"] = 1 if pend_sub else 0
-            d["status_operacional"] = _status_operacional_especial(d, pend_substituicao=pend_sub)
-            d = _attach_ultimo_km_veiculo(cur, d)
-            d.update(_transferencias_resumo(cur, codigo, company_id=company_id))
-            response_rows.append(d)
+        response_rows = _enriquecer_rotas_ativas(cur, rows, company_id=int(m.get("company_id") or 1))
 
     return response_rows
 
@@ -7289,13 +8239,7 @@ def rota_detalhe(codigo_programacao: str, m=Depends(get_current_motorista)):
             """
             SELECT
                 p.*,
-                (
-                    SELECT CAST(NULLIF(TRIM(v.capacidade_cx), '') AS INTEGER)
-                    FROM veiculos v
-                    WHERE UPPER(TRIM(v.placa)) = UPPER(TRIM(p.veiculo))
-                       OR UPPER(TRIM(v.modelo)) = UPPER(TRIM(p.veiculo))
-                    LIMIT 1
-                ) AS capacidade_cx,
+                """ + _capacidade_cx_subquery(conn, "p") + """ AS capacidade_cx,
                 """ + caixas_saldo_expr + """
             FROM programacoes p
             WHERE p.codigo_programacao=?
@@ -7430,13 +8374,7 @@ def rota_detalhe_desktop(
             """
             SELECT
                 p.*,
-                (
-                    SELECT CAST(NULLIF(TRIM(v.capacidade_cx), '') AS INTEGER)
-                    FROM veiculos v
-                    WHERE UPPER(TRIM(v.placa)) = UPPER(TRIM(p.veiculo))
-                       OR UPPER(TRIM(v.modelo)) = UPPER(TRIM(p.veiculo))
-                    LIMIT 1
-                ) AS capacidade_cx,
+                """ + _capacidade_cx_subquery(conn, "p") + """ AS capacidade_cx,
                 """ + caixas_saldo_expr + """
             FROM programacoes p
             WHERE p.codigo_programacao=?
@@ -7727,8 +8665,7 @@ def desktop_criar_recebimento(
         _ensure_programacao_mutable(cur, prog, company_id=company_id)
         _ensure_programacao_has_cliente(cur, prog, cod, company_id=company_id)
         ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        cur.execute("PRAGMA table_info(recebimentos)")
-        cols_rec = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols_rec = table_columns(cur, "recebimentos")
         insert_cols = ["codigo_programacao", "cod_cliente", "nome_cliente", "valor", "forma_pagamento", "observacao", "num_nf", "data_registro"]
         insert_vals: List[Any] = [prog, cod, nome, valor, forma, obs, num_nf, ts]
         if "company_id" in cols_rec:
@@ -7779,8 +8716,7 @@ def _upsert_diarias_despesas_desktop(
     observacao_ajudantes: str,
     company_id: Optional[int] = None,
 ) -> None:
-    cur.execute("PRAGMA table_info(despesas)")
-    cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+    cols = table_columns(cur, "despesas")
     if not cols:
         return
     company_id = int(company_id or _company_id_for_programacao(cur, prog) or 1)
@@ -7871,8 +8807,7 @@ def desktop_atualizar_cabecalho_rota(
         cur = conn.cursor()
         company_id = _company_id_for_programacao(cur, prog, _desktop_company_id(cur, x_company_id))
         _ensure_programacao_mutable(cur, prog, company_id=company_id)
-        cur.execute("PRAGMA table_info(programacoes)")
-        cols_prog = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols_prog = table_columns(cur, "programacoes")
 
         sets: List[str] = []
         vals: List[Any] = []
@@ -8036,8 +8971,7 @@ def desktop_atualizar_financeiro_rota(
         cur = conn.cursor()
         company_id = _company_id_for_programacao(cur, prog, _desktop_company_id(cur, x_company_id))
         _ensure_programacao_mutable(cur, prog, company_id=company_id)
-        cur.execute("PRAGMA table_info(programacoes)")
-        cols_prog = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols_prog = table_columns(cur, "programacoes")
 
         sets: List[str] = []
         vals: List[Any] = []
@@ -8211,8 +9145,7 @@ def desktop_upsert_cliente_manual_programacao(
             )
             action = "updated"
         else:
-            cur.execute("PRAGMA table_info(programacao_itens)")
-            cols_itens = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+            cols_itens = table_columns(cur, "programacao_itens")
             insert_cols = ["codigo_programacao", "cod_cliente", "nome_cliente", "qnt_caixas", "kg", "preco", "endereco", "vendedor", "pedido"]
             insert_vals: List[Any] = [prog, cod, nome, 0, 0, 0, "", "", "MANUAL"]
             if "company_id" in cols_itens:
@@ -8240,8 +9173,7 @@ def desktop_listar_despesas(
     with get_conn() as conn:
         cur = conn.cursor()
         company_id = _company_id_for_programacao(cur, prog, _desktop_company_id(cur, x_company_id))
-        cur.execute("PRAGMA table_info(despesas)")
-        cols_desp = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols_desp = table_columns(cur, "despesas")
         scope_desp, scope_desp_params = _company_scope_condition(cur, "despesas", company_id)
         scope_desp_clause = f" AND {scope_desp}" if scope_desp else ""
         id_local_expr = "TRIM(COALESCE(id_local,''))" if "id_local" in cols_desp else "''"
@@ -8336,8 +9268,7 @@ def desktop_criar_despesa(
         company_id = _company_id_for_programacao(cur, prog, _desktop_company_id(cur, x_company_id))
         _ensure_programacao_mutable(cur, prog, company_id=company_id)
         ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        cur.execute("PRAGMA table_info(despesas)")
-        cols_desp = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols_desp = table_columns(cur, "despesas")
         insert_cols = ["codigo_programacao", "descricao", "valor", "categoria", "observacao", "data_registro"]
         insert_vals: List[Any] = [prog, desc, val, cat, obs, ts]
         if "company_id" in cols_desp:
@@ -8476,8 +9407,7 @@ def desktop_atualizar_status_rota(
         cur = conn.cursor()
         company_id = _company_id_for_programacao(cur, prog, _desktop_company_id(cur, x_company_id))
         _ensure_programacao_mutable(cur, prog, company_id=company_id)
-        cur.execute("PRAGMA table_info(programacoes)")
-        cols_prog = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols_prog = table_columns(cur, "programacoes")
 
         sets: List[str] = []
         vals: List[Any] = []
@@ -8675,8 +9605,7 @@ def _collect_desktop_logistica(
         out["transf_in"] = int((row["in_cx"] if row else 0) or 0)
 
     if table_exists(cur, "programacao_itens"):
-        cur.execute("PRAGMA table_info(programacao_itens)")
-        cols_it = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols_it = table_columns(cur, "programacao_itens")
         has_cx_atual = "caixas_atual" in cols_it
         scope_itens, scope_itens_params = _company_scope_condition(cur, "programacao_itens", company_id)
         scope_itens_clause = f" AND {scope_itens}" if scope_itens else ""
@@ -8697,8 +9626,7 @@ def _collect_desktop_logistica(
 
         if (not has_cx_atual) and table_exists(cur, "programacao_itens_controle"):
             try:
-                cur.execute("PRAGMA table_info(programacao_itens_controle)")
-                cols_ctl = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+                cols_ctl = table_columns(cur, "programacao_itens_controle")
                 if "caixas_atual" in cols_ctl:
                     scope_ctl, scope_ctl_params = _company_scope_condition(cur, "programacao_itens_controle", company_id)
                     scope_ctl_clause = f" AND {scope_ctl}" if scope_ctl else ""
@@ -8783,8 +9711,7 @@ def _programacao_state(
     if not prog:
         return None
 
-    cur.execute("PRAGMA table_info(programacoes)")
-    cols_prog = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+    cols_prog = table_columns(cur, "programacoes")
     if not cols_prog:
         return None
 
@@ -8882,8 +9809,7 @@ def _cadastro_delete_block_reason(
             cod = (codigo or "").strip().upper()
             if not cod or not table_exists(cur, "programacoes"):
                 return ""
-            cur.execute("PRAGMA table_info(programacoes)")
-            cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+            cols = table_columns(cur, "programacoes")
             conds: List[str] = []
             params: List[Any] = []
             for col in ("motorista_codigo", "codigo_motorista", "motorista"):
@@ -8920,8 +9846,7 @@ def _cadastro_delete_block_reason(
                 if int((cur.fetchone() or [0])[0] or 0) > 0:
                     return "Vendedor vinculado ao cadastro de clientes."
             if table_exists(cur, "programacoes"):
-                cur.execute("PRAGMA table_info(programacoes)")
-                cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+                cols = table_columns(cur, "programacoes")
                 conds: List[str] = []
                 params: List[Any] = []
                 for col in ("usuario_criacao", "usuario_ultima_edicao"):
@@ -8993,8 +9918,7 @@ def _cadastro_delete_block_reason(
             sobrenome = str(row["sobrenome"] or "").strip().upper() if row else ""
             alvo = f"{nome} {sobrenome}".strip()
             if table_exists(cur, "equipes"):
-                cur.execute("PRAGMA table_info(equipes)")
-                cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+                cols = table_columns(cur, "equipes")
                 conds = []
                 params = []
                 for col in ("ajudante1", "ajudante2", "ajudante_1", "ajudante_2"):
@@ -9017,8 +9941,7 @@ def _cadastro_delete_block_reason(
                     if int((cur.fetchone() or [0])[0] or 0) > 0:
                         return "Ajudante vinculado a equipe."
             if nome and table_exists(cur, "programacoes"):
-                cur.execute("PRAGMA table_info(programacoes)")
-                cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+                cols = table_columns(cur, "programacoes")
                 if "equipe" in cols:
                     expr = "UPPER(TRIM(COALESCE(equipe,'')))"
                     scope_sql, scope_params = _company_scope_condition(cur, "programacoes", company_id)
@@ -9102,8 +10025,7 @@ def desktop_overview(_ok: bool = Depends(_require_desktop_secret)):
         cur = conn.cursor()
         where_not_finalizadas = _rotas_not_finalizadas_clause(conn, "p")
         try:
-            cur.execute("PRAGMA table_info(programacoes)")
-            cols_prog = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+            cols_prog = table_columns(cur, "programacoes")
         except Exception:
             cols_prog = set()
 
@@ -9234,8 +10156,7 @@ def desktop_programacoes_listar(
     modo_n = (modo or "todas").strip().lower()
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(programacoes)")
-        cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "programacoes")
 
         has_status = "status" in cols
         has_status_op = "status_operacional" in cols
@@ -9329,8 +10250,7 @@ def desktop_centro_custos_rows(
 ):
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(programacoes)")
-        cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "programacoes")
 
         data_expr = "COALESCE(p.data_saida,p.data_criacao,'')"
         km_expr = "COALESCE(p.km_rodado,0)" if "km_rodado" in cols else "0"
@@ -9396,8 +10316,7 @@ def desktop_centro_custos_rows(
 def desktop_relatorio_km_veiculos(_ok: bool = Depends(_require_desktop_secret)):
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(programacoes)")
-        cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "programacoes")
         km_expr = "COALESCE(km_rodado,0)" if "km_rodado" in cols else "0"
         media_expr = "COALESCE(media_km_l,0)" if "media_km_l" in cols else "0"
         cur.execute(
@@ -9460,8 +10379,7 @@ def desktop_relatorio_rotina_motoristas(
     filtro_mot = str(motorista_like or "").strip().upper()
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(programacoes)")
-        cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "programacoes")
         km_expr = "COALESCE(km_rodado,0)" if "km_rodado" in cols else "0"
         if "nf_kg_vendido" in cols and "kg_vendido" in cols:
             kg_expr = "COALESCE(nf_kg_vendido, kg_vendido, 0)"
@@ -9516,8 +10434,7 @@ def desktop_relatorio_mortalidade_motorista(
 
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(programacoes)")
-        cols_p = {str(c[1]).lower() for c in (cur.fetchall() or [])}
+        cols_p = table_columns(cur, "programacoes")
         has_status = "status" in cols_p
         has_data_criacao = "data_criacao" in cols_p
         has_data = "data" in cols_p
@@ -9583,8 +10500,7 @@ def desktop_escala_rows(
 ):
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(programacoes)")
-        cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "programacoes")
 
         local_expr = (
             "COALESCE(local_rota,'')"
@@ -9714,24 +10630,40 @@ def desktop_rota_logistica(
 
 @app.get("/desktop/monitoramento/rotas")
 def desktop_rotas_monitoramento(
+    response: Response,
+    since: Optional[int] = Query(default=None, ge=0),
     _ok: bool = Depends(_require_desktop_secret),
     x_company_id: Optional[str] = Header(default=None, alias="X-Company-ID"),
+    if_none_match: Optional[str] = Header(default=None, alias="If-None-Match"),
 ):
     """
     Retorna monitoramento consolidado para o desktop:
     - rotas ativas
-    - último ping GPS (lat/lon/velocidade/precisão/horário)
+    - último ping GPS (lat/lon/velocidade/precisão/horário), lido de rota_posicao_atual
+    Com `since` (campo `versao` de uma resposta anterior) volta so as rotas com posicao nova;
+    `ativas` sempre lista todas as rotas ativas, para o cliente descartar as finalizadas/removidas.
+    O ETag vem do estado das rotas (ativas, status, versao das posicoes) e e conferido antes de
+    ler as posicoes: If-None-Match igual responde 304.
     """
+    _gps_flush_pendentes()
     with get_conn() as conn:
         cur = conn.cursor()
         company_id = _desktop_company_id(cur, x_company_id)
         where_not_finalizadas = _rotas_not_finalizadas_clause(conn, "p")
         scope_prog, scope_prog_params = _company_scope_sql_for_conn(conn, "programacoes", company_id, "p")
         scope_prog_clause = f" AND {scope_prog}" if scope_prog else ""
-        gps_has_company = col_exists(conn, "rota_gps_pings", "company_id")
-        gps_select_company = ", r1.company_id" if gps_has_company else ""
-        gps_group_company = ", company_id" if gps_has_company else ""
-        gps_join_company = " AND COALESCE(g.company_id, p.company_id)=p.company_id" if gps_has_company and col_exists(conn, "programacoes", "company_id") else ""
+        if col_exists(conn, "programacoes", "company_id"):
+            pos_join = "g.company_id = p.company_id AND g.codigo_programacao = p.codigo_programacao"
+        else:
+            pos_join = "g.codigo_programacao = p.codigo_programacao"
+        rotas_sql = """
+            FROM programacoes p
+            LEFT JOIN rota_posicao_atual g ON """ + pos_join + """
+            WHERE """ + where_not_finalizadas + """
+              """ + scope_prog_clause + """
+            ORDER BY p.id DESC
+            LIMIT 500
+        """
         cur.execute(
             """
             SELECT
@@ -9740,36 +10672,46 @@ def desktop_rotas_monitoramento(
                 COALESCE(p.veiculo, '') AS veiculo,
                 COALESCE(p.status, '') AS status,
                 COALESCE(p.status_operacional, '') AS status_operacional,
-                g.lat,
-                g.lon,
-                g.speed,
-                g.accuracy,
-                g.recorded_at
-            FROM programacoes p
-            LEFT JOIN (
-                SELECT r1.codigo_programacao, r1.lat, r1.lon, r1.speed, r1.accuracy, r1.recorded_at
-                       """ + gps_select_company + """
-                FROM rota_gps_pings r1
-                INNER JOIN (
-                    SELECT codigo_programacao, MAX(id) AS max_id
-                    FROM rota_gps_pings
-                    GROUP BY codigo_programacao""" + gps_group_company + """
-                ) r2 ON r2.max_id = r1.id
-            ) g ON g.codigo_programacao = p.codigo_programacao
-                 """ + gps_join_company + """
-            WHERE """ + where_not_finalizadas + """
-              """ + scope_prog_clause + """
-            ORDER BY p.id DESC
-            LIMIT 500
-            """,
+                COALESCE(g.versao, 0) AS versao
+            """ + rotas_sql,
             tuple(scope_prog_params),
         )
-        rows = cur.fetchall() or []
+        estado = [dict(r) for r in (cur.fetchall() or [])]
+        ativas = [str(r["codigo_programacao"] or "").strip() for r in estado]
+        pendentes = _pending_substituicoes_lote(cur, ativas, company_id=company_id)
+        versao = max((int(r["versao"] or 0) for r in estado), default=0)
+        assinatura = json.dumps([estado, sorted(pendentes)], sort_keys=True, default=str)
+        etag = f'"v{versao}-' + hashlib.sha1(assinatura.encode("utf-8")).hexdigest()[:16] + '"'
+        if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+            return Response(status_code=304, headers={"ETag": etag})
+
+        novas = [codigo for codigo, r in zip(ativas, estado) if since is None or int(r["versao"] or 0) > since]
+        rows = []
+        if novas:
+            cur.execute(
+                """
+                SELECT
+                    p.codigo_programacao,
+                    COALESCE(p.motorista, '') AS motorista,
+                    COALESCE(p.veiculo, '') AS veiculo,
+                    COALESCE(p.status, '') AS status,
+                    COALESCE(p.status_operacional, '') AS status_operacional,
+                    g.lat,
+                    g.lon,
+                    g.speed,
+                    g.accuracy,
+                    g.recorded_at,
+                    COALESCE(g.versao, 0) AS versao
+                """ + rotas_sql,
+                tuple(scope_prog_params),
+            )
+            wanted = set(novas)
+            rows = [r for r in (cur.fetchall() or []) if str(r["codigo_programacao"] or "").strip() in wanted]
 
         out = []
         for r in rows:
             codigo = str(r["codigo_programacao"] or "").strip()
-            pend_sub = _has_pending_substituicao(cur, codigo, company_id=company_id) if codigo else False
+            pend_sub = bool(codigo) and codigo in pendentes
             status_operacional = _status_operacional_especial(dict(r), pend_substituicao=pend_sub)
             status_base = str(r["status"] or "").strip()
             out.append(
@@ -9787,10 +10729,12 @@ def desktop_rotas_monitoramento(
                     "recorded_at": str(r["recorded_at"] or "").strip(),
                 }
             )
-        return {"rotas": out}
+    response.headers["ETag"] = etag
+    return {"rotas": out, "ativas": ativas, "versao": versao}
 
 
 @app.post("/rotas/{codigo_programacao}/clientes/controle")
+@_atualiza_programacao_resumo
 def salvar_controle_cliente(
     codigo_programacao: str,
     payload: ClienteControleIn,
@@ -9858,8 +10802,7 @@ def salvar_controle_cliente(
         confianca_localizacao = payload.confianca_localizacao
 
         # busca item base (para status/valores), priorizando o pedido informado
-        cur.execute("PRAGMA table_info(programacao_itens)")
-        cols_prog_itens = {row[1] for row in cur.fetchall()}
+        cols_prog_itens = table_columns(cur, "programacao_itens")
         has_pedido_col = "pedido" in cols_prog_itens
 
         item_base = None
@@ -10129,8 +11072,7 @@ def salvar_controle_cliente(
                 ),
             )
         try:
-            cur.execute("PRAGMA table_info(programacao_itens_controle)")
-            cols_ctrl_company = {row[1] for row in cur.fetchall() or []}
+            cols_ctrl_company = table_columns(cur, "programacao_itens_controle")
             if "company_id" in cols_ctrl_company:
                 cur.execute(
                     """
@@ -10159,8 +11101,7 @@ def salvar_controle_cliente(
             company_id=company_id,
         )
         try:
-            cur.execute("PRAGMA table_info(programacao_itens_controle)")
-            cols_ctrl_extra = {row[1] for row in cur.fetchall() or []}
+            cols_ctrl_extra = table_columns(cur, "programacao_itens_controle")
             extra_sets = []
             extra_params: List[Any] = []
 
@@ -10249,8 +11190,7 @@ def salvar_controle_cliente(
         # sincroniza recebimentos (se tabela existir)
         cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='recebimentos'")
         if cur.fetchone() is not None:
-            cur.execute("PRAGMA table_info(recebimentos)")
-            cols_receb = {row[1] for row in cur.fetchall() or []}
+            cols_receb = table_columns(cur, "recebimentos")
             has_receb_pedido = "pedido" in cols_receb
             if valor_recebido is not None and float(valor_recebido) > 0:
                 if has_receb_pedido:
@@ -10444,57 +11384,32 @@ def salvar_gps(
     payload: RotaGpsPingIn,
     m=Depends(get_current_motorista),
 ):
-    nome_motorista = (m["nome"] or "").strip()
-    codigo_motorista = (m.get("codigo") or "").strip().upper()
-    company_id = int(m.get("company_id") or 1)
     codigo_programacao = (codigo_programacao or "").strip()
-
     if not codigo_programacao:
         raise HTTPException(status_code=400, detail="Codigo de programacao invalido.")
 
-    with get_conn() as conn:
-        cur = conn.cursor()
-        if _idempotency_seen(cur, codigo_motorista, codigo_programacao, "gps", payload.idempotency_key):
-            return {"ok": True, "deduplicado": True}
-
-        pr = _fetch_programacao_owned(cur, codigo_programacao, m, "p.id, p.status, p.carregamento_fechado")
-        if not pr:
-            raise HTTPException(status_code=404, detail="Rota nao encontrada para este motorista")
+    res = _registrar_gps_pings(codigo_programacao, [payload], m)
+    if res["deduplicados"]:
+        return {"ok": True, "deduplicado": True}
+    return {"ok": True}
 
-        ts = None
-        if payload.timestamp:
-            try:
-                ts = datetime.fromisoformat(payload.timestamp)
-            except Exception:
-                ts = None
-        if ts is None:
-            ts = datetime.now()
 
-        cur.execute("PRAGMA table_info(rota_gps_pings)")
-        cols_gps = {row[1] for row in cur.fetchall() or []}
-        gps_cols = ["codigo_programacao", "motorista", "lat", "lon", "speed", "accuracy", "recorded_at"]
-        gps_vals = [
-            codigo_programacao,
-            nome_motorista,
-            float(payload.lat),
-            float(payload.lon),
-            (float(payload.speed) if payload.speed is not None else None),
-            (float(payload.accuracy) if payload.accuracy is not None else None),
-            ts.isoformat(timespec="seconds"),
-        ]
-        if "company_id" in cols_gps:
-            gps_cols.append("company_id")
-            gps_vals.append(company_id)
-        placeholders = ", ".join(["?"] * len(gps_cols))
-        cur.execute(
-            f"INSERT INTO rota_gps_pings ({', '.join(gps_cols)}) VALUES ({placeholders})",
-            tuple(gps_vals),
-        )
-        _idempotency_mark(cur, codigo_motorista, codigo_programacao, "gps", payload.idempotency_key)
-        _idempotency_mark(cur, codigo_motorista, codigo_programacao, "clientes_controle", payload.idempotency_key)
-        conn.commit()
+@app.post("/rotas/{codigo_programacao}/gps/batch")
+def salvar_gps_lote(
+    codigo_programacao: str,
+    payload: RotaGpsBatchIn,
+    m=Depends(get_current_motorista),
+):
+    """Recebe varios pings de uma vez (app offline / envio agrupado) e grava via buffer."""
+    codigo_programacao = (codigo_programacao or "").strip()
+    if not codigo_programacao:
+        raise HTTPException(status_code=400, detail="Codigo de programacao invalido.")
+    if not payload.pings:
+        return {"ok": True, "recebidos": 0, "aceitos": 0, "deduplicados": 0}
+    if len(payload.pings) > GPS_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"Maximo de {GPS_BATCH_MAX} pings por lote.")
 
-    return {"ok": True}
+    return {"ok": True, **_registrar_gps_pings(codigo_programacao, payload.pings, m)}
 
 
 @app.post("/rotas/{codigo_programacao}/status-operacional")
@@ -10605,8 +11520,7 @@ def reabrir_rota_app(
             return {"ok": True, "deduplicado": True, "codigo_programacao": codigo_programacao}
 
         _ensure_programacao_mutable(cur, codigo_programacao)
-        cur.execute("PRAGMA table_info(programacoes)")
-        cols_prog = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+        cols_prog = table_columns(cur, "programacoes")
 
         sets: List[str] = []
         vals: List[Any] = []
@@ -10817,8 +11731,7 @@ def finalizar_rota(codigo_programacao: str, payload: FinalizarRotaIn, m=Depends(
         # ============================
         # RECONCILIACAO ANTIFRAUDE
         # ============================
-        cur.execute("PRAGMA table_info(programacoes)")
-        cols_prog = {row[1] for row in cur.fetchall() or []}
+        cols_prog = table_columns(cur, "programacoes")
         cand_cols = [c for c in ("caixas_carregadas", "qnt_cx_carregada", "nf_caixas", "total_caixas") if c in cols_prog]
         caixas_carregadas = 0
         def _to_int_db(v: Any) -> int:
@@ -10897,17 +11810,15 @@ def finalizar_rota(codigo_programacao: str, payload: FinalizarRotaIn, m=Depends(
                 detail=f"Nao e possivel finalizar: existem {pend_transfer} transferencia(s) pendente(s) ou nao convertida(s).",
             )
 
-        cur.execute("PRAGMA table_info(programacao_itens)")
-        cols_pi = {row[1] for row in cur.fetchall() or []}
-        cur.execute("PRAGMA table_info(programacao_itens_controle)")
-        cols_pc = {row[1] for row in cur.fetchall() or []}
+        cols_pi = table_columns(cur, "programacao_itens")
+        cols_pc = table_columns(cur, "programacao_itens_controle")
 
         has_pi_pedido = "pedido" in cols_pi
         has_pc_pedido = "pedido" in cols_pc
         has_pi_status = "status_pedido" in cols_pi
         has_pc_status = "status_pedido" in cols_pc
 
-        join_on = "pc.codigo_programacao = pi.codigo_programacao AND UPPER(TRIM(pc.cod_cliente)) = UPPER(TRIM(pi.cod_cliente))"
+        join_on = _controle_join_on(cols_pi, cols_pc)
         if has_pi_pedido and has_pc_pedido:
             join_on += " AND COALESCE(TRIM(pc.pedido),'') = COALESCE(TRIM(pi.pedido),'')"
         params_pendentes: List[Any] = []
@@ -11059,6 +11970,7 @@ def listar_nfs_frango_disponiveis(m=Depends(get_current_motorista)):
 
 
 @app.post("/rotas/{codigo_programacao}/carregamento")
+@_atualiza_programacao_resumo
 def salvar_carregamento(
     codigo_programacao: str,
     payload: CarregamentoIn,
@@ -11072,8 +11984,7 @@ def salvar_carregamento(
         if _idempotency_seen(cur, codigo_motorista, codigo_programacao, "carregamento", payload.idempotency_key):
             return {"ok": True, "deduplicado": True}
 
-        cur.execute("PRAGMA table_info(programacoes)")
-        cols = {row[1] for row in cur.fetchall()}
+        cols = table_columns(cur, "programacoes")
 
         def has(col: str) -> bool:
             return col in cols
@@ -11385,8 +12296,7 @@ def salvar_transbordo_rota(
             company_id=company_id,
         )
 
-        cur.execute("PRAGMA table_info(programacoes)")
-        cols = {row[1] for row in cur.fetchall() or []}
+        cols = table_columns(cur, "programacoes")
         sets = []
         params: List[Any] = []
 
@@ -11482,8 +12392,7 @@ def salvar_despesa_rota_mobile(
             company_id=company_id,
         )
 
-        cur.execute("PRAGMA table_info(despesas)")
-        cols = {row[1] for row in cur.fetchall() or []}
+        cols = table_columns(cur, "despesas")
         data = {
             "codigo_programacao": codigo_programacao,
             "descricao": payload.descricao or tipo,
@@ -11592,8 +12501,7 @@ def alterar_ajudantes_rota(
             "alterado_em": alterado_em,
             "alterado_por": nome_motorista or codigo_motorista,
         }
-        cur.execute("PRAGMA table_info(programacoes)")
-        cols = {row[1] for row in cur.fetchall() or []}
+        cols = table_columns(cur, "programacoes")
         sets = []
         params: List[Any] = []
         if "equipe" in cols:
@@ -11756,9 +12664,16 @@ def _store_mobile_photo(
     path_hint: str = "",
     company_id: Optional[int] = None,
 ) -> Optional[Dict[str, Any]]:
+    """
+    Registra a foto em rota_fotos. O app envia so a referencia (sha256 devolvido por
+    /fotos/uploads ou /fotos/upload); imagem_base64 continua aceito para versoes
+    antigas do app e vai para o mesmo armazenamento por conteudo. A referencia so vale
+    se a empresa concluiu o upload daquele sha256 ou ja tem foto com ele.
+    """
     photo_in = dict(photo or {})
     path_local = str(photo_in.get("path_local") or photo_in.get("arquivo_path") or path_hint or "").strip()
     imagem_base64 = str(photo_in.get("imagem_base64") or photo_in.get("base64") or "").strip()
+    sha256 = photo_store.normalize_sha256(photo_in.get("sha256") or photo_in.get("foto_sha256"))
     if not photo_in and not path_local and not imagem_base64:
         return None
 
@@ -11785,19 +12700,19 @@ def _store_mobile_photo(
             if "," in imagem_base64[:80]:
                 imagem_base64 = imagem_base64.split(",", 1)[1]
             data = base64.b64decode(imagem_base64, validate=False)
-            destino_dir = os.path.join(
-                _mobile_photo_storage_root(),
-                _safe_file_segment(codigo_programacao, "rota"),
-                _safe_file_segment(categoria, "categoria"),
-            )
-            os.makedirs(destino_dir, exist_ok=True)
-            destino = os.path.join(destino_dir, safe_name)
-            with open(destino, "wb") as fh:
-                fh.write(data)
-            storage_path = destino
-            tamanho_bytes = len(data)
+            sha256, tamanho_bytes, storage_path = photo_store.store_bytes(_mobile_photo_storage_root(), data)
         except Exception:
             storage_path = storage_path or ""
+    elif sha256 and not photo_store.owns_object(cur, sha256, int(company_id or 1)):
+        # sha256 sem upload da empresa nao da acesso ao objeto de outra
+        logging.warning("Referencia de foto %s sem upload da empresa %s; ignorada", sha256, int(company_id or 1))
+        sha256 = ""
+        photo_in.pop("foto_sha256", None)
+    elif sha256:
+        objeto = photo_store.find_object(_mobile_photo_storage_root(), sha256)
+        if objeto:
+            storage_path = objeto
+            tamanho_bytes = os.path.getsize(objeto)
 
     ref = {
         "id_foto": id_foto,
@@ -11809,6 +12724,8 @@ def _store_mobile_photo(
         "mime_type": mime_type,
         "tamanho_bytes": tamanho_bytes,
         "registrado_em": registrado_em,
+        "sha256": sha256,
+        "url": f"/fotos/{sha256}" if sha256 else "",
     }
     payload_to_store = dict(photo_in)
     payload_to_store.pop("imagem_base64", None)
@@ -11821,8 +12738,8 @@ def _store_mobile_photo(
             INSERT INTO rota_fotos (
                 id_foto, codigo_programacao, categoria, tipo_registro, cod_cliente, cliente_nome, pedido,
                 id_vinculo, path_local, storage_path, arquivo_nome, mime_type, tamanho_bytes,
-                motorista_codigo, motorista_nome, registrado_em, payload_json
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                motorista_codigo, motorista_nome, registrado_em, payload_json, sha256, company_id
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ON CONFLICT(id_foto) DO UPDATE SET
                 codigo_programacao=excluded.codigo_programacao,
                 categoria=excluded.categoria,
@@ -11839,7 +12756,9 @@ def _store_mobile_photo(
                 motorista_codigo=excluded.motorista_codigo,
                 motorista_nome=excluded.motorista_nome,
                 registrado_em=excluded.registrado_em,
-                payload_json=excluded.payload_json
+                payload_json=excluded.payload_json,
+                sha256=excluded.sha256,
+                company_id=COALESCE(rota_fotos.company_id, excluded.company_id)
             """,
             (
                 id_foto,
@@ -11859,18 +12778,10 @@ def _store_mobile_photo(
                 motorista_nome or None,
                 registrado_em,
                 json.dumps(payload_to_store, ensure_ascii=False),
+                sha256 or None,
+                int(company_id or 1),
             ),
         )
-        try:
-            cur.execute("PRAGMA table_info(rota_fotos)")
-            cols_fotos = {row[1] for row in cur.fetchall() or []}
-            if "company_id" in cols_fotos:
-                cur.execute(
-                    "UPDATE rota_fotos SET company_id=COALESCE(company_id, ?) WHERE id_foto=?",
-                    (int(company_id or 1), id_foto),
-                )
-        except Exception:
-            pass
     except Exception:
         return ref
     return ref
@@ -11894,6 +12805,226 @@ def _payload_dict(payload: Any) -> Dict[str, Any]:
     return {"value": str(payload)}
 
 
+_UPLOADS_EM_ANDAMENTO: set = set()
+_UPLOADS_LOCK = threading.Lock()
+
+
+def _foto_company_scope(m: Dict[str, Any]) -> Optional[int]:
+    """Empresa dona das fotos do principal; admin enxerga todas (None)."""
+    if m.get("is_admin"):
+        return None
+    return int(m.get("company_id") or 1)
+
+
+def _upload_http_error(exc: photo_store.UploadError) -> HTTPException:
+    if exc.extra:
+        return HTTPException(status_code=exc.status_code, detail={"mensagem": exc.detail, **exc.extra})
+    return HTTPException(status_code=exc.status_code, detail=exc.detail)
+
+
+def _offset_do_bloco(upload_offset: Optional[str], content_range: Optional[str]) -> int:
+    """Offset do bloco: header Upload-Offset ou Content-Range (bytes inicio-fim/total)."""
+    try:
+        if upload_offset not in (None, ""):
+            return max(0, int(str(upload_offset).strip()))
+        match = re.match(r"^bytes\s+(\d+)-\d+/(\d+|\*)$", str(content_range or "").strip())
+        if match:
+            return int(match.group(1))
+    except ValueError:
+        pass
+    if content_range or upload_offset:
+        raise HTTPException(status_code=400, detail="Upload-Offset/Content-Range invalido.")
+    return 0
+
+
+@app.post("/fotos/uploads")
+def iniciar_upload_foto(payload: FotoUploadIn, m=Depends(get_current_motorista)):
+    """Abre um upload retomavel; com sha256 de um objeto ja guardado nao precisa enviar bytes."""
+    with get_conn() as conn:
+        cur = conn.cursor()
+        try:
+            out = photo_store.create_upload(
+                cur,
+                _mobile_photo_storage_root(),
+                tamanho_total=payload.tamanho_bytes,
+                sha256=payload.sha256 or "",
+                mime_type=(payload.mime_type or "").strip(),
+                motorista_codigo=str(m.get("codigo") or ""),
+                company_id=int(m.get("company_id") or 1),
+            )
+        except photo_store.UploadError as exc:
+            raise _upload_http_error(exc)
+        conn.commit()
+    return out
+
+
+@app.get("/fotos/uploads/{upload_id}")
+def status_upload_foto(upload_id: str, m=Depends(get_current_motorista)):
+    with get_conn() as conn:
+        try:
+            return photo_store.upload_status(conn.cursor(), _mobile_photo_storage_root(), upload_id, _foto_company_scope(m))
+        except photo_store.UploadError as exc:
+            raise _upload_http_error(exc)
+
+
+@app.put("/fotos/uploads/{upload_id}")
+async def enviar_bloco_foto(
+    upload_id: str,
+    request: Request,
+    upload_offset: Optional[str] = Header(default=None, alias="Upload-Offset"),
+    content_range: Optional[str] = Header(default=None, alias="Content-Range"),
+    m=Depends(get_current_motorista),
+):
+    """
+    Recebe o corpo cru (application/octet-stream) a partir do offset e grava em disco
+    conforme chega. Conexao perdida: GET /fotos/uploads/{id} informa de onde continuar.
+    """
+    offset = _offset_do_bloco(upload_offset, content_range)
+    root = _mobile_photo_storage_root()
+    company_id = _foto_company_scope(m)
+    with _UPLOADS_LOCK:
+        if upload_id in _UPLOADS_EM_ANDAMENTO:
+            raise HTTPException(status_code=409, detail="Upload ja recebendo outro bloco.")
+        _UPLOADS_EM_ANDAMENTO.add(upload_id)
+    try:
+        def abrir():
+            with get_conn() as conn:
+                return photo_store.open_part_for_append(conn.cursor(), root, upload_id, offset, company_id)
+
+        def concluir():
+            with get_conn() as conn:
+                out = photo_store.finish_upload(conn.cursor(), root, upload_id, company_id)
+                conn.commit()
+                return out
+
+        try:
+            fh, restante = await run_in_threadpool(abrir)
+        except photo_store.UploadError as exc:
+            raise _upload_http_error(exc)
+        recebido = 0
+        buffer = bytearray()
+        try:
+            async for chunk in request.stream():
+                recebido += len(chunk)
+                if recebido > restante:
+                    buffer.clear()
+                    raise HTTPException(status_code=413, detail="Bloco excede o tamanho declarado do upload.")
+                buffer += chunk
+                if len(buffer) >= photo_store.CHUNK_BYTES:
+                    await run_in_threadpool(fh.write, bytes(buffer))
+                    buffer.clear()
+        finally:
+            # o que chegou antes de uma queda de conexao fica gravado para a retomada
+            if buffer:
+                fh.write(bytes(buffer))
+            fh.close()
+        try:
+            return await run_in_threadpool(concluir)
+        except photo_store.UploadError as exc:
+            raise _upload_http_error(exc)
+    finally:
+        with _UPLOADS_LOCK:
+            _UPLOADS_EM_ANDAMENTO.discard(upload_id)
+
+
+@app.post("/fotos/upload")
+def enviar_foto_multipart(arquivo: UploadFile = File(...), m=Depends(get_current_motorista)):
+    """Upload de uma vez (multipart), copiado em blocos para o armazenamento por conteudo."""
+    root = _mobile_photo_storage_root()
+    try:
+        sha, tamanho, _path = photo_store.store_chunks(
+            root, iter(lambda: arquivo.file.read(photo_store.CHUNK_BYTES), b"")
+        )
+    except photo_store.UploadError as exc:
+        raise _upload_http_error(exc)
+    with get_conn() as conn:
+        out = photo_store.register_direct_upload(
+            conn.cursor(),
+            sha,
+            tamanho,
+            mime_type=str(arquivo.content_type or ""),
+            motorista_codigo=str(m.get("codigo") or ""),
+            company_id=int(m.get("company_id") or 1),
+        )
+        conn.commit()
+    return out
+
+
+def _foto_response(
+    sha256: str,
+    company_id: Optional[int],
+    range_header: Optional[str],
+    if_none_match: Optional[str],
+    largura: Optional[int] = None,
+):
+    sha = photo_store.normalize_sha256(sha256)
+    path = photo_store.find_object(_mobile_photo_storage_root(), sha) if sha else None
+    if not path:
+        raise HTTPException(status_code=404, detail="Foto nao encontrada.")
+    with get_conn() as conn:
+        info = photo_store.object_info(conn.cursor(), sha, company_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Foto nao encontrada.")
+    if largura:
+        thumb = photo_thumbnails.miniatura(path, _mobile_photo_storage_root(), largura, sha)
+        if thumb is not None:
+            path, etag = thumb["path"], thumb["etag"]
+            info = {"mime_type": thumb["media_type"]}
+        else:
+            etag = f'"{sha}"'
+    else:
+        etag = f'"{sha}"'
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        # conteudo enderecado pelo hash nunca muda
+        "Cache-Control": "private, max-age=31536000, immutable",
+    }
+    if photo_thumbnails.etag_confere(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    size = os.path.getsize(path)
+    try:
+        faixa = photo_store.parse_range(range_header or "", size)
+    except photo_store.UploadError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    start, end, status = (0, size - 1, 200) if faixa is None else (faixa[0], faixa[1], 206)
+    headers["Content-Length"] = str(end - start + 1 if size else 0)
+    if status == 206:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(
+        photo_store.iter_file_range(path, start, end) if size else iter(()),
+        status_code=status,
+        media_type=info["mime_type"],
+        headers=headers,
+    )
+
+
+@app.get("/fotos/{sha256}")
+def baixar_foto(
+    sha256: str,
+    largura: Optional[int] = Query(default=None, ge=1, le=4096),
+    range_header: Optional[str] = Header(default=None, alias="Range"),
+    if_none_match: Optional[str] = Header(default=None, alias="If-None-Match"),
+    m=Depends(get_current_motorista),
+):
+    """Foto original (com Range) ou, com ?largura=, a miniatura gerada sob demanda."""
+    return _foto_response(sha256, _foto_company_scope(m), range_header, if_none_match, largura)
+
+
+@app.get("/desktop/fotos/{sha256}")
+def desktop_baixar_foto(
+    sha256: str,
+    largura: Optional[int] = Query(default=None, ge=1, le=4096),
+    range_header: Optional[str] = Header(default=None, alias="Range"),
+    if_none_match: Optional[str] = Header(default=None, alias="If-None-Match"),
+    _ok: bool = Depends(_require_desktop_secret),
+    x_company_id: Optional[str] = Header(default=None, alias="X-Company-ID"),
+):
+    with get_conn() as conn:
+        company_id = _desktop_company_id(conn.cursor(), x_company_id)
+    return _foto_response(sha256, company_id, range_header, if_none_match, largura)
+
+
 def _registrar_roteiro_operacional(
     cur: sqlite3.Cursor,
     *,
@@ -11920,8 +13051,7 @@ def _registrar_roteiro_operacional(
 ) -> None:
     try:
         codigo = str(codigo_programacao or "").strip().upper()
-        cur.execute("PRAGMA table_info(roteiro_operacional)")
-        cols = {row[1] for row in cur.fetchall() or []}
+        cols = table_columns(cur, "roteiro_operacional")
         if company_id is None and "company_id" in cols and codigo:
             try:
                 cur.execute(
@@ -12241,8 +13371,7 @@ def _upsert_item_destino_transferencia(
         except Exception:
             company_id = None
 
-    cur.execute("PRAGMA table_info(programacao_itens)")
-    cols_itens = {row[1] for row in (cur.fetchall() or [])}
+    cols_itens = table_columns(cur, "programacao_itens")
     has_pedido_col = "pedido" in cols_itens
     existing = None
     if has_pedido_col:
@@ -12392,8 +13521,7 @@ def _recalcular_origem_transferencia(
     if not codigo_origem or not cod_cliente:
         return
 
-    cur.execute("PRAGMA table_info(programacao_itens)")
-    cols_itens = {row[1] for row in (cur.fetchall() or [])}
+    cols_itens = table_columns(cur, "programacao_itens")
     has_pedido_col = "pedido" in cols_itens
     company_id = int(company_id or 1)
 
@@ -12435,8 +13563,7 @@ def _recalcular_origem_transferencia(
 
     # Soma transferências ainda ativas (pendentes/aceitas) para este pedido.
     qtd_ativa = 0
-    cur.execute("PRAGMA table_info(transferencias)")
-    cols_transferencias = {row[1] for row in (cur.fetchall() or [])}
+    cols_transferencias = table_columns(cur, "transferencias")
     transf_company_sql = ""
     transf_company_params: List[Any] = []
     if "company_id" in cols_transferencias:
@@ -12489,8 +13616,7 @@ def _recalcular_origem_transferencia(
         cur.execute(f"UPDATE programacao_itens SET {', '.join(sets)} WHERE rowid=?", tuple(params))
 
     pedido_db = base["pedido"] if has_pedido_col else None
-    cur.execute("PRAGMA table_info(programacao_itens_controle)")
-    cols_controle = {row[1] for row in (cur.fetchall() or [])}
+    cols_controle = table_columns(cur, "programacao_itens_controle")
     controle_company_set = ", company_id=COALESCE(company_id, ?)" if "company_id" in cols_controle else ""
     controle_company_where = " AND COALESCE(company_id, ?) = ?" if "company_id" in cols_controle else ""
     controle_update_params: List[Any] = [novo_status, detalhe, novo_caixas, now, (alterado_por or "SISTEMA")]
@@ -12560,8 +13686,7 @@ def _has_pending_substituicao(
 ) -> bool:
     company_sql = ""
     params: List[Any] = [(codigo_programacao or "").strip()]
-    cur.execute("PRAGMA table_info(rota_substituicoes)")
-    cols_sub = {str(r[1]) for r in (cur.fetchall() or [])}
+    cols_sub = table_columns(cur, "rota_substituicoes")
     if company_id is not None and "company_id" in cols_sub:
         company_sql = " AND COALESCE(company_id, ?) = ?"
         params.extend([int(company_id or 1), int(company_id or 1)])
@@ -12578,6 +13703,37 @@ def _has_pending_substituicao(
     return int((cur.fetchone() or [0])[0] or 0) > 0
 
 
+def _pending_substituicoes_lote(
+    cur: sqlite3.Cursor,
+    codigos: List[str],
+    company_id: Optional[int] = None,
+) -> set[str]:
+    """Codigos (entre os informados) com substituicao aguardando aceite."""
+    wanted = sorted({(c or "").strip() for c in codigos if (c or "").strip()})
+    pendentes: set[str] = set()
+    if not wanted:
+        return pendentes
+    company_sql = ""
+    company_params: List[Any] = []
+    cols_sub = table_columns(cur, "rota_substituicoes")
+    if company_id is not None and "company_id" in cols_sub:
+        company_sql = " AND COALESCE(company_id, ?) = ?"
+        company_params = [int(company_id or 1), int(company_id or 1)]
+    for chunk in _chunks(wanted):
+        cur.execute(
+            f"""
+            SELECT DISTINCT codigo_programacao
+            FROM rota_substituicoes
+            WHERE codigo_programacao IN ({", ".join("?" for _ in chunk)})
+              AND UPPER(TRIM(COALESCE(status,'')))='PENDENTE_ACEITE'
+              {company_sql}
+            """,
+            tuple(chunk) + tuple(company_params),
+        )
+        pendentes.update(str(r[0]) for r in cur.fetchall() or [])
+    return pendentes
+
+
 def _list_substituicoes_por_rota(
     cur: sqlite3.Cursor,
     codigo_programacao: str,
@@ -12586,8 +13742,7 @@ def _list_substituicoes_por_rota(
 ) -> List[Dict[str, Any]]:
     company_sql = ""
     params: List[Any] = [(codigo_programacao or "").strip()]
-    cur.execute("PRAGMA table_info(rota_substituicoes)")
-    cols_sub = {str(r[1]) for r in (cur.fetchall() or [])}
+    cols_sub = table_columns(cur, "rota_substituicoes")
     if company_id is not None and "company_id" in cols_sub:
         company_sql = " AND COALESCE(company_id, ?) = ?"
         params.extend([int(company_id or 1), int(company_id or 1)])
@@ -12614,8 +13769,7 @@ def _get_motorista_by_codigo(
     cod = (codigo or "").strip().upper()
     if not cod:
         return None
-    cur.execute("PRAGMA table_info(motoristas)")
-    cols = {str(r[1]) for r in (cur.fetchall() or [])}
+    cols = table_columns(cur, "motoristas")
     company_sql = ""
     params: List[Any] = [cod]
     if company_id is not None and "company_id" in cols:
@@ -12649,8 +13803,7 @@ def _registrar_amostra_localizacao_cliente(
     has_addr = any(str(v or "").strip() for v in (endereco_evento, cidade_evento, bairro_evento))
     if not has_geo and not has_addr:
         return
-    cur.execute("PRAGMA table_info(cliente_localizacao_amostras)")
-    cols = {row[1] for row in cur.fetchall() or []}
+    cols = table_columns(cur, "cliente_localizacao_amostras")
     insert_cols = [
         "cod_cliente", "codigo_programacao", "pedido", "latitude", "longitude", "endereco", "cidade", "bairro",
         "status_pedido", "motorista_codigo", "motorista_nome", "origem", "registrado_em",
@@ -12740,8 +13893,7 @@ def listar_cad_motoristas(m=Depends(get_current_motorista)):
     company_id = int(m.get("company_id") or 1)
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(motoristas)")
-        cols = {str(r[1]) for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "motoristas")
         if "nome" not in cols:
             return []
         sel = ["id", "nome"]
@@ -12787,8 +13939,7 @@ def listar_cad_ajudantes(m=Depends(get_current_motorista)):
     company_id = int(m.get("company_id") or 1)
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(ajudantes)")
-        cols = {r[1] for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "ajudantes")
 
         if "nome" not in cols:
             return []
@@ -12888,8 +14039,7 @@ def _recursos_ocupados_programacoes_ativas(
                 found = ""
             if not found:
                 try:
-                    cur.execute("PRAGMA table_info(equipes)")
-                    cols_eq = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+                    cols_eq = table_columns(cur, "equipes")
                     cand_cols = [c for c in ("ajudante1", "ajudante2", "ajudante_1", "ajudante_2") if c in cols_eq]
                     if cand_cols and "codigo" in cols_eq:
                         cur.execute(
@@ -12918,8 +14068,7 @@ def _recursos_ocupados_programacoes_ativas(
         return resolved
 
     try:
-        cur.execute("PRAGMA table_info(programacoes)")
-        cols = {str(r[1]) for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "programacoes")
         if not cols:
             return ocupados
 
@@ -13006,8 +14155,7 @@ def listar_cad_veiculos(m=Depends(get_current_motorista)):
     company_id = int(m.get("company_id") or 1)
     with get_conn() as conn:
         cur = conn.cursor()
-        cur.execute("PRAGMA table_info(veiculos)")
-        cols = {r[1] for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "veiculos")
 
         if "placa" not in cols:
             return []
@@ -13226,8 +14374,7 @@ def aceitar_substituicao_rota(
         if status_atual in ("FINALIZADA", "FINALIZADO", "CANCELADA", "CANCELADO"):
             raise HTTPException(status_code=409, detail=f"Rota encerrada (status={status_atual}).")
 
-        cur.execute("PRAGMA table_info(programacoes)")
-        cols = {r[1] for r in (cur.fetchall() or [])}
+        cols = table_columns(cur, "programacoes")
         sets = []
         params: List[Any] = []
 
@@ -13332,6 +14479,7 @@ def recusar_substituicao_rota(
 
 # âœ… CRIAR TRANSFERÊNCIA (origem envia)
 @app.post("/rotas/{codigo_programacao}/transferencias")
+@_atualiza_programacao_resumo
 def criar_transferencia(
     codigo_programacao: str,
     payload: TransferenciaCreateIn,
@@ -13452,13 +14600,7 @@ def criar_transferencia(
             SELECT
                 p.codigo_programacao,
                 COALESCE(p.status, '') AS status,
-                (
-                    SELECT CAST(NULLIF(TRIM(v.capacidade_cx), '') AS INTEGER)
-                    FROM veiculos v
-                    WHERE UPPER(TRIM(v.placa)) = UPPER(TRIM(p.veiculo))
-                       OR UPPER(TRIM(v.modelo)) = UPPER(TRIM(p.veiculo))
-                    LIMIT 1
-                ) AS capacidade_cx,
+                """ + _capacidade_cx_subquery(conn, "p") + """ AS capacidade_cx,
                 """
             + caixas_saldo_expr_dest
             + """
@@ -13497,8 +14639,7 @@ def criar_transferencia(
                     detail=f"Transferencia excede saldo do destino em rota. Saldo destino: {saldo_dest} cx.",
                 )
         # valida disponibilidade no pedido de origem
-        cur.execute("PRAGMA table_info(programacao_itens)")
-        cols_itens = {row[1] for row in cur.fetchall() or []}
+        cols_itens = table_columns(cur, "programacao_itens")
         has_pedido_col = "pedido" in cols_itens
         has_caixas_atual_col = "caixas_atual" in cols_itens
 
@@ -14126,6 +15267,7 @@ def listar_transferencias_enviadas(
 
 
 @app.post("/transferencias/{transferencia_id}/aceitar")
+@_atualiza_programacao_resumo
 def aceitar_transferencia(
     transferencia_id: str,
     m=Depends(get_current_motorista),
@@ -14229,6 +15371,7 @@ class TransferenciaConverterIn(BaseModel):
 
 
 @app.post("/transferencias/{transferencia_id}/converter")
+@_atualiza_programacao_resumo
 def converter_transferencia(
     transferencia_id: str,
     payload: TransferenciaConverterIn,
@@ -152,7 +152,9 @@ class SyncedConnection(sqlite3.Connection):
 @contextmanager
 def get_db():
     """Gerenciador de contexto para conexoes com o banco."""
-    conn = sqlite3.connect(_configured_db_path(), factory=SyncedConnection)
+    db_path = _configured_db_path()
+    conn = sqlite3.connect(db_path, factory=SyncedConnection)
+    conn._rota_db_path = db_path
     _configure_sqlite(conn)
     conn.row_factory = sqlite3.Row
     try:
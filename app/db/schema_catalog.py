@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, FrozenSet, Hashable, Optional
+
+
+class SchemaCatalog:
+    """Colunas por tabela em memoria, recarregadas quando PRAGMA schema_version muda."""
+
+    def __init__(self, db_key: str):
+        self.db_key = db_key
+        self.version: Optional[int] = None
+        self.loads = 0
+        self._tables: Dict[str, FrozenSet[str]] = {}
+        self._fragments: Dict[Hashable, Any] = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _read_version(conn: sqlite3.Connection) -> int:
+        row = conn.execute("PRAGMA schema_version").fetchone()
+        return int(row[0] if row else 0)
+
+    def sync(self, conn: sqlite3.Connection) -> bool:
+        """Recarrega o catalogo se o schema mudou. Retorna True quando recarregou."""
+        version = self._read_version(conn)
+        if version == self.version:
+            return False
+        with self._lock:
+            if version == self.version:
+                return False
+            tables: Dict[str, FrozenSet[str]] = {}
+            names = [
+                str(r[0])
+                for r in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type IN ('table','view') AND name NOT LIKE 'sqlite_%'"
+                ).fetchall()
+            ]
+            for name in names:
+                cols = conn.execute(f'PRAGMA table_info("{name}")').fetchall() or []
+                tables[name.lower()] = frozenset(str(r[1]).lower() for r in cols)
+            self._tables = tables
+            self._fragments = {}
+            self.version = version
+            self.loads += 1
+        return True
+
+    def has_table(self, conn: sqlite3.Connection, table: str) -> bool:
+        key = str(table or "").lower()
+        if key in self._tables:
+            return True
+        return self.sync(conn) and key in self._tables
+
+    def columns(self, conn: sqlite3.Connection, table: str) -> FrozenSet[str]:
+        key = str(table or "").lower()
+        cols = self._tables.get(key)
+        if cols is None and self.sync(conn):
+            cols = self._tables.get(key)
+        return cols or frozenset()
+
+    def has_column(self, conn: sqlite3.Connection, table: str, col: str) -> bool:
+        name = str(col or "").lower()
+        if name in self._tables.get(str(table or "").lower(), ()):
+            return True
+        return self.sync(conn) and name in self._tables.get(str(table or "").lower(), ())
+
+    def fragment(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        """Memoriza um trecho de SQL derivado do schema ate a proxima mudanca de versao."""
+        version = self.version
+        try:
+            return self._fragments[key]
+        except KeyError:
+            pass
+        value = build()
+        with self._lock:
+            if self.version == version:
+                self._fragments[key] = value
+        return value
+
+
+_CATALOGS: Dict[str, SchemaCatalog] = {}
+_CATALOGS_LOCK = threading.Lock()
+
+
+def _db_key(db_path: str) -> str:
+    return os.path.normcase(os.path.abspath(str(db_path or "")))
+
+
+def catalog_for(db_path: str) -> SchemaCatalog:
+    key = _db_key(db_path)
+    catalog = _CATALOGS.get(key)
+    if catalog is None:
+        with _CATALOGS_LOCK:
+            catalog = _CATALOGS.setdefault(key, SchemaCatalog(key))
+    return catalog
+
+
+def invalidate(db_path: Optional[str] = None) -> None:
+    with _CATALOGS_LOCK:
+        if db_path is None:
+            _CATALOGS.clear()
+        else:
+            _CATALOGS.pop(_db_key(db_path), None)
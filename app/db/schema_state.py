@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import os
+import threading
+from typing import Hashable, Optional, Set, Tuple
+
+
+# (nome do bootstrap, identidade do banco) ja aplicados neste processo
+_READY: Set[Tuple[str, Hashable]] = set()
+_LOCK = threading.Lock()
+
+
+def database_identity(db_path: Optional[str]) -> Hashable:
+    """
+    Identidade do arquivo do banco: caminho + (st_dev, st_ino). Um arquivo novo no mesmo
+    caminho (restore, testes) invalida as flags sem precisar consultar o banco.
+    """
+    if not db_path or str(db_path) == ":memory:":
+        return str(db_path or "")
+    path = os.path.abspath(str(db_path))
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (path, None)
+    return (path, st.st_dev, st.st_ino)
+
+
+def schema_ready(name: str, identity: Hashable) -> bool:
+    return (name, identity) in _READY
+
+
+def mark_schema_ready(name: str, identity: Hashable) -> None:
+    with _LOCK:
+        _READY.add((name, identity))
+
+
+def reset_schema_flags() -> None:
+    """Esquece os bootstraps aplicados (o proximo acesso refaz o ensure_*)."""
+    with _LOCK:
+        _READY.clear()
@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import contextvars
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+DEFAULT_POOL_SIZE = int(os.environ.get("ROTA_DB_POOL_SIZE", "8") or 8)
+DEFAULT_POOL_TIMEOUT = float(os.environ.get("ROTA_DB_POOL_TIMEOUT", "10") or 10)
+
+# conexoes ativas no contexto atual: db_path -> [conexao, profundidade, pool]
+_ACTIVE: contextvars.ContextVar[Optional[Dict[str, list]]] = contextvars.ContextVar("rota_sqlite_active", default=None)
+
+
+class SQLitePool:
+    """
+    Pool limitado de conexoes SQLite ja configuradas (PRAGMAs aplicados uma vez no connect).
+    Se o arquivo do banco for trocado ou removido (restore, testes), as conexoes antigas
+    sao descartadas na proxima retirada. Passando de `size`, espera ate `timeout` e entao
+    abre uma conexao avulsa, fechada na devolucao.
+    """
+
+    def __init__(self, db_path: str, connect: Callable[[str], sqlite3.Connection], *, size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_POOL_TIMEOUT):
+        self.db_path = db_path
+        self._connect = connect
+        self.size = max(1, int(size))
+        self.timeout = float(timeout)
+        self._idle: "queue.LifoQueue[Tuple[int, sqlite3.Connection]]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._generations: Dict[int, int] = {}
+        self._identity = self._file_identity()
+        self.open = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.overflow = 0
+        self.discarded = 0
+
+    def _file_identity(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.db_path)
+        except OSError:
+            return None
+        return (st.st_dev, st.st_ino)
+
+    def _check_identity(self) -> None:
+        identity = self._file_identity()
+        if identity == self._identity:
+            return
+        with self._lock:
+            if identity == self._identity:
+                return
+            self._identity = identity
+            self._generation += 1
+        self._drain()
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                _, conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(conn)
+
+    def _close(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            self._generations.pop(id(conn), None)
+            self.open -= 1
+            self.discarded += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def acquire(self) -> sqlite3.Connection:
+        self._check_identity()
+        with self._lock:
+            self.checkouts += 1
+        while True:
+            try:
+                generation, conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if generation == self._generation:
+                return conn
+            self._close(conn)
+        with self._lock:
+            can_open = self.open < self.size
+            if can_open:
+                self.open += 1
+        if not can_open:
+            with self._lock:
+                self.waits += 1
+            inicio = time.perf_counter()
+            try:
+                generation, conn = self._idle.get(timeout=self.timeout)
+                if generation == self._generation:
+                    return conn
+                self._close(conn)
+            except queue.Empty:
+                logging.warning(
+                    "Pool SQLite esgotado (%s conexoes) apos %.1fs; abrindo conexao avulsa para %s",
+                    self.size, time.perf_counter() - inicio, self.db_path,
+                )
+            with self._lock:
+                self.open += 1
+                self.overflow += 1
+        try:
+            conn = self._connect(self.db_path)
+        except Exception:
+            with self._lock:
+                self.open -= 1
+            raise
+        if self._identity is None:
+            self._identity = self._file_identity()
+        with self._lock:
+            self._generations[id(conn)] = self._generation
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._close(conn)
+            return
+        generation = self._generations.get(id(conn), -1)
+        if generation != self._generation or self._idle.qsize() >= self.size:
+            self._close(conn)
+            return
+        self._idle.put((generation, conn))
+
+    def close_all(self) -> None:
+        """Fecha as conexoes ociosas e invalida as emprestadas (fechadas na devolucao)."""
+        with self._lock:
+            self._generation += 1
+        self._drain()
+
+    def stats(self) -> dict:
+        return {
+            "db_path": self.db_path,
+            "size": self.size,
+            "open": self.open,
+            "idle": self._idle.qsize(),
+            "checkouts": self.checkouts,
+            "waits": self.waits,
+            "overflow": self.overflow,
+            "discarded": self.discarded,
+        }
+
+
+_POOLS: Dict[str, SQLitePool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def pool_for(db_path: str, connect: Callable[[str], sqlite3.Connection]) -> SQLitePool:
+    key = os.path.abspath(db_path)
+    pool = _POOLS.get(key)
+    if pool is None:
+        with _POOLS_LOCK:
+            pool = _POOLS.get(key)
+            if pool is None:
+                pool = _POOLS[key] = SQLitePool(db_path, connect)
+    return pool
+
+
+def pool_stats() -> list:
+    return [pool.stats() for pool in list(_POOLS.values())]
+
+
+def close_pools(db_path: Optional[str] = None) -> None:
+    """Fecha conexoes ociosas (de um banco ou de todos); use antes de substituir o arquivo do banco."""
+    key = os.path.abspath(db_path) if db_path else None
+    for path, pool in list(_POOLS.items()):
+        if key is None or path == key:
+            pool.close_all()
+
+
+@contextmanager
+def pooled_connection(pool: SQLitePool) -> Iterator[sqlite3.Connection]:
+    """
+    Conexao do pool com a semantica do antigo get_conn: commit na saida, rollback em erro.
+    Blocos aninhados no mesmo contexto reutilizam a conexao via SAVEPOINT. Dentro de
+    `request_connection_scope` a conexao fica com o request ate o fim (auth + handler).
+    """
+    active = _ACTIVE.get()
+    token = None
+    if active is None:
+        active = {}
+        token = _ACTIVE.set(active)
+    entry = active.get(pool.db_path)
+    try:
+        if entry is not None and entry[1] > 0:
+            with _savepoint(entry[0], entry[1]) as conn:
+                entry[1] += 1
+                try:
+                    yield conn
+                finally:
+                    entry[1] -= 1
+            return
+        if entry is None:
+            entry = active[pool.db_path] = [pool.acquire(), 0, pool]
+        conn = entry[0]
+        entry[1] = 1
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            entry[1] = 0
+            if token is not None:
+                active.pop(pool.db_path, None)
+                pool.release(conn)
+    finally:
+        if token is not None:
+            _ACTIVE.reset(token)
+
+
+@contextmanager
+def _savepoint(conn: sqlite3.Connection, depth: int) -> Iterator[sqlite3.Connection]:
+    name = f"rota_sp_{depth}"
+    conn.execute(f"SAVEPOINT {name}")
+    try:
+        yield conn
+    except BaseException:
+        try:
+            conn.execute(f"ROLLBACK TO {name}")
+            conn.execute(f"RELEASE {name}")
+        except sqlite3.OperationalError:
+            pass
+        raise
+    try:
+        conn.execute(f"RELEASE {name}")
+    except sqlite3.OperationalError:
+        # commit explicito dentro do bloco ja liberou o savepoint
+        pass
+
+
+@contextmanager
+def request_connection_scope() -> Iterator[None]:
+    """Mantem as conexoes usadas no escopo (um request) e devolve ao pool no final."""
+    active: Dict[str, list] = {}
+    token = _ACTIVE.set(active)
+    try:
+        yield
+    finally:
+        _ACTIVE.reset(token)
+        for conn, _depth, pool in active.values():
+            pool.release(conn)
+
+
+class RequestConnectionMiddleware:
+    """Uma conexao por banco por request, compartilhada por dependencias de auth e handler."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with request_connection_scope():
+            await self.app(scope, receive, send)
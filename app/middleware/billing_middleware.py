@@ -2,12 +2,13 @@ from __future__ import annotations
 
 from typing import Any, Callable
 
-from jose import JWTError, jwt
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.concurrency import run_in_threadpool
 from starlette.requests import Request
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-from backend.config.settings import settings
+from app.middleware.request_auth import company_id_from_request
+from app.services.entitlement_cache import EntitlementCache
 
 
 SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
@@ -25,27 +26,39 @@ ALLOWED_PATH_PREFIXES = (
 )
 
 
-class BillingProtectionMiddleware(BaseHTTPMiddleware):
+class BillingProtectionMiddleware:
     def __init__(
         self,
-        app,
-        get_billing_context: Callable[[int], dict | None],
+        app: ASGIApp,
+        get_billing_context: Callable[[int], dict | None] | None = None,
         audit_block: Callable[[int, Request, dict], None] | None = None,
+        entitlements: EntitlementCache | None = None,
     ):
-        super().__init__(app)
+        self.app = app
         self._get_billing_context = get_billing_context
         self._audit_block = audit_block
-
-    async def dispatch(self, request: Request, call_next):
+        self._entitlements = entitlements
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        blocked = await self._blocked(Request(scope))
+        if blocked is None:
+            await self.app(scope, receive, send)
+        else:
+            await blocked(scope, receive, send)
+
+    async def _blocked(self, request: Request) -> Response | None:
         if _is_allowed_without_billing_check(request):
-            return await call_next(request)
+            return None
 
-        company_id = _safe_int(getattr(request.state, "company_id", None)) or _company_id_from_token(request)
+        company_id = company_id_from_request(request)
         if not company_id:
-            return await call_next(request)
+            return None
 
         try:
-            context = self._get_billing_context(company_id) or {}
+            context = await self._billing_context(company_id)
         except Exception:
             context = {}
 
@@ -56,7 +69,7 @@ class BillingProtectionMiddleware(BaseHTTPMiddleware):
             blocking_status = subscription_status
 
         if not blocking_status:
-            return await call_next(request)
+            return None
 
         payload = {
             "detail": "Operacao bloqueada por status de cobranca.",
@@ -65,11 +78,18 @@ class BillingProtectionMiddleware(BaseHTTPMiddleware):
         }
         if callable(self._audit_block):
             try:
-                self._audit_block(company_id, request, payload)
+                await run_in_threadpool(self._audit_block, company_id, request, payload)
             except Exception:
                 pass
         return JSONResponse(status_code=402, content=payload)
 
+    async def _billing_context(self, company_id: int) -> dict:
+        if self._entitlements is not None:
+            return await self._entitlements.aget(company_id)
+        if not callable(self._get_billing_context):
+            return {}
+        return await run_in_threadpool(self._get_billing_context, company_id) or {}
+
 
 def _is_allowed_without_billing_check(request: Request) -> bool:
     if request.method.upper() in SAFE_METHODS:
@@ -81,25 +101,3 @@ def _is_allowed_without_billing_check(request: Request) -> bool:
 def _norm_status(value: Any) -> str:
     return str(value or "").strip().lower()
 
-
-def _safe_int(value: Any) -> int | None:
-    try:
-        if value is None or value == "":
-            return None
-        return int(value)
-    except Exception:
-        return None
-
-
-def _company_id_from_token(request: Request) -> int | None:
-    auth_header = str(request.headers.get("Authorization") or "")
-    if not auth_header.lower().startswith("bearer "):
-        return None
-    token = auth_header.split(" ", 1)[1].strip()
-    if not token:
-        return None
-    try:
-        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-        return _safe_int(payload.get("company_id"))
-    except (JWTError, ValueError, TypeError):
-        return None
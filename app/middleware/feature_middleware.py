@@ -2,35 +2,53 @@ from __future__ import annotations
 
 from typing import Callable
 
-from jose import JWTError, jwt
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.concurrency import run_in_threadpool
 from starlette.requests import Request
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-from backend.config.settings import settings
+from app.middleware.request_auth import company_id_from_request
+from app.services.entitlement_cache import EntitlementCache, feature_allowed
 
 
-class FeatureGateMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, endpoint_features: dict[str, str], can_use_feature: Callable[[int, str], bool]):
-        super().__init__(app)
+class FeatureGateMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        endpoint_features: dict[str, str],
+        can_use_feature: Callable[[int, str], bool] | None = None,
+        entitlements: EntitlementCache | None = None,
+    ):
+        self.app = app
         self._endpoint_features = dict(endpoint_features or {})
         self._can_use_feature = can_use_feature
+        self._entitlements = entitlements
 
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        blocked = await self._blocked(Request(scope))
+        if blocked is None:
+            await self.app(scope, receive, send)
+        else:
+            await blocked(scope, receive, send)
+
+    async def _blocked(self, request: Request) -> Response | None:
         feature = _match_feature(str(request.url.path or ""), self._endpoint_features)
         if not feature:
-            return await call_next(request)
+            return None
 
-        company_id = _safe_int(getattr(request.state, "company_id", None)) or _company_id_from_token(request)
+        company_id = company_id_from_request(request)
         if not company_id:
-            return await call_next(request)
+            return None
 
         try:
-            allowed = bool(self._can_use_feature(company_id, feature))
+            allowed = await self._allowed(company_id, feature)
         except Exception:
             allowed = False
         if allowed:
-            return await call_next(request)
+            return None
 
         return JSONResponse(
             status_code=403,
@@ -41,6 +59,13 @@ class FeatureGateMiddleware(BaseHTTPMiddleware):
             },
         )
 
+    async def _allowed(self, company_id: int, feature: str) -> bool:
+        if self._entitlements is not None:
+            return feature_allowed(await self._entitlements.aget(company_id), feature)
+        if not callable(self._can_use_feature):
+            return False
+        return bool(await run_in_threadpool(self._can_use_feature, company_id, feature))
+
 
 def _match_feature(path: str, endpoint_features: dict[str, str]) -> str:
     for prefix, feature in endpoint_features.items():
@@ -48,25 +73,3 @@ def _match_feature(path: str, endpoint_features: dict[str, str]) -> str:
             return str(feature or "").strip()
     return ""
 
-
-def _safe_int(value):
-    try:
-        if value is None or value == "":
-            return None
-        return int(value)
-    except Exception:
-        return None
-
-
-def _company_id_from_token(request: Request) -> int | None:
-    auth_header = str(request.headers.get("Authorization") or "")
-    if not auth_header.lower().startswith("bearer "):
-        return None
-    token = auth_header.split(" ", 1)[1].strip()
-    if not token:
-        return None
-    try:
-        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-        return _safe_int(payload.get("company_id"))
-    except (JWTError, ValueError, TypeError):
-        return None
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from typing import Any, Callable
+
+from jose import JWTError, jwt
+from starlette.requests import Request
+
+from backend.config.settings import settings
+
+
+def bearer_token(request: Request) -> str:
+    auth_header = str(request.headers.get("authorization") or "").strip()
+    if not auth_header.lower().startswith("bearer "):
+        return ""
+    return auth_header.split(" ", 1)[1].strip()
+
+
+def decode_jwt(token: str) -> dict | None:
+    try:
+        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+    except (JWTError, ValueError, TypeError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def auth_payload(request: Request, decode: Callable[[str], dict | None] | None = None) -> dict | None:
+    """
+    Payload do bearer token decodificado uma unica vez por request e decodificador,
+    guardado em `request.state.auth_payloads[decode]` (None quando ausente/invalido);
+    os demais middlewares reutilizam o valor em vez de decodificar de novo. A chave
+    pelo decodificador importa porque apps montados compartilham o state: o token
+    HMAC do app mobile nao e JWT, e o None do JWT nao pode valer para o verify_token.
+    """
+    decode = decode or decode_jwt
+    cache = getattr(request.state, "auth_payloads", None)
+    if cache is None:
+        cache = {}
+        request.state.auth_payloads = cache
+    if decode in cache:
+        return cache[decode]
+    payload = None
+    token = bearer_token(request)
+    if token:
+        try:
+            payload = decode(token)
+        except Exception:
+            payload = None
+        if not isinstance(payload, dict):
+            payload = None
+    cache[decode] = payload
+    return payload
+
+
+def company_id_from_request(request: Request) -> int | None:
+    company_id = safe_int(getattr(request.state, "company_id", None))
+    if company_id:
+        return company_id
+    payload = auth_payload(request)
+    return safe_int(payload.get("company_id")) if payload else None
+
+
+def safe_int(value: Any) -> int | None:
+    try:
+        if value is None or value == "":
+            return None
+        return int(value)
+    except Exception:
+        return None
@@ -2,35 +2,37 @@ from __future__ import annotations
 
 from typing import Any, Callable
 
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
+from starlette.types import ASGIApp, Receive, Scope, Send
 
+from app.middleware.request_auth import auth_payload
 
-class TenantContextMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, verify_token: Callable[[str], dict | None]):
-        super().__init__(app)
+
+class TenantContextMiddleware:
+    def __init__(self, app: ASGIApp, verify_token: Callable[[str], dict | None]):
+        self.app = app
         self._verify_token = verify_token
 
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            self._bind(Request(scope))
+        await self.app(scope, receive, send)
+
+    def _bind(self, request: Request) -> None:
+        """Preenche request.state (company_id/tenant/auth_payloads) a partir do token ou X-Company-ID."""
         request.state.company_id = None
         request.state.tenant = None
 
-        auth_header = str(request.headers.get("authorization") or "").strip()
-        if auth_header.lower().startswith("bearer "):
-            token = auth_header.split(" ", 1)[1].strip()
-            try:
-                payload = self._verify_token(token)
-            except Exception:
-                payload = None
-            if isinstance(payload, dict):
-                company_id = _safe_int(payload.get("company_id"))
-                request.state.company_id = company_id
-                request.state.tenant = {
-                    "company_id": company_id,
-                    "user_id": _safe_int(payload.get("user_id")),
-                    "username": str(payload.get("username") or payload.get("codigo") or "").strip(),
-                    "role": str(payload.get("role") or payload.get("perfil") or "").strip(),
-                }
+        payload = auth_payload(request, self._verify_token)
+        if isinstance(payload, dict):
+            company_id = _safe_int(payload.get("company_id"))
+            request.state.company_id = company_id
+            request.state.tenant = {
+                "company_id": company_id,
+                "user_id": _safe_int(payload.get("user_id")),
+                "username": str(payload.get("username") or payload.get("codigo") or "").strip(),
+                "role": str(payload.get("role") or payload.get("perfil") or "").strip(),
+            }
 
         if request.state.company_id is None:
             company_id = _safe_int(request.headers.get("x-company-id"))
@@ -43,8 +45,6 @@ class TenantContextMiddleware(BaseHTTPMiddleware):
                     "role": "desktop",
                 }
 
-        return await call_next(request)
-
 
 def _safe_int(value: Any) -> int | None:
     try:
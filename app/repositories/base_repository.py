@@ -3,21 +3,48 @@ from __future__ import annotations
 from typing import Any, Iterable
 
 from app.db.connection import get_db
-from db_bootstrap import ensure_saas_schema, ensure_tenant_columns
+from app.db.schema_state import database_identity, mark_schema_ready, schema_ready
+from db_bootstrap import ensure_saas_bootstrap
+
+
+def _connection_db_path(conn) -> str | None:
+    path = getattr(conn, "_rota_db_path", None)
+    if path:
+        return path
+    try:
+        for row in conn.execute("PRAGMA database_list").fetchall():
+            if row[1] == "main":
+                return row[2] or None
+    except Exception:
+        return None
+    return None
 
 
 def ensure_saas_ready(conn) -> None:
+    """
+    Garante o schema SaaS no banco da conexao. O bootstrap roda uma vez por processo e
+    banco (no startup ou no primeiro acesso); depois disso e so um teste de flag em memoria.
+    """
+    identity = database_identity(_connection_db_path(conn))
+    if schema_ready("saas", identity):
+        return
+    # dentro de uma transacao do chamador o DDL pode ser desfeito; so marca quando commitado aqui
+    standalone = not conn.in_transaction
     if hasattr(conn, "_suspend_sql_mirror"):
         previous = bool(getattr(conn, "_suspend_sql_mirror", False))
         conn._suspend_sql_mirror = True
         try:
-            company_id = ensure_saas_schema(conn)
-            ensure_tenant_columns(conn, company_id)
+            ensure_saas_bootstrap(conn)
+            if standalone:
+                conn.commit()
         finally:
             conn._suspend_sql_mirror = previous
-        return
-    company_id = ensure_saas_schema(conn)
-    ensure_tenant_columns(conn, company_id)
+    else:
+        ensure_saas_bootstrap(conn)
+        if standalone:
+            conn.commit()
+    if standalone:
+        mark_schema_ready("saas", identity)
 
 
 def row_to_dict(row: Any) -> dict | None:
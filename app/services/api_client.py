@@ -16,6 +16,8 @@ TENANT_ID = ""
 COMPANY_ID = ""
 
 API_GET_CACHE = {}
+# ultima resposta com ETag por chave de cache; revalidada com If-None-Match (304 reaproveita o payload)
+API_ETAG_CACHE = {}
 API_CACHE_TTLS = {
     "desktop/cadastros/": 30.0,
     "desktop/clientes/base": 20.0,
@@ -84,6 +86,7 @@ def _invalidate_api_cache(path: str = ""):
             cached_path = ""
         if (not normalized) or str(cached_path).startswith(normalized):
             API_GET_CACHE.pop(key, None)
+            API_ETAG_CACHE.pop(key, None)
 
 
 def _build_api_url(path: str) -> str:
@@ -123,6 +126,9 @@ def _call_api(method: str, path: str, payload=None, token: str = None, extra_hea
                 logging.info("API cache hit | path=%s", path)
                 return cached_payload
             API_GET_CACHE.pop(cache_key, None)
+        etag_cached = API_ETAG_CACHE.get(cache_key)
+        if etag_cached:
+            headers["If-None-Match"] = etag_cached[0]
 
     req = urllib.request.Request(url, data=data, headers=headers, method=method)
     started = time.perf_counter()
@@ -137,11 +143,19 @@ def _call_api(method: str, path: str, payload=None, token: str = None, extra_hea
             parsed = json.loads(text)
             if cache_key:
                 API_GET_CACHE[cache_key] = (time.time() + cache_ttl, parsed)
+                etag = resp.headers.get("ETag") if resp.headers else None
+                if etag:
+                    API_ETAG_CACHE[cache_key] = (etag, parsed)
             elif method != "GET":
                 _invalidate_api_cache()
             return parsed
     except urllib.error.HTTPError as exc:
         elapsed_ms = (time.perf_counter() - started) * 1000.0
+        if exc.code == 304 and cache_key and API_ETAG_CACHE.get(cache_key):
+            logging.info("API %s %s | 304 nao modificado | %.0f ms", method, path, elapsed_ms)
+            parsed = API_ETAG_CACHE[cache_key][1]
+            API_GET_CACHE[cache_key] = (time.time() + cache_ttl, parsed)
+            return parsed
         logging.warning("API %s %s | HTTPError %s | %.0f ms", method, path, exc.code, elapsed_ms)
         body = exc.read()
         detail = ""
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from app.repositories.base_repository import ensure_saas_ready, get_db
+from app.services.entitlement_cache import invalidate_entitlements
 from app.services.saas_result import error_message, service_result
 
 
@@ -9,6 +10,7 @@ def suspend_overdue_subscriptions(*, grace_days: int = 0) -> dict:
         with get_db() as conn:
             ensure_saas_ready(conn)
             summary = suspend_overdue_subscriptions_conn(conn, grace_days=grace_days)
+        invalidate_entitlements()
         return service_result(ok=True, data=summary)
     except Exception as exc:
         return service_result(ok=False, data=None, error=error_message(exc, "Falha ao suspender assinaturas vencidas."))
@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import base64
+import json
+import re
+import sqlite3
+import unicodedata
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+FTS_TABELA = "clientes_fts"
+FTS_COLUNAS = ("cod_cliente", "nome_cliente", "cidade", "bairro", "vendedor")
+FTS_TRIGGERS = ("clientes_fts_ai", "clientes_fts_ad", "clientes_fts_au")
+INDICE_ORDEM_NOME = "idx_clientes_busca_nome"
+
+EXPR_NOME = "UPPER(TRIM(COALESCE(nome_cliente, '')))"
+EXPR_COD = "UPPER(TRIM(COALESCE(cod_cliente, '')))"
+
+_FTS5_DISPONIVEL: Optional[bool] = None
+
+
+def sem_acento(valor: Any) -> str:
+    texto = unicodedata.normalize("NFKD", str(valor or ""))
+    return "".join(ch for ch in texto if not unicodedata.combining(ch)).upper().strip()
+
+
+def termos_busca(q: Any) -> List[str]:
+    return [termo for termo in re.split(r"[^0-9A-Z]+", sem_acento(q)) if termo]
+
+
+def expressao_fts(termos: Sequence[str]) -> str:
+    """Todos os termos, cada um como prefixo: "SAO"* "JO"* (acentos e caixa ignorados pelo tokenizador)."""
+    return " ".join(f'"{termo}"*' for termo in termos)
+
+
+def fts5_disponivel(cur: Any) -> bool:
+    global _FTS5_DISPONIVEL
+    if _FTS5_DISPONIVEL is None:
+        try:
+            cur.execute("PRAGMA compile_options")
+            opcoes = {str(row[0]).upper() for row in cur.fetchall() or []}
+            _FTS5_DISPONIVEL = "ENABLE_FTS5" in opcoes
+        except sqlite3.Error:
+            _FTS5_DISPONIVEL = False
+    return _FTS5_DISPONIVEL
+
+
+def _colunas_clientes(cur: Any) -> Dict[str, Tuple[str, int]]:
+    cur.execute("PRAGMA table_info(clientes)")
+    return {str(row[1]).lower(): (str(row[2] or "").upper(), int(row[5] or 0)) for row in cur.fetchall() or []}
+
+
+def ensure_clientes_busca(cur: Any) -> bool:
+    """
+    Indice FTS5 (conteudo externo) sobre codigo/nome/cidade/bairro/vendedor, mantido por
+    triggers, e indice de ordenacao por nome para a listagem sem termo. Recria triggers e
+    reindexa quando a tabela clientes foi reconstruida. Retorna False quando o SQLite nao
+    tem FTS5 ou clientes nao tem id inteiro (o chamador usa LIKE).
+    """
+    colunas = _colunas_clientes(cur)
+    if not colunas:
+        return False
+    if "company_id" in colunas and "nome_cliente" in colunas and "cod_cliente" in colunas:
+        cur.execute(
+            f"CREATE INDEX IF NOT EXISTS {INDICE_ORDEM_NOME} ON clientes(company_id, {EXPR_NOME}, {EXPR_COD})"
+        )
+    tipo_id, pk_id = colunas.get("id", ("", 0))
+    if not pk_id or tipo_id != "INTEGER" or not set(FTS_COLUNAS) <= set(colunas) or not fts5_disponivel(cur):
+        return False
+
+    nomes = (FTS_TABELA, *FTS_TRIGGERS)
+    cur.execute(
+        f"SELECT COUNT(*) FROM sqlite_master WHERE name IN ({', '.join('?' for _ in nomes)})",
+        nomes,
+    )
+    if int(cur.fetchone()[0] or 0) == len(nomes):
+        return True
+
+    lista = ", ".join(FTS_COLUNAS)
+    novos = ", ".join(f"new.{col}" for col in FTS_COLUNAS)
+    antigos = ", ".join(f"old.{col}" for col in FTS_COLUNAS)
+    cur.execute(
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABELA} USING fts5(
+            {lista},
+            content='clientes', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        """
+    )
+    for trigger in FTS_TRIGGERS:
+        cur.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cur.execute(
+        f"""
+        CREATE TRIGGER clientes_fts_ai AFTER INSERT ON clientes BEGIN
+            INSERT INTO {FTS_TABELA}(rowid, {lista}) VALUES (new.id, {novos});
+        END
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TRIGGER clientes_fts_ad AFTER DELETE ON clientes BEGIN
+            INSERT INTO {FTS_TABELA}({FTS_TABELA}, rowid, {lista}) VALUES ('delete', old.id, {antigos});
+        END
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TRIGGER clientes_fts_au AFTER UPDATE ON clientes BEGIN
+            INSERT INTO {FTS_TABELA}({FTS_TABELA}, rowid, {lista}) VALUES ('delete', old.id, {antigos});
+            INSERT INTO {FTS_TABELA}(rowid, {lista}) VALUES (new.id, {novos});
+        END
+        """
+    )
+    cur.execute(f"INSERT INTO {FTS_TABELA}({FTS_TABELA}) VALUES ('rebuild')")
+    return True
+
+
+def codificar_cursor(chave: Sequence[Any]) -> str:
+    bruto = json.dumps(list(chave), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(bruto).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: Any) -> Optional[List[Any]]:
+    texto = str(cursor or "").strip()
+    if not texto:
+        return None
+    try:
+        valor = json.loads(base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4)).decode("utf-8"))
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return valor if isinstance(valor, list) else None
+
+
+def _sql_nivel(termos: Sequence[str], fts: bool) -> Tuple[str, List[Any]]:
+    """
+    Nivel do casamento no SQL: 0 codigo igual a busca, 1 codigo comeca com a busca,
+    2 nome comeca com a busca, 3 alguma palavra do nome comeca com o 1o termo, 4 demais
+    campos. Com FTS5 os niveis do nome saem do proprio indice (acentos ignorados); sem
+    ele, de LIKE sobre o nome. Os termos so tem letras e digitos.
+    """
+    cod = EXPR_COD
+    for separador in (" ", "-", ".", "/"):
+        cod = f"REPLACE({cod}, '{separador}', '')"
+    compacto = "".join(termos)
+    if fts:
+        nome_inicio = nome_palavra = f"rowid IN (SELECT rowid FROM {FTS_TABELA} WHERE {FTS_TABELA} MATCH ?)"
+        params_nome = [f'nome_cliente : ^ "{" ".join(termos)}"*', f'nome_cliente : "{termos[0]}"*']
+    else:
+        nome_inicio = f"{EXPR_NOME} LIKE ?"
+        nome_palavra = f"({EXPR_NOME} LIKE ? OR {EXPR_NOME} LIKE ?)"
+        params_nome = [f"{' '.join(termos)}%", f"{termos[0]}%", f"% {termos[0]}%"]
+    return (
+        f"""CASE WHEN {cod} = ? THEN 0
+                 WHEN {cod} LIKE ? THEN 1
+                 WHEN {nome_inicio} THEN 2
+                 WHEN {nome_palavra} THEN 3
+                 ELSE 4 END""",
+        [compacto, f"{compacto}%", *params_nome],
+    )
+
+
+def buscar_clientes(
+    cur: Any,
+    q: Any,
+    *,
+    colunas_sql: str,
+    filtros_sql: Sequence[str] = (),
+    filtros_params: Sequence[Any] = (),
+    ordem: str = "nome",
+    limit: int = 200,
+    cursor: Any = "",
+) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Pagina de clientes e o cursor da proxima ('' no fim).
+
+    `colunas_sql` deve expor cod_cliente e nome_cliente; `filtros_sql` sao condicoes
+    extras (escopo da empresa, vendedor, cidade) com `filtros_params`. Com termo, os
+    casamentos vem do indice FTS5 (LIKE quando indisponivel) e sao ordenados no SQL por
+    nivel de prefixo; com ou sem termo, a pagina segue por chave (keyset) no SQL.
+    """
+    limit = max(int(limit or 1), 1)
+    por_codigo = str(ordem or "").strip().lower() == "codigo"
+    termos = termos_busca(q)
+    condicoes = list(filtros_sql)
+    params: List[Any] = list(filtros_params)
+    apos = decodificar_cursor(cursor)
+
+    if not termos:
+        chaves = (EXPR_COD, EXPR_NOME) if por_codigo else (EXPR_NOME, EXPR_COD)
+        if apos is not None and len(apos) == 3:
+            condicoes.append(f"({chaves[0]}, {chaves[1]}, rowid) > (?, ?, ?)")
+            params.extend(apos)
+        where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        cur.execute(
+            f"""
+            SELECT rowid AS _id, {chaves[0]} AS _k1, {chaves[1]} AS _k2, {colunas_sql}
+              FROM clientes
+              {where}
+             ORDER BY {chaves[0]}, {chaves[1]}, rowid
+             LIMIT ?
+            """,
+            (*params, limit + 1),
+        )
+        linhas = [dict(zip([col[0] for col in cur.description], row)) for row in cur.fetchall() or []]
+        proximo = ""
+        if len(linhas) > limit:
+            linhas = linhas[:limit]
+            ultimo = linhas[-1]
+            proximo = codificar_cursor([ultimo["_k1"], ultimo["_k2"], ultimo["_id"]])
+        return [_sem_internas(linha) for linha in linhas], proximo
+
+    fts = ensure_clientes_busca(cur)
+    if fts:
+        condicoes.insert(0, f"rowid IN (SELECT rowid FROM {FTS_TABELA} WHERE {FTS_TABELA} MATCH ?)")
+        params.insert(0, expressao_fts(termos))
+    else:
+        like = f"%{' '.join(termos)}%"
+        condicoes.insert(0, f"({EXPR_COD} LIKE ? OR {EXPR_NOME} LIKE ? OR UPPER(TRIM(COALESCE(cidade, ''))) LIKE ?)")
+        params[0:0] = [like, like, like]
+    nivel, params_nivel = _sql_nivel(termos, fts)
+    chaves = (EXPR_COD, EXPR_NOME) if por_codigo else (EXPR_NOME, EXPR_COD)
+    apos_sql, apos_params = "", []
+    if apos is not None and len(apos) == 4:
+        apos_sql = "WHERE (_nivel, _k1, _k2, _id) > (?, ?, ?, ?)"
+        apos_params = list(apos)
+    # todos os casamentos ordenados pelo SQLite: pagina e cursor por (nivel, chave de ordem, rowid)
+    cur.execute(
+        f"""
+        SELECT * FROM (
+            SELECT rowid AS _id, {nivel} AS _nivel, {chaves[0]} AS _k1, {chaves[1]} AS _k2, {colunas_sql}
+              FROM clientes
+             WHERE {' AND '.join(condicoes)}
+        )
+        {apos_sql}
+        ORDER BY _nivel, _k1, _k2, _id
+        LIMIT ?
+        """,
+        (*params_nivel, *params, *apos_params, limit + 1),
+    )
+    linhas = [dict(zip([col[0] for col in cur.description], row)) for row in cur.fetchall() or []]
+    proximo = ""
+    if len(linhas) > limit:
+        linhas = linhas[:limit]
+        ultimo = linhas[-1]
+        proximo = codificar_cursor([ultimo["_nivel"], ultimo["_k1"], ultimo["_k2"], ultimo["_id"]])
+    return [_sem_internas(linha) for linha in linhas], proximo
+
+
+def _sem_internas(linha: Dict[str, Any]) -> Dict[str, Any]:
+    return {chave: valor for chave, valor in linha.items() if not chave.startswith("_")}
@@ -0,0 +1,184 @@
+"""
+Gravacao de clientes em lote (importacao de planilha e envio em massa do desktop).
+
+As linhas sao normalizadas e mescladas por codigo em Python, gravadas numa tabela
+temporaria com executemany e aplicadas num unico INSERT ... ON CONFLICT DO UPDATE.
+Clientes cujo conteudo nao muda (hash dos campos gravados igual ao da linha atual)
+ficam fora do upsert: nao reescrevem a linha nem disparam os triggers do indice de busca.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+CAMPOS_PADRAO = ("nome_cliente", "endereco", "telefone", "vendedor")
+TABELA_CHAVES = "temp_clientes_lote_chaves"
+TABELA_LOTE = "temp_clientes_lote"
+
+
+def texto_cliente(valor: Any) -> str:
+    return str(valor or "").strip().upper()
+
+
+def hash_conteudo(valores: Iterable[Any]) -> str:
+    return hashlib.sha1("\x1f".join(str(valor or "") for valor in valores).encode("utf-8")).hexdigest()
+
+
+def mesclar_por_codigo(
+    linhas: Iterable[Mapping[str, Any]],
+    campos: Sequence[str],
+    *,
+    manter_vazios: bool = True,
+) -> Dict[str, Dict[str, str]]:
+    """
+    Uma entrada por cod_cliente, na ordem da primeira ocorrencia. Repeticoes do codigo
+    sobrescrevem os campos da anterior (so os preenchidos quando `manter_vazios`), como
+    se as linhas fossem gravadas uma a uma.
+    """
+    mescladas: Dict[str, Dict[str, str]] = {}
+    for linha in linhas:
+        cod = texto_cliente(linha.get("cod_cliente"))
+        if not cod:
+            continue
+        atual = mescladas.get(cod)
+        if atual is None:
+            mescladas[cod] = {campo: texto_cliente(linha.get(campo)) for campo in campos}
+            continue
+        for campo in campos:
+            valor = texto_cliente(linha.get(campo))
+            if valor or not manter_vazios:
+                atual[campo] = valor
+    return mescladas
+
+
+def _colunas(cur: Any) -> set[str]:
+    cur.execute("PRAGMA table_info(clientes)")
+    return {str(row[1]).lower() for row in cur.fetchall() or []}
+
+
+def indice_unico(cur: Any, colunas: Sequence[str]) -> bool:
+    """True quando clientes tem indice unico (nao parcial) exatamente sobre `colunas`, alvo valido de ON CONFLICT."""
+    alvo = {coluna.lower() for coluna in colunas}
+    cur.execute("PRAGMA index_list(clientes)")
+    for row in cur.fetchall() or []:
+        nome, unico = str(row[1]), int(row[2] or 0)
+        parcial = int(row[4] or 0) if len(row) > 4 else 0
+        if not unico or parcial:
+            continue
+        cur.execute(f'PRAGMA index_info("{nome.replace(chr(34), chr(34) * 2)}")')
+        if {str(info[2] or "").lower() for info in cur.fetchall() or []} == alvo:
+            return True
+    return False
+
+
+def upsert_clientes_lote(
+    cur: Any,
+    linhas: Iterable[Mapping[str, Any]],
+    *,
+    campos: Sequence[str] = CAMPOS_PADRAO,
+    company_id: Optional[int] = None,
+    manter_vazios: bool = True,
+    obrigatorios: Sequence[str] = ("nome_cliente",),
+) -> Optional[Dict[str, int]]:
+    """
+    Insere/atualiza clientes por cod_cliente (dentro de `company_id` quando informado e a
+    tabela tem a coluna). Com `manter_vazios`, campo vazio preserva o valor gravado.
+    Clientes novos sem algum campo de `obrigatorios` sao ignorados.
+
+    Retorna {"criados", "atualizados", "inalterados", "ignorados"}, ou None quando a tabela
+    nao tem indice unico para a chave (schema legado) e o chamador deve gravar linha a linha.
+    """
+    colunas = _colunas(cur)
+    if "cod_cliente" not in colunas:
+        return None
+    campos = tuple(campo for campo in campos if campo in colunas and campo != "cod_cliente")
+    escopo = bool(company_id) and "company_id" in colunas
+    chave = ("company_id", "cod_cliente") if escopo else ("cod_cliente",)
+    if not indice_unico(cur, chave):
+        return None
+
+    resultado = {"criados": 0, "atualizados": 0, "inalterados": 0, "ignorados": 0}
+    mescladas = mesclar_por_codigo(linhas, campos, manter_vazios=manter_vazios)
+    if not mescladas:
+        return resultado
+
+    filtro_escopo = " AND c.company_id = ?" if escopo else ""
+    params_escopo: Tuple[Any, ...] = (int(company_id),) if escopo else ()
+    try:
+        cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS {TABELA_CHAVES} (cod TEXT PRIMARY KEY)")
+        cur.execute(f"DELETE FROM {TABELA_CHAVES}")
+        cur.executemany(f"INSERT INTO {TABELA_CHAVES} (cod) VALUES (?)", [(cod,) for cod in mescladas])
+
+        # codigos legados gravados fora do padrao (minusculas/espacos) passam a casar com o indice unico
+        cur.execute(
+            f"""
+            UPDATE OR IGNORE clientes
+               SET cod_cliente = UPPER(TRIM(cod_cliente))
+             WHERE cod_cliente <> UPPER(TRIM(cod_cliente))
+               AND UPPER(TRIM(cod_cliente)) IN (SELECT cod FROM {TABELA_CHAVES})
+               {"AND company_id = ?" if escopo else ""}
+            """,
+            params_escopo,
+        )
+        lista_campos = "".join(f", c.{campo}" for campo in campos)
+        cur.execute(
+            f"""
+            SELECT c.cod_cliente{lista_campos}
+              FROM {TABELA_CHAVES} k
+              JOIN clientes c ON c.cod_cliente = k.cod{filtro_escopo}
+            """,
+            params_escopo,
+        )
+        existentes = {str(row[0]): [str(valor or "") for valor in row[1:]] for row in cur.fetchall() or []}
+
+        lote: List[Tuple[str, ...]] = []
+        for cod, valores in mescladas.items():
+            atual = existentes.get(cod)
+            if atual is None:
+                if any(not valores.get(campo) for campo in obrigatorios if campo in campos):
+                    resultado["ignorados"] += 1
+                    continue
+                resultado["criados"] += 1
+                lote.append((cod, *(valores[campo] for campo in campos)))
+                continue
+            final = [
+                valores[campo] or (atual[idx] if manter_vazios else "")
+                for idx, campo in enumerate(campos)
+            ]
+            if hash_conteudo(final) == hash_conteudo(atual):
+                resultado["inalterados"] += 1
+                continue
+            resultado["atualizados"] += 1
+            lote.append((cod, *final))
+
+        if lote:
+            cur.execute(f"DROP TABLE IF EXISTS {TABELA_LOTE}")
+            cur.execute(
+                f"CREATE TEMP TABLE {TABELA_LOTE} (cod TEXT PRIMARY KEY{''.join(f', {campo} TEXT' for campo in campos)})"
+            )
+            marcadores = ", ".join("?" for _ in range(len(campos) + 1))
+            cur.executemany(
+                f"INSERT INTO {TABELA_LOTE} (cod{''.join(f', {campo}' for campo in campos)}) VALUES ({marcadores})",
+                lote,
+            )
+            destino = ", ".join((*(["company_id"] if escopo else []), "cod_cliente", *campos))
+            origem = ", ".join((*(["?"] if escopo else []), "cod", *campos))
+            acao = (
+                "DO UPDATE SET " + ", ".join(f"{campo} = excluded.{campo}" for campo in campos)
+                if campos
+                else "DO NOTHING"
+            )
+            # WHERE true: desfaz a ambiguidade entre INSERT ... SELECT e a clausula ON CONFLICT
+            cur.execute(
+                f"""
+                INSERT INTO clientes ({destino})
+                SELECT {origem} FROM {TABELA_LOTE} WHERE true
+                ON CONFLICT({', '.join(chave)}) {acao}
+                """,
+                params_escopo,
+            )
+    finally:
+        cur.execute(f"DROP TABLE IF EXISTS {TABELA_LOTE}")
+        cur.execute(f"DROP TABLE IF EXISTS {TABELA_CHAVES}")
+    return resultado
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from app.repositories import company_repository
+from app.services.entitlement_cache import invalidate_entitlements
 from app.services.saas_result import error_message, service_result
 
 
@@ -44,6 +45,7 @@ def update_company(company_id: int, data: dict) -> dict:
         company = company_repository.update_company(company_id, data or {})
         if not company:
             return service_result(ok=False, data=None, error="Empresa nao encontrada.")
+        invalidate_entitlements(company_id)
         return service_result(ok=True, data=company)
     except Exception as exc:
         return service_result(ok=False, data=None, error=error_message(exc, "Falha ao atualizar empresa."))
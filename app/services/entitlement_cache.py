@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+import weakref
+from typing import Any, Callable, Hashable
+
+from starlette.concurrency import run_in_threadpool
+
+
+DEFAULT_TTL_SECONDS = float(os.environ.get("ROTA_ENTITLEMENT_TTL", "30") or 30)
+
+_CACHES: "weakref.WeakSet[EntitlementCache]" = weakref.WeakSet()
+
+
+class EntitlementCache:
+    """
+    Entitlements por empresa (features do plano + status de cobranca) com TTL.
+    Compartilhado entre FeatureGateMiddleware e BillingProtectionMiddleware: no
+    acerto o custo e uma leitura de dict; na falta o loader roda fora do event loop.
+    `scope` separa entradas por contexto (ex.: caminho do banco) sem mudar a chave.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[int], dict],
+        *,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        scope: Callable[[], Hashable] | None = None,
+    ):
+        self._loader = loader
+        self.ttl_seconds = float(ttl_seconds)
+        self._scope = scope
+        self._entries: dict[int, tuple[float, Hashable, dict]] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        _CACHES.add(self)
+
+    def peek(self, company_id: int) -> dict | None:
+        entry = self._entries.get(int(company_id))
+        if entry is None:
+            return None
+        expires_at, scope, value = entry
+        if expires_at < time.monotonic() or (self._scope is not None and scope != self._scope()):
+            return None
+        self.hits += 1
+        return value
+
+    def get(self, company_id: int) -> dict:
+        cached = self.peek(company_id)
+        if cached is not None:
+            return cached
+        self.misses += 1
+        generation = self._generation
+        scope = self._scope() if self._scope is not None else None
+        value = dict(self._loader(int(company_id)) or {})
+        with self._lock:
+            # invalidacao durante o load: nao grava o valor possivelmente antigo
+            if generation == self._generation:
+                self._entries[int(company_id)] = (time.monotonic() + self.ttl_seconds, scope, value)
+        return value
+
+    async def aget(self, company_id: int) -> dict:
+        cached = self.peek(company_id)
+        if cached is not None:
+            return cached
+        return await run_in_threadpool(self.get, company_id)
+
+    def invalidate(self, company_id: int | None = None) -> None:
+        with self._lock:
+            self._generation += 1
+            if company_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(int(company_id), None)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+def invalidate_entitlements(company_id: int | None = None) -> None:
+    """Descarta entitlements em cache (todas as instancias) apos mudanca de plano, pagamento ou status."""
+    for cache in list(_CACHES):
+        cache.invalidate(company_id)
+
+
+def feature_allowed(entitlements: dict | None, feature_name: str) -> bool:
+    features = (entitlements or {}).get("features")
+    return bool(isinstance(features, dict) and features.get(str(feature_name or "").strip()))
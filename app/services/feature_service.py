@@ -11,7 +11,7 @@ def list_company_features(company_id: int) -> dict:
         subscription = subscription_repository.get_active_subscription(company_id)
         if not subscription:
             return service_result(ok=False, data=None, error="Assinatura ativa nao encontrada.")
-        features = _decode_features(subscription.get("plan_features_json"))
+        features = decode_features(subscription.get("plan_features_json"))
         return service_result(
             ok=True,
             data={
@@ -38,7 +38,7 @@ def can_use_feature(company_id: int, feature_name: str) -> dict:
     return service_result(ok=True, data=out)
 
 
-def _decode_features(raw) -> dict:
+def decode_features(raw) -> dict:
     if isinstance(raw, dict):
         return dict(raw)
     try:
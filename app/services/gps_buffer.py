@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Hashable, List
+
+
+class GpsWriteBuffer:
+    """
+    Buffer write-behind para pings GPS: acumula itens em memoria e grava em lote
+    (group commit) a cada `flush_ms` ou quando atingir `flush_rows` itens.
+    Com flush_ms <= 0 a gravacao e imediata (modo sincrono).
+    """
+
+    def __init__(
+        self,
+        writer: Callable[[List[dict]], Any],
+        *,
+        flush_ms: int = 250,
+        flush_rows: int = 500,
+        max_pending: int = 50000,
+    ):
+        self.writer = writer
+        self.flush_ms = int(flush_ms)
+        self.flush_rows = max(1, int(flush_rows))
+        self.max_pending = max(self.flush_rows, int(max_pending))
+        self.flushed_rows = 0
+        self.flush_count = 0
+        self.dropped_rows = 0
+        self._items: List[dict] = []
+        self._pending_keys: set = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._items)
+
+    def is_pending(self, key: Hashable) -> bool:
+        return key in self._pending_keys
+
+    def add(self, items: List[dict]) -> int:
+        """Enfileira itens; cada item pode trazer `dedup_key` para deduplicacao antes do flush."""
+        if not items:
+            return 0
+        with self._lock:
+            for item in items:
+                key = item.get("dedup_key")
+                if key is not None:
+                    self._pending_keys.add(key)
+                self._items.append(item)
+            cheio = len(self._items) >= self.flush_rows
+        if self.flush_ms <= 0 or cheio:
+            self.flush()
+        else:
+            self._ensure_thread()
+        return len(items)
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                lote, self._items = self._items, []
+            if not lote:
+                return 0
+            inicio = time.perf_counter()
+            try:
+                self.writer(lote)
+            except Exception:
+                logging.exception("Falha ao gravar lote de %s pings GPS; mantendo no buffer", len(lote))
+                with self._lock:
+                    self._items = lote + self._items
+                    excedente = len(self._items) - self.max_pending
+                    if excedente > 0:
+                        descartados = self._items[:excedente]
+                        self._items = self._items[excedente:]
+                        self.dropped_rows += excedente
+                        for item in descartados:
+                            self._pending_keys.discard(item.get("dedup_key"))
+                        logging.warning("Buffer GPS cheio; %s pings antigos descartados", excedente)
+                return 0
+            with self._lock:
+                for item in lote:
+                    self._pending_keys.discard(item.get("dedup_key"))
+            self.flushed_rows += len(lote)
+            self.flush_count += 1
+            logging.debug("GPS group commit | linhas=%s | %.1f ms", len(lote), (time.perf_counter() - inicio) * 1000)
+            return len(lote)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "flushed_rows": self.flushed_rows,
+            "flush_count": self.flush_count,
+            "dropped_rows": self.dropped_rows,
+            "flush_ms": self.flush_ms,
+            "flush_rows": self.flush_rows,
+        }
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="gps-write-buffer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        intervalo = max(self.flush_ms, 1) / 1000.0
+        while not self._stop.wait(intervalo):
+            try:
+                self.flush()
+            except Exception:
+                logging.exception("Falha no flush periodico do buffer GPS")
+
+    def close(self) -> int:
+        """Para a thread de flush e grava o que estiver pendente."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout=5)
+        self._thread = None
+        return self.flush()
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from app.repositories import company_repository, payment_repository, subscription_repository
+from app.services.entitlement_cache import invalidate_entitlements
 from app.services.saas_result import error_message, service_result
 
 
@@ -33,6 +34,7 @@ def register_payment(payment_id: int, *, method: str | None = None, reference: s
         payment = payment_repository.register_payment(payment_id, method=method, reference=reference, notes=notes)
         if not payment:
             return service_result(ok=False, data=None, error="Pagamento nao encontrado.")
+        invalidate_entitlements(int(payment.get("company_id") or 0))
         return service_result(ok=True, data=payment)
     except Exception as exc:
         return service_result(ok=False, data=None, error=error_message(exc, "Falha ao registrar pagamento."))
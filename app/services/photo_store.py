@@ -0,0 +1,344 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+from uuid import uuid4
+
+
+UPLOADS_TABLE = "foto_uploads"
+OBJETOS_DIR = "objetos"
+UPLOADS_DIR = "uploads"
+CHUNK_BYTES = 1024 * 1024
+MAX_FOTO_BYTES = 25 * 1024 * 1024
+
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class UploadError(Exception):
+    """Erro de upload com status HTTP sugerido (o endpoint converte em HTTPException)."""
+
+    def __init__(self, status_code: int, detail: str, **extra: Any):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.extra = extra
+
+
+def _now_iso() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def normalize_sha256(value: Any) -> str:
+    txt = str(value or "").strip().lower()
+    return txt if _SHA256_RE.match(txt) else ""
+
+
+def ensure_photo_store_schema(cur: sqlite3.Cursor) -> None:
+    """
+    Sessoes de upload retomavel (foto_uploads) e a coluna rota_fotos.sha256 que liga
+    o registro da foto ao objeto guardado por conteudo.
+    """
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {UPLOADS_TABLE} (
+            upload_id TEXT PRIMARY KEY,
+            company_id INTEGER,
+            motorista_codigo TEXT,
+            tamanho_total INTEGER NOT NULL,
+            sha256_esperado TEXT,
+            sha256 TEXT,
+            mime_type TEXT,
+            status TEXT NOT NULL DEFAULT 'ABERTO',
+            criado_em TEXT,
+            concluido_em TEXT
+        )
+        """
+    )
+    cur.execute('PRAGMA table_info("rota_fotos")')
+    cols = {str(r[1]).lower() for r in (cur.fetchall() or [])}
+    if cols and "sha256" not in cols:
+        cur.execute("ALTER TABLE rota_fotos ADD COLUMN sha256 TEXT")
+    if cols:
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_rota_fotos_sha256 ON rota_fotos(sha256)")
+
+
+def object_path(root: str, sha256: str) -> str:
+    sha = normalize_sha256(sha256)
+    if not sha:
+        raise UploadError(400, "sha256 invalido.")
+    return os.path.join(root, OBJETOS_DIR, sha[:2], sha)
+
+
+def find_object(root: str, sha256: str) -> Optional[str]:
+    if not normalize_sha256(sha256):
+        return None
+    path = object_path(root, sha256)
+    return path if os.path.isfile(path) else None
+
+
+def _place_object(root: str, temp_path: str, sha256: str) -> str:
+    destino = object_path(root, sha256)
+    if os.path.isfile(destino):
+        # mesmo conteudo ja guardado (reenvio/retry): descarta a copia
+        os.unlink(temp_path)
+        return destino
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    os.replace(temp_path, destino)
+    return destino
+
+
+def store_chunks(root: str, chunks: Iterable[bytes], max_bytes: int = MAX_FOTO_BYTES) -> Tuple[str, int, str]:
+    """Grava os blocos em disco calculando o sha256 no caminho; retorna (sha256, tamanho, caminho)."""
+    uploads = os.path.join(root, UPLOADS_DIR)
+    os.makedirs(uploads, exist_ok=True)
+    temp_path = os.path.join(uploads, f"direto_{uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, "wb") as fh:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadError(413, "Foto excede o tamanho maximo permitido.")
+                digest.update(chunk)
+                fh.write(chunk)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    sha = digest.hexdigest()
+    return sha, size, _place_object(root, temp_path, sha)
+
+
+def store_bytes(root: str, data: bytes) -> Tuple[str, int, str]:
+    return store_chunks(root, (data[i:i + CHUNK_BYTES] for i in range(0, len(data), CHUNK_BYTES)), max_bytes=max(len(data), 1))
+
+
+def _part_path(root: str, upload_id: str) -> str:
+    if not re.match(r"^[0-9a-f]{32}$", str(upload_id or "")):
+        raise UploadError(404, "Upload nao encontrado.")
+    return os.path.join(root, UPLOADS_DIR, f"{upload_id}.part")
+
+
+def _session(cur: sqlite3.Cursor, upload_id: str, company_id: Optional[int]) -> sqlite3.Row:
+    cur.execute(
+        f"""
+        SELECT upload_id, company_id, tamanho_total, sha256_esperado, sha256, mime_type, status
+          FROM {UPLOADS_TABLE}
+         WHERE upload_id=?
+        """,
+        (upload_id,),
+    )
+    row = cur.fetchone()
+    if not row or (company_id is not None and row[1] is not None and int(row[1]) != int(company_id)):
+        raise UploadError(404, "Upload nao encontrado.")
+    return row
+
+
+def _status_dict(root: str, row: Any) -> Dict[str, Any]:
+    upload_id, _company, total, _esperado, sha, mime_type, status = tuple(row)
+    concluido = status == "CONCLUIDO"
+    if concluido:
+        recebido = int(total)
+    else:
+        part = _part_path(root, upload_id)
+        recebido = os.path.getsize(part) if os.path.isfile(part) else 0
+    return {
+        "upload_id": upload_id,
+        "tamanho_total": int(total),
+        "recebido_bytes": int(recebido),
+        "concluido": concluido,
+        "sha256": sha or "",
+        "mime_type": mime_type or "",
+    }
+
+
+def create_upload(
+    cur: sqlite3.Cursor,
+    root: str,
+    *,
+    tamanho_total: int,
+    sha256: str = "",
+    mime_type: str = "",
+    motorista_codigo: str = "",
+    company_id: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Abre uma sessao de upload. Se o cliente informa o sha256 e o objeto ja existe e e
+    da empresa, nada precisa ser enviado (deduplicacao antes da transferencia); objeto
+    de outra empresa exige o envio dos bytes, que prova a posse do conteudo.
+    """
+    total = int(tamanho_total or 0)
+    if total <= 0 or total > MAX_FOTO_BYTES:
+        raise UploadError(413 if total > 0 else 400, "tamanho_total invalido para foto.")
+    sha = normalize_sha256(sha256)
+    if sha256 and not sha:
+        raise UploadError(400, "sha256 invalido.")
+    existente = find_object(root, sha) if sha else None
+    if existente and os.path.getsize(existente) == total and owns_object(cur, sha, company_id):
+        return {
+            "upload_id": "",
+            "tamanho_total": total,
+            "recebido_bytes": total,
+            "concluido": True,
+            "sha256": sha,
+            "mime_type": mime_type or "",
+        }
+    upload_id = uuid4().hex
+    os.makedirs(os.path.join(root, UPLOADS_DIR), exist_ok=True)
+    open(_part_path(root, upload_id), "wb").close()
+    cur.execute(
+        f"""
+        INSERT INTO {UPLOADS_TABLE}
+            (upload_id, company_id, motorista_codigo, tamanho_total, sha256_esperado, mime_type, status, criado_em)
+        VALUES (?, ?, ?, ?, ?, ?, 'ABERTO', ?)
+        """,
+        (upload_id, company_id, motorista_codigo or None, total, sha or None, mime_type or None, _now_iso()),
+    )
+    return _status_dict(root, _session(cur, upload_id, company_id))
+
+
+def register_direct_upload(
+    cur: sqlite3.Cursor,
+    sha256: str,
+    tamanho: int,
+    *,
+    mime_type: str = "",
+    motorista_codigo: str = "",
+    company_id: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Upload de uma vez (multipart) ja gravado em objetos/: registra so a sessao concluida."""
+    upload_id = uuid4().hex
+    agora = _now_iso()
+    cur.execute(
+        f"""
+        INSERT INTO {UPLOADS_TABLE}
+            (upload_id, company_id, motorista_codigo, tamanho_total, sha256, mime_type, status, criado_em, concluido_em)
+        VALUES (?, ?, ?, ?, ?, ?, 'CONCLUIDO', ?, ?)
+        """,
+        (upload_id, company_id, motorista_codigo or None, int(tamanho), sha256, mime_type or None, agora, agora),
+    )
+    return {
+        "upload_id": upload_id,
+        "tamanho_total": int(tamanho),
+        "recebido_bytes": int(tamanho),
+        "concluido": True,
+        "sha256": sha256,
+        "mime_type": mime_type or "",
+    }
+
+
+def object_info(cur: sqlite3.Cursor, sha256: str, company_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    mime_type do objeto se ele pertence a empresa (foto registrada ou upload dela);
+    company_id None = sem restricao (admin). None = nao encontrado para a empresa.
+    """
+    sql = [
+        "SELECT mime_type FROM rota_fotos WHERE sha256=?",
+        f"SELECT mime_type FROM {UPLOADS_TABLE} WHERE sha256=? AND status='CONCLUIDO'",
+    ]
+    params: list = []
+    for i, parte in enumerate(sql):
+        if company_id is not None:
+            sql[i] = parte + " AND company_id=?"
+            params.extend([sha256, int(company_id)])
+        else:
+            params.append(sha256)
+    cur.execute(" UNION ALL ".join(sql) + " LIMIT 1", params)
+    row = cur.fetchone()
+    if row is None:
+        return None
+    return {"mime_type": str(row[0] or "") or "image/jpeg"}
+
+
+def owns_object(cur: sqlite3.Cursor, sha256: str, company_id: Optional[int] = None) -> bool:
+    """A empresa concluiu um upload do objeto ou ja tem foto em rota_fotos com ele (None = admin)."""
+    return object_info(cur, sha256, company_id) is not None
+
+
+def upload_status(cur: sqlite3.Cursor, root: str, upload_id: str, company_id: Optional[int] = None) -> Dict[str, Any]:
+    """Estado para retomada: o cliente continua do recebido_bytes informado."""
+    return _status_dict(root, _session(cur, upload_id, company_id))
+
+
+def open_part_for_append(cur: sqlite3.Cursor, root: str, upload_id: str, offset: int, company_id: Optional[int] = None):
+    """
+    Valida o offset do bloco contra o que ja esta em disco e devolve (arquivo aberto
+    em append, bytes restantes). Offset divergente -> 409 com o recebido atual.
+    """
+    row = _session(cur, upload_id, company_id)
+    status = _status_dict(root, row)
+    if status["concluido"]:
+        raise UploadError(409, "Upload ja concluido.", **status)
+    if int(offset) != status["recebido_bytes"]:
+        raise UploadError(409, "Offset divergente do recebido.", **status)
+    return open(_part_path(root, upload_id), "ab"), status["tamanho_total"] - status["recebido_bytes"]
+
+
+def finish_upload(cur: sqlite3.Cursor, root: str, upload_id: str, company_id: Optional[int] = None) -> Dict[str, Any]:
+    """Conclui a sessao quando todos os bytes chegaram: confere o sha256 e move para objetos/."""
+    row = _session(cur, upload_id, company_id)
+    status = _status_dict(root, row)
+    if status["concluido"] or status["recebido_bytes"] < status["tamanho_total"]:
+        return status
+    part = _part_path(root, upload_id)
+    digest = hashlib.sha256()
+    with open(part, "rb") as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_BYTES), b""):
+            digest.update(chunk)
+    sha = digest.hexdigest()
+    esperado = str(row[3] or "")
+    if esperado and esperado != sha:
+        os.unlink(part)
+        cur.execute(f"DELETE FROM {UPLOADS_TABLE} WHERE upload_id=?", (upload_id,))
+        raise UploadError(422, "sha256 do conteudo nao confere; reinicie o upload.")
+    _place_object(root, part, sha)
+    cur.execute(
+        f"UPDATE {UPLOADS_TABLE} SET status='CONCLUIDO', sha256=?, concluido_em=? WHERE upload_id=?",
+        (sha, _now_iso(), upload_id),
+    )
+    return _status_dict(root, _session(cur, upload_id, company_id))
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Intervalo (inicio, fim inclusivo) de um header Range de faixa unica.
+    None = sem Range (resposta inteira); UploadError 416 = faixa fora do arquivo.
+    """
+    txt = str(header or "").strip()
+    if not txt:
+        return None
+    match = re.match(r"^bytes=(\d*)-(\d*)$", txt)
+    if not match or (not match.group(1) and not match.group(2)):
+        # multiplas faixas ou sintaxe desconhecida: ignora e envia tudo (RFC 9110)
+        return None
+    if not match.group(1):
+        suffix = int(match.group(2))
+        if suffix <= 0:
+            raise UploadError(416, "Faixa invalida.")
+        return max(size - suffix, 0), size - 1
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else size - 1
+    if start >= size or end < start:
+        raise UploadError(416, "Faixa invalida.")
+    return start, min(end, size - 1)
+
+
+def iter_file_range(path: str, start: int, end: int) -> Iterable[bytes]:
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = fh.read(min(CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
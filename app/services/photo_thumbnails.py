@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import Any, Dict, Optional
+from uuid import uuid4
+
+try:  # Pillow e opcional: sem ele as telas recebem a foto original
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - depende do ambiente
+    Image = None
+    ImageOps = None
+
+
+MINIATURAS_DIR = "miniaturas"
+# larguras aceitas (a maior dimensao da miniatura); limita o cache a poucas variantes por foto
+LARGURAS = (160, 320, 640, 1280)
+LARGURA_PADRAO = 320
+QUALIDADE_JPEG = 80
+# cache de conteudo derivado de hash: nunca muda para a mesma chave
+CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def pillow_disponivel() -> bool:
+    return Image is not None
+
+
+def largura_valida(largura: Any) -> int:
+    """Arredonda para a menor largura aceita >= pedida (ou a maior disponivel)."""
+    try:
+        pedida = int(largura or LARGURA_PADRAO)
+    except (TypeError, ValueError):
+        pedida = LARGURA_PADRAO
+    for opcao in LARGURAS:
+        if pedida <= opcao:
+            return opcao
+    return LARGURAS[-1]
+
+
+def chave_foto(path: str, sha256: str = "") -> str:
+    """
+    Chave de cache da foto: o sha256 do conteudo quando conhecido (armazenamento por
+    conteudo); para arquivos antigos, hash de caminho + tamanho + mtime, que muda se o
+    arquivo for substituido.
+    """
+    sha = str(sha256 or "").strip().lower()
+    if len(sha) == 64:
+        return sha
+    stat = os.stat(path)
+    ident = f"{os.path.realpath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha256(ident.encode("utf-8")).hexdigest()
+
+
+def etag(chave: str, largura: int) -> str:
+    return f'"{chave}-{int(largura)}"'
+
+
+def etag_confere(if_none_match: Optional[str], valor: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in str(if_none_match).split(",")]
+    return "*" in tags or valor in tags or f"W/{valor}" in tags
+
+
+def caminho_miniatura(cache_dir: str, chave: str, largura: int) -> str:
+    return os.path.join(cache_dir, MINIATURAS_DIR, chave[:2], f"{chave}_{int(largura)}.jpg")
+
+
+def gerar_miniatura(origem: str, destino: str, largura: int) -> None:
+    """Reduz a foto (respeitando a orientacao EXIF) e grava JPEG de forma atomica."""
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temp = f"{destino}.{uuid4().hex}.tmp"
+    try:
+        with Image.open(origem) as img:
+            # JPEG: decodifica ja reduzido (DCT scaling) em vez da resolucao cheia
+            img.draft("RGB", (largura, largura))
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((largura, largura))
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            img.save(temp, "JPEG", quality=QUALIDADE_JPEG, optimize=True)
+        os.replace(temp, destino)
+    except BaseException:
+        try:
+            os.unlink(temp)
+        except OSError:
+            pass
+        raise
+
+
+def miniatura(origem: str, cache_dir: str, largura: Any = LARGURA_PADRAO, sha256: str = "") -> Optional[Dict[str, Any]]:
+    """
+    Miniatura da foto, gerada na primeira chamada e servida do cache nas seguintes.
+    Retorna {path, etag, largura, media_type} ou None quando nao da para gerar
+    (Pillow ausente ou arquivo que nao e imagem); o chamador entao serve o original.
+    """
+    if Image is None or not os.path.isfile(origem):
+        return None
+    largura = largura_valida(largura)
+    chave = chave_foto(origem, sha256)
+    destino = caminho_miniatura(cache_dir, chave, largura)
+    if not os.path.isfile(destino):
+        try:
+            gerar_miniatura(origem, destino, largura)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            return None
+    return {"path": destino, "etag": etag(chave, largura), "largura": largura, "media_type": "image/jpeg"}
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+
+
+DEFAULT_TTL_SECONDS = float(os.environ.get("ROTA_PRINCIPAL_TTL", "30") or 30)
+
+
+class PrincipalCache:
+    """
+    Cache curto de principals autenticados (motorista/vendedor), chaveado pelo token
+    completo (payload + assinatura) ja verificado. Entradas expiram no menor entre TTL e
+    `exp` do token; `invalidate(kind, codigo)` derruba todos os tokens daquele cadastro.
+    Cada invalidacao avanca `generation()`: put com a geracao lida antes do cadastro e
+    ignorado se houve invalidacao no meio, entao um login em curso nao desfaz um bloqueio.
+    """
+
+    def __init__(self, ttl_seconds: float = DEFAULT_TTL_SECONDS, max_entries: int = 10000):
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_entries = max(1, int(max_entries))
+        self._entries: "OrderedDict[Tuple[Hashable, str, str], Tuple[float, Dict[str, Any], Tuple[str, str]]]" = OrderedDict()
+        self._tags: Dict[Tuple[str, str], Set[Tuple[Hashable, str, str]]] = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, scope: Hashable, kind: str, token: str) -> Optional[Dict[str, Any]]:
+        key = (scope, kind, token)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(entry[1])
+
+    def generation(self) -> int:
+        return self._generation
+
+    def put(
+        self,
+        scope: Hashable,
+        kind: str,
+        token: str,
+        principal: Dict[str, Any],
+        *,
+        codigo: str,
+        exp: Any = None,
+        generation: Optional[int] = None,
+    ) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        try:
+            if exp:
+                expires_at = min(expires_at, float(exp))
+        except (TypeError, ValueError):
+            pass
+        key = (scope, kind, token)
+        tag = (kind, str(codigo or "").strip().upper())
+        with self._lock:
+            # invalidacao depois da leitura do cadastro: o principal pode estar desatualizado
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (expires_at, dict(principal), tag)
+            self._entries.move_to_end(key)
+            self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                old_key, (_, _, old_tag) = self._entries.popitem(last=False)
+                self._discard_tag(old_tag, old_key)
+
+    def invalidate(self, kind: Optional[str] = None, codigo: Optional[str] = None) -> None:
+        with self._lock:
+            self._generation += 1
+            if kind is None:
+                self._entries.clear()
+                self._tags.clear()
+                return
+            tag = (kind, str(codigo or "").strip().upper())
+            for key in self._tags.pop(tag, set()):
+                self._entries.pop(key, None)
+
+    def _discard_tag(self, tag: Tuple[str, str], key: Tuple[Hashable, str, str]) -> None:
+        keys = self._tags.get(tag)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                self._tags.pop(tag, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "ttl_seconds": self.ttl_seconds}
@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+from db_bootstrap import normalized_key_expr
+
+
+RESUMO_TABLE = "programacao_resumo"
+PENDENTE_TABLE = "programacao_resumo_pendente"
+
+# colunas materializadas por rota (alem de chave, codigo, company_id e atualizado_em)
+RESUMO_VALUE_COLUMNS = (
+    "caixas_saldo",
+    "caixas_ativas",
+    "transferencias_saida",
+    "transferencias_entrada",
+    "transferencias_pendentes",
+    "kg_transferido_convertido",
+    "compra_transferida_saida",
+    "compra_transferida_entrada",
+)
+
+_STATUS_CANCELADOS = {"CANCELADA", "CANCELADO", "RECUSADA", "RECUSADO"}
+_STATUS_PENDENTES = {"", "PENDENTE", "ABERTA", "AGUARDANDO", "SOLICITADA"}
+
+# colunas que alteram o resumo quando atualizadas (so entram no trigger se existirem)
+_WATCHED_COLUMNS = {
+    "programacao_itens": (
+        "codigo_programacao", "cod_cliente", "pedido", "qnt_caixas", "caixas_atual",
+        "status_pedido", "transferencia_origem_id", "alteracao_tipo",
+    ),
+    "programacao_itens_controle": (
+        "codigo_programacao", "cod_cliente", "pedido", "caixas_atual", "status_pedido", "alteracao_tipo",
+    ),
+    "programacoes": (
+        "codigo_programacao", "company_id", "caixas_carregadas", "qnt_cx_carregada", "nf_kg_carregado",
+        "kg_carregado", "nf_kg", "kg_nf", "nf_caixas", "total_caixas", "nf_preco", "preco_nf",
+    ),
+}
+
+# campos da rota raiz/origem usados para converter caixas transferidas em kg e valor
+ROTA_CARGA_COLUMNS = (
+    "nf_kg_carregado", "kg_carregado", "nf_kg", "kg_nf",
+    "nf_caixas", "total_caixas", "caixas_carregadas", "nf_preco", "preco_nf",
+)
+
+
+def codigo_key(value: Any) -> str:
+    return str(value or "").strip().upper()
+
+
+def _columns(cur: sqlite3.Cursor, table: str) -> set[str]:
+    cur.execute(f'PRAGMA table_info("{table}")')
+    return {str(r[1]).lower() for r in (cur.fetchall() or [])}
+
+
+def _table_exists(cur: sqlite3.Cursor, table: str) -> bool:
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=? LIMIT 1", (table,))
+    return cur.fetchone() is not None
+
+
+def _json1_available(cur: sqlite3.Cursor) -> bool:
+    try:
+        cur.execute("SELECT json_valid('{}')")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _mark_sql(key_sql: str) -> str:
+    return (
+        f"DELETE FROM {RESUMO_TABLE} WHERE codigo_programacao_key={key_sql}; "
+        f"INSERT OR IGNORE INTO {PENDENTE_TABLE} (codigo_programacao_key) VALUES ({key_sql});"
+    )
+
+
+def ensure_programacao_resumo_schema(cur: sqlite3.Cursor) -> bool:
+    """
+    Cria programacao_resumo (uma linha por rota) e os triggers que invalidam a linha
+    quando itens, controle, transferencias ou a carga da rota mudam: a linha sai do
+    resumo e a chave vai para programacao_resumo_pendente ate o proximo refresh.
+    Retorna True quando a tabela foi criada agora (precisa de rebuild).
+    """
+    criada = not _table_exists(cur, RESUMO_TABLE)
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {RESUMO_TABLE} (
+            codigo_programacao_key TEXT PRIMARY KEY,
+            codigo_programacao TEXT,
+            company_id INTEGER,
+            caixas_saldo INTEGER DEFAULT 0,
+            caixas_ativas INTEGER DEFAULT 0,
+            transferencias_saida INTEGER DEFAULT 0,
+            transferencias_entrada INTEGER DEFAULT 0,
+            transferencias_pendentes INTEGER DEFAULT 0,
+            kg_transferido_convertido REAL DEFAULT 0,
+            compra_transferida_saida REAL DEFAULT 0,
+            compra_transferida_entrada REAL DEFAULT 0,
+            atualizado_em TEXT
+        )
+        """
+    )
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {PENDENTE_TABLE} (codigo_programacao_key TEXT PRIMARY KEY)")
+
+    for table in ("programacao_itens", "programacao_itens_controle"):
+        if not _table_exists(cur, table):
+            continue
+        cols = _columns(cur, table)
+        if "codigo_programacao" not in cols:
+            continue
+        new_key = normalized_key_expr("NEW.codigo_programacao")
+        old_key = normalized_key_expr("OLD.codigo_programacao")
+        watched = ", ".join(c for c in _WATCHED_COLUMNS[table] if c in cols)
+        cur.execute(
+            f'CREATE TRIGGER IF NOT EXISTS trg_{table}_resumo_ins AFTER INSERT ON "{table}" '
+            f"BEGIN {_mark_sql(new_key)} END"
+        )
+        cur.execute(
+            f'CREATE TRIGGER IF NOT EXISTS trg_{table}_resumo_upd AFTER UPDATE OF {watched} ON "{table}" '
+            f"BEGIN {_mark_sql(new_key)} {_mark_sql(old_key)} END"
+        )
+        cur.execute(
+            f'CREATE TRIGGER IF NOT EXISTS trg_{table}_resumo_del AFTER DELETE ON "{table}" '
+            f"BEGIN {_mark_sql(old_key)} END"
+        )
+
+    if _table_exists(cur, "transferencias"):
+        marks_new = _mark_sql(normalized_key_expr("NEW.codigo_origem")) + " " + _mark_sql(normalized_key_expr("NEW.codigo_destino"))
+        marks_old = _mark_sql(normalized_key_expr("OLD.codigo_origem")) + " " + _mark_sql(normalized_key_expr("OLD.codigo_destino"))
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_transferencias_resumo_ins AFTER INSERT ON transferencias BEGIN {marks_new} END")
+        cur.execute(
+            f"CREATE TRIGGER IF NOT EXISTS trg_transferencias_resumo_upd AFTER UPDATE ON transferencias "
+            f"BEGIN {marks_new} {marks_old} END"
+        )
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_transferencias_resumo_del AFTER DELETE ON transferencias BEGIN {marks_old} END")
+
+    if _table_exists(cur, "programacoes"):
+        cols = _columns(cur, "programacoes")
+        new_key = normalized_key_expr("NEW.codigo_programacao")
+        old_key = normalized_key_expr("OLD.codigo_programacao")
+        # destinos que convertem caixas com o kg/preco desta rota (origem direta ou carga raiz)
+        destinos = ""
+        if _table_exists(cur, "transferencias"):
+            cols_t = _columns(cur, "transferencias")
+            match = f"{normalized_key_expr('t.codigo_origem')}={new_key}"
+            if "snapshot" in cols_t and _json1_available(cur):
+                raiz = (
+                    "COALESCE(json_extract(t.snapshot,'$.carga_raiz_programacao'),"
+                    "json_extract(t.snapshot,'$.carga_origem_programacao'))"
+                )
+                match += f" OR (json_valid(t.snapshot) AND {normalized_key_expr(raiz)}={new_key})"
+            destinos = (
+                f"INSERT OR IGNORE INTO {PENDENTE_TABLE} (codigo_programacao_key) "
+                f"SELECT {normalized_key_expr('t.codigo_destino')} FROM transferencias t "
+                f"WHERE TRIM(COALESCE(t.codigo_destino,''))<>'' AND ({match}); "
+                f"DELETE FROM {RESUMO_TABLE} WHERE codigo_programacao_key IN (SELECT codigo_programacao_key FROM {PENDENTE_TABLE});"
+            )
+        watched = ", ".join(c for c in _WATCHED_COLUMNS["programacoes"] if c in cols)
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_programacoes_resumo_ins AFTER INSERT ON programacoes BEGIN {_mark_sql(new_key)} END")
+        cur.execute(
+            f"CREATE TRIGGER IF NOT EXISTS trg_programacoes_resumo_upd AFTER UPDATE OF {watched} ON programacoes "
+            f"BEGIN {_mark_sql(new_key)} {_mark_sql(old_key)} {destinos} END"
+        )
+        cur.execute(
+            f"CREATE TRIGGER IF NOT EXISTS trg_programacoes_resumo_del AFTER DELETE ON programacoes "
+            f"BEGIN DELETE FROM {RESUMO_TABLE} WHERE codigo_programacao_key={old_key}; END"
+        )
+    return criada
+
+
+def pending_keys(cur: sqlite3.Cursor, limit: int = 5000) -> List[str]:
+    try:
+        cur.execute(f"SELECT codigo_programacao_key FROM {PENDENTE_TABLE} LIMIT ?", (int(limit),))
+    except sqlite3.OperationalError:
+        return []
+    return [str(r[0]) for r in (cur.fetchall() or []) if str(r[0] or "").strip()]
+
+
+def clear_pending(cur: sqlite3.Cursor, keys: Iterable[str]) -> None:
+    cur.executemany(f"DELETE FROM {PENDENTE_TABLE} WHERE codigo_programacao_key=?", [(k,) for k in keys])
+    # chaves vazias (itens sem codigo) nunca viram linha
+    cur.execute(f"DELETE FROM {PENDENTE_TABLE} WHERE TRIM(COALESCE(codigo_programacao_key,''))=''")
+
+
+def upsert_resumos(cur: sqlite3.Cursor, rows: Iterable[Mapping[str, Any]]) -> int:
+    agora = datetime.now().isoformat(timespec="seconds")
+    cols = ("codigo_programacao_key", "codigo_programacao", "company_id") + RESUMO_VALUE_COLUMNS
+    updates = ", ".join(f"{c}=excluded.{c}" for c in cols[1:])
+    params = [tuple(row.get(c) for c in cols) + (agora,) for row in rows]
+    if not params:
+        return 0
+    cur.executemany(
+        f"""
+        INSERT INTO {RESUMO_TABLE} ({", ".join(cols)}, atualizado_em)
+        VALUES ({", ".join("?" for _ in cols)}, ?)
+        ON CONFLICT(codigo_programacao_key) DO UPDATE SET {updates}, atualizado_em=excluded.atualizado_em
+        """,
+        params,
+    )
+    return len(params)
+
+
+def read_resumos(cur: sqlite3.Cursor, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Linhas materializadas por chave; chaves pendentes/ausentes simplesmente nao aparecem."""
+    wanted = sorted({codigo_key(k) for k in keys if codigo_key(k)})
+    out: Dict[str, Dict[str, Any]] = {}
+    for i in range(0, len(wanted), 500):
+        chunk = wanted[i:i + 500]
+        try:
+            cur.execute(
+                f"SELECT * FROM {RESUMO_TABLE} WHERE codigo_programacao_key IN ({', '.join('?' for _ in chunk)})",
+                tuple(chunk),
+            )
+        except sqlite3.OperationalError:
+            return {}
+        for row in cur.fetchall() or []:
+            data = {str(k): row[k] for k in row.keys()}
+            out[str(data["codigo_programacao_key"])] = data
+    return out
+
+
+def _num(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _int(value: Any) -> int:
+    try:
+        return int(float(value or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def carga_raiz(snapshot: Any, fallback: Any = "") -> str:
+    try:
+        data = json.loads(str(snapshot or "{}"))
+    except ValueError:
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+    return codigo_key(data.get("carga_raiz_programacao") or data.get("carga_origem_programacao") or fallback)
+
+
+def qtd_convertida(row: Mapping[str, Any]) -> int:
+    convertida = max(_int(row.get("qtd_convertida")), 0)
+    if convertida > 0:
+        return convertida
+    if codigo_key(row.get("status")) == "CONVERTIDA":
+        return max(_int(row.get("qtd_caixas")), _int(row.get("qtd_convertida")), 0)
+    return 0
+
+
+def transferencias_totais(
+    transferencias: Iterable[Mapping[str, Any]],
+    rotas: Mapping[str, Mapping[str, Any]],
+    companies: Mapping[str, Optional[int]],
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Totais de transferencia por rota (chaves de `companies`), a partir das linhas de
+    `transferencias` e dos campos de carga das rotas origem/raiz (`rotas`, por chave):
+    caixas saida/entrada/pendentes, kg convertido recebido e valor de compra transferido.
+    """
+    out: Dict[str, Dict[str, Any]] = {
+        key: {
+            "transferencias_saida": 0,
+            "transferencias_entrada": 0,
+            "transferencias_pendentes": 0,
+            "kg_transferido_convertido": 0.0,
+            "compra_transferida_saida": 0.0,
+            "compra_transferida_entrada": 0.0,
+        }
+        for key in companies
+    }
+    for row in transferencias:
+        status = codigo_key(row.get("status"))
+        if status in _STATUS_CANCELADOS:
+            continue
+        origem = codigo_key(row.get("codigo_origem"))
+        destino = codigo_key(row.get("codigo_destino"))
+        row_company = row.get("company_id")
+
+        qtd = _int(row.get("qtd_convertida")) or _int(row.get("qtd_caixas"))
+        if qtd > 0:
+            for key in {origem, destino}:
+                totais = out.get(key)
+                if totais is None:
+                    continue
+                company_id = companies.get(key)
+                if company_id is not None and row_company is not None and int(row_company) != int(company_id):
+                    continue
+                if status in _STATUS_PENDENTES:
+                    totais["transferencias_pendentes"] += qtd
+                if key == origem:
+                    totais["transferencias_saida"] += qtd
+                if key == destino:
+                    totais["transferencias_entrada"] += qtd
+
+        convertida = qtd_convertida(row)
+        if convertida <= 0 or (origem not in out and destino not in out):
+            continue
+        root = rotas.get(carga_raiz(row.get("snapshot"), origem)) or {}
+        orig = rotas.get(origem) or {}
+        kg_root = _num(root.get("nf_kg_carregado")) or _num(root.get("kg_carregado")) or _num(root.get("nf_kg")) or _num(root.get("kg_nf"))
+        cx_root = _int(root.get("nf_caixas")) or _int(root.get("total_caixas")) or _int(root.get("caixas_carregadas"))
+        if destino in out and kg_root > 0 and cx_root > 0:
+            out[destino]["kg_transferido_convertido"] = round(
+                out[destino]["kg_transferido_convertido"] + convertida * (kg_root / cx_root), 2
+            )
+        kg_origem = kg_root or _num(orig.get("nf_kg_carregado")) or _num(orig.get("kg_carregado")) or _num(orig.get("nf_kg")) or _num(orig.get("kg_nf"))
+        cx_origem = cx_root or _int(orig.get("nf_caixas")) or _int(orig.get("total_caixas")) or _int(orig.get("caixas_carregadas"))
+        preco = _num(root.get("nf_preco")) or _num(root.get("preco_nf")) or _num(orig.get("nf_preco")) or _num(orig.get("preco_nf"))
+        kg_por_caixa = (kg_origem / cx_origem) if kg_origem > 0 and cx_origem > 0 else 0.0
+        valor = round(convertida * kg_por_caixa * preco, 2) if kg_por_caixa > 0 and preco > 0 else 0.0
+        if origem in out:
+            out[origem]["compra_transferida_saida"] = round(out[origem]["compra_transferida_saida"] + valor, 2)
+        if destino in out:
+            out[destino]["compra_transferida_entrada"] = round(out[destino]["compra_transferida_entrada"] + valor, 2)
+    return out
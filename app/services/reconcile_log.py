@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Set
+
+from db_bootstrap import get_runtime_metadata, set_runtime_metadata
+
+
+LOG_TABLE = "reconcile_log"
+HWM_PREFIX = "reconcile_hwm:"
+
+# tabela -> (expressao gravada em ref, colunas observadas no UPDATE; vazio = qualquer coluna)
+_TRACKED = {
+    "programacoes": (
+        "id",
+        (
+            "status", "status_operacional", "data_chegada", "hora_chegada", "km_final",
+            "motorista", "motorista_id", "motorista_codigo", "codigo_motorista", "company_id",
+        ),
+    ),
+    "transferencias": ("id", ("codigo_origem", "cod_cliente", "pedido", "qtd_caixas", "status")),
+    "programacao_itens": ("codigo_programacao", ("codigo_programacao", "cod_cliente", "pedido", "qnt_caixas")),
+    "motoristas": ("id", ("nome", "codigo", "company_id")),
+}
+
+
+def _columns(cur: sqlite3.Cursor, table: str) -> set[str]:
+    cur.execute(f'PRAGMA table_info("{table}")')
+    return {str(r[1]).lower() for r in (cur.fetchall() or [])}
+
+
+def ensure_reconcile_log_schema(cur: sqlite3.Cursor) -> None:
+    """
+    Cria reconcile_log e os triggers que registram (tabela, ref) a cada insert/update
+    relevante. O seq do log e o high-water mark de cada reconciliacao de startup.
+    """
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {LOG_TABLE} (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            tabela TEXT NOT NULL,
+            ref TEXT NOT NULL
+        )
+        """
+    )
+    for table, (ref_col, watched) in _TRACKED.items():
+        cols = _columns(cur, table)
+        if ref_col not in cols:
+            continue
+        insert = f"INSERT INTO {LOG_TABLE} (tabela, ref) VALUES ('{table}', NEW.{ref_col});"
+        cur.execute(f'CREATE TRIGGER IF NOT EXISTS trg_{table}_reconcile_ins AFTER INSERT ON "{table}" BEGIN {insert} END')
+        observed = ", ".join(c for c in watched if c in cols)
+        if observed:
+            cur.execute(
+                f'CREATE TRIGGER IF NOT EXISTS trg_{table}_reconcile_upd AFTER UPDATE OF {observed} ON "{table}" '
+                f"BEGIN {insert} END"
+            )
+
+
+def last_seq(cur: sqlite3.Cursor) -> int:
+    # sqlite_sequence continua valendo depois do prune (o log pode estar vazio)
+    cur.execute("SELECT seq FROM sqlite_sequence WHERE name=?", (LOG_TABLE,))
+    row = cur.fetchone()
+    return int(row[0] or 0) if row else 0
+
+
+def high_water_mark(cur: sqlite3.Cursor, name: str) -> Optional[int]:
+    """seq ja processado pela reconciliacao `name`; None = nunca rodou (precisa da passada completa)."""
+    value = get_runtime_metadata(cur, HWM_PREFIX + name)
+    try:
+        return None if value is None else int(value)
+    except ValueError:
+        return None
+
+
+def set_high_water_mark(cur: sqlite3.Cursor, name: str, seq: int) -> None:
+    set_runtime_metadata(cur, HWM_PREFIX + name, int(seq))
+
+
+def changes_between(cur: sqlite3.Cursor, after: int, upto: int, tables: Iterable[str]) -> Dict[str, Set[str]]:
+    """refs alterados em (after, upto], agrupados por tabela."""
+    wanted = list(tables)
+    out: Dict[str, Set[str]] = {table: set() for table in wanted}
+    if not wanted or upto <= after:
+        return out
+    cur.execute(
+        f"SELECT DISTINCT tabela, ref FROM {LOG_TABLE} WHERE seq > ? AND seq <= ? "
+        f"AND tabela IN ({', '.join('?' for _ in wanted)})",
+        (int(after), int(upto), *wanted),
+    )
+    for tabela, ref in cur.fetchall() or []:
+        ref_txt = str(ref or "").strip()
+        if ref_txt:
+            out[str(tabela)].add(ref_txt)
+    return out
+
+
+def prune(cur: sqlite3.Cursor, names: Iterable[str]) -> int:
+    """Remove do log o que todas as reconciliacoes ja processaram."""
+    marks: List[Optional[int]] = [high_water_mark(cur, name) for name in names]
+    if not marks or any(mark is None for mark in marks):
+        return 0
+    cur.execute(f"DELETE FROM {LOG_TABLE} WHERE seq <= ?", (min(int(m) for m in marks),))
+    return int(cur.rowcount or 0)
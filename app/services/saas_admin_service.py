@@ -8,6 +8,7 @@ from pathlib import Path
 from app.repositories import audit_repository, company_repository, payment_repository, plan_repository, subscription_repository
 from app.repositories.base_repository import ensure_saas_ready, get_db
 from app.services.billing_automation_service import suspend_overdue_subscriptions
+from app.services.entitlement_cache import invalidate_entitlements
 from app.services.saas_result import error_message, service_result
 from app.services.usage_service import get_company_usage
 from app.services.vehicle_limit_service import vehicle_usage_snapshot
@@ -74,6 +75,7 @@ def change_company_plan(company_id: int, plan_code: str, *, actor: str = "ADMIN"
                 ),
             )
         subscription = subscription_repository.change_company_plan(company_id, int(plan["id"]))
+        invalidate_entitlements(company_id)
         audit_repository.create_audit_log(
             {
                 "company_id": int(company_id),
@@ -101,6 +103,7 @@ def set_company_status(company_id: int, status: str, *, actor: str = "ADMIN", re
         company = company_repository.update_company(company_id, {"status": str(status or "").strip().lower()})
         if not company:
             return service_result(ok=False, data=None, error="Empresa nao encontrada.")
+        invalidate_entitlements(company_id)
         audit_repository.create_audit_log(
             {
                 "company_id": int(company_id),
@@ -193,6 +196,7 @@ def register_payment(payment_id: int, *, method: str = "manual", reference: str
         payment = payment_repository.register_payment(payment_id, method=method, reference=reference, notes=notes)
         if not payment:
             return service_result(ok=False, data=None, error="Pagamento nao encontrado.")
+        invalidate_entitlements(int(payment.get("company_id") or 0))
         audit_repository.create_audit_log(
             {
                 "company_id": int(payment.get("company_id") or 0),
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from app.repositories import company_repository, plan_repository, subscription_repository
+from app.services.entitlement_cache import invalidate_entitlements
 from app.services.saas_result import error_message, service_result
 
 
@@ -30,6 +31,7 @@ def change_company_plan(company_id: int, plan_code: str) -> dict:
         if not plan:
             return service_result(ok=False, data=None, error="Plano nao encontrado.")
         subscription = subscription_repository.change_company_plan(company_id, int(plan["id"]))
+        invalidate_entitlements(company_id)
         return service_result(ok=True, data=subscription)
     except Exception as exc:
         return service_result(ok=False, data=None, error=error_message(exc, "Falha ao alterar plano da empresa."))
@@ -16,7 +16,7 @@ from typing import Any, List
 from uuid import uuid4
 
 import pandas as pd
-from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile, status
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, Response, UploadFile, status
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, create_model
 from sqlalchemy import func, select, text
@@ -24,6 +24,7 @@ from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.security.passwords import hash_password_pbkdf2
+from app.services import clientes_busca, clientes_lote
 from app.utils.excel_helpers import guess_col
 from app.utils.formatters import safe_float, safe_int
 from app.utils.validators import (
@@ -35,7 +36,7 @@ from app.utils.validators import (
     normalize_phone,
 )
 from backend.api.v1.endpoints.users import require_admin_user
-from backend.config.database import get_db
+from backend.config.database import get_db, schema_bootstrap
 from backend.models.cadastro import AjudanteDB, CaixaDB, CaixaMovimentoDB, ClienteDB, FornecedorDB, MotoristaDB, ProdutoDB, VeiculoDB, VendedorDB
 from backend.models.user import User, UserDB
 from backend.services.audit import client_ip_from_request, record_audit_log
@@ -344,6 +345,7 @@ def upper_text(value: Any) -> str:
     return str(value or "").strip().upper()
 
 
+@schema_bootstrap
 async def ensure_fornecedor_perfis(db: AsyncSession) -> None:
     await db.execute(
         text(
@@ -397,6 +399,7 @@ async def fornecedor_perfis_ativos(db: AsyncSession) -> set[str]:
     return {upper_text(row[0]) for row in result.all()} | FORNECEDOR_PERFIS
 
 
+@schema_bootstrap
 async def ensure_caixas_movimentos(db: AsyncSession) -> None:
     await db.execute(
         text(
@@ -613,6 +616,9 @@ def excel_cell_text(value: Any) -> str:
     return "" if text_value.upper() in {"NAN", "NAT", "NONE", "NULL", "<NA>"} else text_value
 
 
+CLIENTES_IMPORT_FIELDS = ("nome", "nome_cliente", "endereco", "telefone", "vendedor")
+
+
 def normalize_cliente_import_row(row: ClienteImportRow, *, require_required: bool = True) -> dict[str, Any] | None:
     data = {
         "cod_cliente": upper_text(excel_cell_text(row.cod_cliente)),
@@ -720,6 +726,28 @@ async def bulk_upsert_clientes(
     if not ordered_codes:
         return result
 
+    if db.get_bind().dialect.name == "sqlite":
+        # Set-based path: staged rows + one INSERT ... ON CONFLICT, skipping rows whose content is unchanged.
+        # Raw SQL bypasses the tenant filter, so a tenant session passes its company: the helper then
+        # matches and inserts within it, or returns None (ORM path) without a (company_id, cod_cliente) key.
+        await db.flush()
+        company_id = db.info.get("company_id")
+        counts = await db.run_sync(
+            lambda session: clientes_lote.upsert_clientes_lote(
+                session.connection().connection.cursor(),
+                [normalized_by_code[key] for key in ordered_codes],
+                campos=CLIENTES_IMPORT_FIELDS,
+                company_id=int(company_id) if company_id else None,
+                manter_vazios=merge_duplicate_rows,
+            )
+        )
+        if counts is not None:
+            result.inseridos = counts["criados"]
+            result.atualizados = counts["atualizados"]
+            result.ignorados += counts["inalterados"] + counts["ignorados"]
+            result.total = result.inseridos + result.atualizados
+            return result
+
     seen = set(ordered_codes)
     existing_result = await db.execute(
         select(ClienteDB).where(func.upper(func.coalesce(ClienteDB.cod_cliente, "")).in_(seen))
@@ -1500,28 +1528,60 @@ async def clientes_dashboard(
     )
 
 
+CLIENTES_LOOKUP_COLUMNS = "cod_cliente, COALESCE(NULLIF(nome_cliente,''), nome, '') AS nome_cliente"
+CLIENTES_LOOKUP_FILTER = "NULLIF(TRIM(COALESCE(cod_cliente,'')), '') IS NOT NULL"
+
+
 @router.get("/clientes/lookup", response_model=list[ClienteLookupResponse])
 async def clientes_lookup(
-    limit: int = 5000,
+    response: Response,
+    q: str = "",
+    limit: int = 50,
+    cursor: str = "",
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(require_admin_user),
 ):
+    """
+    Typeahead page of clients (code, name, city, bairro, vendedor) on the FTS5 index;
+    the next page cursor is returned in the X-Next-Cursor header.
+    """
     del current_user
-    result = await db.execute(
-        text(
-            """
-            SELECT cod_cliente, COALESCE(NULLIF(nome_cliente,''), nome, '') AS nome_cliente
-            FROM clientes
-            WHERE NULLIF(TRIM(COALESCE(cod_cliente,'')), '') IS NOT NULL
-            ORDER BY nome_cliente ASC
-            LIMIT :limit
-            """
-        ),
-        {"limit": max(1, min(int(limit or 5000), 10000))},
-    )
+    limit = max(1, min(int(limit or 50), 1000))
+    if db.get_bind().dialect.name == "sqlite":
+
+        def search(session) -> tuple[list[dict], str]:
+            return clientes_busca.buscar_clientes(
+                session.connection().connection.cursor(),
+                q,
+                colunas_sql=CLIENTES_LOOKUP_COLUMNS,
+                filtros_sql=[CLIENTES_LOOKUP_FILTER],
+                limit=limit,
+                cursor=cursor,
+            )
+
+        rows, next_cursor = await db.run_sync(search)
+        await db.commit()
+    else:
+        like = f"%{upper_text(q)}%"
+        result = await db.execute(
+            text(
+                f"""
+                SELECT {CLIENTES_LOOKUP_COLUMNS}
+                FROM clientes
+                WHERE {CLIENTES_LOOKUP_FILTER}
+                  AND (UPPER(cod_cliente) LIKE :like OR UPPER(COALESCE(nome_cliente, nome, '')) LIKE :like)
+                ORDER BY nome_cliente ASC
+                LIMIT :limit
+                """
+            ),
+            {"like": like, "limit": limit},
+        )
+        rows, next_cursor = [dict(row) for row in result.mappings().all()], ""
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return [
         ClienteLookupResponse(cod_cliente=str(row["cod_cliente"] or ""), nome_cliente=str(row["nome_cliente"] or ""))
-        for row in result.mappings().all()
+        for row in rows
     ]
 
 
@@ -14,7 +14,7 @@ from sqlalchemy import func, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.utils.formatters import safe_float, safe_int
-from backend.api.v1.endpoints.programacao import normalize_ascii, upper_text
+from backend.api.v1.endpoints.programacao import normalize_ascii, programacao_resumo_por_codigo, upper_text
 from backend.api.v1.endpoints.users import require_admin_user
 from backend.config.database import get_db
 from backend.models.cadastro import VeiculoDB
@@ -23,6 +23,7 @@ from backend.models.programacao import ProgramacaoDB, ProgramacaoItemControleDB,
 from backend.models.recebimento import RecebimentoDB
 from backend.models.user import User
 from backend.models.venda_importada import VendaImportadaDB
+from backend.services.programacao_data_ref import refresh_pending_data_ref
 
 router = APIRouter()
 
@@ -392,6 +393,15 @@ async def transferencias_compra_por_programacao(db: AsyncSession, codigos: list[
     codigos_norm = [upper_text(codigo) for codigo in codigos if upper_text(codigo)]
     if not codigos_norm:
         return {}, {}
+    resumo = await programacao_resumo_por_codigo(db, codigos_norm, ("compra_transferida_saida", "compra_transferida_entrada"))
+    resumo_saida = {codigo: money(row.get("compra_transferida_saida")) for codigo, row in resumo.items()}
+    resumo_entrada = {codigo: money(row.get("compra_transferida_entrada")) for codigo, row in resumo.items()}
+    codigos_norm = [codigo for codigo in codigos_norm if codigo not in resumo]
+    if not codigos_norm:
+        return (
+            {codigo: valor for codigo, valor in resumo_saida.items() if valor},
+            {codigo: valor for codigo, valor in resumo_entrada.items() if valor},
+        )
     try:
         result = await db.execute(
             text(
@@ -421,7 +431,10 @@ async def transferencias_compra_por_programacao(db: AsyncSession, codigos: list[
             ),
         )
     except Exception:
-        return {}, {}
+        return (
+            {codigo: valor for codigo, valor in resumo_saida.items() if valor},
+            {codigo: valor for codigo, valor in resumo_entrada.items() if valor},
+        )
     rows = list(result.mappings().all())
     roots = {
         carga_raiz_from_snapshot(row.get("snapshot"), row.get("codigo_origem"))
@@ -480,6 +493,8 @@ async def transferencias_compra_por_programacao(db: AsyncSession, codigos: list[
             saida[origem] = money(saida.get(origem, 0.0) + valor)
         if destino in codigos_norm:
             entrada[destino] = money(entrada.get(destino, 0.0) + valor)
+    saida.update({codigo: valor for codigo, valor in resumo_saida.items() if valor})
+    entrada.update({codigo: valor for codigo, valor in resumo_entrada.items() if valor})
     return saida, entrada
 
 
@@ -929,6 +944,20 @@ async def centro_custos_base_rows(db: AsyncSession, limit: int) -> list[tuple[Pr
     return [(row[0], safe_float(row[1], 0.0)) for row in result.all()]
 
 
+async def programacoes_no_periodo(db: AsyncSession, cutoff: datetime | None, *criteria: Any, limit: int) -> list[ProgramacaoDB]:
+    """
+    Latest programacoes matching `criteria`, with the period cutoff pushed into SQL on
+    data_ref_iso (a superset at day granularity; programacao_passes_filters still applies
+    the exact cutoff to the matching rows).
+    """
+    query = select(ProgramacaoDB).where(*criteria)
+    if cutoff is not None:
+        await refresh_pending_data_ref(db)
+        query = query.where(ProgramacaoDB.data_ref_iso >= cutoff.date().isoformat())
+    result = await db.execute(query.order_by(ProgramacaoDB.id.desc()).limit(max(min(limit, 20000), 1)))
+    return list(result.scalars().all())
+
+
 def programacao_passes_filters(programacao: ProgramacaoDB, periodo: str, veiculo: str, cutoff: datetime | None = None) -> bool:
     veiculo_row = upper_text(programacao.veiculo)
     if not veiculo_row:
@@ -970,15 +999,11 @@ async def centro_custos_financeiro_data(
         except Exception:
             cutoff = None
 
-    prog_result = await db.execute(
-        select(ProgramacaoDB)
-        .where(func.trim(func.coalesce(ProgramacaoDB.veiculo, "")) != "")
-        .order_by(ProgramacaoDB.id.desc())
-        .limit(max(min(limit, 20000), 1))
-    )
     programacoes_periodo = [
         item
-        for item in prog_result.scalars().all()
+        for item in await programacoes_no_periodo(
+            db, cutoff, func.trim(func.coalesce(ProgramacaoDB.veiculo, "")) != "", limit=limit
+        )
         if programacao_passes_filters(item, periodo, "TODOS", cutoff)
     ]
     programacoes = [
@@ -1437,15 +1462,11 @@ async def centro_custos_veiculos_data(
     cad_result = await db.execute(select(VeiculoDB).order_by(VeiculoDB.placa.asc()))
     veiculos_cadastro = {upper_text(item.placa): item for item in cad_result.scalars().all() if upper_text(item.placa)}
 
-    prog_result = await db.execute(
-        select(ProgramacaoDB)
-        .where(func.trim(func.coalesce(ProgramacaoDB.veiculo, "")) != "")
-        .order_by(ProgramacaoDB.id.desc())
-        .limit(max(min(limit, 20000), 1))
-    )
     programacoes = [
         item
-        for item in prog_result.scalars().all()
+        for item in await programacoes_no_periodo(
+            db, cutoff, func.trim(func.coalesce(ProgramacaoDB.veiculo, "")) != "", limit=limit
+        )
         if programacao_passes_filters(item, periodo, veiculo, cutoff)
     ]
 
@@ -1551,15 +1572,9 @@ async def centro_custos_veiculo_detalhe_data(
         raise HTTPException(status_code=404, detail="Veiculo nao encontrado no centro de custos.")
 
     cutoff = cutoff_from_periodo(periodo)
-    prog_result = await db.execute(
-        select(ProgramacaoDB)
-        .where(func.upper(ProgramacaoDB.veiculo) == placa_norm)
-        .order_by(ProgramacaoDB.id.desc())
-        .limit(max(min(limit, 20000), 1))
-    )
     programacoes_db = [
         item
-        for item in prog_result.scalars().all()
+        for item in await programacoes_no_periodo(db, cutoff, func.upper(ProgramacaoDB.veiculo) == placa_norm, limit=limit)
         if programacao_passes_filters(item, periodo, placa_norm, cutoff)
     ]
     codigos = [upper_text(item.codigo_programacao) for item in programacoes_db if upper_text(item.codigo_programacao)]
@@ -1786,15 +1801,11 @@ async def centro_custos_despesas_rota(
     veiculo_norm = upper_text(veiculo or "TODOS") or "TODOS"
     cutoff = cutoff_from_periodo(periodo_norm)
 
-    prog_result = await db.execute(
-        select(ProgramacaoDB)
-        .where(func.trim(func.coalesce(ProgramacaoDB.codigo_programacao, "")) != "")
-        .order_by(ProgramacaoDB.id.desc())
-        .limit(max(min(limit, 20000), 1))
-    )
     programacoes = [
         item
-        for item in prog_result.scalars().all()
+        for item in await programacoes_no_periodo(
+            db, cutoff, func.trim(func.coalesce(ProgramacaoDB.codigo_programacao, "")) != "", limit=limit
+        )
         if programacao_passes_filters(item, periodo_norm, veiculo_norm, cutoff)
     ]
     codigos = [upper_text(item.codigo_programacao) for item in programacoes if upper_text(item.codigo_programacao)]
@@ -17,9 +17,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.api.v1.endpoints.programacao import upper_text
 from backend.api.v1.endpoints.users import require_admin_user
-from backend.config.database import get_db
+from backend.config.database import get_db, schema_bootstrap
 from backend.models.user import User
 from backend.services.audit import client_ip_from_request, record_audit_log
+from backend.services.produto_resolver import ProdutoRef, produto_ref_key, resolve_produto_refs
+from db_bootstrap import normalized_key_statements
 
 router = APIRouter()
 
@@ -153,14 +155,6 @@ async def logistica_defaults(db: AsyncSession) -> dict[str, str]:
     return dict(DEFAULT_LOGISTICA)
 
 
-def produto_codigo_base(value: Any) -> str:
-    text_value = upper_text(value)
-    code = "".join(ch if ch.isalnum() else "-" for ch in text_value).strip("-")
-    while "--" in code:
-        code = code.replace("--", "-")
-    return (code or "PRODUTO")[:40]
-
-
 def xml_text(root: ET.Element, local_name: str) -> str:
     for node in root.iter():
         if str(node.tag).split("}")[-1] == local_name:
@@ -241,6 +235,7 @@ def parse_nfe_xml(contents: bytes) -> dict[str, Any]:
     }
 
 
+@schema_bootstrap
 async def ensure_compras_schema(db: AsyncSession) -> None:
     await db.execute(
         text(
@@ -397,55 +392,49 @@ async def ensure_compras_schema(db: AsyncSession) -> None:
     await db.execute(text("CREATE INDEX IF NOT EXISTS idx_estoque_movimentos_produto ON estoque_movimentos(produto_id, produto)"))
     await db.execute(text("CREATE INDEX IF NOT EXISTS idx_estoque_movimentos_nf ON estoque_movimentos(numero_nf)"))
     await db.execute(text("CREATE INDEX IF NOT EXISTS idx_estoque_movimentos_prog ON estoque_movimentos(codigo_programacao)"))
+    await ensure_normalized_keys_async(db, ("programacoes", "programacao_itens", "compras_nfe"))
+
+
+async def ensure_normalized_keys_async(db: AsyncSession, tables: tuple[str, ...]) -> None:
+    """Mesma migracao de db_bootstrap.ensure_normalized_keys, pela sessao async."""
+    existentes = (
+        await db.execute(text("SELECT type, LOWER(name) FROM sqlite_master WHERE type IN ('table','trigger','index')"))
+    ).all()
+    tabelas = {str(row[1]) for row in existentes if row[0] == "table"}
+    triggers = {str(row[1]) for row in existentes if row[0] == "trigger"}
+    indexes = {str(row[1]) for row in existentes if row[0] == "index"}
+    for table in tables:
+        if table not in tabelas:
+            continue
+        columns = {str(row[1]) for row in (await db.execute(text(f"PRAGMA table_info({table})"))).all()}
+        for sql in normalized_key_statements(table, columns, triggers, indexes):
+            await db.execute(text(sql))
 
 
-async def ensure_produto_catalogo(db: AsyncSession, nome: str, *, codigo: str = "", unidade: str = "") -> int | None:
+def categoria_produto_compra(nome: str) -> str:
+    return "AVES" if "AVE" in nome or "FRANGO" in nome else "GERAL"
+
+
+async def ensure_produtos_catalogo(db: AsyncSession, itens: list[ProdutoRef]) -> list[int | None]:
+    """Produto de cada item (codigo explicito antes do nome), criando os que faltam num lote so."""
     defaults = await logistica_defaults(db)
     produto_padrao = defaults["produto_padrao"]
-    unidade_padrao = upper_text(unidade or defaults["unidade_padrao"]) or "KG"
-    nome_norm = upper_text(nome or produto_padrao) or produto_padrao
-    codigo_explicit = bool(upper_text(codigo))
-    codigo_norm = produto_codigo_base(codigo or nome_norm)
-    if codigo_explicit and codigo_norm:
-        result = await db.execute(text("SELECT id FROM produtos WHERE UPPER(COALESCE(codigo,''))=:codigo LIMIT 1"), {"codigo": codigo_norm})
-        produto_id = result.scalar_one_or_none()
-        if produto_id:
-            return int(produto_id)
-    result = await db.execute(text("SELECT id FROM produtos WHERE UPPER(COALESCE(nome,''))=:nome LIMIT 1"), {"nome": nome_norm})
-    produto_id = result.scalar_one_or_none()
-    if produto_id:
-        return int(produto_id)
-    codigo_final = codigo_norm
-    for suffix in range(0, 1000):
-        candidate = codigo_final if suffix == 0 else f"{codigo_norm[:34]}-{suffix:03d}"
-        result = await db.execute(text("SELECT id FROM produtos WHERE UPPER(COALESCE(codigo,''))=:codigo LIMIT 1"), {"codigo": candidate})
-        if result.scalar_one_or_none():
-            continue
-        await db.execute(
-            text(
-                """
-                INSERT INTO produtos (
-                    codigo, nome, descricao, categoria, unidade, unidade_estoque,
-                    controla_estoque_fisico, controla_estoque_fiscal, status
-                ) VALUES (
-                    :codigo, :nome, :descricao, :categoria, :unidade, :unidade, 1, 1, 'ATIVO'
-                )
-                """
-            ),
-            {
-                "codigo": candidate,
-                "nome": nome_norm,
-                "categoria": "AVES" if "AVE" in nome_norm or "FRANGO" in nome_norm else "GERAL",
-                "unidade": unidade_padrao,
-                "descricao": "Cadastro automatico criado a partir de compras/estoque.",
-            },
-        )
-        break
-    else:
-        raise HTTPException(status_code=409, detail="Nao foi possivel gerar codigo unico para o produto.")
-    result = await db.execute(text("SELECT id FROM produtos WHERE UPPER(COALESCE(nome,''))=:nome LIMIT 1"), {"nome": nome_norm})
-    produto_id = result.scalar_one_or_none()
-    return int(produto_id) if produto_id else None
+    refs = [
+        ProdutoRef(nome=upper_text(item.nome or produto_padrao) or produto_padrao, codigo=item.codigo, unidade=item.unidade)
+        for item in itens
+    ]
+    resolved = await resolve_produto_refs(
+        db,
+        refs,
+        descricao="Cadastro automatico criado a partir de compras/estoque.",
+        categoria=categoria_produto_compra,
+        unidade=defaults["unidade_padrao"],
+    )
+    return [resolved.get(produto_ref_key(ref)) for ref in refs]
+
+
+async def ensure_produto_catalogo(db: AsyncSession, nome: str, *, codigo: str = "", unidade: str = "") -> int | None:
+    return (await ensure_produtos_catalogo(db, [ProdutoRef(nome=nome, codigo=codigo, unidade=unidade)]))[0]
 
 
 async def ensure_fornecedor_from_xml(db: AsyncSession, nfe: dict[str, Any], natureza: str) -> tuple[int | None, bool]:
@@ -555,8 +544,11 @@ async def importar_nfe_xml(
     fornecedor_id, fornecedor_criado = await ensure_fornecedor_from_xml(db, nfe, natureza)
     nfe_produtos = [item for item in nfe.get("produtos", []) if isinstance(item, dict)]
     produto_ids: list[int] = []
-    for item in nfe_produtos:
-        produto_id_item = await ensure_produto_catalogo(db, item.get("produto") or "", codigo=item.get("codigo") or "", unidade=item.get("unidade") or "")
+    refs = [
+        ProdutoRef(nome=item.get("produto") or "", codigo=item.get("codigo") or "", unidade=item.get("unidade") or "")
+        for item in nfe_produtos
+    ]
+    for item, produto_id_item in zip(nfe_produtos, await ensure_produtos_catalogo(db, refs)):
         if produto_id_item:
             item["produto_id"] = produto_id_item
             produto_ids.append(produto_id_item)
@@ -1066,13 +1058,10 @@ async def sincronizar_saidas_programacoes(
                    COALESCE(MAX(cni.quantidade_kg), 0) AS compra_item_kg
               FROM programacoes p
               JOIN compras_nfe c
-                ON TRIM(COALESCE(c.numero, '')) <> ''
-               AND UPPER(TRIM(COALESCE(c.numero, ''))) IN (
-                    UPPER(TRIM(COALESCE(p.num_nf, ''))),
-                    UPPER(TRIM(COALESCE(p.nf_numero, '')))
-               )
+                ON c.numero_key <> ''
+               AND c.numero_key IN (p.num_nf_key, p.nf_numero_key)
               LEFT JOIN programacao_itens pi
-                ON UPPER(TRIM(COALESCE(pi.codigo_programacao, ''))) = UPPER(TRIM(COALESCE(p.codigo_programacao, '')))
+                ON pi.codigo_programacao_key = p.codigo_programacao_key
               LEFT JOIN compras_nfe_itens cni
                 ON cni.compra_id=c.id
                AND (
@@ -7,17 +7,20 @@ from __future__ import annotations
 from datetime import datetime, timedelta
 from io import BytesIO
 from pathlib import Path
+import os
 import re
 from typing import Any
 import json
 from uuid import uuid4
 
 from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, UploadFile, status
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from sqlalchemy import func, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.services import photo_thumbnails
 from app.utils.formatters import safe_float, safe_int
 from backend.api.v1.endpoints.programacao import get_programacao_by_codigo, upper_text
 from backend.api.v1.endpoints.recebimentos import (
@@ -36,6 +39,8 @@ from backend.services.roteiro_operacional import registrar_roteiro_operacional
 
 router = APIRouter()
 
+PROJECT_ROOT = Path(__file__).resolve().parents[4]
+
 CANCELLED_STATUSES = {"CANCELADA", "CANCELADO"}
 CEDULAS = (200, 100, 50, 20, 10, 5, 2)
 DIARIA_DESCRICAO_MOTORISTA = "DIARIAS MOTORISTA"
@@ -2754,27 +2759,16 @@ async def listar_fotos_mortalidade(
     }
 
 
-@router.get("/mortalidade/fotos/{id_foto}/arquivo")
-async def obter_arquivo_foto_mortalidade(
-    id_foto: str,
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_admin_user),
-):
-    del current_user
+def photos_root() -> Path:
+    return Path(os.getenv("ROTA_MOBILE_PHOTOS_DIR", PROJECT_ROOT / ".rotahub_runtime" / "fotos_rotas")).expanduser()
+
+
+async def rota_foto_arquivo(db: AsyncSession, id_foto: str) -> tuple[Path, dict[str, Any]]:
     foto_id = str(id_foto or "").strip()
     if not foto_id:
         raise HTTPException(status_code=404, detail="Foto nao encontrada.")
-    result = await db.execute(
-        text(
-            """
-            SELECT path_local, storage_path, arquivo_nome, mime_type
-              FROM rota_fotos
-             WHERE id_foto=:id_foto
-             LIMIT 1
-            """
-        ),
-        {"id_foto": foto_id},
-    )
+    # SELECT * : rota_fotos.sha256 so existe depois do bootstrap da API legada
+    result = await db.execute(text("SELECT * FROM rota_fotos WHERE id_foto=:id_foto LIMIT 1"), {"id_foto": foto_id})
     row = result.mappings().first()
     if not row:
         raise HTTPException(status_code=404, detail="Foto nao encontrada.")
@@ -2782,10 +2776,43 @@ async def obter_arquivo_foto_mortalidade(
     for candidate in candidates:
         path = Path(str(candidate or "").strip())
         if path.exists() and path.is_file():
-            return FileResponse(path, media_type=str(row.get("mime_type") or "application/octet-stream"), filename=path.name)
+            return path, dict(row)
     raise HTTPException(status_code=404, detail="Arquivo da foto nao encontrado no servidor.")
 
 
+@router.get("/mortalidade/fotos/{id_foto}/arquivo")
+async def obter_arquivo_foto_mortalidade(
+    id_foto: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(require_admin_user),
+):
+    del current_user
+    path, row = await rota_foto_arquivo(db, id_foto)
+    return FileResponse(path, media_type=str(row.get("mime_type") or "application/octet-stream"), filename=path.name)
+
+
+@router.get("/mortalidade/fotos/{id_foto}/miniatura")
+async def obter_miniatura_foto_mortalidade(
+    id_foto: str,
+    request: Request,
+    largura: int = Query(default=photo_thumbnails.LARGURA_PADRAO, ge=1, le=4096),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(require_admin_user),
+):
+    del current_user
+    path, row = await rota_foto_arquivo(db, id_foto)
+    thumb = await run_in_threadpool(
+        photo_thumbnails.miniatura, str(path), str(photos_root()), largura, str(row.get("sha256") or "")
+    )
+    if thumb is None:
+        # sem Pillow ou arquivo que nao e imagem: entrega o original
+        return FileResponse(path, media_type=str(row.get("mime_type") or "application/octet-stream"), filename=path.name)
+    headers = {"ETag": thumb["etag"], "Cache-Control": photo_thumbnails.CACHE_CONTROL}
+    if photo_thumbnails.etag_confere(request.headers.get("if-none-match"), thumb["etag"]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(thumb["path"], media_type=thumb["media_type"], headers=headers)
+
+
 @router.post("/mortalidade/manual", response_model=MortalidadeManualResponse)
 async def registrar_mortalidade_manual(
     request: Request,
@@ -13,6 +13,7 @@ from sqlalchemy import distinct, exists, func, not_, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.utils.formatters import safe_float, safe_int
+from backend.api.v1.endpoints.programacao import programacao_resumo_por_codigo
 from backend.config.database import get_db
 from backend.config.settings import settings
 from backend.models.cadastro import ClienteDB
@@ -96,6 +97,14 @@ async def kg_transferido_convertido_por_destino(db: AsyncSession, codigos: list[
     codigos_norm = {upper_text(codigo) for codigo in codigos if upper_text(codigo)}
     if not codigos_norm:
         return {}
+    resumo = await programacao_resumo_por_codigo(db, list(codigos_norm), ("kg_transferido_convertido",))
+    resolvidos = {
+        codigo: round(safe_float(row.get("kg_transferido_convertido"), 0.0), 2)
+        for codigo, row in resumo.items()
+    }
+    codigos_norm -= set(resolvidos)
+    if not codigos_norm:
+        return {codigo: kg for codigo, kg in resolvidos.items() if kg > 0}
     try:
         result = await db.execute(
             text(
@@ -107,7 +116,7 @@ async def kg_transferido_convertido_por_destino(db: AsyncSession, codigos: list[
             )
         )
     except Exception:
-        return {}
+        return {codigo: kg for codigo, kg in resolvidos.items() if kg > 0}
     transferencias = [dict(row) for row in result.mappings().all()]
     roots = {
         carga_raiz_from_snapshot(row.get("snapshot"), row.get("codigo_origem"))
@@ -146,6 +155,7 @@ async def kg_transferido_convertido_por_destino(db: AsyncSession, codigos: list[
         if kg_base <= 0 or caixas_base <= 0:
             continue
         out[destino] = round(out.get(destino, 0.0) + (qtd * (kg_base / caixas_base)), 2)
+    out.update({codigo: kg for codigo, kg in resolvidos.items() if kg > 0})
     return out
 
 
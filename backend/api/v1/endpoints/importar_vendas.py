@@ -4,14 +4,15 @@ Importar Vendas endpoints mirroring the desktop import/selection/link flow.
 """
 from __future__ import annotations
 
+import itertools
+from collections.abc import Iterable, Iterator
 from datetime import datetime
-from io import BytesIO
 from typing import Any
 
 import pandas as pd
 from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile, status
 from pydantic import BaseModel, Field, field_validator
-from sqlalchemy import func, or_, select
+from sqlalchemy import func, insert, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.utils.excel_helpers import guess_col
@@ -23,11 +24,14 @@ from backend.api.v1.endpoints.programacao import (
 )
 from backend.api.v1.endpoints.users import require_admin_user
 from backend.config.database import get_db
-from backend.models.cadastro import ClienteDB, ProdutoDB
+from backend.models.cadastro import ClienteDB
 from backend.models.programacao import ProgramacaoDB, ProgramacaoItemDB
 from backend.models.user import User
 from backend.models.venda_importada import VendaImportadaDB
 from backend.services.audit import client_ip_from_request, record_audit_log
+from backend.services.produto_resolver import resolve_produto_ids
+from backend.services.vendas_import import CHUNK_ROWS, iter_upload_frames, normalize_vendas_frame
+from backend.services.vendas_row_key import existing_row_keys, refresh_pending_row_keys, venda_row_key
 
 router = APIRouter()
 
@@ -35,14 +39,6 @@ VINCULAVEL_STATUSES = {"", "ATIVA", "ABERTA", "PROGRAMADA", "EM_ROTA", "EM ROTA"
 BLOCKED_STATUSES = {"CANCELADA", "CANCELADO", "FINALIZADA", "FINALIZADO", "EM ENTREGAS", "EM_ENTREGAS"}
 
 
-def produto_codigo_base(value: Any) -> str:
-    text_value = upper_text(value)
-    code = "".join(ch if ch.isalnum() else "-" for ch in text_value).strip("-")
-    while "--" in code:
-        code = code.replace("--", "-")
-    return (code or "PRODUTO")[:40]
-
-
 class VendaImportadaPayload(BaseModel):
     pedido: Any = None
     data_venda: Any = None
@@ -200,136 +196,118 @@ def normalized_import_row(raw: dict[str, Any]) -> dict[str, Any] | None:
     }
 
 
-def row_key(row: dict[str, Any] | VendaImportadaDB) -> tuple[str, str, str, str]:
+def row_key(row: dict[str, Any] | VendaImportadaDB) -> str:
     if isinstance(row, VendaImportadaDB):
-        return (
-            upper_text(row.pedido),
-            upper_text(row.cliente),
-            upper_text(row.produto),
-            str(row.data_venda or "").strip(),
-        )
-    return (
-        upper_text(row.get("pedido")),
-        upper_text(row.get("cliente")),
-        upper_text(row.get("produto")),
-        str(row.get("data_venda") or "").strip(),
-    )
+        return venda_row_key(row.pedido, row.cliente, row.produto, row.data_venda)
+    return venda_row_key(row.get("pedido"), row.get("cliente"), row.get("produto"), row.get("data_venda"))
+
+
+PRODUTO_IMPORT_DESCRICAO = "Cadastro automatico criado pela importacao de vendas."
 
 
-async def existing_venda_keys(db: AsyncSession) -> set[tuple[str, str, str, str]]:
-    result = await db.execute(select(VendaImportadaDB))
-    return {row_key(item) for item in result.scalars().all()}
+async def produto_ids_for_nomes(db: AsyncSession, nomes: Iterable[str]) -> dict[str, int]:
+    return await resolve_produto_ids(db, nomes, descricao=PRODUTO_IMPORT_DESCRICAO)
 
 
 async def produto_id_for_nome(db: AsyncSession, nome: str) -> int | None:
-    nome_norm = upper_text(nome)
-    if not nome_norm:
-        return None
-    result = await db.execute(select(ProdutoDB).where(func.upper(func.coalesce(ProdutoDB.nome, "")) == nome_norm).limit(1))
-    produto = result.scalar_one_or_none()
-    if produto:
-        return int(produto.id)
-    codigo = produto_codigo_base(nome_norm)
-    codigo_final = codigo
-    for suffix in range(0, 1000):
-        candidate = codigo_final if suffix == 0 else f"{codigo[:34]}-{suffix:03d}"
-        result = await db.execute(select(ProdutoDB).where(func.upper(func.coalesce(ProdutoDB.codigo, "")) == candidate).limit(1))
-        if result.scalar_one_or_none():
-            continue
-        codigo_final = candidate
-        break
-    else:
-        raise HTTPException(status_code=409, detail="Nao foi possivel gerar codigo unico para o produto.")
-    produto = ProdutoDB(
-        codigo=codigo_final,
-        nome=nome_norm,
-        descricao="Cadastro automatico criado pela importacao de vendas.",
-        categoria="AVES",
-        unidade="KG",
-        unidade_estoque="KG",
-        controla_estoque_fisico=1,
-        controla_estoque_fiscal=1,
-        status="ATIVO",
-    )
-    db.add(produto)
-    await db.flush()
-    return int(produto.id)
+    return (await produto_ids_for_nomes(db, [nome])).get(upper_text(nome))
+
+
+VENDAS_IMPORT_COLUMNS = (
+    ("pedido", ["numero pedido", "num pedido", "n pedido", "pedido"], "Numero Pedido", True),
+    ("data_venda", ["data venda", "data", "dt"], "Data", False),
+    ("cliente", ["cod cliente", "codigo cliente", "cliente", "cod"], "Cliente", True),
+    ("nome_cliente", ["nome completo", "nome cliente", "razao", "nome"], "Nome Completo", True),
+    ("produto", ["descricao do produto", "produto", "descr", "item"], "Descricao do Produto", True),
+    ("vr_total", ["vr. total", "vr total", "valor total", "total"], "Vr. Total", True),
+    ("qnt", ["qnt", "qtd", "quantidade"], "Qnt.", True),
+    ("cidade", ["cidade", "municipio"], "Cidade", False),
+    ("vendedor", ["nome do vendedor", "vendedor", "vend"], "Nome do Vendedor", False),
+    ("observacao", ["obs", "observ", "observacao"], "Observacao", False),
+)
 
 
-async def import_rows(db: AsyncSession, rows: list[dict[str, Any]]) -> ImportarVendasResult:
-    keys = await existing_venda_keys(db)
+def vendas_column_map(columns) -> tuple[dict[str, str], list[str]]:
+    """Spreadsheet column for each import field and the labels of missing optional columns."""
+    mapping: dict[str, str] = {}
+    missing = []
+    opcionais = []
+    for field, candidates, label, required in VENDAS_IMPORT_COLUMNS:
+        column = guess_col(columns, candidates)
+        if column:
+            mapping[field] = column
+        elif required:
+            missing.append(label)
+        else:
+            opcionais.append(label)
+    if missing:
+        raise HTTPException(status_code=422, detail="Nao identifiquei as colunas: " + ", ".join(missing))
+    return mapping, opcionais
+
+
+def canonical_frames(frames: Iterable[pd.DataFrame], mapping: dict[str, str]) -> Iterator[pd.DataFrame]:
+    for frame in frames:
+        yield pd.DataFrame({field: frame[column] for field, column in mapping.items()}, index=frame.index)
+
+
+async def import_frames(db: AsyncSession, frames: Iterable[pd.DataFrame]) -> ImportarVendasResult:
+    """
+    Imports chunks of raw sales (canonical column names). Each chunk is
+    normalized in one pass, deduplicated against the row_keys of the session's
+    company (indexed lookups for the chunk's keys only) and bulk inserted;
+    products are resolved once per distinct name of the import, new names of a
+    chunk in one batch. The Core insert skips the ORM hooks, so company_id is
+    set here.
+    """
+    await refresh_pending_row_keys(db)
+    company_id = int(db.info["company_id"]) if db.info.get("company_id") else None
     result = ImportarVendasResult()
-    for raw in rows:
-        row = normalized_import_row(raw)
-        if not row:
-            result.invalidas += 1
+    produto_ids: dict[str, int] = {}
+    for frame in frames:
+        rows, invalidas = normalize_vendas_frame(frame)
+        result.invalidas += invalidas
+        if rows.empty:
             continue
-        key = row_key(row)
-        if key in keys:
-            result.ignoradas += 1
+        total = len(rows)
+        rows = rows.drop_duplicates("row_key")
+        existing = await existing_row_keys(db, rows["row_key"].tolist(), company_id)
+        if existing:
+            rows = rows[~rows["row_key"].isin(existing)]
+        result.ignoradas += total - len(rows)
+        if rows.empty:
             continue
-        produto_id = await produto_id_for_nome(db, row.get("produto"))
-        db.add(VendaImportadaDB(**row, produto_id=produto_id, selecionada=0, usada=0, usada_em="", codigo_programacao=""))
-        keys.add(key)
-        result.importadas += 1
+        novos = [nome for nome in rows["produto"].unique().tolist() if nome not in produto_ids]
+        if novos:
+            produto_ids.update(await produto_ids_for_nomes(db, novos))
+        rows = rows.assign(
+            produto_id=[produto_ids.get(nome) for nome in rows["produto"].tolist()],
+            selecionada=0,
+            usada=0,
+            usada_em="",
+            codigo_programacao="",
+            company_id=company_id,
+        )
+        columns = list(rows.columns)
+        records = [dict(zip(columns, values)) for values in zip(*(rows[column].tolist() for column in columns))]
+        await db.execute(insert(VendaImportadaDB.__table__), records)
+        result.importadas += len(records)
     return result
 
 
-def rows_from_dataframe(df: pd.DataFrame) -> tuple[list[dict[str, Any]], list[str]]:
-    col_pedido = guess_col(df.columns, ["numero pedido", "num pedido", "n pedido", "pedido"])
-    col_data = guess_col(df.columns, ["data venda", "data", "dt"])
-    col_cliente = guess_col(df.columns, ["cod cliente", "codigo cliente", "cliente", "cod"])
-    col_nome = guess_col(df.columns, ["nome completo", "nome cliente", "razao", "nome"])
-    col_produto = guess_col(df.columns, ["descricao do produto", "produto", "descr", "item"])
-    col_vr_total = guess_col(df.columns, ["vr. total", "vr total", "valor total", "total"])
-    col_qnt = guess_col(df.columns, ["qnt", "qtd", "quantidade"])
-    col_cidade = guess_col(df.columns, ["cidade", "municipio"])
-    col_vendedor = guess_col(df.columns, ["nome do vendedor", "vendedor", "vend"])
-    col_obs = guess_col(df.columns, ["obs", "observ", "observacao"])
+async def import_rows(db: AsyncSession, rows: list[dict[str, Any]]) -> ImportarVendasResult:
+    frame = pd.DataFrame(rows, columns=list(VendaImportadaPayload.model_fields))
+    return await import_frames(
+        db, (frame.iloc[start : start + CHUNK_ROWS] for start in range(0, len(frame), CHUNK_ROWS))
+    )
 
-    missing = []
-    if not col_pedido:
-        missing.append("Numero Pedido")
-    if not col_cliente:
-        missing.append("Cliente")
-    if not col_nome:
-        missing.append("Nome Completo")
-    if not col_produto:
-        missing.append("Descricao do Produto")
-    if not col_vr_total:
-        missing.append("Vr. Total")
-    if not col_qnt:
-        missing.append("Qnt.")
-    if missing:
-        raise HTTPException(status_code=422, detail="Nao identifiquei as colunas: " + ", ".join(missing))
 
-    opcionais = []
-    if not col_data:
-        opcionais.append("Data")
-    if not col_cidade:
-        opcionais.append("Cidade")
-    if not col_vendedor:
-        opcionais.append("Nome do Vendedor")
-    if not col_obs:
-        opcionais.append("Observacao")
-
-    rows = []
-    for _, source in df.iterrows():
-        rows.append(
-            {
-                "pedido": source.get(col_pedido, ""),
-                "data_venda": source.get(col_data, "") if col_data else "",
-                "cliente": source.get(col_cliente, ""),
-                "nome_cliente": source.get(col_nome, ""),
-                "vendedor": source.get(col_vendedor, "") if col_vendedor else "",
-                "produto": source.get(col_produto, ""),
-                "vr_total": source.get(col_vr_total, 0),
-                "qnt": source.get(col_qnt, 0),
-                "cidade": source.get(col_cidade, "") if col_cidade else "",
-                "observacao": source.get(col_obs, "") if col_obs else "",
-            }
-        )
-    return rows, opcionais
+def read_upload_frames(source, filename: str) -> Iterator[pd.DataFrame]:
+    try:
+        yield from iter_upload_frames(source, filename)
+    except HTTPException:
+        raise
+    except Exception as exc:
+        raise HTTPException(status_code=422, detail=f"Nao foi possivel ler o arquivo: {exc}") from exc
 
 
 def is_programacao_vinculavel(programacao: ProgramacaoDB) -> bool:
@@ -450,21 +428,17 @@ async def importar_vendas_upload(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(require_admin_user),
 ):
-    filename = str(file.filename or "").lower()
-    contents = await file.read()
-    if not contents:
+    source = file.file
+    source.seek(0)
+    if not source.read(1):
         raise HTTPException(status_code=422, detail="Arquivo vazio.")
-    try:
-        if filename.endswith(".csv"):
-            df = pd.read_csv(BytesIO(contents))
-        else:
-            engine = "xlrd" if filename.endswith(".xls") and not filename.endswith(".xlsx") else "openpyxl"
-            df = pd.read_excel(BytesIO(contents), engine=engine)
-    except Exception as exc:
-        raise HTTPException(status_code=422, detail=f"Nao foi possivel ler o arquivo: {exc}") from exc
-
-    rows, opcionais = rows_from_dataframe(df)
-    result = await import_rows(db, rows)
+    source.seek(0)
+    frames = read_upload_frames(source, str(file.filename or ""))
+    first = next(frames, None)
+    if first is None:
+        raise HTTPException(status_code=422, detail="Arquivo vazio.")
+    mapping, opcionais = vendas_column_map(first.columns)
+    result = await import_frames(db, canonical_frames(itertools.chain([first], frames), mapping))
     result.opcionais_ausentes = opcionais
     record_audit_log(
         db,
@@ -599,18 +573,25 @@ async def vincular_vendas_programacao(
     existentes = await items_for_programacao(db, programacao.codigo_programacao)
     seen = {item_key(item) for item in existentes}
     endereco_map = await endereco_map_for_vendas(db, vendas)
-    added = 0
+    novos: list[tuple[VendaImportadaDB, dict[str, Any]]] = []
     for venda in vendas:
         item_data = venda_to_programacao_item(venda, endereco_map, payload.caixas_por_venda)
         key = item_key(item_data)
         if not item_data["cod_cliente"] or not item_data["nome_cliente"] or key in seen:
             continue
+        novos.append((venda, item_data))
+        seen.add(key)
+    produto_ids = await produto_ids_for_nomes(
+        db, [item_data["produto"] for venda, item_data in novos if not int(getattr(venda, "produto_id", 0) or 0)]
+    )
+    added = 0
+    for venda, item_data in novos:
         db.add(
             ProgramacaoItemDB(
                 codigo_programacao=upper_text(programacao.codigo_programacao),
                 cod_cliente=item_data["cod_cliente"],
                 nome_cliente=item_data["nome_cliente"],
-                produto_id=int(getattr(venda, "produto_id", 0) or 0) or await produto_id_for_nome(db, item_data["produto"]),
+                produto_id=int(getattr(venda, "produto_id", 0) or 0) or produto_ids.get(item_data["produto"]),
                 produto=item_data["produto"],
                 endereco=item_data["endereco"] or None,
                 qnt_caixas=safe_int(item_data["qnt_caixas"], 0),
@@ -621,7 +602,6 @@ async def vincular_vendas_programacao(
                 observacao=item_data["observacao"] or None,
             )
         )
-        seen.add(key)
         added += 1
 
     usada_em = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -10,7 +10,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.api.v1.endpoints.programacao import upper_text
 from backend.api.v1.endpoints.users import require_admin_user
-from backend.config.database import get_db
+from backend.config.database import get_db, schema_bootstrap
 from backend.models.user import User
 from backend.services.audit import client_ip_from_request, record_audit_log
 
@@ -238,6 +238,7 @@ class LogisticaOcorrenciaPayload(BaseModel):
         return str(value or "").strip()
 
 
+@schema_bootstrap
 async def ensure_logistica_schema(db: AsyncSession) -> None:
     await db.execute(
         text(
@@ -17,6 +17,7 @@ from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, field_validator
 from sqlalchemy import delete, func, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
 from app.utils.formatters import normalize_time, safe_float, safe_int
 from app.utils.validators import normalize_phone
@@ -27,6 +28,8 @@ from backend.models.programacao import ProgramacaoDB, ProgramacaoItemDB
 from backend.models.user import User
 from backend.models.venda_importada import VendaImportadaDB
 from backend.services.audit import client_ip_from_request, record_audit_log
+from backend.services.produto_resolver import resolve_produto_ids
+from backend.services.route_ordering import order_route
 
 router = APIRouter()
 
@@ -54,14 +57,6 @@ def programacao_reserva_recurso(programacao: ProgramacaoDB) -> bool:
     return True
 
 
-def produto_codigo_base(value: Any) -> str:
-    text_value = upper_text(value)
-    code = "".join(ch if ch.isalnum() else "-" for ch in text_value).strip("-")
-    while "--" in code:
-        code = code.replace("--", "-")
-    return (code or "PRODUTO")[:40]
-
-
 class ProgramacaoItemPayload(BaseModel):
     cod_cliente: str = Field(min_length=1, max_length=80)
     nome_cliente: str = Field(min_length=1, max_length=180)
@@ -323,6 +318,34 @@ def normalize_ascii(value: Any) -> str:
     return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
 
 
+async def programacao_resumo_por_codigo(db: AsyncSession, codigos: list[str], colunas: tuple[str, ...]) -> dict[str, dict[str, Any]]:
+    """
+    Reads the materialized per-route summary (programacao_resumo, kept by the legacy API).
+    Routes without a row (never built or invalidated by a write) are simply absent, so callers
+    compute those on the fly.
+    """
+    keys = sorted({upper_text(codigo) for codigo in codigos if upper_text(codigo)})
+    if not keys:
+        return {}
+    out: dict[str, dict[str, Any]] = {}
+    try:
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            params = {f"k{i}": key for i, key in enumerate(chunk)}
+            result = await db.execute(
+                text(
+                    f"SELECT codigo_programacao_key, {', '.join(colunas)} FROM programacao_resumo "
+                    f"WHERE codigo_programacao_key IN ({', '.join(':' + name for name in params)})"
+                ),
+                params,
+            )
+            for row in result.mappings().all():
+                out[str(row["codigo_programacao_key"])] = dict(row)
+    except Exception:
+        return {}
+    return out
+
+
 def normalize_operacao_tipo(value: Any, tipo_estimativa: str = "") -> str:
     raw = normalize_ascii(value).replace("-", "_").replace(" ", "_")
     if raw in {"TRANSBORDO", "TRANSFERENCIA_CARGA", "REDISTRIBUICAO"}:
@@ -791,43 +814,22 @@ async def cliente_endereco_map(db: AsyncSession, codigos: set[str]) -> dict[str,
     return {upper_text(item.cod_cliente): upper_text(item.endereco) for item in result.scalars().all()}
 
 
-async def produto_id_for_item(db: AsyncSession, produto_id: int | None, produto_nome: str | None) -> int | None:
-    if produto_id:
-        found = await db.get(ProdutoDB, int(produto_id))
-        if found:
-            return int(found.id)
-    nome_norm = upper_text(produto_nome)
-    if not nome_norm:
-        return None
-    result = await db.execute(select(ProdutoDB).where(func.upper(func.coalesce(ProdutoDB.nome, "")) == nome_norm).limit(1))
-    produto = result.scalar_one_or_none()
-    if produto:
-        return int(produto.id)
-    codigo = produto_codigo_base(nome_norm)
-    codigo_final = codigo
-    for suffix in range(0, 1000):
-        candidate = codigo_final if suffix == 0 else f"{codigo[:34]}-{suffix:03d}"
-        result = await db.execute(select(ProdutoDB).where(func.upper(func.coalesce(ProdutoDB.codigo, "")) == candidate).limit(1))
-        if result.scalar_one_or_none():
-            continue
-        codigo_final = candidate
-        break
-    else:
-        raise HTTPException(status_code=409, detail="Nao foi possivel gerar codigo unico para o produto.")
-    produto = ProdutoDB(
-        codigo=codigo_final,
-        nome=nome_norm,
+async def produto_ids_for_items(db: AsyncSession, itens: list[ProgramacaoItemPayload]) -> list[int | None]:
+    """Product of each item: its own produto_id when it exists, otherwise resolved by name in one batch."""
+    ids = {int(item.produto_id) for item in itens if item.produto_id}
+    validos: set[int] = set()
+    if ids:
+        result = await db.execute(select(ProdutoDB.id).where(ProdutoDB.id.in_(sorted(ids))))
+        validos = {int(produto_id) for produto_id in result.scalars().all()}
+    por_nome = await resolve_produto_ids(
+        db,
+        [item.produto for item in itens if not (item.produto_id and int(item.produto_id) in validos)],
         descricao="Cadastro automatico criado pela programacao.",
-        categoria="AVES",
-        unidade="KG",
-        unidade_estoque="KG",
-        controla_estoque_fisico=1,
-        controla_estoque_fiscal=1,
-        status="ATIVO",
     )
-    db.add(produto)
-    await db.flush()
-    return int(produto.id)
+    return [
+        int(item.produto_id) if item.produto_id and int(item.produto_id) in validos else por_nome.get(upper_text(item.produto))
+        for item in itens
+    ]
 
 
 def venda_importada_to_programacao_item(venda: VendaImportadaDB, endereco_map: dict[str, str]) -> ProgramacaoVendaSelecionadaItem | None:
@@ -1080,34 +1082,6 @@ async def historico_pares_clientes(db: AsyncSession, codigos: set[str], limit_pr
     return pares
 
 
-def ordenar_por_vizinho_mais_proximo(items: list[dict[str, Any]], historico: dict[tuple[str, str], int] | None = None) -> list[dict[str, Any]]:
-    historico = historico or {}
-    com_geo = [item for item in items if item.get("lat") not in (None, "") and item.get("lon") not in (None, "")]
-    sem_geo = [item for item in items if item not in com_geo]
-    if len(com_geo) <= 1:
-        return com_geo + sorted(sem_geo, key=lambda it: (upper_text(it.get("cidade")), upper_text(it.get("endereco")), upper_text(it.get("nome_cliente"))))
-    start = min(com_geo, key=lambda it: (upper_text(it.get("cidade")), upper_text(it.get("bairro")), upper_text(it.get("nome_cliente"))))
-    ordered = [start]
-    remaining = [item for item in com_geo if item is not start]
-    while remaining:
-        last = ordered[-1]
-        last_cod = upper_text(last.get("cod_cliente"))
-        nxt = min(
-            remaining,
-            key=lambda it: (
-                geo_distance_km(last.get("lat"), last.get("lon"), it.get("lat"), it.get("lon"))
-                - min(historico.get((last_cod, upper_text(it.get("cod_cliente"))), 0) * 2.0, 12.0),
-                upper_text(it.get("cidade")),
-                upper_text(it.get("bairro")),
-                upper_text(it.get("nome_cliente")),
-            ),
-        )
-        ordered.append(nxt)
-        remaining.remove(nxt)
-    ordered.extend(sorted(sem_geo, key=lambda it: (upper_text(it.get("cidade")), upper_text(it.get("endereco")), upper_text(it.get("nome_cliente")))))
-    return ordered
-
-
 async def mark_vendas_importadas_used(db: AsyncSession, ids: list[int], codigo_programacao: str) -> int:
     venda_ids = sorted({safe_int(item, 0) for item in ids if safe_int(item, 0) > 0})
     if not venda_ids:
@@ -2287,7 +2261,8 @@ async def sugerir_programacao(
         )
 
     historico = await historico_pares_clientes(db, codigos)
-    ordered = ordenar_por_vizinho_mais_proximo(enriched, historico)
+    # CPU-bound local search with a time budget: keep it off the event loop
+    ordered = await run_in_threadpool(order_route, enriched, historico)
     total_caixas = sum(max(safe_int(item.get("qnt_caixas"), 0), 0) for item in ordered)
     caixas_acum = 0
     distancia_total = 0.0
@@ -2572,7 +2547,8 @@ async def save_programacao(
 
     if payload.itens is not None:
         await db.execute(delete(ProgramacaoItemDB).where(func.upper(ProgramacaoItemDB.codigo_programacao) == codigo))
-        for index, item in enumerate(itens, start=1):
+        produto_ids = await produto_ids_for_items(db, itens)
+        for index, (item, produto_id) in enumerate(zip(itens, produto_ids), start=1):
             db.add(
                 ProgramacaoItemDB(
                     codigo_programacao=codigo,
@@ -2584,7 +2560,7 @@ async def save_programacao(
                     endereco=upper_text(item.endereco) or None,
                     vendedor=upper_text(item.vendedor) or None,
                     pedido=upper_text(item.pedido) or None,
-                    produto_id=await produto_id_for_item(db, item.produto_id, item.produto),
+                    produto_id=produto_id,
                     produto=upper_text(item.produto) or None,
                     observacao=upper_text(item.obs) or None,
                     ordem_sugerida=safe_int(item.ordem_sugerida, 0) or index,
@@ -19,7 +19,7 @@ from pydantic import BaseModel, Field, field_validator
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.config.database import get_db
+from backend.config.database import get_db, schema_bootstrap
 from backend.services.auth import get_password_hash
 
 router = APIRouter()
@@ -220,6 +220,7 @@ def decode_features(raw: Any) -> list[str]:
     return [str(item).strip() for item in values if str(item).strip()]
 
 
+@schema_bootstrap
 async def ensure_public_signup_table(db: AsyncSession) -> None:
     await db.execute(
         text(
@@ -7,6 +7,7 @@ from __future__ import annotations
 import re
 import unicodedata
 import json
+from dataclasses import dataclass, field
 from datetime import datetime
 from io import BytesIO
 from typing import Any
@@ -28,6 +29,8 @@ from backend.models.recebimento import RecebimentoDB
 from backend.models.user import User
 from backend.models.venda_importada import VendaImportadaDB
 from backend.services.audit import client_ip_from_request, record_audit_log
+from backend.services.excel_export import sheet_from_dicts, xlsx_response
+from backend.services.programacao_data_ref import data_ref_range, refresh_pending_data_ref, relatorio_data_ref_iso_of
 
 router = APIRouter()
 
@@ -165,6 +168,14 @@ def matches_date(value: str, patterns: list[str]) -> bool:
     return any(upper_text(pattern) in text for pattern in patterns)
 
 
+def matches_data_ref(programacao: ProgramacaoDB, data_like: str) -> bool:
+    date_range = data_ref_range(data_like)
+    if date_range is None:
+        return matches_date(data_ref(programacao), date_patterns(data_like))
+    iso = programacao.relatorio_data_ref_iso if programacao.data_ref_iso is not None else relatorio_data_ref_iso_of(programacao)
+    return date_range[0] <= iso < date_range[1]
+
+
 def matches_programacao(
     programacao: ProgramacaoDB,
     *,
@@ -180,7 +191,7 @@ def matches_programacao(
         return False
     if motorista_like and motorista_like not in motorista:
         return False
-    if not matches_date(data_ref(programacao), date_patterns(data_like)):
+    if not matches_data_ref(programacao, data_like):
         return False
     if "PRESTACAO" in tipo_key or "FECHAMENTO" in tipo_key:
         prestacao = upper_text(programacao.prestacao_status or "PENDENTE")
@@ -189,15 +200,24 @@ def matches_programacao(
     return True
 
 
+async def ajudante_nomes(db: AsyncSession) -> dict[str, str]:
+    result = await db.execute(select(AjudanteDB.id, AjudanteDB.nome, AjudanteDB.sobrenome))
+    return {
+        str(ajudante_id): upper_text(f"{nome or ''} {sobrenome or ''}".strip())
+        for ajudante_id, nome, sobrenome in result.all()
+    }
+
+
 async def resolve_equipe_nomes(db: AsyncSession, equipe_raw: str | None) -> str:
+    if not str(equipe_raw or "").strip():
+        return ""
+    return equipe_nomes(await ajudante_nomes(db), equipe_raw)
+
+
+def equipe_nomes(nomes: dict[str, str], equipe_raw: str | None) -> str:
     raw = str(equipe_raw or "").strip()
     if not raw:
         return ""
-    result = await db.execute(select(AjudanteDB))
-    nomes = {
-        str(item.id): upper_text(f"{item.nome or ''} {item.sobrenome or ''}".strip())
-        for item in result.scalars().all()
-    }
     out = []
     seen = set()
     for part in re.split(r"[|,;/]+", raw):
@@ -213,8 +233,16 @@ async def resolve_equipe_nomes(db: AsyncSession, equipe_raw: str | None) -> str:
     return " / ".join(out)
 
 
-async def programacao_rows(db: AsyncSession, limit: int = 1000) -> list[ProgramacaoDB]:
-    result = await db.execute(select(ProgramacaoDB).order_by(ProgramacaoDB.id.desc()).limit(max(min(limit, 3000), 1)))
+async def programacao_rows(db: AsyncSession, limit: int = 1000, data_like: str = "") -> list[ProgramacaoDB]:
+    """Latest programacoes; a recognizable `data_like` (day, month or year) is filtered in SQL on relatorio_data_ref_iso."""
+    query = select(ProgramacaoDB)
+    date_range = data_ref_range(data_like)
+    if date_range is not None:
+        await refresh_pending_data_ref(db)
+        query = query.where(
+            ProgramacaoDB.relatorio_data_ref_iso >= date_range[0], ProgramacaoDB.relatorio_data_ref_iso < date_range[1]
+        )
+    result = await db.execute(query.order_by(ProgramacaoDB.id.desc()).limit(max(min(limit, 3000), 1)))
     return list(result.scalars().all())
 
 
@@ -261,6 +289,117 @@ async def vendas_importadas_for(db: AsyncSession, codigo: str) -> list[VendaImpo
     return list(result.scalars().all())
 
 
+BATCH_IN_SIZE = 500
+FOTOS_MORTALIDADE_FILTER = """
+   AND (
+       UPPER(COALESCE(categoria, '')) LIKE '%MORT%'
+    OR UPPER(COALESCE(tipo_registro, '')) LIKE '%MORT%'
+    OR UPPER(COALESCE(categoria, '')) LIKE '%DOA%'
+    OR UPPER(COALESCE(tipo_registro, '')) LIKE '%DOA%'
+   )
+"""
+
+
+@dataclass
+class RelatorioBatch:
+    """Rows of a route set indexed by upper(codigo_programacao); a missing code means no rows."""
+
+    itens: dict[str, list[ProgramacaoItemDB]] = field(default_factory=dict)
+    controles: dict[str, list[ProgramacaoItemControleDB]] = field(default_factory=dict)
+    recebimentos: dict[str, list[RecebimentoDB]] = field(default_factory=dict)
+    despesas: dict[str, list[DespesaDB]] = field(default_factory=dict)
+    vendas: dict[str, list[VendaImportadaDB]] = field(default_factory=dict)
+    fotos: dict[str, list[dict[str, Any]]] = field(default_factory=dict)
+    ajudantes: dict[str, str] = field(default_factory=dict)
+
+    def equipe(self, equipe_raw: str | None) -> str:
+        return equipe_nomes(self.ajudantes, equipe_raw)
+
+
+def batch_chunks(codigos: list[str]) -> list[list[str]]:
+    return [codigos[i:i + BATCH_IN_SIZE] for i in range(0, len(codigos), BATCH_IN_SIZE)]
+
+
+async def batch_models(db: AsyncSession, model: Any, codigos: list[str], order_by: tuple[Any, ...]) -> dict[str, list[Any]]:
+    grouped: dict[str, list[Any]] = {}
+    for chunk in batch_chunks(codigos):
+        result = await db.execute(
+            select(model).where(func.upper(model.codigo_programacao).in_(chunk)).order_by(*order_by)
+        )
+        for row in result.scalars().all():
+            grouped.setdefault(upper_text(row.codigo_programacao), []).append(row)
+    return grouped
+
+
+async def batch_fotos(db: AsyncSession, codigos: list[str], somente_mortalidade: bool = False) -> dict[str, list[dict[str, Any]]]:
+    grouped: dict[str, list[dict[str, Any]]] = {}
+    for chunk in batch_chunks(codigos):
+        params = {f"c{i}": codigo for i, codigo in enumerate(chunk)}
+        try:
+            result = await db.execute(
+                text(
+                    f"""
+                    SELECT codigo_programacao, categoria, tipo_registro, cod_cliente, cliente_nome,
+                           arquivo_nome, storage_path, registrado_em
+                      FROM rota_fotos
+                     WHERE UPPER(COALESCE(codigo_programacao, '')) IN ({", ".join(f":{key}" for key in params)})
+                     {FOTOS_MORTALIDADE_FILTER if somente_mortalidade else ""}
+                     ORDER BY id DESC
+                    """
+                ),
+                params,
+            )
+        except Exception:
+            # rota_fotos so existe depois que a API movel criou o schema
+            return {}
+        for row in result.mappings().all():
+            grouped.setdefault(upper_text(row.get("codigo_programacao")), []).append(dict(row))
+    return grouped
+
+
+async def load_relatorio_batch(
+    db: AsyncSession,
+    codigos: list[str],
+    *,
+    itens: bool = False,
+    controles: bool = False,
+    recebimentos: bool = False,
+    despesas: bool = False,
+    vendas: bool = False,
+    fotos: bool = False,
+    fotos_mortalidade: bool = False,
+    ajudantes: bool = False,
+) -> RelatorioBatch:
+    """
+    Loads the requested relations for the whole route set with chunked IN queries
+    (one query per relation and chunk) instead of one await per route.
+    Per-route ordering matches the single-route *_for helpers.
+    """
+    codes = list(dict.fromkeys(upper_text(codigo) for codigo in codigos if upper_text(codigo)))
+    batch = RelatorioBatch()
+    if ajudantes:
+        batch.ajudantes = await ajudante_nomes(db)
+    if not codes:
+        return batch
+    if itens:
+        batch.itens = await batch_models(
+            db, ProgramacaoItemDB, codes, (ProgramacaoItemDB.nome_cliente.asc(), ProgramacaoItemDB.cod_cliente.asc())
+        )
+    if controles:
+        batch.controles = await batch_models(db, ProgramacaoItemControleDB, codes, (ProgramacaoItemControleDB.id.asc(),))
+    if recebimentos:
+        batch.recebimentos = await batch_models(
+            db, RecebimentoDB, codes, (RecebimentoDB.data_registro.desc(), RecebimentoDB.id.desc())
+        )
+    if despesas:
+        batch.despesas = await batch_models(db, DespesaDB, codes, (DespesaDB.data_registro.desc(), DespesaDB.id.desc()))
+    if vendas:
+        batch.vendas = await batch_models(db, VendaImportadaDB, codes, (VendaImportadaDB.id.desc(),))
+    if fotos or fotos_mortalidade:
+        batch.fotos = await batch_fotos(db, codes, somente_mortalidade=fotos_mortalidade and not fotos)
+    return batch
+
+
 def relatorio_status(message: str, count: int = 0) -> str:
     suffix = f" ({count})" if count else ""
     return f"STATUS: {message}{suffix}"
@@ -564,12 +703,15 @@ async def transferencias_programacao(db: AsyncSession, codigo: str) -> tuple[lis
 
 async def build_detalhe_completo_report(db: AsyncSession, programacao: ProgramacaoDB) -> RelatorioResumoResponse:
     codigo = upper_text(programacao.codigo_programacao)
-    itens = await itens_for(db, codigo)
-    controles = await controles_for(db, codigo)
-    recebimentos = await recebimentos_for(db, codigo)
-    despesas = await despesas_for(db, codigo)
-    vendas = await vendas_importadas_for(db, codigo)
-    equipe = await resolve_equipe_nomes(db, programacao.equipe)
+    batch = await load_relatorio_batch(
+        db, [codigo], itens=True, controles=True, recebimentos=True, despesas=True, vendas=True, ajudantes=True
+    )
+    itens = batch.itens.get(codigo, [])
+    controles = batch.controles.get(codigo, [])
+    recebimentos = batch.recebimentos.get(codigo, [])
+    despesas = batch.despesas.get(codigo, [])
+    vendas = batch.vendas.get(codigo, [])
+    equipe = batch.equipe(programacao.equipe)
     transferencias, transferencia_saida_compra, transferencia_entrada_compra = await transferencias_programacao(db, codigo)
 
     controle_map = {item_key(ctrl.cod_cliente, ctrl.pedido): ctrl for ctrl in controles}
@@ -886,15 +1028,25 @@ async def build_nf_transbordo_report(db: AsyncSession, nf_like: str) -> Relatori
     total_recebido = 0.0
     total_despesas = 0.0
 
+    batch = await load_relatorio_batch(
+        db,
+        [codigo for codigo in codigos if codigo in programacoes],
+        itens=True,
+        controles=True,
+        recebimentos=True,
+        despesas=True,
+        fotos=True,
+        ajudantes=True,
+    )
     for codigo in codigos:
         prog = programacoes.get(codigo)
         if not prog:
             continue
-        itens = await itens_for(db, codigo)
-        controles = await controles_for(db, codigo)
-        recebimentos = await recebimentos_for(db, codigo)
-        despesas = await despesas_for(db, codigo)
-        equipe = await resolve_equipe_nomes(db, prog.equipe)
+        itens = batch.itens.get(codigo, [])
+        controles = batch.controles.get(codigo, [])
+        recebimentos = batch.recebimentos.get(codigo, [])
+        despesas = batch.despesas.get(codigo, [])
+        equipe = batch.equipe(prog.equipe)
         controle_map = {item_key(ctrl.cod_cliente, ctrl.pedido): ctrl for ctrl in controles}
         caixas = sum(item_caixas(item, controle_map.get(item_key(item.cod_cliente, item.pedido))) for item in itens)
         kg_itens = sum(
@@ -959,31 +1111,16 @@ async def build_nf_transbordo_report(db: AsyncSession, nf_like: str) -> Relatori
                     "obs": despesa.observacao or "-",
                 }
             )
-        try:
-            fotos_result = await db.execute(
-                text(
-                    """
-                    SELECT codigo_programacao, categoria, tipo_registro, cod_cliente, cliente_nome,
-                           arquivo_nome, storage_path, registrado_em
-                      FROM rota_fotos
-                     WHERE UPPER(COALESCE(codigo_programacao, ''))=:codigo
-                     ORDER BY id DESC
-                    """
-                ),
-                {"codigo": codigo},
+        for foto in batch.fotos.get(codigo, []):
+            fotos_rows.append(
+                {
+                    "codigo_programacao": codigo,
+                    "categoria": upper_text(foto.get("categoria") or foto.get("tipo_registro")) or "-",
+                    "cliente": upper_text(foto.get("cliente_nome") or foto.get("cod_cliente")) or "-",
+                    "arquivo": foto.get("arquivo_nome") or foto.get("storage_path") or "-",
+                    "data": str(foto.get("registrado_em") or "")[:19],
+                }
             )
-            for foto in fotos_result.mappings().all():
-                fotos_rows.append(
-                    {
-                        "codigo_programacao": codigo,
-                        "categoria": upper_text(foto.get("categoria") or foto.get("tipo_registro")) or "-",
-                        "cliente": upper_text(foto.get("cliente_nome") or foto.get("cod_cliente")) or "-",
-                        "arquivo": foto.get("arquivo_nome") or foto.get("storage_path") or "-",
-                        "data": str(foto.get("registrado_em") or "")[:19],
-                    }
-                )
-        except Exception:
-            pass
 
     for row, origem, destino, raiz, qtd, qtd_convertida, kg_transf, kg_convertido in transfer_rows_base:
         transfer_rows.append(
@@ -1108,8 +1245,9 @@ async def build_nf_transbordo_report(db: AsyncSession, nf_like: str) -> Relatori
 
 async def build_programacao_report(db: AsyncSession, programacao: ProgramacaoDB) -> RelatorioResumoResponse:
     codigo = upper_text(programacao.codigo_programacao)
-    itens = await itens_for(db, codigo)
-    equipe = await resolve_equipe_nomes(db, programacao.equipe)
+    batch = await load_relatorio_batch(db, [codigo], itens=True, ajudantes=True)
+    itens = batch.itens.get(codigo, [])
+    equipe = batch.equipe(programacao.equipe)
     valor_total = sum(normalize_unit_price(item.preco) for item in itens)
     preco_medio = valor_total / max(len(itens), 1)
 
@@ -1186,10 +1324,11 @@ async def build_prestacao_report(
     show_despesas: bool,
 ) -> RelatorioResumoResponse:
     codigo = upper_text(programacao.codigo_programacao)
-    itens = await itens_for(db, codigo)
-    recebimentos = await recebimentos_for(db, codigo)
-    despesas = await despesas_for(db, codigo)
-    equipe = await resolve_equipe_nomes(db, programacao.equipe)
+    batch = await load_relatorio_batch(db, [codigo], itens=True, recebimentos=True, despesas=True, ajudantes=True)
+    itens = batch.itens.get(codigo, [])
+    recebimentos = batch.recebimentos.get(codigo, [])
+    despesas = batch.despesas.get(codigo, [])
+    equipe = batch.equipe(programacao.equipe)
     transferencias, transferencia_saida_compra, transferencia_entrada_compra = await transferencias_programacao(db, codigo)
 
     total_receb = money(sum(safe_float(item.valor, 0.0) for item in recebimentos))
@@ -1429,6 +1568,7 @@ async def build_rotina_report(db: AsyncSession, motorista_like: str) -> Relatori
             transfer_entrada_kg_by_codigo[destino] = transfer_entrada_kg_by_codigo.get(destino, 0.0) + kg_convertido
     mot: dict[str, dict[str, float]] = {}
     aju: dict[str, dict[str, float]] = {}
+    nomes_ajudantes = await ajudante_nomes(db)
 
     for programacao in rows:
         codigo = upper_text(programacao.codigo_programacao)
@@ -1441,7 +1581,7 @@ async def build_rotina_report(db: AsyncSession, motorista_like: str) -> Relatori
         d["km"] += safe_float(programacao.km_rodado, 0.0)
         if status_ref(programacao) in ACTIVE_STATUSES:
             d["em_rota"] += 1
-        equipe = await resolve_equipe_nomes(db, programacao.equipe)
+        equipe = equipe_nomes(nomes_ajudantes, programacao.equipe)
         for nome in re.split(r"[|,;/]+", equipe or ""):
             ajudante = upper_text(nome)
             if not ajudante or ajudante in {"-", "NAN", "NONE", "SEM EQUIPE"}:
@@ -1537,7 +1677,7 @@ async def build_km_report(
         item["litros"] += safe_float(despesa.litros, 0.0)
 
     grouped: dict[str, dict[str, float]] = {}
-    for programacao in await programacao_rows(db):
+    for programacao in await programacao_rows(db, data_like=data_like):
         codigo = upper_text(programacao.codigo_programacao)
         if codigo_like and codigo_like not in codigo and codigo_like not in nf_programacao(programacao):
             continue
@@ -1791,7 +1931,8 @@ async def build_mortalidade_report(
     rows: list[dict[str, Any]] = []
     detalhe_rows: list[dict[str, Any]] = []
     foto_rows: list[dict[str, Any]] = []
-    for programacao in await programacao_rows(db):
+    selecionadas = []
+    for programacao in await programacao_rows(db, data_like=data_like):
         codigo = upper_text(programacao.codigo_programacao)
         nf_ref = nf_programacao(programacao)
         if codigo_like and codigo_like not in codigo and codigo_like not in nf_ref:
@@ -1804,8 +1945,19 @@ async def build_mortalidade_report(
             data_like=data_like,
         ):
             continue
-        controles = await controles_for(db, codigo)
-        itens = await itens_for(db, codigo)
+        selecionadas.append(programacao)
+    batch = await load_relatorio_batch(
+        db,
+        [programacao.codigo_programacao for programacao in selecionadas],
+        itens=True,
+        controles=True,
+        fotos_mortalidade=True,
+    )
+    for programacao in selecionadas:
+        codigo = upper_text(programacao.codigo_programacao)
+        nf_ref = nf_programacao(programacao)
+        controles = batch.controles.get(codigo, [])
+        itens = batch.itens.get(codigo, [])
         item_by_key = {item_key(item.cod_cliente, item.pedido): item for item in itens}
         media_prog = media_carregada_programacao(programacao)
         mort_cliente_aves = 0
@@ -1864,39 +2016,18 @@ async def build_mortalidade_report(
                     "data": data_ref(programacao),
                 }
             )
-        try:
-            fotos_result = await db.execute(
-                text(
-                    """
-                    SELECT codigo_programacao, categoria, tipo_registro, cod_cliente, cliente_nome,
-                           arquivo_nome, storage_path, registrado_em
-                      FROM rota_fotos
-                     WHERE UPPER(COALESCE(codigo_programacao, ''))=:codigo
-                       AND (
-                           UPPER(COALESCE(categoria, '')) LIKE '%MORT%'
-                        OR UPPER(COALESCE(tipo_registro, '')) LIKE '%MORT%'
-                        OR UPPER(COALESCE(categoria, '')) LIKE '%DOA%'
-                        OR UPPER(COALESCE(tipo_registro, '')) LIKE '%DOA%'
-                       )
-                     ORDER BY id DESC
-                    """
-                ),
-                {"codigo": codigo},
+        for foto in batch.fotos.get(codigo, []):
+            foto_rows.append(
+                {
+                    "codigo_programacao": codigo,
+                    "nf_numero": nf_ref or "-",
+                    "motorista": upper_text(programacao.motorista) or "-",
+                    "categoria": upper_text(foto.get("categoria") or foto.get("tipo_registro")) or "-",
+                    "cliente": upper_text(foto.get("cliente_nome") or foto.get("cod_cliente")) or "-",
+                    "arquivo": foto.get("arquivo_nome") or foto.get("storage_path") or "-",
+                    "data": str(foto.get("registrado_em") or "")[:19],
+                }
             )
-            for foto in fotos_result.mappings().all():
-                foto_rows.append(
-                    {
-                        "codigo_programacao": codigo,
-                        "nf_numero": nf_ref or "-",
-                        "motorista": upper_text(programacao.motorista) or "-",
-                        "categoria": upper_text(foto.get("categoria") or foto.get("tipo_registro")) or "-",
-                        "cliente": upper_text(foto.get("cliente_nome") or foto.get("cod_cliente")) or "-",
-                        "arquivo": foto.get("arquivo_nome") or foto.get("storage_path") or "-",
-                        "data": str(foto.get("registrado_em") or "")[:19],
-                    }
-                )
-        except Exception:
-            pass
         mort_total_aves = mort_cliente_aves + mort_trans_aves
         mort_total_kg = number2(mort_cliente_kg + mort_trans_kg)
         rows.append(
@@ -2153,7 +2284,7 @@ async def relatorios_programacoes(
         codigos, _ = await codigos_relacionados_nf(db, nf_norm)
         nf_relacionados = set(codigos)
     rows = []
-    for programacao in await programacao_rows(db, limit=max(limit, 1)):
+    for programacao in await programacao_rows(db, limit=max(limit, 1), data_like=data):
         codigo_prog = upper_text(programacao.codigo_programacao)
         if nf_norm:
             if nf_relacionados:
@@ -2217,22 +2348,6 @@ def serialize_model_row(item: Any, fields: list[str]) -> dict[str, Any]:
     return {field: getattr(item, field, None) for field in fields}
 
 
-def add_sheet(workbook: Any, title: str, rows: list[dict[str, Any]]) -> None:
-    safe_title = re.sub(r"[\[\]:*?/\\]", "_", title or "RELATORIO")[:31] or "RELATORIO"
-    ws = workbook.create_sheet(title=safe_title)
-    if not rows:
-        ws.append(["sem_dados"])
-        return
-    headers = list(rows[0].keys())
-    ws.append(headers)
-    for row in rows:
-        ws.append([row.get(header) for header in headers])
-    for column_cells in ws.columns:
-        letter = column_cells[0].column_letter
-        max_len = max(len(str(cell.value or "")) for cell in column_cells)
-        ws.column_dimensions[letter].width = min(max(max_len + 2, 12), 46)
-
-
 def relatorio_response_rows(report: RelatorioResumoResponse) -> list[dict[str, Any]]:
     rows: list[dict[str, Any]] = []
     for row in report.rows:
@@ -2256,11 +2371,6 @@ async def relatorios_exportar_excel_generico(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(require_admin_user),
 ):
-    try:
-        from openpyxl import Workbook
-    except Exception as exc:  # pragma: no cover - depends on optional package
-        raise HTTPException(status_code=503, detail="Biblioteca openpyxl indisponivel.") from exc
-
     report = await build_report(
         db,
         tipo=tipo,
@@ -2273,36 +2383,24 @@ async def relatorios_exportar_excel_generico(
         show_despesas=show_despesas,
     )
 
-    wb = Workbook()
-    wb.remove(wb.active)
-    add_sheet(
-        wb,
-        "RESUMO",
-        [
-            {"indicador": item.label, "valor": item.value}
-            for item in report.kpis
-        ],
-    )
-    add_sheet(wb, "DADOS", relatorio_response_rows(report))
-    for section in report.sections:
-        section_rows = []
-        for row in section.rows:
-            out: dict[str, Any] = {}
-            for column in section.columns:
-                out[column.label or column.key] = row.get(column.key)
-            section_rows.append(out)
-        add_sheet(wb, section.title or "DETALHES", section_rows)
-    add_sheet(wb, "MEMORIAL", [{"linha": line} for line in (report.text or "").splitlines()])
-
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
+    def section_sheets():
+        for section in report.sections:
+            section_rows = []
+            for row in section.rows:
+                out: dict[str, Any] = {}
+                for column in section.columns:
+                    out[column.label or column.key] = row.get(column.key)
+                section_rows.append(out)
+            yield sheet_from_dicts(section.title or "DETALHES", section_rows)
+
+    sheets = [
+        sheet_from_dicts("RESUMO", [{"indicador": item.label, "valor": item.value} for item in report.kpis]),
+        sheet_from_dicts("DADOS", relatorio_response_rows(report)),
+        *section_sheets(),
+        sheet_from_dicts("MEMORIAL", [{"linha": line} for line in (report.text or "").splitlines()]),
+    ]
     safe_name = upper_text(report.programacao) or normalize_key(report.tipo).replace(" ", "_").replace("/", "_")
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="RELATORIO_{safe_name}.xlsx"'},
-    )
+    return await xlsx_response(sheets, f"RELATORIO_{safe_name}.xlsx")
 
 
 @router.get("/{codigo_programacao}/exportar-excel")
@@ -2311,88 +2409,71 @@ async def relatorios_exportar_excel(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(require_admin_user),
 ):
-    try:
-        from openpyxl import Workbook
-    except Exception as exc:  # pragma: no cover - depends on optional package
-        raise HTTPException(status_code=503, detail="Biblioteca openpyxl indisponivel.") from exc
-
     programacao = await get_programacao_by_codigo(db, codigo_programacao)
     if not programacao:
         raise HTTPException(status_code=404, detail="Planejamento nao encontrado")
     codigo = upper_text(programacao.codigo_programacao)
 
-    itens = await itens_for(db, codigo)
-    recebimentos = await recebimentos_for(db, codigo)
-    despesas = await despesas_for(db, codigo)
-
-    wb = Workbook()
-    wb.remove(wb.active)
-    add_sheet(
-        wb,
-        "PROGRAMACAO",
-        [
-            serialize_model_row(
-                programacao,
-                [
-                    "codigo_programacao",
-                    "data_criacao",
-                    "motorista",
-                    "veiculo",
-                    "equipe",
-                    "kg_estimado",
-                    "status",
-                    "status_operacional",
-                    "prestacao_status",
-                    "local_rota",
-                    "local_carregamento",
-                    "nf_numero",
-                    "data_saida",
-                    "hora_saida",
-                    "data_chegada",
-                    "hora_chegada",
-                    "km_rodado",
-                    "custo_km",
-                ],
-            )
-        ],
-    )
-    add_sheet(
-        wb,
-        "ITENS",
-        [
-            serialize_model_row(
-                item,
-                ["cod_cliente", "nome_cliente", "qnt_caixas", "kg", "preco", "endereco", "vendedor", "pedido", "produto", "observacao"],
-            )
-            for item in itens
-        ],
-    )
-    add_sheet(
-        wb,
-        "RECEBIMENTOS",
-        [
-            serialize_model_row(item, ["cod_cliente", "nome_cliente", "valor", "forma_pagamento", "observacao", "num_nf", "data_registro"])
-            for item in recebimentos
-        ],
-    )
-    add_sheet(
-        wb,
-        "CUSTOS",
-        [
-            serialize_model_row(item, ["descricao", "valor", "data_registro", "tipo_despesa", "categoria", "motorista", "veiculo", "observacao"])
-            for item in despesas
-        ],
-    )
-
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    filename = f"RELATORIO_{codigo}.xlsx"
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
-    )
+    batch = await load_relatorio_batch(db, [codigo], itens=True, recebimentos=True, despesas=True)
+    itens = batch.itens.get(codigo, [])
+    recebimentos = batch.recebimentos.get(codigo, [])
+    despesas = batch.despesas.get(codigo, [])
+
+    sheets = [
+        sheet_from_dicts(
+            "PROGRAMACAO",
+            [
+                serialize_model_row(
+                    programacao,
+                    [
+                        "codigo_programacao",
+                        "data_criacao",
+                        "motorista",
+                        "veiculo",
+                        "equipe",
+                        "kg_estimado",
+                        "status",
+                        "status_operacional",
+                        "prestacao_status",
+                        "local_rota",
+                        "local_carregamento",
+                        "nf_numero",
+                        "data_saida",
+                        "hora_saida",
+                        "data_chegada",
+                        "hora_chegada",
+                        "km_rodado",
+                        "custo_km",
+                    ],
+                )
+            ],
+        ),
+        sheet_from_dicts(
+            "ITENS",
+            [
+                serialize_model_row(
+                    item,
+                    ["cod_cliente", "nome_cliente", "qnt_caixas", "kg", "preco", "endereco", "vendedor", "pedido", "produto", "observacao"],
+                )
+                for item in itens
+            ],
+        ),
+        sheet_from_dicts(
+            "RECEBIMENTOS",
+            [
+                serialize_model_row(item, ["cod_cliente", "nome_cliente", "valor", "forma_pagamento", "observacao", "num_nf", "data_registro"])
+                for item in recebimentos
+            ],
+        ),
+        sheet_from_dicts(
+            "CUSTOS",
+            [
+                serialize_model_row(item, ["descricao", "valor", "data_registro", "tipo_despesa", "categoria", "motorista", "veiculo", "observacao"])
+                for item in despesas
+            ],
+        ),
+    ]
+    return await xlsx_response(sheets, f"RELATORIO_{codigo}.xlsx")
 
 
 @router.get("/pdf")
@@ -4,30 +4,32 @@ System tools endpoints mirroring BackupExportarPage and SystemToolsPage.
 """
 from __future__ import annotations
 
-import json
 import os
 import shutil
 import sqlite3
 import zipfile
-from datetime import datetime, timedelta, timezone
-from io import BytesIO
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Optional
 
 from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse
 from pydantic import BaseModel, Field
 from sqlalchemy import delete, func, select, text
 from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
 from backend.api.v1.endpoints.users import require_admin_user
-from backend.config.database import get_db
+from backend.config.database import get_db, schema_bootstrap
 from backend.config.settings import settings
 from backend.models.system import SistemaLogDB
 from backend.models.user import User
 from backend.models.venda_importada import VendaImportadaDB
+from backend.services import migration_package
 from backend.services.audit import client_ip_from_request, record_audit_log
+from backend.services.excel_export import ExcelSheet, stream_select_rows, xlsx_response
+from backend.services.jobs import JOB_CONCLUIDO, ProgressCallback, get_job_runner, job_handler
 
 router = APIRouter()
 
@@ -35,6 +37,7 @@ PROJECT_ROOT = Path(__file__).resolve().parents[4]
 BACKUP_DIR = Path(os.getenv("BACKUP_DIR", PROJECT_ROOT / "backup")).resolve()
 EXPORT_DIR = Path(os.getenv("ROTA_EXPORT_DIR", PROJECT_ROOT / "exports")).resolve()
 INSTALLER_DIR = Path(os.getenv("INSTALLER_DIR", PROJECT_ROOT / "dist_installer")).resolve()
+BACKUP_PAGES_PER_STEP = 1024
 SYSTEM_TABLES = [
     "usuarios",
     "motoristas",
@@ -110,6 +113,36 @@ class SystemOverviewResponse(BaseModel):
     info: SystemInfoResponse
 
 
+class MigrationPackageInfo(BaseModel):
+    arquivo: str
+    criado_em: str = ""
+    incremental: bool = False
+    fotos_total: int = 0
+    disponivel: bool = True
+
+
+class JobCreatePayload(BaseModel):
+    tipo: str
+    arquivo: str = ""
+    confirmar: bool = False
+    base: str = ""
+    vacuum: bool = False
+
+
+class JobResponse(BaseModel):
+    id: str
+    tipo: str
+    status: str
+    progresso: float = 0
+    mensagem: str = ""
+    resultado: dict[str, Any] | None = None
+    download_url: str = ""
+    usuario: str = ""
+    criado_em: str | None = None
+    iniciado_em: str | None = None
+    concluido_em: str | None = None
+
+
 class DiariaConfigItem(BaseModel):
     local_rota: str
     motorista: float = Field(default=0, ge=0)
@@ -184,12 +217,20 @@ def latest_installer_path() -> Path:
     return max(candidates, key=lambda item: item.stat().st_mtime)
 
 
-def sqlite_backup_copy(src: Path, dst: Path) -> None:
+def sqlite_backup_copy(src: Path, dst: Path, progress: Optional[Callable[[int, int], None]] = None) -> None:
     src_conn = sqlite3.connect(str(src))
     dst_conn = sqlite3.connect(str(dst))
     try:
         with dst_conn:
-            src_conn.backup(dst_conn)
+            if progress is None:
+                src_conn.backup(dst_conn)
+            else:
+                # copy in steps so the job can report (copied pages, total pages)
+                src_conn.backup(
+                    dst_conn,
+                    pages=BACKUP_PAGES_PER_STEP,
+                    progress=lambda _status, remaining, total: progress(total - remaining, total),
+                )
     finally:
         dst_conn.close()
         src_conn.close()
@@ -220,55 +261,92 @@ def backup_to_info(path: Path) -> BackupInfo:
     )
 
 
-def create_migration_package() -> Path:
+def create_backup_file(progress: Optional[ProgressCallback] = None) -> tuple[Path, str]:
+    db_path = sqlite_db_path()
+    if not db_path.exists():
+        raise HTTPException(status_code=404, detail="Banco de dados principal nao encontrado.")
+    assert_sqlite_file(db_path)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    target = ensure_backup_dir() / f"banco_de_dados_{timestamp}.db"
+    pages = None
+    if progress is not None:
+        pages = lambda copied, total: progress(copied * 100 / max(total, 1), "Copiando banco de dados")
+    try:
+        sqlite_backup_copy(db_path, target, pages)
+    except Exception:
+        file_copy(db_path, target)
+    return target, timestamp
+
+
+def migration_base_path(filename: str) -> Path:
+    name = Path(filename).name
+    path = (ensure_export_dir() / name).resolve()
+    if path.parent != EXPORT_DIR or not name.startswith("rotahub_migration_"):
+        raise HTTPException(status_code=400, detail="Pacote base invalido.")
+    if path.suffix.lower() == ".zip" and not path.exists():
+        # the package may have been deleted after download; its sidecar manifest is enough
+        path = migration_package.sidecar_path(path)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Pacote base nao encontrado.")
+    return path
+
+
+def list_migration_packages() -> list[MigrationPackageInfo]:
+    """Previous packages that can be the base of an incremental export (newest first)."""
+    if not EXPORT_DIR.exists():
+        return []
+    items = []
+    for sidecar in sorted(EXPORT_DIR.glob(f"rotahub_migration_*{migration_package.SIDECAR_SUFFIX}"), reverse=True):
+        try:
+            manifest = migration_package.load_manifest(sidecar)
+        except ValueError:
+            continue
+        archive = sidecar.name[: -len(migration_package.SIDECAR_SUFFIX)] + ".zip"
+        items.append(
+            MigrationPackageInfo(
+                arquivo=archive,
+                criado_em=str(manifest.get("created_at_utc") or ""),
+                incremental=bool(manifest.get("incremental")),
+                fotos_total=int((manifest.get("photos") or {}).get("total_files") or 0),
+                disponivel=(EXPORT_DIR / archive).exists(),
+            )
+        )
+    return items
+
+
+def create_migration_package(
+    progress: Optional[ProgressCallback] = None,
+    base: str = "",
+    vacuum: bool = False,
+) -> Path:
     db_path = sqlite_db_path()
     if not db_path.exists():
         raise HTTPException(status_code=404, detail="Banco de dados principal nao encontrado.")
     assert_sqlite_file(db_path)
 
+    base_manifest = None
+    if base:
+        try:
+            base_manifest = migration_package.load_manifest(migration_base_path(base))
+        except (KeyError, ValueError, zipfile.BadZipFile) as exc:
+            raise HTTPException(status_code=422, detail="Manifesto do pacote base invalido.") from exc
+
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    export_dir = ensure_export_dir()
-    archive_path = export_dir / f"rotahub_migration_{timestamp}.zip"
-    backup_db = export_dir / f".rotadb_export_{timestamp}.db"
+    suffix = "_incremental" if base_manifest is not None else ""
+    archive_path = ensure_export_dir() / f"rotahub_migration_{timestamp}{suffix}.zip"
     photos_dir = Path(
         os.getenv("ROTA_MOBILE_PHOTOS_DIR", PROJECT_ROOT / ".rotahub_runtime" / "fotos_rotas")
     ).expanduser()
-    photos_count = 0
-
-    try:
-        sqlite_backup_copy(db_path, backup_db)
-        manifest = {
-            "format": "rotahub-migration-v1",
-            "created_at_utc": datetime.now(timezone.utc).isoformat(timespec="seconds"),
-            "database": {
-                "type": "sqlite",
-                "archive_path": "database/rotadb.db",
-                "source_name": db_path.name,
-                "size_bytes": backup_db.stat().st_size,
-            },
-            "photos": {
-                "archive_path": "fotos_rotas/",
-                "included": photos_dir.exists(),
-                "files": 0,
-            },
-            "restore": {
-                "rota_db": "/var/rotahub/data/rotadb.db",
-                "photos_dir": "/var/rotahub/data/fotos_rotas",
-            },
-        }
-        with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
-            archive.write(backup_db, "database/rotadb.db")
-            if photos_dir.exists():
-                for path in sorted(photos_dir.rglob("*")):
-                    if not path.is_file():
-                        continue
-                    archive.write(path, Path("fotos_rotas") / path.relative_to(photos_dir))
-                    photos_count += 1
-            manifest["photos"]["files"] = photos_count
-            archive.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
-    finally:
-        backup_db.unlink(missing_ok=True)
-
+    migration_package.build_package(
+        db_path,
+        photos_dir,
+        archive_path,
+        base=base_manifest,
+        base_name=Path(base).name,
+        vacuum=vacuum,
+        progress=progress,
+    )
     return archive_path
 
 
@@ -293,6 +371,87 @@ async def registrar_log(
     )
 
 
+def registrar_log_sqlite(db_path: Path, *, tipo_acao: str, descricao: str, usuario: str, status: str = "OK", resultado: str = "") -> None:
+    """registrar_log for job threads (no async session there); writes straight to sistema_logs."""
+    try:
+        with sqlite3.connect(str(db_path)) as conn:
+            conn.execute(
+                "INSERT INTO sistema_logs (tipo_acao, descricao, usuario, status, resultado_texto, executado_em) VALUES (?, ?, ?, ?, ?, ?)",
+                (tipo_acao, descricao, usuario, status, resultado, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            )
+    except sqlite3.Error:
+        pass
+
+
+@job_handler("backup")
+def job_criar_backup(progress: ProgressCallback, params: dict[str, Any]) -> tuple[dict[str, Any], str]:
+    target, timestamp = create_backup_file(progress)
+    info = backup_to_info(target)
+    registrar_log_sqlite(
+        sqlite_db_path(), tipo_acao="BACKUP", descricao=f"Backup criado: {info.arquivo}",
+        usuario=params.get("usuario", ""), resultado=info.caminho,
+    )
+    return {**info.model_dump(), "timestamp": timestamp}, str(target)
+
+
+@job_handler("migracao")
+def job_pacote_migracao(progress: ProgressCallback, params: dict[str, Any]) -> tuple[dict[str, Any], str]:
+    path = create_migration_package(progress, base=params.get("base", ""), vacuum=bool(params.get("vacuum")))
+    registrar_log_sqlite(
+        sqlite_db_path(), tipo_acao="EXPORTAR_MIGRACAO", descricao=f"Pacote de migracao criado: {path.name}",
+        usuario=params.get("usuario", ""), resultado=str(path),
+    )
+    return {"arquivo": path.name, "tamanho_kb": round(path.stat().st_size / 1024, 2), "base": params.get("base", "")}, str(path)
+
+
+@job_handler("restaurar")
+def job_restaurar_backup(progress: ProgressCallback, params: dict[str, Any]) -> tuple[dict[str, Any], None]:
+    src = backup_file_path(params.get("arquivo", ""))
+    db_path = sqlite_db_path()
+    progress(10, "Restaurando banco de dados")
+    auto_backup = restore_backup_file(src, db_path)
+    # the log goes to the restored database, so it survives the restore
+    registrar_log_sqlite(
+        db_path, tipo_acao="RESTAURACAO", descricao=f"Banco restaurado de: {src.name}",
+        usuario=params.get("usuario", ""), resultado="Restauracao executada em segundo plano.",
+    )
+    return {
+        "arquivo_restaurado": src.name,
+        "backup_anterior": str(auto_backup) if auto_backup.exists() else "",
+        "mensagem": "Backup restaurado. Reinicie o servidor para reabrir conexoes do banco.",
+    }, None
+
+
+@job_handler("integridade")
+def job_verificar_integridade(progress: ProgressCallback, params: dict[str, Any]) -> tuple[dict[str, Any], None]:
+    db_path = sqlite_db_path()
+    progress(5, "Verificando integridade")
+    try:
+        with sqlite3.connect(str(db_path)) as conn:
+            rows = [str(row[0]) for row in conn.execute("PRAGMA integrity_check").fetchall()]
+        integridade = "\n".join(rows)
+        ok = rows == ["ok"]
+    except sqlite3.Error as exc:
+        integridade = str(exc)
+        ok = False
+    registrar_log_sqlite(
+        db_path,
+        tipo_acao="VERIFICACAO",
+        descricao="Integridade do banco verificada" if ok else "Problemas encontrados na integridade",
+        usuario=params.get("usuario", ""),
+        status="OK" if ok else "AVISO",
+        resultado=integridade,
+    )
+    return {"ok": ok, "integridade": "OK" if ok else integridade, "verificado_em": datetime.now().isoformat(timespec="seconds")}, None
+
+
+def job_response(job: dict[str, Any]) -> JobResponse:
+    data = {key: job.get(key) for key in JobResponse.model_fields if key in job}
+    if job.get("status") == JOB_CONCLUIDO and job.get("artefato"):
+        data["download_url"] = f"/api/v1/system-tools/jobs/{job['id']}/download"
+    return JobResponse(**data)
+
+
 def username(current_user: User) -> str:
     return str(getattr(current_user, "nome", None) or getattr(current_user, "username", None) or "ADMIN")
 
@@ -306,6 +465,7 @@ def normalize_local_rota(value: Any) -> str:
     return text_value
 
 
+@schema_bootstrap
 async def ensure_diarias_config_table(db: AsyncSession) -> None:
     await db.execute(
         text(
@@ -486,18 +646,10 @@ async def criar_backup(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(require_admin_user),
 ):
-    db_path = sqlite_db_path()
-    if not db_path.exists():
-        raise HTTPException(status_code=404, detail="Banco de dados principal nao encontrado.")
-    assert_sqlite_file(db_path)
-
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    target = ensure_backup_dir() / f"banco_de_dados_{timestamp}.db"
     try:
-        try:
-            sqlite_backup_copy(db_path, target)
-        except Exception:
-            file_copy(db_path, target)
+        target, timestamp = await run_in_threadpool(create_backup_file)
+    except HTTPException:
+        raise
     except Exception as exc:
         await registrar_log(
             db,
@@ -562,11 +714,13 @@ async def baixar_backup(
 @router.get("/migration/export/download")
 async def baixar_pacote_migracao(
     request: Request,
+    base: str = "",
+    vacuum: bool = False,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(require_admin_user),
 ):
     try:
-        path = create_migration_package()
+        path = await run_in_threadpool(create_migration_package, None, base, vacuum)
     except HTTPException:
         raise
     except Exception as exc:
@@ -586,7 +740,7 @@ async def baixar_pacote_migracao(
         entity_type="migration_package",
         entity_id=path.name,
         ip_address=client_ip_from_request(request),
-        metadata={"tamanho_kb": round(path.stat().st_size / 1024, 2)},
+        metadata={"tamanho_kb": round(path.stat().st_size / 1024, 2), "base": base},
     )
     await db.commit()
     return FileResponse(
@@ -596,6 +750,13 @@ async def baixar_pacote_migracao(
     )
 
 
+@router.get("/migration/exports", response_model=list[MigrationPackageInfo])
+async def listar_pacotes_migracao(
+    current_user: User = Depends(require_admin_user),
+):
+    return await run_in_threadpool(list_migration_packages)
+
+
 @router.get("/installer/download")
 async def baixar_instalador(
     request: Request,
@@ -676,7 +837,7 @@ async def restaurar_backup_salvo(
         metadata={"origem": "backup_salvo"},
     )
     await db.commit()
-    auto_backup = restore_backup_file(src, db_path)
+    auto_backup = await run_in_threadpool(restore_backup_file, src, db_path)
     return RestoreResponse(
         arquivo_restaurado=src.name,
         backup_anterior=str(auto_backup) if auto_backup.exists() else "",
@@ -721,7 +882,7 @@ async def restaurar_backup_upload(
             metadata={"origem": "upload"},
         )
         await db.commit()
-        auto_backup = restore_backup_file(temp_path, sqlite_db_path())
+        auto_backup = await run_in_threadpool(restore_backup_file, temp_path, sqlite_db_path())
         return RestoreResponse(
             arquivo_restaurado=Path(file.filename).name,
             backup_anterior=str(auto_backup) if auto_backup.exists() else "",
@@ -735,19 +896,89 @@ async def restaurar_backup_upload(
             pass
 
 
+@router.post("/jobs", response_model=JobResponse, status_code=202)
+async def criar_job_sistema(
+    payload: JobCreatePayload,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(require_admin_user),
+):
+    tipo = str(payload.tipo or "").strip().lower()
+    params: dict[str, Any] = {"usuario": username(current_user)}
+    if tipo == "migracao":
+        if payload.base:
+            params["base"] = migration_base_path(payload.base).name
+        params["vacuum"] = bool(payload.vacuum)
+    if tipo == "restaurar":
+        if not payload.confirmar:
+            raise HTTPException(status_code=422, detail="Confirmacao obrigatoria para restaurar backup.")
+        params["arquivo"] = backup_file_path(payload.arquivo).name
+    if tipo in {"backup", "migracao", "restaurar"}:
+        db_path = sqlite_db_path()
+        if not db_path.exists():
+            raise HTTPException(status_code=404, detail="Banco de dados principal nao encontrado.")
+    try:
+        job = get_job_runner().submit(tipo, params, usuario=params["usuario"])
+    except KeyError as exc:
+        raise HTTPException(status_code=422, detail="Tipo de tarefa invalido. Use backup, migracao, restaurar ou integridade.") from exc
+    record_audit_log(
+        db,
+        action="system_job_enfileirado",
+        actor_user=current_user,
+        entity_type="system_job",
+        entity_id=job["id"],
+        severity="warning" if tipo == "restaurar" else "info",
+        ip_address=client_ip_from_request(request),
+        metadata={"tipo": tipo, "arquivo": params.get("arquivo", "")},
+    )
+    await db.commit()
+    return job_response(job)
+
+
+@router.get("/jobs", response_model=list[JobResponse])
+async def listar_jobs_sistema(
+    limit: int = 50,
+    current_user: User = Depends(require_admin_user),
+):
+    jobs = await run_in_threadpool(get_job_runner().store.list, max(min(int(limit), 200), 1))
+    return [job_response(job) for job in jobs]
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def obter_job_sistema(
+    job_id: str,
+    current_user: User = Depends(require_admin_user),
+):
+    job = await run_in_threadpool(get_job_runner().store.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Tarefa nao encontrada.")
+    return job_response(job)
+
+
+@router.get("/jobs/{job_id}/download")
+async def baixar_artefato_job(
+    job_id: str,
+    current_user: User = Depends(require_admin_user),
+):
+    job = await run_in_threadpool(get_job_runner().store.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Tarefa nao encontrada.")
+    if job["status"] != JOB_CONCLUIDO or not job.get("artefato"):
+        raise HTTPException(status_code=409, detail="Tarefa sem arquivo disponivel.")
+    path = Path(job["artefato"]).resolve()
+    if path.parent not in {BACKUP_DIR, EXPORT_DIR} or not path.is_file():
+        raise HTTPException(status_code=404, detail="Arquivo da tarefa nao encontrado.")
+    media_type = "application/zip" if path.suffix.lower() == ".zip" else "application/x-sqlite3"
+    return FileResponse(path, media_type=media_type, filename=path.name)
+
+
 @router.get("/vendas-importadas/export")
 async def exportar_vendas_importadas(
     current_user: User = Depends(require_admin_user),
     db: AsyncSession = Depends(get_db),
 ):
-    try:
-        from openpyxl import Workbook
-    except Exception as exc:  # pragma: no cover - optional package
-        raise HTTPException(status_code=503, detail="Biblioteca openpyxl indisponivel.") from exc
-
-    result = await db.execute(select(VendaImportadaDB).order_by(VendaImportadaDB.id.desc()))
-    rows = result.scalars().all()
-    if not rows:
+    existe = await db.execute(select(VendaImportadaDB.id).limit(1))
+    if existe.scalar() is None:
         raise HTTPException(status_code=404, detail="Nao ha vendas importadas para exportar.")
 
     fields = [
@@ -768,25 +999,11 @@ async def exportar_vendas_importadas(
         "usada_em",
         "codigo_programacao",
     ]
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "VENDAS_IMPORTADAS"
-    ws.append(fields)
-    for item in rows:
-        ws.append([getattr(item, field, None) for field in fields])
-    for column_cells in ws.columns:
-        letter = column_cells[0].column_letter
-        max_len = max(len(str(cell.value or "")) for cell in column_cells)
-        ws.column_dimensions[letter].width = min(max(max_len + 2, 12), 46)
-
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
+    statement = select(*[getattr(VendaImportadaDB, field) for field in fields]).order_by(VendaImportadaDB.id.desc())
     filename = f"VENDAS_IMPORTADAS_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    return await xlsx_response(
+        [ExcelSheet("VENDAS_IMPORTADAS", fields, stream_select_rows(db, statement))],
+        filename,
     )
 
 
@@ -2,15 +2,20 @@
 """
 Database configuration and connection management
 """
+import functools
 import logging
 import tempfile
 from pathlib import Path
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Awaitable, Callable, Dict, Hashable
 from sqlalchemy import event
 from sqlalchemy import inspect, text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase, Session, with_loader_criteria
+from app.db.schema_state import database_identity, mark_schema_ready, schema_ready
 from backend.config.settings import settings
+from backend.services.catalog_version import ensure_catalog_version_schema
+from backend.services.programacao_data_ref import backfill_data_ref_iso, ensure_data_ref_schema
+from backend.services.vendas_row_key import ensure_row_key_schema
 
 logger = logging.getLogger(__name__)
 
@@ -106,6 +111,62 @@ def _assign_tenant_on_new_objects(session, flush_context, instances):
             setattr(obj, "company_id", int(company_id))
 
 
+_PENDING_SCHEMA_KEY = "pending_schema_bootstraps"
+_SCHEMA_BOOTSTRAPS: Dict[str, Callable[[AsyncSession], Awaitable[None]]] = {}
+
+
+def _session_db_identity(db: AsyncSession) -> Hashable:
+    url = db.get_bind().url
+    if url.get_backend_name() == "sqlite":
+        return database_identity(url.database)
+    return url.render_as_string(hide_password=True)
+
+
+def schema_bootstrap(func: Callable[[AsyncSession], Awaitable[None]]):
+    """
+    Run an endpoint's ensure_* schema helper once per database per process.
+
+    The DDL runs at startup (run_schema_bootstraps) or on the first call; the database
+    is marked ready only after the session commits, so a rolled-back request retries.
+    """
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    async def wrapper(db: AsyncSession) -> None:
+        identity = _session_db_identity(db)
+        if schema_ready(name, identity):
+            return
+        await func(db)
+        db.sync_session.info.setdefault(_PENDING_SCHEMA_KEY, set()).add((name, identity))
+
+    _SCHEMA_BOOTSTRAPS[name] = func
+    return wrapper
+
+
+@event.listens_for(AsyncSession.sync_session_class, "after_commit")
+def _mark_schema_bootstraps(session):
+    for name, identity in session.info.pop(_PENDING_SCHEMA_KEY, ()):
+        mark_schema_ready(name, identity)
+
+
+@event.listens_for(AsyncSession.sync_session_class, "after_rollback")
+def _discard_schema_bootstraps(session):
+    session.info.pop(_PENDING_SCHEMA_KEY, None)
+
+
+async def run_schema_bootstraps() -> int:
+    """Apply every registered ensure_* helper in one transaction (application startup)."""
+    async with async_session() as session:
+        identity = _session_db_identity(session)
+        pending = [(name, func) for name, func in _SCHEMA_BOOTSTRAPS.items() if not schema_ready(name, identity)]
+        for _name, func in pending:
+            await func(session)
+        await session.commit()
+    for name, _func in pending:
+        mark_schema_ready(name, identity)
+    return len(pending)
+
+
 def _ensure_backend_columns(sync_conn):
     inspector = inspect(sync_conn)
     table_names = set(inspector.get_table_names())
@@ -555,6 +616,7 @@ def _ensure_backend_columns(sync_conn):
             sync_conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS idx_backend_produtos_codigo ON produtos(codigo)"))
             sync_conn.execute(text("CREATE INDEX IF NOT EXISTS idx_backend_produtos_nome ON produtos(nome)"))
             sync_conn.execute(text("CREATE INDEX IF NOT EXISTS idx_backend_produtos_status ON produtos(status)"))
+            ensure_catalog_version_schema(sync_conn)
 
     if "usuarios" in table_names:
         columns = {column["name"] for column in inspector.get_columns("usuarios")}
@@ -764,6 +826,9 @@ def _ensure_backend_columns(sync_conn):
             "nf_kg_carregado": "REAL DEFAULT 0",
             "nf_kg_vendido": "REAL DEFAULT 0",
             "nf_saldo": "REAL DEFAULT 0",
+            "data_ref_iso": "TEXT",
+            "relatorio_data_ref_iso": "TEXT",
+            "company_id": "INTEGER",
         },
     )
     if "programacoes" in table_names:
@@ -913,6 +978,9 @@ def _ensure_backend_columns(sync_conn):
                 """
             )
         )
+        # after the date normalization above, so the backfill sees the final dates
+        ensure_data_ref_schema(sync_conn)
+        backfill_data_ref_iso(sync_conn)
 
     add_missing_columns(
         "programacao_itens",
@@ -1180,11 +1248,13 @@ def _ensure_backend_columns(sync_conn):
             "usada": "INTEGER DEFAULT 0",
             "usada_em": "TEXT",
             "codigo_programacao": "TEXT",
+            "row_key": "TEXT",
         },
     )
     if "vendas_importadas" in table_names:
         sync_conn.execute(text("CREATE INDEX IF NOT EXISTS idx_backend_vendas_importadas_livre ON vendas_importadas(usada, codigo_programacao)"))
         sync_conn.execute(text("CREATE INDEX IF NOT EXISTS idx_backend_vendas_importadas_chave ON vendas_importadas(pedido, cliente, produto, data_venda)"))
+        ensure_row_key_schema(sync_conn)
 
     add_missing_columns(
         "rota_gps_pings",
@@ -97,6 +97,15 @@ class Settings(BaseSettings):
     # Rate Limiting
     RATE_LIMIT_REQUESTS: int = int(os.getenv("RATE_LIMIT_REQUESTS", "100"))
     RATE_LIMIT_WINDOW: int = int(os.getenv("RATE_LIMIT_WINDOW", "60"))  # seconds
+    RATE_LIMIT_TENANT_REQUESTS: int = int(os.getenv("RATE_LIMIT_TENANT_REQUESTS", "0"))  # 0 = off
+    RATE_LIMIT_GROUPS: str = os.getenv("RATE_LIMIT_GROUPS", "")  # "/api/v1/auth=20/60,/prefix=limit/window/tenant"
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory | sqlite
+    RATE_LIMIT_SQLITE_PATH: str = os.getenv("RATE_LIMIT_SQLITE_PATH", "")
+    RATE_LIMIT_MAX_KEYS: int = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+    # Background jobs (backups, migration package, restore, integrity check)
+    JOBS_SQLITE_PATH: str = os.getenv("JOBS_SQLITE_PATH", "")
+    JOBS_MAX_WORKERS: int = int(os.getenv("JOBS_MAX_WORKERS", "1"))
 
     # File Upload
     MAX_UPLOAD_SIZE: int = int(os.getenv("MAX_UPLOAD_SIZE", "10485760"))  # 10MB
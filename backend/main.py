@@ -30,20 +30,23 @@ PUBLIC_WEB_DIR = PROJECT_ROOT / "backend" / "web_public"
 ASSETS_DIR = PROJECT_ROOT / "assets"
 
 from backend.config.database import create_tables
-from backend.config.database import async_session
+from backend.config.database import async_session, run_schema_bootstraps
 from backend.config.settings import settings
 from backend.middleware.tenant import TenantMiddleware
 from backend.middleware.rate_limit import RateLimitMiddleware
 from backend.middleware.logging import LoggingMiddleware
+from backend.middleware.security_headers import SecurityHeadersMiddleware
 from backend.api.v1.api import api_router
 from backend.models.user import UserDB
 from backend.services.auth import get_password_hash
+from backend.services.jobs import shutdown_job_runner
 from app.db.connection import configure_connection
 from app.middleware.feature_middleware import FeatureGateMiddleware
 from app.middleware.billing_middleware import BillingProtectionMiddleware
 from app.repositories.base_repository import ensure_saas_ready, get_db as get_saas_db
 from app.repositories import company_repository, subscription_repository
 from app.services import feature_service
+from app.services.entitlement_cache import EntitlementCache
 
 # Configure logging
 logging.basicConfig(
@@ -184,17 +187,7 @@ async def _ensure_owner_admin_user() -> None:
         )
 
 
-def _can_use_plan_feature(company_id: int, feature_name: str) -> bool:
-    _configure_feature_db()
-    result = feature_service.can_use_feature(company_id, feature_name)
-    data = result.get("data") or {}
-    return bool(result.get("ok") and data.get("allowed"))
-
-
-def _billing_context(company_id: int) -> dict:
-    _configure_feature_db()
-    company = company_repository.get_company(company_id) or {}
-    subscription = subscription_repository.get_active_subscription(company_id) or {}
+def _billing_status(company: dict, subscription: dict) -> dict:
     subscription_status = subscription.get("status")
     next_due_date = subscription.get("next_due_date")
     if subscription_status == "trialing" and next_due_date:
@@ -209,6 +202,19 @@ def _billing_context(company_id: int) -> dict:
     }
 
 
+def _load_entitlements(company_id: int) -> dict:
+    """Features do plano + status de cobranca numa unica leitura (loader do ENTITLEMENTS)."""
+    _configure_feature_db()
+    company = company_repository.get_company(company_id) or {}
+    subscription = subscription_repository.get_active_subscription(company_id) or {}
+    out = _billing_status(company, subscription)
+    out["features"] = feature_service.decode_features(subscription.get("plan_features_json"))
+    return out
+
+
+ENTITLEMENTS = EntitlementCache(_load_entitlements)
+
+
 LEGACY_MOBILE_APP = None
 LEGACY_MOBILE_ENSURE_TABLES = None
 _legacy_default = "1" if os.getenv("ROTA_SECRET") and not os.getenv("DATABASE_URL") else "0"
@@ -231,17 +237,20 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting RotaHub SaaS API...")
     await create_tables()
-    await _ensure_saas_baseline()
-    await _ensure_owner_admin_user()
-    logger.info("Database tables created/verified")
     if LEGACY_MOBILE_ENSURE_TABLES is not None:
         LEGACY_MOBILE_ENSURE_TABLES()
         logger.info("Legacy mobile API tables created/verified")
+    # Schema bootstrap runs once here; per-request ensure_* calls only check an in-memory flag
+    await _ensure_saas_baseline()
+    await run_schema_bootstraps()
+    await _ensure_owner_admin_user()
+    logger.info("Database tables created/verified")
 
     yield
 
     # Shutdown
     logger.info("Shutting down RotaHub SaaS API...")
+    shutdown_job_runner()
 
 # Create FastAPI app
 app = FastAPI(
@@ -259,12 +268,12 @@ if _env_truthy("ROTA_ENFORCE_PLAN_FEATURES", "1"):
     app.add_middleware(
         FeatureGateMiddleware,
         endpoint_features=PLAN_FEATURE_ENDPOINTS,
-        can_use_feature=_can_use_plan_feature,
+        entitlements=ENTITLEMENTS,
     )
 if _env_truthy("ROTA_ENFORCE_BILLING", "1"):
     app.add_middleware(
         BillingProtectionMiddleware,
-        get_billing_context=_billing_context,
+        entitlements=ENTITLEMENTS,
     )
 app.add_middleware(TenantMiddleware)
 app.add_middleware(RateLimitMiddleware)
@@ -280,14 +289,7 @@ app.add_middleware(
 )
 
 
-@app.middleware("http")
-async def security_headers(request: Request, call_next):
-    response = await call_next(request)
-    response.headers.setdefault("X-Content-Type-Options", "nosniff")
-    response.headers.setdefault("X-Frame-Options", "DENY")
-    response.headers.setdefault("Referrer-Policy", "strict-origin-when-cross-origin")
-    response.headers.setdefault("Permissions-Policy", "camera=(), microphone=(), geolocation=()")
-    return response
+app.add_middleware(SecurityHeadersMiddleware)
 
 # Global exception handler
 @app.exception_handler(Exception)
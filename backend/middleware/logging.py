@@ -4,35 +4,53 @@ Logging middleware for request/response logging
 """
 import time
 import logging
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 logger = logging.getLogger(__name__)
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    """Middleware to log HTTP requests and responses"""
+class LoggingMiddleware:
+    """Middleware to log HTTP requests and responses (pure ASGI, body is streamed through)"""
 
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
+    def __init__(self, app: ASGIApp):
+        self.app = app
 
-        # Log request
-        logger.info(
-            f"Request: {request.method} {request.url} "
-            f"Client: {request.client.host if request.client else 'unknown'} "
-            f"Tenant: {getattr(request.state, 'tenant_id', 'unknown')}"
-        )
-
-        response = await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        # Calculate processing time
-        process_time = time.time() - start_time
+        start_time = time.perf_counter()
+        request = Request(scope)
+        client_host = request.client.host if request.client else "unknown"
 
-        # Log response
-        logger.info(
-            f"Response: {response.status_code} "
-            f"Time: {process_time:.3f}s "
-            f"URL: {request.url}"
-        )
-
-        return response
\ No newline at end of file
+        # Log request
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "Request: %s %s Client: %s Tenant: %s",
+                request.method,
+                request.url,
+                client_host,
+                getattr(request.state, "tenant_id", "unknown"),
+            )
+
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Log response
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(
+                    "Response: %s Time: %.3fs URL: %s",
+                    status_code,
+                    time.perf_counter() - start_time,
+                    request.url,
+                )
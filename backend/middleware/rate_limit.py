@@ -1,51 +1,244 @@
 # backend/middleware/rate_limit.py
 """
-Rate limiting middleware
+Rate limiting middleware (GCRA)
+
+Each key keeps a single "theoretical arrival time" (TAT), so a check is O(1)
+and state is one float per key. Keys are limited per client IP and, when the
+request carries a token with company_id, per tenant; limits can be overridden
+per route group (path prefix). State lives in a pluggable backend: in-process
+LRU (default) or a SQLite file shared by every uvicorn worker on the host.
+
+The IP and tenant keys of a request are checked together and spent only when
+both allow it. Backends that block on I/O run off the event loop.
 """
-import time
+import abc
 import logging
-from collections import defaultdict
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence, Tuple
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.middleware.request_auth import auth_payload, safe_int
 from backend.config.settings import settings
 
 logger = logging.getLogger(__name__)
 
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Simple in-memory rate limiting middleware"""
+@dataclass(frozen=True)
+class RateLimitRule:
+    """Limit for a route group: `limit` requests per `window` seconds per IP (and per tenant)."""
+
+    prefix: str
+    limit: int
+    window: float
+    tenant_limit: int = 0
+
+    @property
+    def group(self) -> str:
+        return self.prefix or "*"
+
+
+def parse_rate_limit_groups(raw: str, default_window: float) -> List[RateLimitRule]:
+    """Parses "prefix=limit/window[/tenant_limit],..." (e.g. "/api/v1/auth=20/60,/api/v1/relatorios=30/60/120")."""
+    rules: List[RateLimitRule] = []
+    for item in str(raw or "").split(","):
+        prefix, sep, spec = item.strip().partition("=")
+        if not sep or not prefix.strip():
+            continue
+        parts = [p.strip() for p in spec.split("/")]
+        try:
+            limit = int(parts[0])
+            window = float(parts[1]) if len(parts) > 1 and parts[1] else float(default_window)
+            tenant_limit = int(parts[2]) if len(parts) > 2 and parts[2] else 0
+        except ValueError:
+            logger.warning("Ignoring invalid RATE_LIMIT_GROUPS entry: %s", item)
+            continue
+        rules.append(RateLimitRule(prefix.strip(), limit, window, tenant_limit))
+    return rules
+
+
+class RateLimitBackend(abc.ABC):
+    """Storage for GCRA state. Hits return (allowed, retry_after_seconds)."""
+
+    # True when hits block on I/O: the middleware then runs them in the threadpool
+    blocking = False
+
+    @abc.abstractmethod
+    def hit_many(self, keys: Sequence[Tuple[str, int]], window: float, now: float) -> Tuple[bool, float]:
+        """Checks every (key, limit) and spends all of them only when all allow the request."""
+
+    def hit(self, key: str, limit: int, window: float, now: float) -> Tuple[bool, float]:
+        return self.hit_many([(key, limit)], window, now)
+
+    def close(self) -> None:
+        pass
+
+
+def _gcra_many(
+    tats: Sequence[Optional[float]], keys: Sequence[Tuple[str, int]], window: float, now: float
+) -> Tuple[bool, List[float], float]:
+    """GCRA over several keys: (allowed, new_tats, retry_after), the longest wait among denied keys."""
+    results = [_gcra(tat, limit, window, now) for tat, (_key, limit) in zip(tats, keys)]
+    retry_after = max((retry for allowed, _tat, retry in results if not allowed), default=0.0)
+    return all(allowed for allowed, _tat, _retry in results), [tat for _allowed, tat, _retry in results], retry_after
+
+
+def _gcra(tat: Optional[float], limit: int, window: float, now: float) -> Tuple[bool, float, float]:
+    """Returns (allowed, new_tat, retry_after); allows bursts of up to `limit` requests."""
+    interval = float(window) / max(1, int(limit))
+    new_tat = max(tat or now, now) + interval
+    allow_at = new_tat - float(window)
+    if allow_at > now:
+        return False, tat if tat is not None else now, allow_at - now
+    return True, new_tat, 0.0
 
-    def __init__(self, app):
-        super().__init__(app)
-        self.requests = defaultdict(list)
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Per-process state with LRU eviction of idle keys (bounded by max_keys)."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max(1, int(max_keys))
+        self._tats: "OrderedDict[str, float]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._tats)
+
+    def hit_many(self, keys: Sequence[Tuple[str, int]], window: float, now: float) -> Tuple[bool, float]:
+        allowed, new_tats, retry_after = _gcra_many([self._tats.get(key) for key, _limit in keys], keys, window, now)
+        for (key, _limit), new_tat in zip(keys, new_tats):
+            if allowed:
+                self._tats[key] = new_tat
+            if key in self._tats:
+                self._tats.move_to_end(key)
+        while len(self._tats) > self.max_keys:
+            self._tats.popitem(last=False)
+        return allowed, retry_after
+
+
+class SQLiteRateLimitBackend(RateLimitBackend):
+    """State in a local SQLite file (WAL), shared by every worker process on the host."""
+
+    PRUNE_EVERY = 1000
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_state (key TEXT PRIMARY KEY, tat REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._lock = threading.Lock()
+        self._hits = 0
+
+    def hit_many(self, keys: Sequence[Tuple[str, int]], window: float, now: float) -> Tuple[bool, float]:
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                tats = []
+                for key, _limit in keys:
+                    row = cur.execute("SELECT tat FROM rate_limit_state WHERE key=?", (key,)).fetchone()
+                    tats.append(row[0] if row else None)
+                allowed, new_tats, retry_after = _gcra_many(tats, keys, window, now)
+                if allowed:
+                    cur.executemany(
+                        "INSERT INTO rate_limit_state (key, tat) VALUES (?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET tat=excluded.tat",
+                        [(key, new_tat) for (key, _limit), new_tat in zip(keys, new_tats)],
+                    )
+                self._hits += 1
+                if self._hits % self.PRUNE_EVERY == 0:
+                    # a TAT in the past is equivalent to no history
+                    cur.execute("DELETE FROM rate_limit_state WHERE tat < ?", (now,))
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return allowed, retry_after
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def build_rate_limit_backend() -> RateLimitBackend:
+    kind = str(settings.RATE_LIMIT_BACKEND or "memory").strip().lower()
+    if kind == "sqlite":
+        path = settings.RATE_LIMIT_SQLITE_PATH or os.path.join(".rotahub_runtime", "rate_limit.db")
+        return SQLiteRateLimitBackend(path)
+    return MemoryRateLimitBackend(settings.RATE_LIMIT_MAX_KEYS)
+
+
+class RateLimitMiddleware:
+    """Rate limiting per IP and per tenant, with per-route-group limits"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        backend: Optional[RateLimitBackend] = None,
+        rules: Optional[Iterable[RateLimitRule]] = None,
+    ):
+        self.app = app
         self.max_requests = settings.RATE_LIMIT_REQUESTS
         self.window_seconds = settings.RATE_LIMIT_WINDOW
+        self.backend = backend if backend is not None else build_rate_limit_backend()
+        self.default_rule = RateLimitRule("", self.max_requests, self.window_seconds, settings.RATE_LIMIT_TENANT_REQUESTS)
+        if rules is None:
+            rules = parse_rate_limit_groups(settings.RATE_LIMIT_GROUPS, self.window_seconds)
+        # longest prefix wins
+        self.rules = sorted(rules, key=lambda rule: len(rule.prefix), reverse=True)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        rule = self._rule_for(scope.get("path") or "")
+        now = time.time()
+        keys = [(f"{rule.group}|ip|{self._get_client_ip(request)}", rule.limit)]
+        if rule.tenant_limit > 0:
+            payload = auth_payload(request)
+            company_id = safe_int(payload.get("company_id")) if payload else None
+            if company_id:
+                keys.append((f"{rule.group}|co|{company_id}", rule.tenant_limit))
 
-    async def dispatch(self, request: Request, call_next):
-        # Get client IP
-        client_ip = self._get_client_ip(request)
-
-        # Clean old requests
-        current_time = time.time()
-        self.requests[client_ip] = [
-            req_time for req_time in self.requests[client_ip]
-            if current_time - req_time < self.window_seconds
-        ]
-
-        # Check rate limit
-        if len(self.requests[client_ip]) >= self.max_requests:
-            logger.warning(f"Rate limit exceeded for IP: {client_ip}")
-            return JSONResponse(
+        try:
+            if self.backend.blocking:
+                allowed, retry_after = await run_in_threadpool(self.backend.hit_many, keys, rule.window, now)
+            else:
+                allowed, retry_after = self.backend.hit_many(keys, rule.window, now)
+        except Exception:
+            logger.exception("Rate limit backend failure; allowing request")
+            allowed, retry_after = True, 0.0
+        if not allowed:
+            logger.warning("Rate limit exceeded for %s", ", ".join(key for key, _limit in keys))
+            response = JSONResponse(
                 status_code=429,
-                content={"detail": "Too many requests. Please try again later."}
+                content={"detail": "Too many requests. Please try again later."},
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
             )
+            await response(scope, receive, send)
+            return
 
-        # Add current request
-        self.requests[client_ip].append(current_time)
+        await self.app(scope, receive, send)
 
-        response = await call_next(request)
-        return response
+    def _rule_for(self, path: str) -> RateLimitRule:
+        for rule in self.rules:
+            if path.startswith(rule.prefix):
+                return rule
+        return self.default_rule
 
     def _get_client_ip(self, request: Request) -> str:
         """Get client IP address"""
@@ -60,4 +253,4 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
             return x_real_ip
 
         # Fallback to client host
-        return request.client.host if request.client else "unknown"
\ No newline at end of file
+        return request.client.host if request.client else "unknown"
@@ -4,12 +4,10 @@ Tenant middleware for multi-tenant SaaS support
 """
 import logging
 from typing import Optional
-from fastapi import Request, HTTPException
-from jose import JWTError, jwt
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import JSONResponse
+from starlette.requests import Request
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-from backend.config.settings import settings
+from app.middleware.request_auth import auth_payload
 
 logger = logging.getLogger(__name__)
 
@@ -36,20 +34,27 @@ class TenantContext:
 tenant_context = TenantContext()
 
 
-class TenantMiddleware(BaseHTTPMiddleware):
+class TenantMiddleware:
     """Middleware to handle tenant context from request headers"""
 
-    async def dispatch(self, request: Request, call_next):
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
         # Extract tenant from header (e.g., X-Tenant-ID)
         tenant_header = request.headers.get("X-Tenant-ID")
         company_id = 1
-        auth_header = request.headers.get("Authorization", "")
-        if auth_header.lower().startswith("bearer "):
-            token = auth_header.split(" ", 1)[1].strip()
+        # decodifica o JWT uma vez; billing/feature gate reutilizam request.state.auth_payloads
+        payload = auth_payload(request)
+        if payload:
             try:
-                payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
                 company_id = int(payload.get("company_id") or 1)
-            except (JWTError, ValueError, TypeError):
+            except (ValueError, TypeError):
                 company_id = 1
 
         if tenant_header:
@@ -73,9 +78,8 @@ class TenantMiddleware(BaseHTTPMiddleware):
         request.state.company_id = tenant_context.company_id
         request.state.plan_code = tenant_context.plan_code
 
-        response = await call_next(request)
-
-        # Clear context after request
-        tenant_context.clear()
-
-        return response
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # Clear context after request
+            tenant_context.clear()
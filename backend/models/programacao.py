@@ -5,9 +5,15 @@ Operational programacao models.
 The column names mirror the desktop SQLite schema so the browser flow can share
 the same operational vocabulary used by ProgramacaoPage in main.py.
 """
-from sqlalchemy import Column, Float, Integer, String
+from sqlalchemy import Column, Float, Index, Integer, String, event
 
 from backend.config.database import Base
+from backend.services.programacao_data_ref import (
+    COMPANY_INDEX,
+    RELATORIO_COMPANY_INDEX,
+    data_ref_iso_of,
+    relatorio_data_ref_iso_of,
+)
 
 
 class ProgramacaoDB(Base):
@@ -110,8 +116,24 @@ class ProgramacaoDB(Base):
     nf_kg_carregado = Column(Float, default=0)
     nf_kg_vendido = Column(Float, default=0)
     nf_saldo = Column(Float, default=0)
+    # data_saida/data_criacao/data as YYYY-MM-DD, kept for SQL-side period filters
+    data_ref_iso = Column(String)
+    # same, with the report precedence (data_criacao/data/data_saida)
+    relatorio_data_ref_iso = Column(String)
     company_id = Column(Integer)
 
+    __table_args__ = (
+        Index(COMPANY_INDEX, "company_id", "data_ref_iso"),
+        Index(RELATORIO_COMPANY_INDEX, "company_id", "relatorio_data_ref_iso"),
+    )
+
+
+@event.listens_for(ProgramacaoDB, "before_insert")
+@event.listens_for(ProgramacaoDB, "before_update")
+def _sync_data_ref_iso(_mapper, _connection, target: ProgramacaoDB) -> None:
+    target.data_ref_iso = data_ref_iso_of(target)
+    target.relatorio_data_ref_iso = relatorio_data_ref_iso_of(target)
+
 
 class ProgramacaoItemDB(Base):
     __tablename__ = "programacao_itens"
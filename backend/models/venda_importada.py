@@ -5,9 +5,10 @@ Imported sales model used by the Importar Vendas browser flow.
 The columns follow the desktop table ``vendas_importadas`` so sales can move
 from import, to selection, to a linked programacao without changing vocabulary.
 """
-from sqlalchemy import Column, Float, Integer, String
+from sqlalchemy import Column, Float, Index, Integer, String
 
 from backend.config.database import Base
+from backend.services.vendas_row_key import ROW_KEY_INDEX
 
 
 class VendaImportadaDB(Base):
@@ -31,4 +32,7 @@ class VendaImportadaDB(Base):
     usada = Column(Integer, default=0)
     usada_em = Column(String)
     codigo_programacao = Column(String, index=True)
+    row_key = Column(String)
     company_id = Column(Integer)
+
+    __table_args__ = (Index(ROW_KEY_INDEX, "company_id", "row_key", unique=True),)
@@ -0,0 +1,56 @@
+# backend/services/catalog_version.py
+"""
+Version stamp of the produtos catalog.
+
+SQLite triggers bump ``catalog_versions.version`` on every insert, update or
+delete on ``produtos`` - whichever API writes - so in-process caches of the
+catalog (backend/services/produto_resolver.py) can tell whether they are
+stale with a single read. Other dialects have no stamp and callers reload.
+"""
+from __future__ import annotations
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+VERSION_TABLE = "catalog_versions"
+CATALOG_NAME = "produtos"
+VERSION_TRIGGERS = {
+    "trg_produtos_catalog_version_ai": "AFTER INSERT",
+    "trg_produtos_catalog_version_au": "AFTER UPDATE",
+    "trg_produtos_catalog_version_ad": "AFTER DELETE",
+}
+
+
+def ensure_catalog_version_schema(conn: Connection) -> None:
+    if conn.dialect.name != "sqlite":
+        return
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (name TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)"))
+    conn.execute(text(f"INSERT OR IGNORE INTO {VERSION_TABLE} (name, version) VALUES ('{CATALOG_NAME}', 0)"))
+    for name, timing in VERSION_TRIGGERS.items():
+        conn.execute(
+            text(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {name} {timing} ON produtos
+                BEGIN
+                    UPDATE {VERSION_TABLE} SET version = version + 1 WHERE name = '{CATALOG_NAME}';
+                END
+                """
+            )
+        )
+
+
+async def catalog_version(db: AsyncSession) -> int | None:
+    """Current stamp, or None when the database has none (other dialects, schema not bootstrapped)."""
+    if db.get_bind().dialect.name != "sqlite":
+        return None
+    result = await db.execute(
+        text(
+            f"""
+            SELECT (SELECT version FROM {VERSION_TABLE} WHERE name = :name)
+             WHERE EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :table)
+            """
+        ),
+        {"name": CATALOG_NAME, "table": VERSION_TABLE},
+    )
+    return result.scalar_one_or_none()
@@ -0,0 +1,238 @@
+# backend/services/jobs.py
+"""
+Background jobs for long admin operations (backups, migration package,
+restore, integrity check).
+
+Jobs are persisted in a small SQLite file of their own (a restore replaces the
+main database, so job state cannot live there) and executed by a thread pool.
+Handlers are plain sync functions registered per job type; they receive a
+`progress(percent, message)` callback and return a JSON-able result plus an
+optional artifact path that can be downloaded once the job is done.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from backend.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+JOB_PENDENTE = "PENDENTE"
+JOB_EXECUTANDO = "EXECUTANDO"
+JOB_CONCLUIDO = "CONCLUIDO"
+JOB_ERRO = "ERRO"
+
+ProgressCallback = Callable[[float, str], None]
+# handler(progress, params) -> (result, artifact_path)
+JobHandler = Callable[[ProgressCallback, Dict[str, Any]], Tuple[Dict[str, Any], Optional[str]]]
+
+JOB_HANDLERS: Dict[str, JobHandler] = {}
+
+
+def job_handler(tipo: str) -> Callable[[JobHandler], JobHandler]:
+    """Registers the function that runs jobs of type `tipo`."""
+
+    def decorator(func: JobHandler) -> JobHandler:
+        JOB_HANDLERS[tipo] = func
+        return func
+
+    return decorator
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _process_alive(pid: Any) -> bool:
+    try:
+        pid = int(pid or 0)
+    except (TypeError, ValueError):
+        return False
+    if pid <= 0 or pid == os.getpid():
+        # our own pid on a fresh runner means a previous process reused it
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class JobStore:
+    """Job rows in a local SQLite file (WAL); safe to share between threads."""
+
+    COLUMNS = (
+        "id", "tipo", "status", "progresso", "mensagem", "parametros", "resultado", "artefato",
+        "usuario", "processo", "criado_em", "iniciado_em", "concluido_em",
+    )
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS system_jobs (
+                id TEXT PRIMARY KEY,
+                tipo TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progresso REAL DEFAULT 0,
+                mensagem TEXT DEFAULT '',
+                parametros TEXT DEFAULT '{}',
+                resultado TEXT,
+                artefato TEXT,
+                usuario TEXT DEFAULT '',
+                processo INTEGER,
+                criado_em TEXT,
+                iniciado_em TEXT,
+                concluido_em TEXT
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_system_jobs_criado_em ON system_jobs(criado_em)")
+        self._lock = threading.Lock()
+
+    def _row(self, row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        data = {key: row[key] for key in self.COLUMNS}
+        for key, default in (("parametros", {}), ("resultado", None)):
+            try:
+                data[key] = json.loads(data[key]) if data[key] else default
+            except ValueError:
+                data[key] = default
+        return data
+
+    def create(self, tipo: str, parametros: Dict[str, Any], usuario: str = "") -> Dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO system_jobs (id, tipo, status, progresso, mensagem, parametros, usuario, processo, criado_em) "
+                "VALUES (?, ?, ?, 0, 'Na fila', ?, ?, ?, ?)",
+                (job_id, tipo, JOB_PENDENTE, json.dumps(parametros or {}, ensure_ascii=False), usuario, os.getpid(), _now()),
+            )
+        return self.get(job_id) or {}
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        if "resultado" in fields:
+            fields["resultado"] = json.dumps(fields["resultado"], ensure_ascii=False, default=str)
+        sets = ", ".join(f"{key}=?" for key in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE system_jobs SET {sets} WHERE id=?", (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM system_jobs WHERE id=?", (job_id,)).fetchone()
+        return self._row(row)
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM system_jobs ORDER BY criado_em DESC, rowid DESC LIMIT ?", (max(1, int(limit)),)
+            ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def fail_interrupted(self) -> int:
+        """Jobs left pending/running by a process that no longer exists can never finish."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, processo FROM system_jobs WHERE status IN (?, ?)", (JOB_PENDENTE, JOB_EXECUTANDO)
+            ).fetchall()
+            orphans = [row["id"] for row in rows if not _process_alive(row["processo"])]
+            self._conn.executemany(
+                "UPDATE system_jobs SET status=?, mensagem='Interrompido: servidor reiniciado', concluido_em=? WHERE id=?",
+                [(JOB_ERRO, _now(), job_id) for job_id in orphans],
+            )
+        return len(orphans)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class JobRunner:
+    """Runs registered job handlers in a thread pool and records their state in a JobStore."""
+
+    # minimum interval between progress writes (the final state is always written)
+    PROGRESS_INTERVAL = 0.5
+
+    def __init__(self, store: JobStore, max_workers: int = 1):
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="rota-job")
+
+    def submit(self, tipo: str, parametros: Optional[Dict[str, Any]] = None, usuario: str = "") -> Dict[str, Any]:
+        handler = JOB_HANDLERS.get(tipo)
+        if handler is None:
+            raise KeyError(tipo)
+        job = self.store.create(tipo, parametros or {}, usuario)
+        self._executor.submit(self._run, job["id"], handler, dict(parametros or {}))
+        return job
+
+    def _run(self, job_id: str, handler: JobHandler, parametros: Dict[str, Any]) -> None:
+        self.store.update(job_id, status=JOB_EXECUTANDO, mensagem="Em execucao", iniciado_em=_now())
+        last = [0.0]
+
+        def progress(percent: float, mensagem: str = "") -> None:
+            now = time.monotonic()
+            if now - last[0] < self.PROGRESS_INTERVAL:
+                return
+            last[0] = now
+            self.store.update(job_id, progresso=round(max(0.0, min(float(percent), 99.0)), 1), mensagem=mensagem or "Em execucao")
+
+        try:
+            resultado, artefato = handler(progress, parametros)
+        except Exception as exc:
+            detail = getattr(exc, "detail", None) or str(exc) or exc.__class__.__name__
+            logger.exception("Job %s failed", job_id)
+            self.store.update(job_id, status=JOB_ERRO, mensagem=str(detail), concluido_em=_now())
+            return
+        self.store.update(
+            job_id,
+            status=JOB_CONCLUIDO,
+            progresso=100,
+            mensagem="Concluido",
+            resultado=resultado,
+            artefato=artefato,
+            concluido_em=_now(),
+        )
+
+    def shutdown(self, wait: bool = False) -> None:
+        # queued jobs are dropped (marked failed on next start); a running one finishes on its own
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_RUNNER: Optional[JobRunner] = None
+_RUNNER_LOCK = threading.Lock()
+
+
+def get_job_runner() -> JobRunner:
+    global _RUNNER
+    if _RUNNER is None:
+        with _RUNNER_LOCK:
+            if _RUNNER is None:
+                path = settings.JOBS_SQLITE_PATH or os.path.join(".rotahub_runtime", "jobs.db")
+                store = JobStore(path)
+                interrupted = store.fail_interrupted()
+                if interrupted:
+                    logger.warning("Marked %s interrupted background jobs as failed", interrupted)
+                _RUNNER = JobRunner(store, settings.JOBS_MAX_WORKERS)
+    return _RUNNER
+
+
+def shutdown_job_runner() -> None:
+    global _RUNNER
+    with _RUNNER_LOCK:
+        runner, _RUNNER = _RUNNER, None
+    if runner is not None:
+        runner.shutdown(wait=False)
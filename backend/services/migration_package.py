@@ -0,0 +1,205 @@
+# backend/services/migration_package.py
+"""
+Portable migration package (database snapshot + route photos).
+
+Photos are already compressed (JPEG/PNG/WebP), so they are stored in the ZIP
+without deflate; only the database and text entries are compressed. Every
+package carries a content-hash index of the photo folder. Given a previous
+package (or its sidecar manifest) as base, a new export ships only photos that
+are new or changed since then, and hashes of unchanged files are reused from
+the base index when size and mtime still match, so a repeated export reads
+only the new files.
+
+Standard library only: used by the system-tools API and by
+scripts/export_runtime_backup.py.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import zipfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+FORMAT = "rotahub-migration-v2"
+DATABASE_ARCHIVE_PATH = "database/rotadb.db"
+PHOTOS_ARCHIVE_PREFIX = "fotos_rotas"
+MANIFEST_NAME = "manifest.json"
+SIDECAR_SUFFIX = ".manifest.json"
+# formats that gain nothing from deflate
+STORED_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".heic", ".heif", ".mp4", ".zip", ".gz"}
+HASH_CHUNK = 1024 * 1024
+# in-progress uploads of the photo store (app/services/photo_store.py) are not photos yet,
+# and thumbnails (app/services/photo_thumbnails.py) are regenerated on demand
+SKIPPED_TOP_DIRS = {"uploads", "miniaturas"}
+BACKUP_PAGES_PER_STEP = 1024
+
+Progress = Callable[[float, str], None]
+
+
+def _noop(_percent: float, _mensagem: str = "") -> None:
+    pass
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot_database(src: Path, dst: Path, *, vacuum: bool = False, progress: Optional[Callable[[int, int], None]] = None) -> str:
+    """
+    Consistent copy of the SQLite database at `dst`; returns the method used.
+
+    `vacuum=True` uses VACUUM INTO (one pass, compacted output without free
+    pages); otherwise, or when VACUUM INTO is not available, the online
+    backup API copies the pages in steps.
+    """
+    dst.unlink(missing_ok=True)
+    src_conn = sqlite3.connect(str(src))
+    try:
+        if vacuum:
+            try:
+                src_conn.execute("VACUUM INTO ?", (str(dst),))
+                return "vacuum_into"
+            except sqlite3.OperationalError:
+                dst.unlink(missing_ok=True)
+        dst_conn = sqlite3.connect(str(dst))
+        try:
+            with dst_conn:
+                if progress is None:
+                    src_conn.backup(dst_conn)
+                else:
+                    src_conn.backup(
+                        dst_conn,
+                        pages=BACKUP_PAGES_PER_STEP,
+                        progress=lambda _status, remaining, total: progress(total - remaining, total),
+                    )
+        finally:
+            dst_conn.close()
+        return "backup"
+    finally:
+        src_conn.close()
+
+
+def scan_photos(photos_dir: Path, previous: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+    """Index {relative path: {sha256, size, mtime_ns}}; unchanged entries of `previous` are not re-hashed."""
+    previous = previous or {}
+    index: Dict[str, Dict[str, Any]] = {}
+    if not photos_dir.exists():
+        return index
+    for path in sorted(photos_dir.rglob("*")):
+        if not path.is_file():
+            continue
+        rel = path.relative_to(photos_dir).as_posix()
+        if "/" in rel and rel.split("/", 1)[0] in SKIPPED_TOP_DIRS:
+            continue
+        stat = path.stat()
+        known = previous.get(rel) or {}
+        if known.get("sha256") and known.get("size") == stat.st_size and known.get("mtime_ns") == stat.st_mtime_ns:
+            digest = known["sha256"]
+        else:
+            digest = file_sha256(path)
+        index[rel] = {"sha256": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return index
+
+
+def load_manifest(path: Path) -> Dict[str, Any]:
+    """Manifest of a previous package: the .zip itself or its sidecar .manifest.json."""
+    if path.suffix.lower() == ".zip":
+        with zipfile.ZipFile(path) as archive:
+            return json.loads(archive.read(MANIFEST_NAME).decode("utf-8"))
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def sidecar_path(archive_path: Path) -> Path:
+    return archive_path.with_name(archive_path.stem + SIDECAR_SUFFIX)
+
+
+def build_package(
+    db_path: Path,
+    photos_dir: Path,
+    archive_path: Path,
+    *,
+    base: Optional[Dict[str, Any]] = None,
+    base_name: str = "",
+    vacuum: bool = False,
+    progress: Optional[Progress] = None,
+) -> Dict[str, Any]:
+    """
+    Writes the package at `archive_path` (plus its sidecar manifest) and returns the manifest.
+
+    With `base` (manifest of a previous package) only photos whose path or
+    content changed are added; the manifest still indexes the whole folder so
+    the new package can be the base of the next one. Progress: database 0-40%,
+    photo scan 40-50%, archive 50-95%.
+    """
+    report = progress or _noop
+    temp_db = archive_path.with_name(f".{archive_path.stem}.db")
+    base_index: Dict[str, Dict[str, Any]] = dict(((base or {}).get("photos") or {}).get("index") or {})
+    try:
+        method = snapshot_database(
+            db_path,
+            temp_db,
+            vacuum=vacuum,
+            progress=lambda copied, total: report(copied * 40 / max(total, 1), "Copiando banco de dados"),
+        )
+        report(40, "Indexando fotos")
+        index = scan_photos(photos_dir, base_index)
+        changed = [
+            rel for rel, entry in index.items()
+            if (base_index.get(rel) or {}).get("sha256") != entry["sha256"]
+        ]
+        report(50, "Compactando pacote")
+
+        manifest: Dict[str, Any] = {
+            "format": FORMAT,
+            "created_at_utc": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "database": {
+                "type": "sqlite",
+                "archive_path": DATABASE_ARCHIVE_PATH,
+                "source_name": db_path.name,
+                "snapshot": method,
+                "size_bytes": temp_db.stat().st_size,
+            },
+            "photos": {
+                "archive_path": f"{PHOTOS_ARCHIVE_PREFIX}/",
+                "included": photos_dir.exists(),
+                "files": len(changed),
+                "total_files": len(index),
+                "unchanged_skipped": len(index) - len(changed),
+                "removed_since_base": sorted(set(base_index) - set(index)) if base is not None else [],
+                "index": index,
+            },
+            "incremental": (
+                {"base": base_name, "base_created_at_utc": (base or {}).get("created_at_utc", "")}
+                if base is not None
+                else None
+            ),
+            "restore": {
+                "rota_db": "/var/rotahub/data/rotadb.db",
+                "photos_dir": "/var/rotahub/data/fotos_rotas",
+            },
+        }
+        with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.write(temp_db, DATABASE_ARCHIVE_PATH)
+            for count, rel in enumerate(changed, start=1):
+                path = photos_dir / rel
+                # objetos/ of the content store have no extension and are always images
+                stored = path.suffix.lower() in STORED_SUFFIXES or rel.startswith("objetos/")
+                compress = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+                archive.write(path, f"{PHOTOS_ARCHIVE_PREFIX}/{rel}", compress_type=compress)
+                report(50 + count * 45 / len(changed), f"Compactando fotos ({count}/{len(changed)})")
+            archive.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2))
+    except BaseException:
+        archive_path.unlink(missing_ok=True)
+        raise
+    finally:
+        temp_db.unlink(missing_ok=True)
+
+    sidecar_path(archive_path).write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+    return manifest
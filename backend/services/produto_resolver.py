@@ -0,0 +1,259 @@
+# backend/services/produto_resolver.py
+"""
+Product catalog resolver shared by imports, programacao and compras.
+
+Items reference products by name (and, for NF-e XML, by supplier code).
+The resolver keeps an in-process map of normalized name/code -> id per
+database and company, validated against the catalog version stamp
+(backend/services/catalog_version.py), so a batch costs one stamp read
+instead of one lookup per row.
+
+Names missing from the map are confirmed against the database in one query
+(the map may predate products created elsewhere) and the remaining ones are
+created together: codes come from one lookup of the taken codes sharing
+their base (``BASE`` or ``BASE[:34]-NNN``, next suffix after the highest)
+and the rows are inserted in one flush. Products created by a session stay
+in a per-session overlay until commit, so uncommitted rows never reach the
+shared map.
+"""
+from __future__ import annotations
+
+import re
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from typing import Any, Hashable
+
+from fastapi import HTTPException
+from sqlalchemy import event, func, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.schema_state import database_identity
+from backend.models.cadastro import ProdutoDB
+from backend.services.catalog_version import catalog_version
+
+MAX_SUFFIX = 999
+IN_BATCH = 500
+
+_SESSION_KEY = "produto_resolver_created"
+_SUFFIX = re.compile(r"^(.*)-(\d{3})$")
+
+
+def upper_text(value: Any) -> str:
+    return str(value or "").strip().upper()
+
+
+def produto_codigo_base(value: Any) -> str:
+    text_value = upper_text(value)
+    code = "".join(ch if ch.isalnum() else "-" for ch in text_value).strip("-")
+    while "--" in code:
+        code = code.replace("--", "-")
+    return (code or "PRODUTO")[:40]
+
+
+@dataclass(frozen=True)
+class ProdutoRef:
+    nome: str
+    codigo: str = ""
+    unidade: str = ""
+
+
+@dataclass
+class _Catalog:
+    version: int | None
+    by_nome: dict[str, int] = field(default_factory=dict)
+    by_codigo: dict[str, int] = field(default_factory=dict)
+
+
+_CATALOGS: dict[Hashable, _Catalog] = {}
+
+
+def clear_catalog_cache() -> None:
+    _CATALOGS.clear()
+
+
+@event.listens_for(AsyncSession.sync_session_class, "after_commit")
+@event.listens_for(AsyncSession.sync_session_class, "after_rollback")
+def _drop_session_overlay(session) -> None:
+    session.info.pop(_SESSION_KEY, None)
+
+
+def _catalog_key(db: AsyncSession) -> Hashable:
+    url = db.get_bind().url
+    identity = database_identity(url.database) if url.get_backend_name() == "sqlite" else url.render_as_string(hide_password=True)
+    return identity, db.sync_session.info.get("company_id")
+
+
+def _overlay(db: AsyncSession) -> _Catalog:
+    return db.sync_session.info.setdefault(_SESSION_KEY, _Catalog(version=None))
+
+
+async def _catalog(db: AsyncSession) -> _Catalog:
+    key = _catalog_key(db)
+    cached = _CATALOGS.get(key)
+    # this transaction created products: a reload would publish its uncommitted rows
+    dirty = bool(db.sync_session.info.get(_SESSION_KEY))
+    if cached is not None and dirty:
+        return cached
+    version = await catalog_version(db)
+    if cached is not None and version is not None and cached.version == version:
+        return cached
+    catalog = _Catalog(version=version)
+    rows = await db.execute(select(ProdutoDB.id, ProdutoDB.nome, ProdutoDB.codigo).order_by(ProdutoDB.id))
+    for produto_id, nome, codigo in rows.all():
+        catalog.by_nome.setdefault(upper_text(nome), int(produto_id))
+        if upper_text(codigo):
+            catalog.by_codigo.setdefault(upper_text(codigo), int(produto_id))
+    if version is not None and not dirty:
+        _CATALOGS[key] = catalog
+    return catalog
+
+
+def _chunks(values: list[str]) -> Iterable[list[str]]:
+    for start in range(0, len(values), IN_BATCH):
+        yield values[start : start + IN_BATCH]
+
+
+async def _stored_matches(db: AsyncSession, nomes: list[str], codigos: list[str]) -> tuple[dict[str, int], dict[str, int]]:
+    by_nome: dict[str, int] = {}
+    by_codigo: dict[str, int] = {}
+    nome_col = func.upper(func.coalesce(ProdutoDB.nome, ""))
+    codigo_col = func.upper(func.coalesce(ProdutoDB.codigo, ""))
+    size = max(len(nomes), len(codigos))
+    for start in range(0, size, IN_BATCH):
+        nomes_chunk = nomes[start : start + IN_BATCH]
+        codigos_chunk = codigos[start : start + IN_BATCH]
+        conditions = []
+        if nomes_chunk:
+            conditions.append(nome_col.in_(nomes_chunk))
+        if codigos_chunk:
+            conditions.append(codigo_col.in_(codigos_chunk))
+        rows = await db.execute(select(ProdutoDB.id, nome_col, codigo_col).where(or_(*conditions)).order_by(ProdutoDB.id))
+        for produto_id, nome, codigo in rows.all():
+            by_nome.setdefault(nome, int(produto_id))
+            if codigo:
+                by_codigo.setdefault(codigo, int(produto_id))
+    return by_nome, by_codigo
+
+
+async def _taken_codes(db: AsyncSession, bases: list[str]) -> set[str]:
+    """Codes equal to a base or in its suffixed family (BASE[:34]-NNN), across every company."""
+    taken: set[str] = set()
+    prefixes = sorted({base[:34] for base in bases})
+    for chunk in _chunks(sorted(set(bases))):
+        params = {f"b{idx}": base for idx, base in enumerate(chunk)}
+        prefix_params = {f"p{idx}": prefix for idx, prefix in enumerate(prefixes)}
+        rows = await db.execute(
+            text(
+                f"""
+                SELECT UPPER(COALESCE(codigo, ''))
+                  FROM produtos
+                 WHERE UPPER(COALESCE(codigo, '')) IN ({", ".join(f":{name}" for name in params)})
+                    OR (LENGTH(codigo) > 4
+                        AND SUBSTR(UPPER(codigo), 1, LENGTH(codigo) - 4) IN ({", ".join(f":{name}" for name in prefix_params)}))
+                """
+            ),
+            {**params, **prefix_params},
+        )
+        taken.update(row[0] for row in rows.all())
+    return taken
+
+
+def _allocate_code(base: str, taken: set[str]) -> str:
+    if base not in taken:
+        return base
+    prefix = base[:34]
+    highest = 0
+    for code in taken:
+        match = _SUFFIX.match(code)
+        if match and match.group(1) == prefix:
+            highest = max(highest, int(match.group(2)))
+    if highest >= MAX_SUFFIX:
+        raise HTTPException(status_code=409, detail="Nao foi possivel gerar codigo unico para o produto.")
+    return f"{prefix}-{highest + 1:03d}"
+
+
+def produto_ref_key(ref: ProdutoRef) -> tuple[str, str]:
+    return upper_text(ref.nome), produto_codigo_base(ref.codigo) if upper_text(ref.codigo) else ""
+
+
+async def resolve_produto_refs(
+    db: AsyncSession,
+    refs: Iterable[ProdutoRef],
+    *,
+    descricao: str,
+    categoria: str | Callable[[str], str] = "AVES",
+    unidade: str = "KG",
+) -> dict[tuple[str, str], int]:
+    """
+    (normalized name, explicit code) -> id for every reference with a name,
+    creating the missing products. An explicit code matches that code first,
+    then the name; new products take codes derived from the code or the name.
+    """
+    catalog = await _catalog(db)
+    overlay = db.sync_session.info.get(_SESSION_KEY) or _Catalog(version=None)
+    resolved: dict[tuple[str, str], int] = {}
+    pending: dict[tuple[str, str], ProdutoRef] = {}
+    for ref in refs:
+        key = produto_ref_key(ref)
+        nome, codigo = key
+        if not nome or key in resolved or key in pending:
+            continue
+        found = (codigo and (overlay.by_codigo.get(codigo) or catalog.by_codigo.get(codigo))) or (
+            overlay.by_nome.get(nome) or catalog.by_nome.get(nome)
+        )
+        if found:
+            resolved[key] = found
+        else:
+            pending[key] = ref
+    if not pending:
+        return resolved
+
+    stored_nome, stored_codigo = await _stored_matches(
+        db, sorted({nome for nome, _codigo in pending}), sorted({codigo for _nome, codigo in pending if codigo})
+    )
+    for key in list(pending):
+        nome, codigo = key
+        found = (codigo and stored_codigo.get(codigo)) or stored_nome.get(nome)
+        if found:
+            resolved[key] = found
+            del pending[key]
+    if not pending:
+        return resolved
+
+    # one product per new name: references repeating a name with another code share it
+    novos: dict[str, ProdutoRef] = {}
+    for (nome, _codigo), ref in pending.items():
+        novos.setdefault(nome, ref)
+    bases = {nome: produto_ref_key(ref)[1] or produto_codigo_base(nome) for nome, ref in novos.items()}
+    taken = await _taken_codes(db, list(bases.values()))
+    produtos: dict[str, ProdutoDB] = {}
+    for nome, ref in novos.items():
+        codigo = _allocate_code(bases[nome], taken)
+        taken.add(codigo)
+        unidade_item = upper_text(ref.unidade or unidade) or "KG"
+        produtos[nome] = ProdutoDB(
+            codigo=codigo,
+            nome=nome,
+            descricao=descricao,
+            categoria=categoria(nome) if callable(categoria) else categoria,
+            unidade=unidade_item,
+            unidade_estoque=unidade_item,
+            controla_estoque_fisico=1,
+            controla_estoque_fiscal=1,
+            status="ATIVO",
+        )
+    db.add_all(produtos.values())
+    await db.flush()
+    overlay = _overlay(db)
+    for nome, produto in produtos.items():
+        overlay.by_nome[nome] = int(produto.id)
+        overlay.by_codigo[upper_text(produto.codigo)] = int(produto.id)
+    for key in pending:
+        resolved[key] = int(produtos[key[0]].id)
+    return resolved
+
+
+async def resolve_produto_ids(db: AsyncSession, nomes: Iterable[str], **options: Any) -> dict[str, int]:
+    """Normalized name -> id of every non-empty name, creating the missing products."""
+    resolved = await resolve_produto_refs(db, (ProdutoRef(nome=nome) for nome in nomes), **options)
+    return {nome: produto_id for (nome, _codigo), produto_id in resolved.items()}
@@ -0,0 +1,157 @@
+# backend/services/programacao_data_ref.py
+"""
+Normalized reference dates of a programacao.
+
+Route dates are stored as free text in mixed formats (ISO, dd/mm/yyyy,
+dd/mm/yy, with or without time). Two columns keep them as YYYY-MM-DD so
+period filters can push date ranges into SQL through a (company_id, column)
+index; '' marks rows without a usable date:
+  - data_ref_iso: data_saida, then data_criacao, then data (cost center);
+  - relatorio_data_ref_iso: data_criacao, then data, then data_saida (reports).
+
+The ORM fills the column on every write (backend/models/programacao.py).
+Writers that bypass the ORM (legacy mobile API, desktop sync) leave it NULL:
+on SQLite a trigger also resets it when a date column changes, and pending
+rows are recomputed before date-filtered queries through a partial index, so
+the catch-up cost is proportional to the rows touched since the last refresh.
+A NULL data_ref_iso marks both columns as pending.
+"""
+from __future__ import annotations
+
+import re
+from datetime import date, timedelta
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.utils.formatters import normalize_date
+
+DATA_REF_COLUMNS = ("data_saida", "data_criacao", "data")
+RELATORIO_DATA_REF_COLUMNS = ("data_criacao", "data", "data_saida")
+COMPANY_INDEX = "idx_backend_programacoes_company_data_ref"
+RELATORIO_COMPANY_INDEX = "idx_backend_programacoes_company_relatorio_data_ref"
+PENDING_INDEX = "idx_backend_programacoes_data_ref_pendente"
+STALE_TRIGGER = "trg_programacoes_data_ref_stale"
+BACKFILL_BATCH = 1000
+
+_MONTH_ISO = re.compile(r"^(\d{4})-(\d{1,2})$")
+_MONTH_BR = re.compile(r"^(\d{1,2})/(\d{4})$")
+_YEAR = re.compile(r"^(\d{4})$")
+
+
+def data_ref_iso(*values: Any) -> str:
+    """ISO date of the first non-empty value; '' if unparseable."""
+    for value in values:
+        raw = str(value or "").strip()
+        if raw:
+            return normalize_date(raw.replace("T", " ")) or ""
+    return ""
+
+
+def data_ref_iso_of(programacao: Any) -> str:
+    return data_ref_iso(*(getattr(programacao, column, None) for column in DATA_REF_COLUMNS))
+
+
+def relatorio_data_ref_iso_of(programacao: Any) -> str:
+    return data_ref_iso(*(getattr(programacao, column, None) for column in RELATORIO_DATA_REF_COLUMNS))
+
+
+def _month_range(year: int, month: int) -> tuple[str, str] | None:
+    if not 1 <= month <= 12:
+        return None
+    start = date(year, month, 1)
+    end = date(year + (month == 12), month % 12 + 1, 1)
+    return start.isoformat(), end.isoformat()
+
+
+def data_ref_range(value: Any) -> tuple[str, str] | None:
+    """
+    Half-open ISO range [start, end) for a report date filter: a day
+    (2026-03-05, 05/03/2026, 05/03/26), a month (2026-03, 03/2026) or a year.
+    None when the text is not a recognizable date.
+    """
+    raw = str(value or "").strip()
+    if not raw:
+        return None
+    month = _MONTH_ISO.match(raw)
+    if month:
+        return _month_range(int(month.group(1)), int(month.group(2)))
+    month = _MONTH_BR.match(raw)
+    if month:
+        return _month_range(int(month.group(2)), int(month.group(1)))
+    if _YEAR.match(raw):
+        return f"{raw}-01-01", f"{int(raw) + 1:04d}-01-01"
+    day = normalize_date(raw)
+    if not day:
+        return None
+    try:
+        start = date.fromisoformat(day)
+    except ValueError:
+        return None
+    return start.isoformat(), (start + timedelta(days=1)).isoformat()
+
+
+def ensure_data_ref_schema(conn: Connection) -> None:
+    """Indexes (and the SQLite staleness trigger) for both reference date columns; the columns must exist."""
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {COMPANY_INDEX} ON programacoes(company_id, data_ref_iso)"))
+    conn.execute(
+        text(f"CREATE INDEX IF NOT EXISTS {RELATORIO_COMPANY_INDEX} ON programacoes(company_id, relatorio_data_ref_iso)")
+    )
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {PENDING_INDEX} ON programacoes(id) WHERE data_ref_iso IS NULL"))
+    # rows filled before relatorio_data_ref_iso existed go back to pending once
+    conn.execute(
+        text("UPDATE programacoes SET data_ref_iso = NULL WHERE relatorio_data_ref_iso IS NULL AND data_ref_iso IS NOT NULL")
+    )
+    if conn.dialect.name == "sqlite":
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {STALE_TRIGGER}"))
+        conn.execute(
+            text(
+                f"""
+                CREATE TRIGGER {STALE_TRIGGER}
+                AFTER UPDATE OF data_saida, data_criacao, data ON programacoes
+                WHEN NEW.data_ref_iso IS OLD.data_ref_iso
+                 AND (NEW.data_saida IS NOT OLD.data_saida
+                      OR NEW.data_criacao IS NOT OLD.data_criacao
+                      OR NEW.data IS NOT OLD.data)
+                BEGIN
+                    UPDATE programacoes SET data_ref_iso = NULL, relatorio_data_ref_iso = NULL WHERE id = NEW.id;
+                END
+                """
+            )
+        )
+
+
+def backfill_data_ref_iso(conn: Connection) -> int:
+    """Computes both reference dates for every pending (NULL data_ref_iso) row; returns how many rows were updated."""
+    updated = 0
+    while True:
+        rows = conn.execute(
+            text(
+                f"""
+                SELECT id, data_saida, data_criacao, data
+                  FROM programacoes
+                 WHERE data_ref_iso IS NULL
+                 LIMIT {BACKFILL_BATCH}
+                """
+            )
+        ).all()
+        if not rows:
+            return updated
+        conn.execute(
+            text("UPDATE programacoes SET data_ref_iso = :iso, relatorio_data_ref_iso = :relatorio WHERE id = :id"),
+            [
+                {"id": row.id, "iso": data_ref_iso_of(row), "relatorio": relatorio_data_ref_iso_of(row)}
+                for row in rows
+            ],
+        )
+        updated += len(rows)
+
+
+async def refresh_pending_data_ref(db: AsyncSession) -> int:
+    """Catches up rows written outside the ORM before a date-filtered query."""
+    updated = await db.run_sync(lambda session: backfill_data_ref_iso(session.connection()))
+    if updated:
+        await db.commit()
+    return updated
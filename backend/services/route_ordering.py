@@ -0,0 +1,180 @@
+# backend/services/route_ordering.py
+"""
+Delivery ordering for programacao route suggestions.
+
+Items of the same client form one stop. The cost between two stops is the
+haversine distance in km, computed once for the whole route as a NumPy
+matrix, minus the historical affinity of the pair (how often past
+programacoes delivered one client right after the other, capped like the
+former greedy ordering: 2 km per occurrence, at most 12 km).
+
+The route is open: it starts at the first stop by (cidade, bairro,
+nome_cliente) and ends anywhere. A nearest-neighbour tour is improved by
+2-opt (segment reversal) and Or-opt (moving runs of 1-3 stops) until no
+move helps or the time budget runs out. Items without coordinates go to the
+end, sorted by cidade, endereco and nome_cliente.
+"""
+from __future__ import annotations
+
+import time
+from typing import Any
+
+import numpy as np
+
+from app.utils.formatters import safe_float
+
+EARTH_RADIUS_KM = 6371.0
+AFFINITY_KM_PER_ROUTE = 2.0
+AFFINITY_MAX_KM = 12.0
+TIME_BUDGET_S = 0.5
+OR_OPT_SEGMENTS = (1, 2, 3)
+
+_EPS = 1e-9
+
+
+def _upper(value: Any) -> str:
+    return str(value or "").strip().upper()
+
+
+def _has_geo(item: dict[str, Any]) -> bool:
+    return item.get("lat") not in (None, "") and item.get("lon") not in (None, "")
+
+
+def _start_key(item: dict[str, Any]) -> tuple[str, str, str]:
+    return _upper(item.get("cidade")), _upper(item.get("bairro")), _upper(item.get("nome_cliente"))
+
+
+def _tail_key(item: dict[str, Any]) -> tuple[str, str, str]:
+    return _upper(item.get("cidade")), _upper(item.get("endereco")), _upper(item.get("nome_cliente"))
+
+
+def haversine_matrix(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Pairwise great-circle distances in km between points given in degrees."""
+    phi = np.radians(np.asarray(lat, dtype=float))[:, None]
+    lam = np.radians(np.asarray(lon, dtype=float))[:, None]
+    x = np.sin((phi.T - phi) / 2) ** 2 + np.cos(phi) * np.cos(phi.T) * np.sin((lam.T - lam) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(x, 0.0, 1.0)))
+
+
+def affinity_matrix(codigos: list[str], historico: dict[tuple[str, str], int]) -> np.ndarray:
+    """km discounted between stops that past routes visited back to back (symmetric)."""
+    index = {codigo: pos for pos, codigo in enumerate(codigos) if codigo}
+    bonus = np.zeros((len(codigos), len(codigos)))
+    for (atual, proximo), vezes in historico.items():
+        i, j = index.get(atual), index.get(proximo)
+        if i is not None and j is not None and i != j:
+            bonus[i, j] = min(float(vezes) * AFFINITY_KM_PER_ROUTE, AFFINITY_MAX_KM)
+    return np.maximum(bonus, bonus.T)
+
+
+def path_cost(cost: np.ndarray, tour: list[int] | np.ndarray) -> float:
+    tour = np.asarray(tour, dtype=int)
+    return float(cost[tour[:-1], tour[1:]].sum()) if len(tour) > 1 else 0.0
+
+
+def nearest_neighbour(cost: np.ndarray) -> list[int]:
+    """Greedy open tour from stop 0; ties go to the lowest index."""
+    n = len(cost)
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = True
+    tour = [0]
+    for _ in range(n - 1):
+        nxt = int(np.argmin(np.where(visited, np.inf, cost[tour[-1]])))
+        tour.append(nxt)
+        visited[nxt] = True
+    return tour
+
+
+def _two_opt_pass(cost: np.ndarray, tour: np.ndarray, deadline: float) -> bool:
+    """Reverses tour[i..j] whenever it shortens the path; tour[0] and the open end stay put."""
+    improved = False
+    last = len(tour) - 2
+    for i in range(1, last):
+        if time.perf_counter() > deadline:
+            break
+        a, b = tour[i - 1], tour[i]
+        js = np.arange(i + 1, last + 1)
+        c, d = tour[js], tour[js + 1]
+        delta = cost[a, c] + cost[b, d] - cost[a, b] - cost[c, d]
+        best = int(np.argmin(delta))
+        if delta[best] < -_EPS:
+            j = int(js[best])
+            tour[i : j + 1] = tour[i : j + 1][::-1]
+            improved = True
+    return improved
+
+
+def _or_opt_pass(cost: np.ndarray, tour: np.ndarray, deadline: float) -> bool:
+    """Moves runs of 1-3 stops, possibly reversed, to the cheapest edge elsewhere in the tour."""
+    improved = False
+    edges = np.arange(len(tour) - 1)
+    for length in OR_OPT_SEGMENTS:
+        i = 1
+        while i + length <= len(tour) - 1:
+            if time.perf_counter() > deadline:
+                return improved
+            prev, first, last, nxt = tour[i - 1], tour[i], tour[i + length - 1], tour[i + length]
+            removal = cost[prev, first] + cost[last, nxt] - cost[prev, nxt]
+            ks = edges[(edges < i - 1) | (edges > i + length - 1)]
+            u, v = tour[ks], tour[ks + 1]
+            forward = cost[u, first] + cost[last, v] - cost[u, v]
+            backward = cost[u, last] + cost[first, v] - cost[u, v]
+            insertion = np.minimum(forward, backward)
+            best = int(np.argmin(insertion)) if len(ks) else -1
+            if best >= 0 and insertion[best] - removal < -_EPS:
+                k = int(ks[best])
+                segment = tour[i : i + length].copy()
+                if backward[best] < forward[best]:
+                    segment = segment[::-1]
+                rest = np.delete(tour, np.arange(i, i + length))
+                position = k + 1 if k < i else k + 1 - length
+                tour[:] = np.insert(rest, position, segment)
+                improved = True
+            else:
+                i += 1
+    return improved
+
+
+def improve_tour(cost: np.ndarray, tour: list[int], *, time_budget: float = TIME_BUDGET_S) -> list[int]:
+    """2-opt + Or-opt local search on an open tour with a fixed first stop (costs must be symmetric)."""
+    n = len(tour)
+    if n < 3:
+        return list(tour)
+    # extra node n: free open end, so both moves treat the path like a cycle
+    padded = np.zeros((n + 1, n + 1))
+    padded[:n, :n] = cost
+    work = np.array([*tour, n], dtype=int)
+    deadline = time.perf_counter() + max(float(time_budget), 0.0)
+    while time.perf_counter() < deadline:
+        improved = _two_opt_pass(padded, work, deadline)
+        improved = _or_opt_pass(padded, work, deadline) or improved
+        if not improved:
+            break
+    return work[:-1].tolist()
+
+
+def order_route(
+    items: list[dict[str, Any]],
+    historico: dict[tuple[str, str], int] | None = None,
+    *,
+    time_budget: float = TIME_BUDGET_S,
+) -> list[dict[str, Any]]:
+    """Items in suggested delivery order (see the module docstring)."""
+    com_geo = [item for item in items if _has_geo(item)]
+    sem_geo = sorted((item for item in items if not _has_geo(item)), key=_tail_key)
+    if len(com_geo) <= 1:
+        return com_geo + sem_geo
+
+    # the first stop by (cidade, bairro, nome) starts the route; equal costs keep this order
+    com_geo.sort(key=_start_key)
+    stops: dict[Any, list[dict[str, Any]]] = {}
+    for pos, item in enumerate(com_geo):
+        stops.setdefault(_upper(item.get("cod_cliente")) or pos, []).append(item)
+    grupos = list(stops.values())
+    lat = np.array([safe_float(grupo[0].get("lat"), 0.0) for grupo in grupos])
+    lon = np.array([safe_float(grupo[0].get("lon"), 0.0) for grupo in grupos])
+    codigos = [key if isinstance(key, str) else "" for key in stops]
+    cost = haversine_matrix(lat, lon) - affinity_matrix(codigos, historico or {})
+
+    tour = improve_tour(cost, nearest_neighbour(cost), time_budget=time_budget)
+    return [item for stop in tour for item in grupos[stop]] + sem_geo
@@ -0,0 +1,151 @@
+# backend/services/vendas_import.py
+"""
+Streaming ingestion for Importar Vendas uploads.
+
+Spreadsheets are read in chunks (openpyxl read-only for .xlsx, the pandas
+chunked reader for CSV) and normalized with pandas string/numeric ops using
+the same rules as ``importar_vendas.normalized_import_row``, so memory stays
+flat whatever the size of the file. Each chunk carries the `row_key` used
+for deduplication (backend/services/vendas_row_key.py).
+"""
+from __future__ import annotations
+
+from collections.abc import Iterator
+from typing import IO, Any
+
+import numpy as np
+import pandas as pd
+
+from app.utils.formatters import normalize_date, safe_float
+from backend.services.vendas_row_key import ROW_KEY_SEPARATOR
+
+CHUNK_ROWS = 5000
+NUMBER_FIELDS = ("vr_total", "qnt", "valor_unitario")
+NULL_TOKENS = {"", "NAN", "NAT", "NONE", "NULL", "<NA>"}
+
+
+def _header_names(values: tuple[Any, ...]) -> list[str]:
+    names: list[str] = []
+    seen: dict[str, int] = {}
+    for idx, value in enumerate(values):
+        name = str(value).strip() if value is not None and str(value).strip() else f"Unnamed: {idx}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _iter_xlsx_frames(source: IO[bytes], chunk_rows: int) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header: list[str] | None = None
+        buffer: list[tuple[Any, ...]] = []
+        yielded = False
+        for values in rows:
+            if all(value is None or str(value).strip() == "" for value in values):
+                continue
+            if header is None:
+                header = _header_names(values)
+                continue
+            values = tuple(values[: len(header)]) + (None,) * (len(header) - len(values))
+            buffer.append(values)
+            if len(buffer) >= chunk_rows:
+                yield pd.DataFrame(buffer, columns=header)
+                buffer = []
+                yielded = True
+        if header is not None and (buffer or not yielded):
+            yield pd.DataFrame(buffer, columns=header)
+    finally:
+        workbook.close()
+
+
+def iter_upload_frames(source: IO[bytes], filename: str, *, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """DataFrames of at most `chunk_rows` rows with the file's own column names."""
+    name = str(filename or "").lower()
+    if name.endswith(".csv"):
+        yield from pd.read_csv(source, chunksize=chunk_rows)
+    elif name.endswith(".xls"):
+        # the legacy binary format has no streaming reader; parse once and hand out chunks
+        frame = pd.read_excel(source, engine="xlrd")
+        for start in range(0, max(len(frame), 1), chunk_rows):
+            yield frame.iloc[start : start + chunk_rows]
+    else:
+        yield from _iter_xlsx_frames(source, chunk_rows)
+
+
+def _text(series: pd.Series) -> pd.Series:
+    """excel_text for a whole column: stripped text, '' for empty/zero/NaN-like cells."""
+    values = series.astype(object)
+    values = values.where(values.notna() & ~values.isin([0]), "")
+    texts = values.astype(str).str.strip()
+    return texts.mask(texts.str.upper().isin(NULL_TOKENS), "")
+
+
+def _numbers(series: pd.Series) -> pd.Series:
+    """safe_float for a whole column: numeric cells vectorized, pt-BR formatted text through safe_float."""
+    values = pd.to_numeric(series, errors="coerce").astype(float)
+    pending = values.isna() & series.notna()
+    if pending.any():
+        values[pending] = series[pending].map(lambda value: safe_float(value, 0.0))
+    return values.fillna(0.0)
+
+
+def _pedido(series: pd.Series) -> pd.Series:
+    """clean_pedido for a whole column: numeric orders lose the spreadsheet's trailing .0."""
+    pedido = _text(series)
+    number = pd.to_numeric(pedido.str.replace(",", ".", regex=False), errors="coerce")
+    finite = pd.Series(np.isfinite(number.to_numpy(dtype=float, na_value=np.nan)), index=pedido.index)
+    integral = finite & ((number - np.trunc(number)).abs() < 1e-9)
+    fraction = finite & ~integral
+    if integral.any():
+        pedido[integral] = number[integral].map(lambda value: str(int(value)))
+    if fraction.any():
+        pedido[fraction] = number[fraction].map(lambda value: str(value).rstrip("0").rstrip("."))
+    return pedido.str.upper()
+
+
+def _data_venda(series: pd.Series) -> pd.Series:
+    texts = _text(series)
+    normalized = {}
+    for value in texts.unique():
+        parsed = normalize_date(value) if value else ""
+        normalized[value] = parsed if parsed is not None else value
+    return texts.map(normalized)
+
+
+def normalize_vendas_frame(frame: pd.DataFrame) -> tuple[pd.DataFrame, int]:
+    """
+    Normalized sales of a chunk with canonical column names (missing optional
+    columns count as empty) plus the number of invalid rows - those without
+    pedido, cliente, nome_cliente or produto. The result carries `row_key`.
+    """
+    empty = pd.Series([""] * len(frame), index=frame.index, dtype=object)
+    column = lambda name: frame[name] if name in frame.columns else empty  # noqa: E731
+
+    out = pd.DataFrame(index=frame.index)
+    out["pedido"] = _pedido(column("pedido"))
+    out["data_venda"] = _data_venda(column("data_venda"))
+    for name in ("cliente", "nome_cliente", "vendedor", "produto", "cidade", "observacao"):
+        out[name] = _text(column(name)).str.upper()
+    for name in NUMBER_FIELDS:
+        out[name] = _numbers(column(name))
+
+    valid = (out["pedido"] != "") & (out["cliente"] != "") & (out["nome_cliente"] != "") & (out["produto"] != "")
+    invalid = int((~valid).sum())
+    out = out[valid].copy()
+
+    qnt = out["qnt"]
+    out["valor_unitario"] = out["valor_unitario"].where(
+        (out["valor_unitario"] > 0) | (qnt <= 0), out["vr_total"] / qnt.where(qnt > 0, 1.0)
+    )
+    out["qnt_caixas"] = np.maximum(np.round(qnt), (qnt > 0).astype(float)).astype(int)
+    out["row_key"] = out["pedido"].str.cat(
+        [out["cliente"], out["produto"], out["data_venda"].str.strip()], sep=ROW_KEY_SEPARATOR
+    )
+    return out, invalid
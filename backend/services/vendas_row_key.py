@@ -0,0 +1,124 @@
+# backend/services/vendas_row_key.py
+"""
+Normalized dedup key of an imported sale (`vendas_importadas.row_key`).
+
+The key joins the normalized (pedido, cliente, produto, data_venda) of a
+sale and is unique per company (index on company_id, row_key), so imports
+check duplicates of their own company with indexed IN lookups instead of
+loading every stored sale. Rows without a company are checked by the same
+lookups (SQL unique indexes do not compare NULLs).
+
+Rows written outside the backend (legacy desktop API) have a NULL row_key;
+they are keyed before each import through a partial index, and on SQLite a
+trigger resets the key when one of its columns changes.
+"""
+from __future__ import annotations
+
+from collections.abc import Iterable
+from typing import Any
+
+from sqlalchemy import column, select, table, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+ROW_KEY_INDEX = "idx_backend_vendas_importadas_company_row_key"
+LEGACY_ROW_KEY_INDEX = "idx_backend_vendas_importadas_row_key"
+PENDING_INDEX = "idx_backend_vendas_importadas_row_key_pendente"
+STALE_TRIGGER = "trg_vendas_importadas_row_key_stale"
+ROW_KEY_SEPARATOR = "\x1f"
+BACKFILL_BATCH = 1000
+
+_VENDAS = table("vendas_importadas", column("company_id"), column("row_key"))
+
+
+def _upper(value: Any) -> str:
+    return str(value or "").strip().upper()
+
+
+def venda_row_key(pedido: Any, cliente: Any, produto: Any, data_venda: Any) -> str:
+    return ROW_KEY_SEPARATOR.join((_upper(pedido), _upper(cliente), _upper(produto), str(data_venda or "").strip()))
+
+
+def ensure_row_key_schema(conn: Connection) -> None:
+    """Keys pending rows, then creates the unique (company_id, row_key) index (and the SQLite staleness trigger); the columns must exist."""
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {PENDING_INDEX} ON vendas_importadas(id) WHERE row_key IS NULL"))
+    # the first version of the key was unique across companies
+    conn.execute(text(f"DROP INDEX IF EXISTS {LEGACY_ROW_KEY_INDEX}"))
+    backfill_row_keys(conn)
+    conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {ROW_KEY_INDEX} ON vendas_importadas(company_id, row_key)"))
+    if conn.dialect.name == "sqlite":
+        conn.execute(
+            text(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {STALE_TRIGGER}
+                AFTER UPDATE OF pedido, cliente, produto, data_venda ON vendas_importadas
+                WHEN NEW.row_key IS OLD.row_key
+                BEGIN
+                    UPDATE vendas_importadas SET row_key = NULL WHERE id = NEW.id;
+                END
+                """
+            )
+        )
+
+
+def backfill_row_keys(conn: Connection) -> int:
+    """
+    Computes row_key for every pending (NULL) row and returns how many were
+    keyed. Rows duplicating a key already taken in their company (the legacy
+    API never deduplicated strictly) get the key suffixed with their id, so
+    they stay visible without blocking the unique index.
+    """
+    updated = 0
+    while True:
+        rows = conn.execute(
+            text(
+                f"""
+                SELECT id, company_id, pedido, cliente, produto, data_venda
+                  FROM vendas_importadas
+                 WHERE row_key IS NULL
+                 ORDER BY id
+                 LIMIT {BACKFILL_BATCH}
+                """
+            )
+        ).all()
+        if not rows:
+            return updated
+        by_company: dict[Any, dict[int, str]] = {}
+        for row in rows:
+            by_company.setdefault(row[1], {})[row[0]] = venda_row_key(*row[2:])
+        params = []
+        for company_id, keys in by_company.items():
+            taken = set(existing_row_keys_sync(conn, set(keys.values()), company_id))
+            for row_id, key in keys.items():
+                if key in taken:
+                    key = f"{key}{ROW_KEY_SEPARATOR}#{row_id}"
+                taken.add(key)
+                params.append({"id": row_id, "row_key": key})
+        conn.execute(text("UPDATE vendas_importadas SET row_key = :row_key WHERE id = :id"), params)
+        updated += len(rows)
+
+
+def existing_row_keys_sync(conn: Connection, keys: Iterable[str], company_id: int | None) -> list[str]:
+    """Keys among `keys` already stored for `company_id` (None: rows without company), in chunks through the unique index."""
+    keys = list(keys)
+    found: list[str] = []
+    for start in range(0, len(keys), BACKFILL_BATCH):
+        chunk = keys[start : start + BACKFILL_BATCH]
+        found.extend(
+            conn.execute(
+                select(_VENDAS.c.row_key).where(_VENDAS.c.company_id == company_id, _VENDAS.c.row_key.in_(chunk))
+            ).scalars()
+        )
+    return found
+
+
+async def existing_row_keys(db: AsyncSession, keys: Iterable[str], company_id: int | None) -> set[str]:
+    keys = list(keys)
+    if not keys:
+        return set()
+    return set(await db.run_sync(lambda session: existing_row_keys_sync(session.connection(), keys, company_id)))
+
+
+async def refresh_pending_row_keys(db: AsyncSession) -> int:
+    """Keys rows written outside the backend; runs inside the caller's transaction."""
+    return await db.run_sync(lambda session: backfill_row_keys(session.connection()))
@@ -600,6 +600,8 @@ function bindEvents() {
   el("clientesOpenLocalizacaoButton").addEventListener("click", () => showClientesSection("localizacao"));
   el("clientesHistoricoLoadButton").addEventListener("click", loadClienteHistoricoSelecionado);
   el("clientesLocalizacaoLoadButton").addEventListener("click", loadClienteLocalizacaoSelecionado);
+  el("clientesHistoricoBusca").addEventListener("input", buscarClientesLookup);
+  el("clientesLocalizacaoBusca").addEventListener("input", buscarClientesLookup);
   document.querySelectorAll("[data-clientes-section]").forEach((button) => {
     button.addEventListener("click", () => showClientesSection(button.dataset.clientesSection || "hub"));
   });
@@ -2981,15 +2983,26 @@ async function loadClientesDashboard() {
   }
 }
 
-async function loadClientesLookup() {
+async function loadClientesLookup(busca = "") {
   try {
-    state.clientesLookup = await apiRequest("/cadastros/clientes/lookup");
+    const params = new URLSearchParams({q: clean(busca), limit: "50"});
+    state.clientesLookup = await apiRequest(`/cadastros/clientes/lookup?${params.toString()}`);
     renderClientesSelectors();
   } catch (error) {
     notify(error.message, true);
   }
 }
 
+function buscarClientesLookup(event) {
+  const busca = event.target.value;
+  window.clearTimeout(buscarClientesLookup.timer);
+  buscarClientesLookup.timer = window.setTimeout(async () => {
+    await loadClientesLookup(busca);
+    if (event.target.id === "clientesHistoricoBusca") loadClienteHistoricoSelecionado();
+    if (event.target.id === "clientesLocalizacaoBusca") loadClienteLocalizacaoSelecionado();
+  }, 250);
+}
+
 function showClientesSection(section) {
   state.clientesSection = section || "hub";
   renderCadastroLayout();
@@ -5002,7 +5015,7 @@ async function loadMortalidadeDoaDetailPhoto(idFoto, arquivo) {
   }
   if (!idFoto) return;
   try {
-    const {blob} = await apiBlobRequest(`/despesas/mortalidade/fotos/${encodeURIComponent(idFoto)}/arquivo`);
+    const {blob} = await apiBlobRequest(`/despesas/mortalidade/fotos/${encodeURIComponent(idFoto)}/miniatura?largura=1280`);
     const url = URL.createObjectURL(blob);
     state.mortalidadeDoaPhotoUrl = url;
     img.src = url;
@@ -7559,10 +7572,24 @@ async function saveDiariasConfig(event) {
   }
 }
 
+async function runSystemJob(tipo, payload = {}) {
+  let job = await apiRequest("/system-tools/jobs", {
+    method: "POST",
+    body: JSON.stringify({tipo, ...payload}),
+  });
+  while (job.status === "PENDENTE" || job.status === "EXECUTANDO") {
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+    job = await apiRequest(`/system-tools/jobs/${encodeURIComponent(job.id)}`);
+  }
+  if (job.status !== "CONCLUIDO") throw new Error(job.mensagem || "Falha ao executar tarefa.");
+  return job;
+}
+
 async function createSystemBackup() {
   try {
-    const result = await apiRequest("/system-tools/backups", {method: "POST"});
-    notify(`Backup criado: ${result.arquivo}`);
+    notify("Criando backup...");
+    const job = await runSystemJob("backup");
+    notify(`Backup criado: ${job.resultado.arquivo}`);
     await loadSystemTools();
   } catch (error) {
     notify(error.message, true);
@@ -7581,8 +7608,14 @@ async function exportBackupVendas() {
 
 async function downloadMigrationPackage() {
   try {
+    const pacotes = await apiRequest("/system-tools/migration/exports");
+    const ultimo = pacotes.length ? pacotes[0] : null;
+    const incremental = ultimo && window.confirm(
+      `Exportar somente as fotos novas desde o pacote ${ultimo.arquivo}?\nCancelar gera o pacote completo.`
+    );
     notify("Preparando banco e fotos para migracao...");
-    const result = await apiBlobRequest("/system-tools/migration/export/download");
+    const job = await runSystemJob("migracao", incremental ? {base: ultimo.arquivo} : {});
+    const result = await apiBlobRequest(`/system-tools/jobs/${encodeURIComponent(job.id)}/download`);
     downloadBlob(result.blob, result.filename || "rotahub_migration.zip");
     notify("Pacote de migracao baixado.");
   } catch (error) {
@@ -7614,11 +7647,9 @@ async function downloadSystemInstaller() {
 async function restoreSavedBackup(filename) {
   if (!window.confirm(`Restaurar o backup ${filename}? Esta acao substitui o banco atual.`)) return;
   try {
-    const result = await apiRequest(`/system-tools/backups/${encodeURIComponent(filename)}/restore`, {
-      method: "POST",
-      body: JSON.stringify({confirmar: true}),
-    });
-    notify(result.mensagem || "Backup restaurado.");
+    notify("Restaurando backup...");
+    const job = await runSystemJob("restaurar", {arquivo: filename, confirmar: true});
+    notify(job.resultado.mensagem || "Backup restaurado.");
   } catch (error) {
     notify(error.message, true);
   }
@@ -7653,7 +7684,8 @@ async function restoreBackupUpload(event) {
 
 async function checkSystemIntegrity() {
   try {
-    const result = await apiRequest("/system-tools/integridade");
+    const job = await runSystemJob("integridade");
+    const result = job.resultado;
     notify(result.ok ? "Banco de dados integro." : `Problemas encontrados: ${result.integridade}`, !result.ok);
     await loadSystemTools();
   } catch (error) {
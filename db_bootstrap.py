@@ -7,7 +7,7 @@ import json
 import os
 import secrets
 import sqlite3
-from typing import Dict
+from typing import Any, Dict, List
 
 
 PBKDF2_ITERATIONS = 200_000
@@ -47,6 +47,8 @@ TENANT_SCOPED_TABLES = OPERATIONAL_TABLES + [
 DEFAULT_COMPANY_CODE = "default"
 DEFAULT_COMPANY_NAME = "Empresa Inicial"
 DEFAULT_PLAN_CODE = "starter"
+# incrementar ao mudar ensure_saas_schema/DEFAULT_PLANS: bancos com versao antiga refazem o bootstrap
+SAAS_SCHEMA_VERSION = 1
 DEFAULT_PLANS = [
     {
         "code": "starter",
@@ -528,6 +530,202 @@ def ensure_tenant_columns(conn: sqlite3.Connection, company_id: int | None = Non
     return result
 
 
+def ensure_tenant_default_triggers(conn: sqlite3.Connection, company_id: int) -> None:
+    """
+    Trigger que aplica a empresa inicial em linhas inseridas sem company_id. Substitui o
+    backfill que ensure_tenant_columns fazia a cada request quando o bootstrap rodava sempre.
+    """
+    cur = conn.cursor()
+    for table in TENANT_SCOPED_TABLES:
+        if not table_exists(cur, table) or "company_id" not in _table_columns(cur, table):
+            continue
+        cur.execute(
+            f'CREATE TRIGGER IF NOT EXISTS trg_{table}_company_default AFTER INSERT ON "{table}" '
+            f"WHEN NEW.company_id IS NULL OR NEW.company_id=0 "
+            f'BEGIN UPDATE "{table}" SET company_id={int(company_id)} WHERE rowid=NEW.rowid; END'
+        )
+
+
+# Chaves canonicas (UPPER/TRIM) mantidas por trigger para joins indexaveis.
+# tabela -> ((coluna_chave, coluna_origem, tipo), ...); tipo "nf" tambem remove . - /
+NORMALIZED_KEY_COLUMNS: Dict[str, tuple] = {
+    "programacoes": (
+        ("codigo_programacao_key", "codigo_programacao", "codigo"),
+        ("veiculo_key", "veiculo", "codigo"),
+        ("num_nf_key", "num_nf", "nf"),
+        ("nf_numero_key", "nf_numero", "nf"),
+    ),
+    "veiculos": (("placa_key", "placa", "codigo"),),
+    "transferencias": (
+        ("codigo_origem_key", "codigo_origem", "codigo"),
+        ("codigo_destino_key", "codigo_destino", "codigo"),
+    ),
+    "programacao_itens": (
+        ("codigo_programacao_key", "codigo_programacao", "codigo"),
+        ("cod_cliente_key", "cod_cliente", "codigo"),
+    ),
+    "programacao_itens_controle": (
+        ("codigo_programacao_key", "codigo_programacao", "codigo"),
+        ("cod_cliente_key", "cod_cliente", "codigo"),
+    ),
+    "clientes": (("cod_cliente_key", "cod_cliente", "codigo"),),
+    "compras_nfe": (("numero_key", "numero", "nf"),),
+}
+
+# tabela -> indices compostos; company_id entra por ultimo quando a tabela tiver a coluna
+NORMALIZED_KEY_INDEXES: Dict[str, tuple] = {
+    "programacoes": (
+        ("codigo_programacao_key",),
+        ("veiculo_key",),
+        ("num_nf_key",),
+        ("nf_numero_key",),
+    ),
+    "veiculos": (("placa_key",),),
+    "transferencias": (("codigo_origem_key",), ("codigo_destino_key",)),
+    "programacao_itens": (("codigo_programacao_key", "cod_cliente_key"),),
+    "programacao_itens_controle": (("codigo_programacao", "cod_cliente_key"),),
+    "clientes": (("cod_cliente_key",),),
+    "compras_nfe": (("numero_key",),),
+}
+
+
+def normalized_key_expr(column: str, kind: str = "codigo") -> str:
+    """Expressao SQL da chave canonica; deve bater com normalize_key_value."""
+    expr = f"UPPER(TRIM(COALESCE({column},'')))"
+    if kind == "nf":
+        expr = f"REPLACE(REPLACE(REPLACE({expr},'.',''),'-',''),'/','')"
+    return expr
+
+
+def normalize_key_value(value: Any, kind: str = "codigo") -> str:
+    out = str(value if value is not None else "").strip().upper()
+    if kind == "nf":
+        out = out.replace(".", "").replace("-", "").replace("/", "")
+    return out
+
+
+def normalized_key_statements(
+    table: str,
+    columns: set[str],
+    triggers: set[str],
+    indexes: set[str] | None = None,
+) -> List[str]:
+    """
+    SQL pendente para as chaves normalizadas de `table`: colunas, triggers,
+    backfill (so para chaves novas) e indices. Separado para o backend async reutilizar.
+    """
+    cols = {str(c).lower() for c in columns}
+    trg = {str(t).lower() for t in triggers}
+    idx = {str(i).lower() for i in (indexes or ())}
+    statements: List[str] = []
+    backfill: List[str] = []
+    for key_col, src_col, kind in NORMALIZED_KEY_COLUMNS.get(table, ()):
+        if src_col not in cols:
+            continue
+        expr_new = normalized_key_expr(f"NEW.{src_col}", kind)
+        novo = key_col not in cols
+        if novo:
+            statements.append(f'ALTER TABLE "{table}" ADD COLUMN {key_col} TEXT')
+            cols.add(key_col)
+        trg_ins = f"trg_{table}_{key_col}_ins"
+        trg_upd = f"trg_{table}_{key_col}_upd"
+        if trg_ins not in trg:
+            statements.append(
+                f'CREATE TRIGGER IF NOT EXISTS {trg_ins} AFTER INSERT ON "{table}" '
+                f'BEGIN UPDATE "{table}" SET {key_col}={expr_new} WHERE rowid=NEW.rowid; END'
+            )
+        if trg_upd not in trg:
+            statements.append(
+                f'CREATE TRIGGER IF NOT EXISTS {trg_upd} AFTER UPDATE OF {src_col} ON "{table}" '
+                f'BEGIN UPDATE "{table}" SET {key_col}={expr_new} WHERE rowid=NEW.rowid; END'
+            )
+        if novo or trg_ins not in trg or trg_upd not in trg:
+            backfill.append(f"{key_col}={normalized_key_expr(src_col, kind)}")
+    if backfill:
+        statements.append(f'UPDATE "{table}" SET {", ".join(backfill)}')
+    for idx_cols in NORMALIZED_KEY_INDEXES.get(table, ()):
+        if any(c not in cols for c in idx_cols):
+            continue
+        idx_name = f'idx_{table}_{"_".join(idx_cols)}_nk'
+        if idx_name in idx:
+            continue
+        full = list(idx_cols) + (["company_id"] if "company_id" in cols else [])
+        statements.append(f'CREATE INDEX IF NOT EXISTS {idx_name} ON "{table}"({", ".join(full)})')
+    return statements
+
+
+def ensure_normalized_keys(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Cria/backfill das colunas *_key e seus triggers. Retorna comandos executados por tabela."""
+    cur = conn.cursor()
+    cur.execute("SELECT type, LOWER(name) FROM sqlite_master WHERE type IN ('trigger','index')")
+    existentes = cur.fetchall() or []
+    triggers = {str(r[1]) for r in existentes if r[0] == "trigger"}
+    indexes = {str(r[1]) for r in existentes if r[0] == "index"}
+    result: Dict[str, int] = {}
+    for table in NORMALIZED_KEY_COLUMNS:
+        if not table_exists(cur, table):
+            continue
+        statements = normalized_key_statements(table, _table_columns(cur, table), triggers, indexes)
+        for sql in statements:
+            cur.execute(sql)
+        result[table] = len(statements)
+    return result
+
+
+def ensure_runtime_metadata(cur: sqlite3.Cursor) -> None:
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS runtime_metadata (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            updated_at TEXT DEFAULT (datetime('now'))
+        )
+        """
+    )
+
+
+def get_runtime_metadata(cur: sqlite3.Cursor, key: str) -> str | None:
+    if not table_exists(cur, "runtime_metadata"):
+        return None
+    cur.execute("SELECT value FROM runtime_metadata WHERE key=?", (str(key),))
+    row = cur.fetchone()
+    return None if row is None else row[0]
+
+
+def set_runtime_metadata(cur: sqlite3.Cursor, key: str, value: Any) -> None:
+    ensure_runtime_metadata(cur)
+    cur.execute(
+        """
+        INSERT INTO runtime_metadata (key, value, updated_at) VALUES (?, ?, datetime('now'))
+        ON CONFLICT(key) DO UPDATE SET value=excluded.value, updated_at=excluded.updated_at
+        """,
+        (str(key), None if value is None else str(value)),
+    )
+
+
+def ensure_saas_bootstrap(conn: sqlite3.Connection) -> int:
+    """
+    Bootstrap SaaS versionado: o DDL de ensure_saas_schema so roda quando a versao gravada
+    em runtime_metadata difere de SAAS_SCHEMA_VERSION; colunas de tenant e chaves
+    normalizadas sao conferidas a cada execucao (tabelas legadas podem ter surgido depois).
+    """
+    cur = conn.cursor()
+    company_id = None
+    if get_runtime_metadata(cur, "saas_schema_version") == str(SAAS_SCHEMA_VERSION):
+        company_code = (os.environ.get("ROTA_DEFAULT_COMPANY_CODE") or DEFAULT_COMPANY_CODE).strip() or DEFAULT_COMPANY_CODE
+        if table_exists(cur, "companies"):
+            cur.execute("SELECT id FROM companies WHERE code=? LIMIT 1", (company_code,))
+            row = cur.fetchone()
+            company_id = int(row[0]) if row else None
+    if company_id is None:
+        company_id = ensure_saas_schema(conn)
+        set_runtime_metadata(cur, "saas_schema_version", SAAS_SCHEMA_VERSION)
+    ensure_tenant_columns(conn, company_id)
+    ensure_tenant_default_triggers(conn, company_id)
+    ensure_normalized_keys(conn)
+    return company_id
+
+
 def ensure_saas_schema(conn: sqlite3.Connection) -> int:
     """Cria a base SaaS multiempresa sem alterar dados operacionais existentes."""
     cur = conn.cursor()
@@ -1537,7 +1735,9 @@ def ensure_core_schema(conn: sqlite3.Connection) -> None:
     _safe_add_column(cur, "programacoes", "pix_motorista", "REAL DEFAULT 0")
     _normalize_existing_programacoes(cur)
     company_id = ensure_saas_schema(conn)
+    set_runtime_metadata(cur, "saas_schema_version", SAAS_SCHEMA_VERSION)
     ensure_tenant_columns(conn, company_id)
+    ensure_normalized_keys(conn)
     conn.commit()
 
 
@@ -0,0 +1,130 @@
+"""
+Mede a gravacao em lote de clientes (POST /desktop/cadastros/clientes/bulk-upsert e
+importacao de planilha do backend) sobre uma planilha sintetica.
+
+A base comeca com parte dos clientes ja cadastrados; a planilha traz clientes novos,
+clientes com algum campo alterado e clientes sem mudanca. Compara, cada um sobre uma
+copia da mesma base:
+  - linha a linha (modelo anterior): _desktop_cliente_upsert_cur por cliente;
+  - em lote: clientes_lote.upsert_clientes_lote (tabela temporaria + ON CONFLICT).
+
+Uso: python scripts/bench_clientes_bulk.py [--clientes 50000] [--existentes 40000] [--alterados 10000]
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("ROTA_SECRET", "bench-secret")
+
+import api_server  # noqa: E402
+from app.services import clientes_lote  # noqa: E402
+
+
+def linha_cliente(i: int, versao: int = 0) -> dict:
+    return {
+        "cod_cliente": f"CL{i:06d}",
+        "nome_cliente": f"CLIENTE SINTETICO {i}",
+        "endereco": f"RUA {i % 900} NUMERO {i % 97}" + (" FUNDOS" if versao else ""),
+        "telefone": f"81 9{i:08d}",
+        "vendedor": f"VENDEDOR {i % 40}",
+    }
+
+
+def preparar_base(caminho: str, existentes: int) -> int:
+    api_server.DB_PATH = caminho
+    api_server.ensure_tables()
+    with sqlite3.connect(caminho) as conn:
+        company_id = int(conn.execute("SELECT id FROM companies ORDER BY id LIMIT 1").fetchone()[0])
+        conn.executemany(
+            """
+            INSERT INTO clientes (cod_cliente, nome_cliente, endereco, telefone, vendedor, company_id)
+            VALUES (:cod_cliente, :nome_cliente, :endereco, :telefone, :vendedor, :company_id)
+            """,
+            ({**linha_cliente(i), "company_id": company_id} for i in range(existentes)),
+        )
+    return company_id
+
+
+def planilha(clientes: int, alterados: int) -> list:
+    return [linha_cliente(i, versao=1 if i < alterados else 0) for i in range(clientes)]
+
+
+def linha_a_linha(caminho: str, linhas: list, company_id: int) -> dict:
+    conn = sqlite3.connect(caminho)
+    conn.row_factory = sqlite3.Row
+    try:
+        cur = conn.cursor()
+        cols = api_server._ensure_clientes_table(cur)
+        contagem = {"criados": 0, "atualizados": 0}
+        for linha in linhas:
+            resultado = api_server._desktop_cliente_upsert_cur(
+                cur, api_server.DesktopClienteUpsertIn(**linha), cols=cols, company_id=company_id
+            )
+            contagem["criados"] += int(resultado.get("created") or 0)
+            contagem["atualizados"] += int(resultado.get("updated") or 0)
+        conn.commit()
+        return contagem
+    finally:
+        conn.close()
+
+
+def em_lote(caminho: str, linhas: list, company_id: int) -> dict:
+    conn = sqlite3.connect(caminho)
+    try:
+        resultado = clientes_lote.upsert_clientes_lote(conn.cursor(), linhas, company_id=company_id)
+        conn.commit()
+        return resultado
+    finally:
+        conn.close()
+
+
+def medir(nome: str, funcao, base: str, linhas: list, company_id: int) -> None:
+    fd, caminho = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        shutil.copyfile(base, caminho)
+        inicio = time.perf_counter()
+        contagem = funcao(caminho, linhas, company_id)
+        duracao = time.perf_counter() - inicio
+        with sqlite3.connect(caminho) as conn:
+            total = conn.execute("SELECT COUNT(*) FROM clientes").fetchone()[0]
+        print(f"{nome:<14} {duracao:8.2f} s  {len(linhas) / duracao:10.0f} linhas/s  {contagem}  clientes na base={total}")
+    finally:
+        os.unlink(caminho)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, default=50000)
+    parser.add_argument("--existentes", type=int, default=40000)
+    parser.add_argument("--alterados", type=int, default=10000)
+    parser.add_argument("--sem-linha-a-linha", action="store_true", help="mede so o caminho em lote")
+    args = parser.parse_args()
+
+    fd, base = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        company_id = preparar_base(base, args.existentes)
+        linhas = planilha(args.clientes, args.alterados)
+        print(
+            f"planilha: {args.clientes} clientes, base com {args.existentes} "
+            f"({args.alterados} alterados, {max(args.clientes - args.existentes, 0)} novos)"
+        )
+        if not args.sem_linha_a_linha:
+            medir("linha a linha", linha_a_linha, base, linhas, company_id)
+        medir("em lote", em_lote, base, linhas, company_id)
+    finally:
+        os.unlink(base)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Mede o overhead por request da pilha de middlewares de backend/main.py usando
+httpx.AsyncClient contra o app em processo (sem rede).
+
+Compara:
+  - app sem middlewares de usuario;
+  - pilha atual (ASGI puro);
+  - referencia: mesmo numero de camadas BaseHTTPMiddleware passthrough (modelo anterior).
+
+Uso: python scripts/bench_middleware.py [--path /health] [--requests 2000] [--token JWT]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("RATE_LIMIT_REQUESTS", "100000000")
+os.environ.setdefault("ROTA_ENABLE_LEGACY_MOBILE_API", "0")
+
+import httpx  # noqa: E402
+from starlette.middleware import Middleware  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+
+
+class _Passthrough(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        return await call_next(request)
+
+
+def _stack(app, user_middleware: list):
+    """Monta a pilha do app (erros/excecoes do FastAPI inclusos) com a lista de middlewares dada."""
+    original = app.user_middleware
+    app.user_middleware = list(user_middleware)
+    try:
+        return app.build_middleware_stack()
+    finally:
+        app.user_middleware = original
+
+
+async def _measure(asgi_app, path: str, total: int, headers: dict) -> list:
+    transport = httpx.ASGITransport(app=asgi_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+        for _ in range(min(100, total)):
+            await client.get(path, headers=headers)
+        samples = []
+        for _ in range(total):
+            inicio = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            samples.append((time.perf_counter() - inicio) * 1000)
+            if response.status_code >= 500:
+                raise SystemExit(f"{path} retornou {response.status_code}")
+    return samples
+
+
+def _pct(samples: list, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default="/health")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--token", default="")
+    args = parser.parse_args()
+
+    from backend.main import app
+
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    layers = len(app.user_middleware)
+    variants = [
+        ("sem middlewares", _stack(app, [])),
+        ("pilha atual (ASGI puro)", _stack(app, app.user_middleware)),
+        (f"referencia {layers}x BaseHTTPMiddleware", _stack(app, [Middleware(_Passthrough)] * layers)),
+    ]
+    resultados = {}
+    for nome, asgi_app in variants:
+        resultados[nome] = asyncio.run(_measure(asgi_app, args.path, args.requests, headers))
+
+    base = statistics.median(resultados["sem middlewares"])
+    print(f"GET {args.path} | {args.requests} requests | {layers} middlewares")
+    for nome, samples in resultados.items():
+        p50 = statistics.median(samples)
+        print(
+            f"  {nome:<40} p50={p50:.3f} ms  p99={_pct(samples, 0.99):.3f} ms  "
+            f"overhead p50={p50 - base:+.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
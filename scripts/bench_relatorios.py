@@ -0,0 +1,216 @@
+"""
+Mede consultas e tempo dos relatorios consolidados de backend/api/v1/endpoints/relatorios.py
+sobre uma base SQLite gerada (programacoes com itens, controles, recebimentos,
+despesas, fotos e ajudantes).
+
+Compara:
+  - por rota (modelo anterior): itens_for/controles_for/recebimentos_for/despesas_for,
+    equipe e fotos aguardados uma vez por programacao;
+  - em lote: load_relatorio_batch (consultas IN por tabela, indexadas por codigo);
+  - os builders de mortalidade, rotina e NF/transbordo como rodam hoje.
+
+Uso: python scripts/bench_relatorios.py [--rotas 500] [--clientes 12] [--repeticoes 3]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from sqlalchemy import event, text  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from backend.api.v1.endpoints import relatorios  # noqa: E402
+from backend.config.database import Base  # noqa: E402
+from backend.models.cadastro import AjudanteDB  # noqa: E402
+from backend.models.despesa import DespesaDB  # noqa: E402
+from backend.models.programacao import ProgramacaoDB, ProgramacaoItemControleDB, ProgramacaoItemDB  # noqa: E402
+from backend.models.recebimento import RecebimentoDB  # noqa: E402
+
+ROTA_FOTOS_DDL = """
+CREATE TABLE IF NOT EXISTS rota_fotos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    codigo_programacao TEXT,
+    categoria TEXT,
+    tipo_registro TEXT,
+    cod_cliente TEXT,
+    cliente_nome TEXT,
+    arquivo_nome TEXT,
+    storage_path TEXT,
+    registrado_em TEXT
+)
+"""
+
+
+async def popular(session_factory, rotas: int, clientes: int) -> None:
+    async with session_factory() as db:
+        db.add_all(AjudanteDB(nome=f"AJUDANTE{i}", sobrenome="TESTE") for i in range(1, 21))
+        for r in range(rotas):
+            codigo = f"PG{r:05d}"
+            db.add(
+                ProgramacaoDB(
+                    codigo_programacao=codigo,
+                    motorista=f"MOTORISTA {r % 25}",
+                    veiculo=f"VEI{r % 40:03d}",
+                    equipe=f"{r % 20 + 1}|{(r + 7) % 20 + 1}",
+                    data_criacao=f"2026-{r % 12 + 1:02d}-{r % 28 + 1:02d} 08:00:00",
+                    num_nf=f"NF{r // 3:05d}",
+                    status="FINALIZADA",
+                    mortalidade_transbordo_aves=r % 3,
+                )
+            )
+            for c in range(clientes):
+                cod_cliente = f"C{c:04d}"
+                pedido = f"P{r}-{c}"
+                db.add(
+                    ProgramacaoItemDB(
+                        codigo_programacao=codigo,
+                        cod_cliente=cod_cliente,
+                        nome_cliente=f"CLIENTE {c}",
+                        pedido=pedido,
+                        qnt_caixas=10,
+                        kg=200.0,
+                        preco=9.5,
+                    )
+                )
+                db.add(
+                    ProgramacaoItemControleDB(
+                        codigo_programacao=codigo,
+                        cod_cliente=cod_cliente,
+                        pedido=pedido,
+                        status_pedido="ENTREGUE",
+                        mortalidade_aves=c % 4,
+                        media_aplicada=2.4,
+                    )
+                )
+                if c % 2 == 0:
+                    db.add(
+                        RecebimentoDB(
+                            codigo_programacao=codigo,
+                            cod_cliente=cod_cliente,
+                            nome_cliente=f"CLIENTE {c}",
+                            valor=1900.0,
+                            forma_pagamento="PIX",
+                            data_registro="2026-01-01 10:00:00",
+                        )
+                    )
+            db.add(DespesaDB(codigo_programacao=codigo, descricao="COMBUSTIVEL", valor=350.0, data_registro="2026-01-01"))
+        await db.commit()
+        await db.execute(text(ROTA_FOTOS_DDL))
+        await db.execute(
+            text(
+                """
+                INSERT INTO rota_fotos (codigo_programacao, categoria, tipo_registro, arquivo_nome, registrado_em)
+                SELECT codigo_programacao, CASE WHEN id % 2 = 0 THEN 'MORTALIDADE' ELSE 'DESPESA' END,
+                       'FOTO', 'foto_' || id || '.jpg', '2026-01-01 10:00:00'
+                  FROM programacoes
+                """
+            )
+        )
+        await db.commit()
+
+
+async def carregar_por_rota(db, codigos: list[str]) -> int:
+    """Acesso do modelo anterior: sete consultas aguardadas por programacao."""
+    linhas = 0
+    for codigo in codigos:
+        linhas += len(await relatorios.itens_for(db, codigo))
+        linhas += len(await relatorios.controles_for(db, codigo))
+        linhas += len(await relatorios.recebimentos_for(db, codigo))
+        linhas += len(await relatorios.despesas_for(db, codigo))
+        await relatorios.resolve_equipe_nomes(db, "1|2")
+        fotos = await db.execute(
+            text("SELECT * FROM rota_fotos WHERE UPPER(COALESCE(codigo_programacao, ''))=:codigo ORDER BY id DESC"),
+            {"codigo": codigo},
+        )
+        linhas += len(fotos.all())
+    return linhas
+
+
+async def carregar_em_lote(db, codigos: list[str]) -> int:
+    batch = await relatorios.load_relatorio_batch(
+        db, codigos, itens=True, controles=True, recebimentos=True, despesas=True, fotos=True, ajudantes=True
+    )
+    return sum(
+        len(rows)
+        for grupo in (batch.itens, batch.controles, batch.recebimentos, batch.despesas, batch.fotos)
+        for rows in grupo.values()
+    )
+
+
+async def medir(session_factory, contador: list, nome: str, fn, repeticoes: int) -> None:
+    tempos = []
+    consultas = 0
+    resultado = None
+    for _ in range(repeticoes):
+        async with session_factory() as db:
+            contador[0] = 0
+            inicio = time.perf_counter()
+            resultado = await fn(db)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+            consultas = contador[0]
+    print(f"{nome:<34} consultas={consultas:>6}  mediana={statistics.median(tempos):9.1f} ms  resultado={resultado}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rotas", type=int, default=500)
+    parser.add_argument("--clientes", type=int, default=12)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{Path(db_path).as_posix()}")
+    contador = [0]
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _contar(*_args):
+        contador[0] += 1
+
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        await popular(session_factory, args.rotas, args.clientes)
+        codigos = [f"PG{r:05d}" for r in range(args.rotas)]
+        print(f"base: {args.rotas} programacoes x {args.clientes} clientes ({db_path})")
+
+        await medir(session_factory, contador, "carga por rota (anterior)", lambda db: carregar_por_rota(db, codigos), args.repeticoes)
+        await medir(session_factory, contador, "carga em lote", lambda db: carregar_em_lote(db, codigos), args.repeticoes)
+        await medir(
+            session_factory,
+            contador,
+            "relatorio mortalidade",
+            lambda db: _linhas(relatorios.build_mortalidade_report(db, codigo_like="", motorista_like="", data_like="")),
+            args.repeticoes,
+        )
+        await medir(
+            session_factory, contador, "relatorio rotina", lambda db: _linhas(relatorios.build_rotina_report(db, "")), args.repeticoes
+        )
+        await medir(
+            session_factory,
+            contador,
+            "relatorio NF/transbordo",
+            lambda db: _linhas(relatorios.build_nf_transbordo_report(db, "NF000")),
+            args.repeticoes,
+        )
+    finally:
+        await engine.dispose()
+        os.unlink(db_path)
+
+
+async def _linhas(coro) -> int:
+    report = await coro
+    return len(report.rows)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,133 @@
+"""
+Mede a ordenacao de entregas da sugestao de rota (programacao) sobre rotas sinteticas.
+
+Cada rota tem N paradas espalhadas em bairros ao redor de uma cidade, parte dos clientes
+com mais de um item e um historico de pares de clientes como o de historico_pares_clientes.
+Compara, na mesma rota:
+  - modelo anterior: vizinho mais proximo guloso com geo_distance_km por par (copia abaixo);
+  - route_ordering.order_route: matriz de distancias NumPy + 2-opt/Or-opt com limite de tempo.
+Relata o tempo de cada um e o total de km percorrido na ordem sugerida.
+
+Uso: python scripts/bench_rota_ordenacao.py [--paradas 50 100 200 300] [--repeticoes 3] [--limite 0.5]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("ROTA_SECRET", "bench-secret")
+
+from backend.api.v1.endpoints.programacao import geo_distance_km, upper_text  # noqa: E402
+from backend.services.route_ordering import order_route  # noqa: E402
+
+
+def ordenacao_anterior(items, historico=None):
+    historico = historico or {}
+    com_geo = [item for item in items if item.get("lat") not in (None, "") and item.get("lon") not in (None, "")]
+    sem_geo = [item for item in items if item not in com_geo]
+    if len(com_geo) <= 1:
+        return com_geo + sorted(sem_geo, key=lambda it: (upper_text(it.get("cidade")), upper_text(it.get("endereco")), upper_text(it.get("nome_cliente"))))
+    start = min(com_geo, key=lambda it: (upper_text(it.get("cidade")), upper_text(it.get("bairro")), upper_text(it.get("nome_cliente"))))
+    ordered = [start]
+    remaining = [item for item in com_geo if item is not start]
+    while remaining:
+        last = ordered[-1]
+        last_cod = upper_text(last.get("cod_cliente"))
+        nxt = min(
+            remaining,
+            key=lambda it: (
+                geo_distance_km(last.get("lat"), last.get("lon"), it.get("lat"), it.get("lon"))
+                - min(historico.get((last_cod, upper_text(it.get("cod_cliente"))), 0) * 2.0, 12.0),
+                upper_text(it.get("cidade")),
+                upper_text(it.get("bairro")),
+                upper_text(it.get("nome_cliente")),
+            ),
+        )
+        ordered.append(nxt)
+        remaining.remove(nxt)
+    ordered.extend(sorted(sem_geo, key=lambda it: (upper_text(it.get("cidade")), upper_text(it.get("endereco")), upper_text(it.get("nome_cliente")))))
+    return ordered
+
+
+def rota_sintetica(paradas: int, semente: int):
+    rng = random.Random(semente)
+    bairros = [(-8.05 + rng.uniform(-0.25, 0.25), -34.90 + rng.uniform(-0.25, 0.25)) for _ in range(max(paradas // 12, 3))]
+    items = []
+    for i in range(paradas):
+        bairro = rng.randrange(len(bairros))
+        lat, lon = bairros[bairro]
+        cliente = {
+            "cod_cliente": f"C{i:04d}",
+            "nome_cliente": f"CLIENTE {i}",
+            "cidade": "RECIFE",
+            "bairro": f"BAIRRO {bairro}",
+            "endereco": f"RUA {i}",
+            "lat": lat + rng.gauss(0, 0.01),
+            "lon": lon + rng.gauss(0, 0.01),
+        }
+        for produto in range(1 + (rng.random() < 0.2)):
+            items.append({**cliente, "produto": f"PRODUTO {produto}"})
+        if rng.random() < 0.03:
+            items.append({**cliente, "cod_cliente": f"S{i:04d}", "lat": None, "lon": None})
+    historico = {}
+    codigos = [f"C{i:04d}" for i in range(paradas)]
+    for _ in range(paradas):
+        atual, proximo = rng.sample(codigos, 2)
+        vezes = rng.randint(1, 4)
+        historico[(atual, proximo)] = historico[(proximo, atual)] = vezes
+    return items, historico
+
+
+def km_total(ordem) -> float:
+    total = 0.0
+    anterior = None
+    for item in ordem:
+        if item.get("lat") in (None, ""):
+            continue
+        if anterior is not None:
+            total += geo_distance_km(anterior["lat"], anterior["lon"], item["lat"], item["lon"])
+        anterior = item
+    return total
+
+
+def medir(funcao, items, historico, repeticoes: int):
+    tempos = []
+    ordem = []
+    for _ in range(repeticoes):
+        copia = [dict(item) for item in items]
+        inicio = time.perf_counter()
+        ordem = funcao(copia, historico)
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos), km_total(ordem), len(ordem)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paradas", type=int, nargs="+", default=[50, 100, 200, 300])
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--limite", type=float, default=0.5, help="limite de tempo da busca local (s)")
+    parser.add_argument("--semente", type=int, default=7)
+    args = parser.parse_args()
+
+    nova = lambda items, historico: order_route(items, historico, time_budget=args.limite)  # noqa: E731
+    print(f"{'paradas':>7} {'itens':>6} | {'anterior s':>10} {'km':>9} | {'nova s':>8} {'km':>9} | {'km':>7}")
+    for paradas in args.paradas:
+        items, historico = rota_sintetica(paradas, args.semente + paradas)
+        t_antes, km_antes, n_antes = medir(ordenacao_anterior, items, historico, args.repeticoes)
+        t_nova, km_nova, n_nova = medir(nova, items, historico, args.repeticoes)
+        assert n_antes == n_nova == len(items)
+        print(
+            f"{paradas:>7} {len(items):>6} | {t_antes:>10.3f} {km_antes:>9.1f} | {t_nova:>8.3f} {km_nova:>9.1f} | "
+            f"{(km_nova - km_antes) / km_antes * 100:>6.1f}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,20 @@
 from __future__ import annotations
 
 import argparse
-import json
 import os
-import shutil
 import sqlite3
+import sys
 import tempfile
 import zipfile
-from datetime import datetime, timezone
+from datetime import datetime
 from pathlib import Path
 
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.services import migration_package
 
 
 def _env_path(name: str, default: Path) -> Path:
@@ -19,33 +22,17 @@ def _env_path(name: str, default: Path) -> Path:
     return Path(value).expanduser().resolve() if value else default.resolve()
 
 
-def _sqlite_backup(src: Path, dst: Path) -> None:
-    if not src.exists():
-        raise FileNotFoundError(f"Banco SQLite nao encontrado: {src}")
-    src_conn = sqlite3.connect(str(src))
-    dst_conn = sqlite3.connect(str(dst))
-    try:
-        with dst_conn:
-            src_conn.backup(dst_conn)
-        result = dst_conn.execute("PRAGMA integrity_check").fetchone()
-        if not result or str(result[0]).lower() != "ok":
-            raise RuntimeError(f"Falha na integridade do backup SQLite: {result}")
-    finally:
-        dst_conn.close()
-        src_conn.close()
-
-
-def _add_directory(archive: zipfile.ZipFile, source: Path, prefix: str) -> int:
-    if not source.exists():
-        return 0
-    count = 0
-    for path in sorted(source.rglob("*")):
-        if not path.is_file():
-            continue
-        relative = path.relative_to(source)
-        archive.write(path, Path(prefix) / relative)
-        count += 1
-    return count
+def _check_integrity(archive_path: Path) -> None:
+    with tempfile.TemporaryDirectory(prefix="rotahub_export_") as temp_dir:
+        with zipfile.ZipFile(archive_path) as archive:
+            db_copy = Path(archive.extract(migration_package.DATABASE_ARCHIVE_PATH, temp_dir))
+        conn = sqlite3.connect(str(db_copy))
+        try:
+            result = conn.execute("PRAGMA integrity_check").fetchone()
+        finally:
+            conn.close()
+    if not result or str(result[0]).lower() != "ok":
+        raise RuntimeError(f"Falha na integridade do backup SQLite: {result}")
 
 
 def main() -> int:
@@ -55,6 +42,11 @@ def main() -> int:
     parser.add_argument("--db", help="Caminho do SQLite. Padrao: ROTA_DB.")
     parser.add_argument("--photos-dir", help="Pasta das fotos. Padrao: ROTA_MOBILE_PHOTOS_DIR.")
     parser.add_argument("--output-dir", help="Pasta de destino. Padrao: ROTA_EXPORT_DIR ou ./exports.")
+    parser.add_argument(
+        "--base",
+        help="Pacote anterior (.zip ou .manifest.json): inclui so as fotos novas ou alteradas desde ele.",
+    )
+    parser.add_argument("--vacuum", action="store_true", help="Copia o banco com VACUUM INTO (compactado).")
     args = parser.parse_args()
 
     db_path = Path(args.db).expanduser().resolve() if args.db else _env_path("ROTA_DB", PROJECT_ROOT / "rotadb.db")
@@ -70,42 +62,31 @@ def main() -> int:
     )
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    archive_path = output_dir / f"rotahub_migration_{timestamp}.zip"
+    if not db_path.exists():
+        raise FileNotFoundError(f"Banco SQLite nao encontrado: {db_path}")
+    base = None
+    if args.base:
+        base = migration_package.load_manifest(Path(args.base).expanduser().resolve())
 
-    with tempfile.TemporaryDirectory(prefix="rotahub_export_") as temp_dir:
-        temp_root = Path(temp_dir)
-        backup_db = temp_root / "rotadb.db"
-        _sqlite_backup(db_path, backup_db)
-
-        manifest = {
-            "format": "rotahub-migration-v1",
-            "created_at_utc": datetime.now(timezone.utc).isoformat(timespec="seconds"),
-            "database": {
-                "type": "sqlite",
-                "archive_path": "database/rotadb.db",
-                "source_name": db_path.name,
-                "size_bytes": backup_db.stat().st_size,
-            },
-            "photos": {
-                "archive_path": "fotos_rotas/",
-                "included": photos_dir.exists(),
-                "files": 0,
-            },
-            "restore": {
-                "rota_db": "/var/rotahub/data/rotadb.db",
-                "photos_dir": "/var/rotahub/data/fotos_rotas",
-            },
-        }
-
-        with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
-            archive.write(backup_db, "database/rotadb.db")
-            manifest["photos"]["files"] = _add_directory(archive, photos_dir, "fotos_rotas")
-            archive.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    suffix = "_incremental" if base is not None else ""
+    archive_path = output_dir / f"rotahub_migration_{timestamp}{suffix}.zip"
+    manifest = migration_package.build_package(
+        db_path,
+        photos_dir,
+        archive_path,
+        base=base,
+        base_name=Path(args.base).name if args.base else "",
+        vacuum=args.vacuum,
+    )
+    _check_integrity(archive_path)
 
     print(f"Pacote criado: {archive_path}")
     print(f"Banco: {db_path}")
-    print(f"Fotos incluidas: {manifest['photos']['files']}")
+    print(
+        f"Fotos incluidas: {manifest['photos']['files']} "
+        f"(inalteradas omitidas: {manifest['photos']['unchanged_skipped']})"
+    )
     return 0
 
 
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from saas_script_common import add_runtime_args, resolve_script_db_path
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Reconstroi a tabela programacao_resumo (saldo/transferencias por rota).")
+    add_runtime_args(parser)
+    args = parser.parse_args()
+
+    app_config, db_path = resolve_script_db_path(args)
+    os.environ["ROTA_DB"] = db_path
+
+    import api_server
+
+    api_server.DB_PATH = db_path
+    result = api_server.rebuild_programacao_resumo(db_path)
+
+    print(f"programacao_resumo reconstruida em: {db_path}")
+    print(f"target: {app_config.app_kind} | env: {app_config.app_env}")
+    print(f"rotas: {result['rotas']} | duracao: {result['duracao_ms']} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
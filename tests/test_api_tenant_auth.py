@@ -103,6 +103,30 @@ class ApiTenantAuthTests(unittest.TestCase):
         self.assertEqual(current["company_id"], self.company_id)
         self.assertEqual(current["codigo"], "VEND-01")
 
+    def test_mounted_legacy_app_binds_company_from_its_own_token(self):
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+
+        from backend.middleware.tenant import TenantMiddleware
+
+        # como backend/main.py: api_server montado em "/" sob o TenantMiddleware, com state compartilhado
+        outer = FastAPI()
+        outer.add_middleware(TenantMiddleware)
+        outer.mount("/", api_server.app)
+        estados = []
+
+        async def probe(scope, receive, send):
+            await outer(scope, receive, send)
+            if scope["type"] == "http":
+                estados.append(dict(scope.get("state") or {}))
+
+        token = api_server.create_token("MOT-01", "motorista", company_id=7)
+        with TestClient(probe, raise_server_exceptions=False) as client:
+            client.get("/__sem_rota__", headers={"Authorization": f"Bearer {token}"})
+        # o JWT do backend nao decodifica o token HMAC; o verify_token do app montado sim
+        self.assertEqual(estados[-1]["company_id"], 7)
+        self.assertEqual(estados[-1]["tenant"]["username"], "MOT-01")
+
 
 if __name__ == "__main__":
     unittest.main()
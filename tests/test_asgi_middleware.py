@@ -0,0 +1,66 @@
+import asyncio
+import unittest
+
+from starlette.responses import StreamingResponse
+
+from backend.middleware.logging import LoggingMiddleware
+from backend.middleware.security_headers import SecurityHeadersMiddleware
+from backend.middleware.tenant import TenantMiddleware, tenant_context
+
+
+class AsgiMiddlewareStackTests(unittest.TestCase):
+    def test_streaming_body_passes_through_without_buffering(self):
+        eventos = []
+
+        async def chunks():
+            for parte in (b"a", b"b", b"c"):
+                eventos.append(("gerado", parte))
+                yield parte
+
+        async def endpoint(scope, receive, send):
+            eventos.append(("company_id", scope["state"]["company_id"]))
+            await StreamingResponse(chunks(), media_type="application/octet-stream")(scope, receive, send)
+
+        app = SecurityHeadersMiddleware(LoggingMiddleware(TenantMiddleware(endpoint)))
+        enviados = []
+
+        recebidos = []
+
+        async def receive():
+            if recebidos:
+                await asyncio.Event().wait()
+            recebidos.append(1)
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                eventos.append(("enviado", message["body"]))
+            enviados.append(message)
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/export",
+            "raw_path": b"/export",
+            "query_string": b"",
+            "headers": [],
+            "scheme": "http",
+            "server": ("testserver", 80),
+            "client": ("127.0.0.1", 1234),
+        }
+        asyncio.run(app(scope, receive, send))
+
+        self.assertEqual(eventos[0], ("company_id", 1))
+        # cada chunk sai antes do proximo ser gerado
+        self.assertEqual(
+            eventos[1:],
+            [("gerado", b"a"), ("enviado", b"a"), ("gerado", b"b"), ("enviado", b"b"), ("gerado", b"c"), ("enviado", b"c")],
+        )
+        headers = dict(enviados[0]["headers"])
+        self.assertEqual(headers[b"x-content-type-options"], b"nosniff")
+        self.assertEqual(headers[b"x-frame-options"], b"DENY")
+        self.assertIsNone(tenant_context.company_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
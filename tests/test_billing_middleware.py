@@ -1,34 +1,46 @@
 import asyncio
 import json
 import unittest
+from types import SimpleNamespace
 
-from starlette.requests import Request
 from starlette.responses import JSONResponse
 
 from app.middleware.billing_middleware import BillingProtectionMiddleware
 from app.middleware.tenant_middleware import TenantContextMiddleware
 
 
-async def _noop_app(_scope, _receive, _send):
-    return None
+async def _terminal_app(scope, receive, send):
+    await JSONResponse({"ok": True})(scope, receive, send)
 
 
-def _request(method: str, path: str) -> Request:
-    return Request(
-        {
-            "type": "http",
-            "asgi": {"version": "3.0"},
-            "http_version": "1.1",
-            "method": method,
-            "scheme": "http",
-            "path": path,
-            "raw_path": path.encode("ascii"),
-            "query_string": b"",
-            "headers": [(b"authorization", b"Bearer token")],
-            "client": ("127.0.0.1", 12345),
-            "server": ("testserver", 80),
-        }
-    )
+def _scope(method: str, path: str) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("ascii"),
+        "query_string": b"",
+        "headers": [(b"authorization", b"Bearer token")],
+        "client": ("127.0.0.1", 12345),
+        "server": ("testserver", 80),
+    }
+
+
+async def _call(app, scope) -> SimpleNamespace:
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body")
+    return SimpleNamespace(status_code=messages[0]["status"], body=body)
 
 
 def _json(response):
@@ -50,17 +62,9 @@ class BillingMiddlewareTests(unittest.TestCase):
             if audit_events is not None:
                 audit_events.append((company_id, request.url.path, payload["billing_status"]))
 
-        tenant = TenantContextMiddleware(_noop_app, verify_token=verify_token)
-        billing = BillingProtectionMiddleware(_noop_app, get_billing_context=billing_context, audit_block=audit_block)
-        request = _request(method, path)
-
-        async def terminal(_request):
-            return JSONResponse({"ok": True})
-
-        async def call_billing(req):
-            return await billing.dispatch(req, terminal)
-
-        return asyncio.run(tenant.dispatch(request, call_billing))
+        billing = BillingProtectionMiddleware(_terminal_app, get_billing_context=billing_context, audit_block=audit_block)
+        tenant = TenantContextMiddleware(billing, verify_token=verify_token)
+        return asyncio.run(_call(tenant, _scope(method, path)))
 
     def test_get_requests_are_allowed_when_suspended(self):
         response = self._dispatch("GET", "/programacoes", subscription_status="suspended")
@@ -0,0 +1,128 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from fastapi import Response
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+
+os.environ.setdefault("ROTA_SECRET", "test-secret")
+os.environ["ROTA_DB"] = tempfile.NamedTemporaryFile(delete=False, suffix=".db").name
+
+import api_server  # noqa: E402
+from app.services import clientes_busca  # noqa: E402
+from backend.api.v1.endpoints import cadastros  # noqa: E402
+from backend.config.database import Base  # noqa: E402
+from backend.models.cadastro import ClienteDB  # noqa: E402
+
+
+class ClientesBuscaTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        api_server.DB_PATH = self.db_path
+        api_server.ensure_tables()
+        with sqlite3.connect(self.db_path) as conn:
+            self.company_id = int(conn.execute("SELECT id FROM companies ORDER BY id LIMIT 1").fetchone()[0])
+            conn.executemany(
+                "INSERT INTO clientes (cod_cliente, nome_cliente, cidade, bairro, vendedor, company_id) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    ("100", "MERCADO CENTRAL", "SÃO JOÃO", "CENTRO", "ANA", self.company_id),
+                    ("101", "SAO JOAO ALIMENTOS", "RECIFE", "BOA VISTA", "ANA", self.company_id),
+                    ("102", "PADARIA JOANA", "SAO JOSE", "CENTRO", "BETO", self.company_id),
+                    ("SJ1", "ACOUGUE BOM", "OLINDA", "SÃO JOSÉ", "BETO", self.company_id),
+                    ("200", "SAO JOAO OUTRA EMPRESA", "RECIFE", "", "", self.company_id + 50),
+                ],
+            )
+        api_server.app.dependency_overrides[api_server._require_desktop_secret] = lambda: True
+        self.client = TestClient(api_server.app)
+
+    def tearDown(self):
+        api_server.app.dependency_overrides.clear()
+        try:
+            os.unlink(self.db_path)
+        except OSError:
+            pass
+
+    def _base(self, **params):
+        return self.client.get("/desktop/clientes/base", params=params, headers={"X-Company-ID": str(self.company_id)})
+
+    def test_accent_insensitive_prefix_search_ranked_and_kept_in_sync(self):
+        resposta = self._base(q="são jo")
+        self.assertEqual(resposta.status_code, 200, resposta.text)
+        # nome comecando com a busca primeiro, os que casam por cidade/bairro em ordem de nome; outra empresa fica de fora
+        self.assertEqual([row["cod_cliente"] for row in resposta.json()], ["101", "SJ1", "100", "102"])
+        self.assertEqual([row["cod_cliente"] for row in self._base(q="sj").json()], ["SJ1"])
+        self.assertEqual([row["cod_cliente"] for row in self._base(q="jo", vendedor="beto").json()], ["102", "SJ1"])
+
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE clientes SET nome_cliente='PADARIA ESTRELA' WHERE cod_cliente='102'")
+            conn.execute("DELETE FROM clientes WHERE cod_cliente='101'")
+        self.assertEqual([row["cod_cliente"] for row in self._base(q="joa").json()], ["100"])
+        self.assertEqual([row["cod_cliente"] for row in self._base(q="estrela").json()], ["102"])
+
+    def test_keyset_pagination_with_and_without_term(self):
+        for params in ({"ordem": "codigo"}, {"q": "sao"}):
+            codigos, cursor = [], ""
+            while True:
+                resposta = self._base(limit=3, cursor=cursor, **params)
+                codigos.extend(row["cod_cliente"] for row in resposta.json())
+                cursor = resposta.headers.get("X-Next-Cursor", "")
+                if not cursor:
+                    break
+            self.assertEqual(len(codigos), 4)
+            self.assertEqual(len(set(codigos)), len(codigos))
+        self.assertEqual(codigos[0], "101")
+
+    def test_ranking_and_paging_cover_every_match(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany(
+                "INSERT INTO clientes (cod_cliente, nome_cliente, cidade, company_id) VALUES (?, ?, ?, ?)",
+                [(f"M{i:04d}", f"MERCADO {i}", "SAO PAULO", self.company_id) for i in range(3000)]
+                + [("SAO01", "SÃO JORGE", "OLINDA", self.company_id)],
+            )
+        primeira = self._base(q="sao", limit=50)
+        # codigo comecando com a busca, depois nomes comecando com ela, antes dos casamentos por cidade
+        self.assertEqual([row["cod_cliente"] for row in primeira.json()][:3], ["SAO01", "101", "SJ1"])
+        codigos, cursor = [], ""
+        while True:
+            resposta = self._base(q="sao", limit=500, cursor=cursor)
+            codigos.extend(row["cod_cliente"] for row in resposta.json())
+            cursor = resposta.headers.get("X-Next-Cursor", "")
+            if not cursor:
+                break
+        self.assertEqual(len(codigos), 3005)
+        self.assertEqual(len(set(codigos)), 3005)
+
+    def test_backend_lookup_is_a_paged_typeahead(self):
+        async def run():
+            engine = create_async_engine(f"sqlite+aiosqlite:///{Path(self.db_path).as_posix()}.backend")
+            try:
+                async with engine.begin() as conn:
+                    await conn.run_sync(Base.metadata.create_all)
+                sessions = async_sessionmaker(engine, expire_on_commit=False)
+                async with sessions() as db:
+                    db.add_all(ClienteDB(cod_cliente=f"C{i:03d}", nome_cliente=f"CLIENTE {i:03d}", cidade="SÃO LUÍS") for i in range(30))
+                    await db.commit()
+                    response = Response()
+                    page = await cadastros.clientes_lookup(response, q="sao luis", limit=20, cursor="", db=db, current_user=None)
+                    rest = await cadastros.clientes_lookup(
+                        Response(), q="sao luis", limit=20, cursor=response.headers["X-Next-Cursor"], db=db, current_user=None
+                    )
+                    return page, rest
+            finally:
+                await engine.dispose()
+                os.unlink(f"{self.db_path}.backend")
+
+        page, rest = asyncio.run(run())
+        self.assertEqual(len(page), 20)
+        self.assertEqual([item.cod_cliente for item in page + rest], [f"C{i:03d}" for i in range(30)])
+        self.assertEqual(clientes_busca.termos_busca("São-Luís/MA"), ["SAO", "LUIS", "MA"])
+
+
+if __name__ == "__main__":
+    unittest.main()
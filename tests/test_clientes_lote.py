@@ -0,0 +1,187 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+
+os.environ.setdefault("ROTA_SECRET", "test-secret")
+os.environ["ROTA_DB"] = tempfile.NamedTemporaryFile(delete=False, suffix=".db").name
+
+import api_server  # noqa: E402
+from backend.api.v1.endpoints import cadastros  # noqa: E402
+from backend.config.database import Base  # noqa: E402
+from backend.models.cadastro import ClienteDB  # noqa: E402
+
+
+class ClientesLoteTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        api_server.DB_PATH = self.db_path
+        api_server.ensure_tables()
+        with sqlite3.connect(self.db_path) as conn:
+            self.company_id = int(conn.execute("SELECT id FROM companies ORDER BY id LIMIT 1").fetchone()[0])
+            conn.executemany(
+                "INSERT INTO clientes (cod_cliente, nome_cliente, endereco, telefone, vendedor, company_id) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    ("100", "MERCADO CENTRAL", "RUA A", "81 9999", "ANA", self.company_id),
+                    (" 101a", "PADARIA JOANA", "RUA B", "", "BETO", self.company_id),
+                    ("102", "ACOUGUE BOM", "RUA C", "", "ANA", self.company_id),
+                    ("100", "OUTRA EMPRESA", "", "", "", self.company_id + 50),
+                ],
+            )
+        api_server.app.dependency_overrides[api_server._require_desktop_secret] = lambda: True
+        self.client = TestClient(api_server.app)
+
+    def tearDown(self):
+        api_server.app.dependency_overrides.clear()
+        try:
+            os.unlink(self.db_path)
+        except OSError:
+            pass
+
+    def _rows(self, company_id):
+        with sqlite3.connect(self.db_path) as conn:
+            return {
+                row[0]: row[1:]
+                for row in conn.execute(
+                    "SELECT cod_cliente, nome_cliente, endereco, telefone, vendedor FROM clientes WHERE company_id=?",
+                    (company_id,),
+                )
+            }
+
+    def test_desktop_bulk_upsert_counts_and_merge_semantics(self):
+        clientes = [
+            {"cod_cliente": "100", "nome_cliente": "Mercado Central", "endereco": "", "telefone": "", "vendedor": ""},
+            {"cod_cliente": "101A", "nome_cliente": "Padaria Joana", "telefone": "81 8888"},
+            {"cod_cliente": "200", "nome_cliente": "Novo", "endereco": "Rua D"},
+            {"cod_cliente": "200", "nome_cliente": "Novo Cliente", "vendedor": "Ana"},
+        ]
+        resposta = self.client.post(
+            "/desktop/cadastros/clientes/bulk-upsert",
+            json={"clientes": clientes},
+            headers={"X-Company-ID": str(self.company_id)},
+        )
+        self.assertEqual(resposta.status_code, 200, resposta.text)
+        body = resposta.json()
+        self.assertEqual((body["total"], body["created"], body["updated"], body["unchanged"]), (4, 1, 1, 1))
+
+        rows = self._rows(self.company_id)
+        self.assertEqual(rows["100"], ("MERCADO CENTRAL", "RUA A", "81 9999", "ANA"))
+        self.assertEqual(rows["101A"], ("PADARIA JOANA", "RUA B", "81 8888", "BETO"))
+        self.assertEqual(rows["200"], ("NOVO CLIENTE", "RUA D", "", "ANA"))
+        self.assertEqual(rows["102"], ("ACOUGUE BOM", "RUA C", "", "ANA"))
+        self.assertEqual(self._rows(self.company_id + 50)["100"], ("OUTRA EMPRESA", "", "", ""))
+
+        # o indice de busca acompanha as linhas gravadas pelo upsert em lote
+        busca = self.client.get(
+            "/desktop/clientes/base", params={"q": "novo cli"}, headers={"X-Company-ID": str(self.company_id)}
+        )
+        self.assertEqual([row["cod_cliente"] for row in busca.json()], ["200"])
+
+        repetido = self.client.post(
+            "/desktop/cadastros/clientes/bulk-upsert",
+            json={"clientes": clientes},
+            headers={"X-Company-ID": str(self.company_id)},
+        ).json()
+        self.assertEqual((repetido["created"], repetido["updated"], repetido["unchanged"]), (0, 0, 3))
+
+    def test_desktop_bulk_upsert_rejects_payload_with_missing_fields(self):
+        resposta = self.client.post(
+            "/desktop/cadastros/clientes/bulk-upsert",
+            json={"clientes": [{"cod_cliente": "300", "nome_cliente": "X"}, {"cod_cliente": "301", "nome_cliente": " "}]},
+            headers={"X-Company-ID": str(self.company_id)},
+        )
+        self.assertEqual(resposta.status_code, 400)
+        detail = resposta.json()["detail"]
+        self.assertEqual((detail["salvos"], detail["total_falhas"]), (1, 1))
+        self.assertEqual(detail["falhas"][0]["index"], 2)
+        self.assertNotIn("300", self._rows(self.company_id))
+
+    def test_backend_bulk_upsert_matches_orm_counts(self):
+        async def run():
+            engine = create_async_engine(f"sqlite+aiosqlite:///{Path(self.db_path).as_posix()}.backend")
+            try:
+                async with engine.begin() as conn:
+                    await conn.run_sync(Base.metadata.create_all)
+                sessions = async_sessionmaker(engine, expire_on_commit=False)
+                async with sessions() as db:
+                    db.add(ClienteDB(cod_cliente="C1", nome="CLIENTE 1", nome_cliente="CLIENTE 1", endereco="RUA 1"))
+                    await db.commit()
+                    rows = [
+                        cadastros.ClienteImportRow(cod_cliente="c1", nome_cliente="Cliente 1", endereco=""),
+                        cadastros.ClienteImportRow(cod_cliente="C2", nome_cliente="Cliente 2", telefone="123"),
+                        cadastros.ClienteImportRow(cod_cliente="C2", nome_cliente="", vendedor="Ana"),
+                        cadastros.ClienteImportRow(cod_cliente="C3", nome_cliente=""),
+                    ]
+                    merged = await cadastros.bulk_upsert_clientes(db, rows, merge_duplicate_rows=True)
+                    await db.commit()
+                    replaced = await cadastros.bulk_upsert_clientes(db, rows[:1])
+                    await db.commit()
+                    stored = {
+                        item.cod_cliente: (item.nome, item.nome_cliente, item.endereco or "", item.telefone, item.vendedor)
+                        for item in (await db.execute(select(ClienteDB).execution_options(populate_existing=True))).scalars()
+                    }
+                    return merged, replaced, stored
+            finally:
+                await engine.dispose()
+                os.unlink(f"{self.db_path}.backend")
+
+        merged, replaced, stored = asyncio.run(run())
+        # C2 repetido e C3 sem nome sao ignorados; C1 nao muda
+        self.assertEqual(merged.model_dump(), {"total": 1, "inseridos": 1, "atualizados": 0, "ignorados": 3})
+        self.assertEqual(replaced.model_dump(), {"total": 1, "inseridos": 0, "atualizados": 1, "ignorados": 0})
+        self.assertEqual(stored["C2"], ("CLIENTE 2", "CLIENTE 2", "", "123", "ANA"))
+        self.assertEqual(stored["C1"], ("CLIENTE 1", "CLIENTE 1", "", "", ""))
+
+    def test_backend_bulk_upsert_stays_within_the_session_company(self):
+        async def run(chave_por_empresa):
+            engine = create_async_engine(f"sqlite+aiosqlite:///{Path(self.db_path).as_posix()}.tenant")
+            try:
+                async with engine.begin() as conn:
+                    await conn.run_sync(Base.metadata.create_all)
+                    if chave_por_empresa:
+                        await conn.execute(text("DROP INDEX ix_clientes_cod_cliente"))
+                        await conn.execute(text("CREATE UNIQUE INDEX ux_clientes_empresa_cod ON clientes(company_id, cod_cliente)"))
+                sessions = async_sessionmaker(engine, expire_on_commit=False)
+                async with sessions() as db:
+                    db.add(ClienteDB(cod_cliente="C1", nome="EMPRESA 1", nome_cliente="EMPRESA 1", company_id=1))
+                    await db.commit()
+                async with sessions() as db:
+                    db.info["company_id"] = 2
+                    rows = [cadastros.ClienteImportRow(cod_cliente="C9", nome_cliente="Cliente 9")]
+                    if chave_por_empresa:
+                        rows.append(cadastros.ClienteImportRow(cod_cliente="C1", nome_cliente="Empresa 2"))
+                    result = await cadastros.bulk_upsert_clientes(db, rows)
+                    await db.commit()
+                    visiveis = sorted(item.cod_cliente for item in (await db.execute(select(ClienteDB))).scalars())
+                async with sessions() as db:
+                    stored = sorted(
+                        (item.company_id, item.cod_cliente, item.nome_cliente)
+                        for item in (await db.execute(select(ClienteDB))).scalars()
+                    )
+                return result, visiveis, stored
+            finally:
+                await engine.dispose()
+                os.unlink(f"{self.db_path}.tenant")
+
+        # chave (company_id, cod_cliente): caminho em lote restrito a empresa da sessao
+        result, visiveis, stored = asyncio.run(run(True))
+        self.assertEqual((result.inseridos, result.atualizados), (2, 0))
+        self.assertEqual(visiveis, ["C1", "C9"])
+        self.assertEqual(stored, [(1, "C1", "EMPRESA 1"), (2, "C1", "EMPRESA 2"), (2, "C9", "CLIENTE 9")])
+        # codigo unico global: cai no caminho ORM, que preenche company_id
+        result, visiveis, stored = asyncio.run(run(False))
+        self.assertEqual((result.inseridos, result.atualizados), (1, 0))
+        self.assertEqual(visiveis, ["C9"])
+        self.assertEqual(stored, [(1, "C1", "EMPRESA 1"), (2, "C9", "CLIENTE 9")])
+
+
+if __name__ == "__main__":
+    unittest.main()
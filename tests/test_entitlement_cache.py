@@ -0,0 +1,88 @@
+import unittest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.middleware.billing_middleware import BillingProtectionMiddleware
+from app.middleware.feature_middleware import FeatureGateMiddleware
+from app.middleware.tenant_middleware import TenantContextMiddleware
+from app.services.entitlement_cache import EntitlementCache, invalidate_entitlements
+
+
+class EntitlementCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.state = {"features": {"rotas": True}, "company_status": "active", "subscription_status": "active"}
+
+        def loader(company_id):
+            self.calls.append(company_id)
+            return dict(self.state)
+
+        self.scope = "a.db"
+        self.cache = EntitlementCache(loader, ttl_seconds=60, scope=lambda: self.scope)
+
+    def test_hit_until_invalidated(self):
+        self.assertEqual(self.cache.get(10)["features"], {"rotas": True})
+        self.cache.get(10)
+        self.assertEqual(self.calls, [10])
+
+        self.state["subscription_status"] = "suspended"
+        invalidate_entitlements(10)
+        self.assertEqual(self.cache.get(10)["subscription_status"], "suspended")
+        self.assertEqual(self.calls, [10, 10])
+
+    def test_scope_change_and_ttl_expire_entries(self):
+        self.cache.get(10)
+        self.scope = "b.db"
+        self.assertIsNone(self.cache.peek(10))
+        self.cache.get(10)
+        self.cache.ttl_seconds = -1
+        self.cache.invalidate()
+        self.cache.get(10)
+        self.assertIsNone(self.cache.peek(10))
+        self.assertEqual(len(self.calls), 3)
+
+    def test_invalidation_during_load_is_not_overwritten(self):
+        cache = EntitlementCache(lambda cid: (cache.invalidate(cid), {"features": {}})[1], ttl_seconds=60)
+        cache.get(7)
+        self.assertIsNone(cache.peek(7))
+
+
+class EntitlementMiddlewareTests(unittest.TestCase):
+    def test_gates_share_one_load_per_company(self):
+        calls = []
+
+        def loader(company_id):
+            calls.append(company_id)
+            return {"features": {"advanced_reports": True}, "company_status": "active", "subscription_status": "active"}
+
+        cache = EntitlementCache(loader, ttl_seconds=60)
+        decodes = []
+
+        def verify_token(_token):
+            decodes.append(1)
+            return {"company_id": 10, "role": "admin"}
+
+        app = FastAPI()
+        app.add_middleware(BillingProtectionMiddleware, entitlements=cache)
+        app.add_middleware(FeatureGateMiddleware, endpoint_features={"/premium": "advanced_reports"}, entitlements=cache)
+        app.add_middleware(TenantContextMiddleware, verify_token=verify_token)
+
+        @app.post("/premium/report")
+        def premium_report():
+            return {"ok": True}
+
+        client = TestClient(app)
+        for _ in range(3):
+            response = client.post("/premium/report", headers={"Authorization": "Bearer token"})
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(calls, [10])
+        self.assertEqual(len(decodes), 3)
+
+        cache._loader = lambda _cid: {"features": {}, "subscription_status": "suspended"}
+        invalidate_entitlements(10)
+        self.assertEqual(client.post("/premium/report", headers={"Authorization": "Bearer token"}).status_code, 403)
+
+
+if __name__ == "__main__":
+    unittest.main()
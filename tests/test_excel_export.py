@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+import anyio
+from openpyxl import load_workbook
+
+from backend.services import excel_export
+from backend.services.excel_export import ExcelSheet, sheet_from_dicts, write_xlsx
+
+
+class ExcelExportTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+
+    def tearDown(self):
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def test_async_rows_are_written_in_batches_with_sampled_widths(self):
+        total = excel_export.BATCH_ROWS * 2 + excel_export.WIDTH_SAMPLE_ROWS + 7
+
+        async def rows():
+            for i in range(total):
+                # linhas longas depois da amostra nao alargam a coluna
+                nome = "X" * 200 if i >= excel_export.WIDTH_SAMPLE_ROWS else f"CLIENTE {i}"
+                yield (i, nome)
+
+        sheets = [
+            ExcelSheet("VENDAS", ["id", "nome"], rows()),
+            sheet_from_dicts("VAZIA", []),
+            sheet_from_dicts("MEMORIAL", [{"linha": "ok"}]),
+        ]
+        anyio.run(write_xlsx, sheets, self.path)
+
+        wb = load_workbook(self.path, read_only=False)
+        self.assertEqual(wb.sheetnames, ["VENDAS", "VAZIA", "MEMORIAL"])
+        vendas = wb["VENDAS"]
+        self.assertEqual(vendas.max_row, total + 1)
+        self.assertEqual([c.value for c in vendas[1]], ["id", "nome"])
+        self.assertEqual(vendas.cell(row=total + 1, column=1).value, total - 1)
+        self.assertEqual(vendas.column_dimensions["A"].width, excel_export.MIN_WIDTH)
+        self.assertLess(vendas.column_dimensions["B"].width, 20)
+        self.assertEqual(wb["VAZIA"]["A1"].value, "sem_dados")
+        self.assertEqual(wb["MEMORIAL"]["A2"].value, "ok")
+
+    def test_widths_are_capped(self):
+        self.assertEqual(excel_export.estimate_widths(["a", "b"], [("x" * 100, None)]), [excel_export.MAX_WIDTH, excel_export.MIN_WIDTH])
+
+
+if __name__ == "__main__":
+    unittest.main()
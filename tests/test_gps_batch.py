@@ -0,0 +1,188 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from fastapi import Response
+
+
+os.environ.setdefault("ROTA_SECRET", "test-secret")
+os.environ["ROTA_DB"] = tempfile.NamedTemporaryFile(delete=False, suffix=".db").name
+
+import api_server  # noqa: E402
+from app.services.gps_buffer import GpsWriteBuffer  # noqa: E402
+
+
+class GpsBatchTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        api_server.DB_PATH = self.db_path
+        api_server.ensure_tables()
+        with sqlite3.connect(self.db_path) as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT id FROM companies ORDER BY id LIMIT 1")
+            self.company_id = int(cur.fetchone()[0])
+            cur.execute(
+                "INSERT INTO motoristas (id, nome, codigo, senha, company_id) VALUES (5, 'MOTORISTA UM', 'MOT-01', '1', ?)",
+                (self.company_id,),
+            )
+            cur.execute(
+                """
+                INSERT INTO programacoes (codigo_programacao, motorista, motorista_id, motorista_codigo, status, company_id)
+                VALUES ('PG-001', 'MOTORISTA UM', 5, 'MOT-01', 'EM_ROTA', ?)
+                """,
+                (self.company_id,),
+            )
+        self.motorista = {"id": 5, "nome": "MOTORISTA UM", "codigo": "MOT-01", "company_id": self.company_id}
+
+    def tearDown(self):
+        api_server._GPS_BUFFER.close()
+        try:
+            os.unlink(self.db_path)
+        except OSError:
+            pass
+
+    def _pings(self):
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute("SELECT lat, recorded_at FROM rota_gps_pings ORDER BY recorded_at").fetchall()
+
+    def test_batch_is_group_committed_and_deduplicated(self):
+        pings = [
+            api_server.RotaGpsPingIn(lat=-3.70 - i / 100, lon=-38.5, timestamp=f"2026-01-01T10:00:{i:02d}", idempotency_key=f"k{i}")
+            for i in range(5)
+        ]
+        res = api_server.salvar_gps_lote("PG-001", api_server.RotaGpsBatchIn(pings=pings), m=self.motorista)
+        self.assertEqual((res["aceitos"], res["deduplicados"]), (5, 0))
+
+        # ainda no buffer: reenvio do mesmo lote ja e deduplicado
+        again = api_server.salvar_gps_lote("PG-001", api_server.RotaGpsBatchIn(pings=pings[:2]), m=self.motorista)
+        self.assertEqual(again["deduplicados"], 2)
+
+        api_server._GPS_BUFFER.flush()
+        self.assertEqual(len(self._pings()), 5)
+        self.assertEqual(api_server.salvar_gps("PG-001", pings[0], m=self.motorista), {"ok": True, "deduplicado": True})
+
+    def test_monitoramento_reads_latest_ping_by_time(self):
+        for ts, lat in (("2026-01-01T10:05:00", -3.9), ("2026-01-01T10:00:00", -3.1)):
+            api_server.salvar_gps("PG-001", api_server.RotaGpsPingIn(lat=lat, lon=-38.5, timestamp=ts), m=self.motorista)
+        out = self._monitoramento()["rotas"]
+        self.assertEqual(out[0]["lat"], -3.9)
+        self.assertEqual(out[0]["recorded_at"], "2026-01-01T10:05:00")
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM rota_posicao_atual").fetchone()[0], 1)
+
+    def _monitoramento(self, **kwargs):
+        kwargs.setdefault("response", Response())
+        kwargs.setdefault("since", None)
+        kwargs.setdefault("if_none_match", None)
+        return api_server.desktop_rotas_monitoramento(_ok=True, x_company_id=str(self.company_id), **kwargs)
+
+    def test_monitoramento_returns_304_when_unchanged(self):
+        ping = api_server.RotaGpsPingIn(lat=-3.5, lon=-38.5, timestamp="2026-01-01T10:00:00")
+        api_server.salvar_gps("PG-001", ping, m=self.motorista)
+        response = Response()
+        body = self._monitoramento(response=response)
+        etag = response.headers["ETag"]
+        self.assertEqual(self._monitoramento(if_none_match=etag).status_code, 304)
+        self.assertEqual(self._monitoramento(since=body["versao"], if_none_match=etag).status_code, 304)
+        self.assertEqual(self._monitoramento(since=body["versao"])["rotas"], [])
+
+        ping = api_server.RotaGpsPingIn(lat=-3.6, lon=-38.5, timestamp="2026-01-01T10:01:00")
+        api_server.salvar_gps("PG-001", ping, m=self.motorista)
+        delta = self._monitoramento(since=body["versao"])
+        self.assertEqual([r["lat"] for r in delta["rotas"]], [-3.6])
+        self.assertGreater(delta["versao"], body["versao"])
+
+    def test_monitoramento_delta_reports_finalized_routes(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT INTO programacoes (codigo_programacao, motorista, status, company_id) VALUES ('PG-002', 'M2', 'EM_ROTA', ?)",
+                (self.company_id,),
+            )
+        api_server.salvar_gps("PG-001", api_server.RotaGpsPingIn(lat=-3.5, lon=-38.5, timestamp="2026-01-01T10:00:00"), m=self.motorista)
+        response = Response()
+        body = self._monitoramento(response=response)
+        etag = response.headers["ETag"]
+        self.assertEqual(sorted(body["ativas"]), ["PG-001", "PG-002"])
+
+        # finalizar nao gera ping: a versao fica igual, mas o ETag e as ativas mudam
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE programacoes SET status='FINALIZADA' WHERE codigo_programacao='PG-002'")
+        response = Response()
+        delta = self._monitoramento(response=response, since=body["versao"], if_none_match=etag)
+        self.assertEqual(delta["versao"], body["versao"])
+        self.assertEqual((delta["rotas"], delta["ativas"]), ([], ["PG-001"]))
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(self._monitoramento(if_none_match=response.headers["ETag"]).status_code, 304)
+
+    def test_compactar_keeps_one_ping_per_window(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany(
+                "INSERT INTO rota_gps_pings (codigo_programacao, motorista, lat, lon, recorded_at, company_id) VALUES ('PG-001', 'M', 0, 0, ?, ?)",
+                [(f"2020-01-01 10:00:{s:02d}", self.company_id) for s in range(0, 60, 10)]
+                + [(f"2020-01-01 10:01:{s:02d}", self.company_id) for s in range(0, 60, 10)],
+            )
+            out = api_server.compactar_gps_pings(conn, retencao_dias=0, detalhe_dias=7, amostra_seg=60)
+            self.assertEqual(out["reduzidos"], 10)
+            out = api_server.compactar_gps_pings(conn, retencao_dias=30, detalhe_dias=7, amostra_seg=60)
+            self.assertEqual(out["removidos"], 2)
+
+    def test_compactar_compares_iso_timestamps_by_instant(self):
+        from datetime import datetime, timedelta
+
+        # pings gravados em ISO ('T'); no mesmo dia do corte 'T' > ' ' faria o ping vencido parecer recente
+        recente = datetime.utcnow() - timedelta(hours=1)
+        antigo = datetime.utcnow() - timedelta(days=30, minutes=5)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany(
+                "INSERT INTO rota_gps_pings (codigo_programacao, motorista, lat, lon, recorded_at, company_id) VALUES ('PG-001', 'M', 0, 0, ?, ?)",
+                [((recente + timedelta(seconds=s)).isoformat(timespec="seconds"), self.company_id) for s in range(0, 60, 10)]
+                + [(antigo.isoformat(timespec="seconds"), self.company_id)],
+            )
+            out = api_server.compactar_gps_pings(conn, retencao_dias=30, detalhe_dias=0, amostra_seg=60)
+            self.assertEqual(out["removidos"], 1)
+            out = api_server.compactar_gps_pings(conn, retencao_dias=0, detalhe_dias=1, amostra_seg=3600)
+            self.assertEqual(out["reduzidos"], 0)
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM rota_gps_pings").fetchone()[0], 6)
+
+    def test_startup_keeps_gps_history_unless_enabled(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT INTO rota_gps_pings (codigo_programacao, motorista, lat, lon, recorded_at, company_id) VALUES ('PG-001', 'M', 0, 0, '2000-01-01T10:00:00', ?)",
+                (self.company_id,),
+            )
+        self.assertFalse(api_server.GPS_COMPACTAR_NO_STARTUP)
+        api_server.run_startup_reconcilers()
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM rota_gps_pings").fetchone()[0], 1)
+
+
+class GpsWriteBufferTests(unittest.TestCase):
+    def test_flushes_when_row_limit_is_reached(self):
+        lotes = []
+        buf = GpsWriteBuffer(lotes.append, flush_ms=60000, flush_rows=3)
+        buf.add([{"n": 1}, {"n": 2}])
+        self.assertEqual((len(lotes), buf.pending), (0, 2))
+        buf.add([{"n": 3}])
+        self.assertEqual([len(lote) for lote in lotes], [3])
+        buf.close()
+
+    def test_failed_flush_keeps_rows(self):
+        falhas = [1]
+
+        def writer(lote):
+            if falhas:
+                falhas.pop()
+                raise sqlite3.OperationalError("database is locked")
+
+        buf = GpsWriteBuffer(writer, flush_ms=0)
+        buf.add([{"n": 1, "dedup_key": "a"}])
+        self.assertEqual(buf.pending, 1)
+        self.assertTrue(buf.is_pending("a"))
+        self.assertEqual(buf.flush(), 1)
+        self.assertFalse(buf.is_pending("a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
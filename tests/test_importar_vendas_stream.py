@@ -0,0 +1,126 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from io import BytesIO
+from pathlib import Path
+
+import pandas as pd
+from openpyxl import Workbook
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from backend.api.v1.endpoints import importar_vendas
+from backend.config.database import Base, _ensure_backend_columns
+from backend.models.cadastro import ProdutoDB
+from backend.models.venda_importada import VendaImportadaDB
+from backend.services.vendas_import import iter_upload_frames, normalize_vendas_frame
+
+
+class ImportarVendasStreamTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{Path(self.db_path).as_posix()}")
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    def tearDown(self):
+        asyncio.run(self.engine.dispose())
+        try:
+            os.unlink(self.db_path)
+        except OSError:
+            pass
+
+    def test_vectorized_normalization_matches_row_rules(self):
+        raw = [
+            {"pedido": 1234.0, "data_venda": "05/03/26", "cliente": " c1 ", "nome_cliente": "Ana", "produto": "frango",
+             "vr_total": "1.234,50", "qnt": "2,5", "vendedor": None, "cidade": float("nan"), "observacao": "nan"},
+            {"pedido": "98,5", "data_venda": "sem data", "cliente": "C2", "nome_cliente": "Beto", "produto": "Ovo",
+             "vr_total": 30, "qnt": 0, "valor_unitario": 4},
+            {"pedido": "P-9", "data_venda": pd.Timestamp("2026-03-05"), "cliente": "C3", "nome_cliente": "Caio",
+             "produto": "Ave", "vr_total": "R$ 10", "qnt": 3.5},
+            {"pedido": "P-10", "cliente": "C4", "nome_cliente": "", "produto": "Ave", "vr_total": 1, "qnt": 1},
+            {"pedido": 0, "cliente": "C5", "nome_cliente": "Duda", "produto": "Ave"},
+        ]
+        frame = pd.DataFrame(raw)
+        rows, invalidas = normalize_vendas_frame(frame)
+        expected = [importar_vendas.normalized_import_row(item) for item in raw]
+        self.assertEqual(invalidas, sum(item is None for item in expected))
+        for got, want in zip(rows.to_dict("records"), [item for item in expected if item]):
+            self.assertEqual(got.pop("row_key"), importar_vendas.row_key(want))
+            self.assertEqual(got, want)
+
+    def test_streamed_upload_dedups_on_row_key_and_resolves_products_once(self):
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(["Numero Pedido", "Data", "Cliente", "Nome Completo", "Descricao do Produto", "Vr. Total", "Qnt."])
+        for i in range(25):
+            sheet.append([1000 + i % 20, "05/03/2026", f"C{i % 20}", f"CLIENTE {i}", f"Produto {(i % 20) % 3}", 10.0 * i, 2])
+        buffer = BytesIO()
+        workbook.save(buffer)
+
+        async def run():
+            async with self.engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                # venda gravada pela API legada, sem row_key
+                await conn.execute(
+                    text(
+                        "INSERT INTO vendas_importadas (pedido, data_venda, cliente, nome_cliente, produto) "
+                        "VALUES ('1000', '2026-03-05', 'c0', 'X', 'produto 0')"
+                    )
+                )
+                await conn.run_sync(_ensure_backend_columns)
+            async with self.sessions() as db:
+                buffer.seek(0)
+                frames = iter_upload_frames(buffer, "vendas.xlsx", chunk_rows=7)
+                first = next(frames)
+                mapping, opcionais = importar_vendas.vendas_column_map(first.columns)
+                result = await importar_vendas.import_frames(
+                    db, importar_vendas.canonical_frames([first, *frames], mapping)
+                )
+                await db.commit()
+                renamed = first.rename(columns={column: field for field, column in mapping.items()})
+                again = await importar_vendas.import_rows(db, renamed.to_dict("records"))
+                produtos = (await db.execute(select(func.count()).select_from(ProdutoDB))).scalar()
+                vendas = (await db.execute(select(func.count()).select_from(VendaImportadaDB))).scalar()
+                pendentes = (await db.execute(select(func.count()).where(VendaImportadaDB.row_key.is_(None)))).scalar()
+                return result, opcionais, again, produtos, vendas, pendentes
+
+        result, opcionais, again, produtos, vendas, pendentes = asyncio.run(run())
+        self.assertEqual(opcionais, ["Cidade", "Nome do Vendedor", "Observacao"])
+        # 20 chaves distintas; a de C0 ja existia e 5 repetem entre blocos
+        self.assertEqual((result.importadas, result.ignoradas, result.invalidas), (19, 6, 0))
+        self.assertEqual((again.importadas, again.ignoradas), (0, 7))
+        self.assertEqual(produtos, 3)
+        self.assertEqual((vendas, pendentes), (20, 0))
+
+    def test_companies_import_the_same_sale_independently(self):
+        venda = {"pedido": "77", "data_venda": "2026-03-05", "cliente": "C1", "nome_cliente": "ANA", "produto": "OVO", "qnt": 1}
+
+        async def run():
+            async with self.engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                await conn.run_sync(_ensure_backend_columns)
+            resultados = {}
+            for company_id in (1, 2, 2):
+                async with self.sessions() as db:
+                    db.info["company_id"] = company_id
+                    resultados.setdefault(company_id, []).append(await importar_vendas.import_rows(db, [dict(venda)]))
+                    await db.commit()
+            visiveis = {}
+            for company_id in (1, 2):
+                async with self.sessions() as db:
+                    db.info["company_id"] = company_id
+                    visiveis[company_id] = [
+                        (item.company_id, item.pedido) for item in (await db.execute(select(VendaImportadaDB))).scalars()
+                    ]
+            return resultados, visiveis
+
+        resultados, visiveis = asyncio.run(run())
+        self.assertEqual((resultados[1][0].importadas, resultados[1][0].ignoradas), (1, 0))
+        self.assertEqual([(item.importadas, item.ignoradas) for item in resultados[2]], [(1, 0), (0, 1)])
+        self.assertEqual(visiveis, {1: [(1, "77")], 2: [(2, "77")]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import json
+import sqlite3
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+from unittest import mock
+
+from backend.services import migration_package
+
+
+class MigrationPackageTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmpdir.name)
+        self.db_path = self.root / "rotadb.db"
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE clientes (id INTEGER PRIMARY KEY, nome TEXT)")
+            conn.executemany("INSERT INTO clientes (nome) VALUES (?)", [(f"CLIENTE {i}",) for i in range(50)])
+        self.photos = self.root / "fotos_rotas"
+        (self.photos / "PG-001").mkdir(parents=True)
+        (self.photos / "PG-001" / "a.jpg").write_bytes(b"\xff\xd8" + b"a" * 4000)
+        (self.photos / "PG-001" / "b.png").write_bytes(b"\x89PNG" + b"b" * 4000)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_photos_are_stored_and_indexed(self):
+        archive_path = self.root / "rotahub_migration_1.zip"
+        manifest = migration_package.build_package(self.db_path, self.photos, archive_path)
+
+        with zipfile.ZipFile(archive_path) as archive:
+            infos = {info.filename: info for info in archive.infolist()}
+            self.assertEqual(infos["fotos_rotas/PG-001/a.jpg"].compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(infos["database/rotadb.db"].compress_type, zipfile.ZIP_DEFLATED)
+            embedded = json.loads(archive.read("manifest.json"))
+        self.assertEqual(embedded["photos"]["files"], 2)
+        self.assertEqual(set(manifest["photos"]["index"]), {"PG-001/a.jpg", "PG-001/b.png"})
+        self.assertIsNone(manifest["incremental"])
+        self.assertEqual(migration_package.load_manifest(migration_package.sidecar_path(archive_path)), embedded)
+
+    def test_incremental_export_ships_only_new_or_changed_photos(self):
+        base = migration_package.build_package(self.db_path, self.photos, self.root / "rotahub_migration_1.zip")
+        (self.photos / "PG-002").mkdir()
+        (self.photos / "PG-002" / "c.jpg").write_bytes(b"\xff\xd8novo")
+        (self.photos / "PG-001" / "b.png").unlink()
+
+        archive_path = self.root / "rotahub_migration_2.zip"
+        with mock.patch.object(migration_package, "file_sha256", wraps=migration_package.file_sha256) as sha:
+            manifest = migration_package.build_package(
+                self.db_path, self.photos, archive_path, base=base, base_name="rotahub_migration_1.zip", vacuum=True
+            )
+        # a.jpg nao mudou: o hash vem do indice do pacote base
+        self.assertEqual([call.args[0].name for call in sha.call_args_list], ["c.jpg"])
+
+        with zipfile.ZipFile(archive_path) as archive:
+            fotos = sorted(name for name in archive.namelist() if name.startswith("fotos_rotas/"))
+            archive.extract("database/rotadb.db", self.root / "out")
+        self.assertEqual(fotos, ["fotos_rotas/PG-002/c.jpg"])
+        self.assertEqual(manifest["photos"]["unchanged_skipped"], 1)
+        self.assertEqual(manifest["photos"]["removed_since_base"], ["PG-001/b.png"])
+        self.assertEqual(manifest["incremental"]["base"], "rotahub_migration_1.zip")
+        self.assertEqual(manifest["database"]["snapshot"], "vacuum_into")
+        with sqlite3.connect(self.root / "out" / "database" / "rotadb.db") as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM clientes").fetchone()[0], 50)
+
+
+if __name__ == "__main__":
+    unittest.main()
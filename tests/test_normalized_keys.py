@@ -0,0 +1,71 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from db_bootstrap import ensure_normalized_keys, normalize_key_value
+
+
+class NormalizedKeysTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.executescript(
+            """
+            CREATE TABLE programacoes (
+                id INTEGER PRIMARY KEY, codigo_programacao TEXT, veiculo TEXT,
+                num_nf TEXT, nf_numero TEXT, company_id INTEGER
+            );
+            CREATE TABLE transferencias (
+                id TEXT PRIMARY KEY, codigo_origem TEXT, codigo_destino TEXT, company_id INTEGER
+            );
+            CREATE TABLE compras_nfe (id INTEGER PRIMARY KEY, numero TEXT);
+            INSERT INTO programacoes (codigo_programacao, veiculo, num_nf, company_id)
+            VALUES (' pg-001 ', 'abc1d23 ', '12.345-6', 1);
+            INSERT INTO transferencias VALUES ('T1', 'pg-001', ' PG-002', 1);
+            """
+        )
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        try:
+            os.unlink(self.db_path)
+        except OSError:
+            pass
+
+    def test_backfill_and_triggers_keep_keys_in_sync(self):
+        executed = ensure_normalized_keys(self.conn)
+        self.assertGreater(executed["programacoes"], 0)
+        row = self.conn.execute(
+            "SELECT codigo_programacao_key, veiculo_key, num_nf_key, nf_numero_key FROM programacoes"
+        ).fetchone()
+        self.assertEqual(row, ("PG-001", "ABC1D23", "123456", ""))
+        self.assertEqual(
+            self.conn.execute("SELECT codigo_origem_key, codigo_destino_key FROM transferencias").fetchone(),
+            ("PG-001", "PG-002"),
+        )
+
+        self.conn.execute("INSERT INTO compras_nfe (numero) VALUES (' 12.345/6 ')")
+        self.conn.execute("UPDATE programacoes SET veiculo=' xyz9z99'")
+        self.assertEqual(self.conn.execute("SELECT numero_key FROM compras_nfe").fetchone()[0], "123456")
+        self.assertEqual(self.conn.execute("SELECT veiculo_key FROM programacoes").fetchone()[0], "XYZ9Z99")
+        self.assertEqual(normalize_key_value(" 12.345/6 ", "nf"), "123456")
+
+        self.assertEqual(set(ensure_normalized_keys(self.conn).values()), {0})
+
+    def test_key_lookup_uses_company_index(self):
+        ensure_normalized_keys(self.conn)
+        plan = " ".join(
+            str(r[-1])
+            for r in self.conn.execute(
+                "EXPLAIN QUERY PLAN SELECT id FROM transferencias WHERE codigo_destino_key=? AND company_id=?",
+                ("PG-002", 1),
+            ).fetchall()
+        )
+        self.assertIn("idx_transferencias_codigo_destino_key_nk", plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+from app.services import photo_thumbnails
+
+
+class PhotoThumbnailTests(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.origem = os.path.join(self.root, "foto.jpg")
+        Image.new("RGB", (2000, 1500), (200, 30, 30)).save(self.origem, "JPEG", quality=95)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_thumbnail_is_generated_once_and_cached_by_hash_and_size(self):
+        sha = "ab" * 32
+        thumb = photo_thumbnails.miniatura(self.origem, self.root, 300, sha256=sha)
+        self.assertEqual(thumb["largura"], 320)
+        self.assertEqual(thumb["etag"], f'"{sha}-320"')
+        self.assertEqual(thumb["path"], os.path.join(self.root, "miniaturas", "ab", f"{sha}_320.jpg"))
+        with Image.open(thumb["path"]) as img:
+            self.assertEqual(img.size, (320, 240))
+        self.assertLess(os.path.getsize(thumb["path"]), os.path.getsize(self.origem))
+
+        with mock.patch.object(photo_thumbnails, "gerar_miniatura") as gerar:
+            again = photo_thumbnails.miniatura(self.origem, self.root, 320, sha256=sha)
+        gerar.assert_not_called()
+        self.assertEqual(again["path"], thumb["path"])
+        self.assertTrue(photo_thumbnails.etag_confere(f'W/"x", {thumb["etag"]}', thumb["etag"]))
+
+    def test_legacy_files_are_keyed_by_path_size_and_mtime(self):
+        primeira = photo_thumbnails.miniatura(self.origem, self.root, 5000)
+        self.assertEqual(primeira["largura"], photo_thumbnails.LARGURAS[-1])
+        Image.new("RGB", (800, 600), (0, 0, 255)).save(self.origem, "JPEG")
+        os.utime(self.origem, ns=(1, 1))
+        segunda = photo_thumbnails.miniatura(self.origem, self.root, 5000)
+        self.assertNotEqual(primeira["etag"], segunda["etag"])
+
+        texto = os.path.join(self.root, "nao_imagem.jpg")
+        with open(texto, "w") as fh:
+            fh.write("x")
+        self.assertIsNone(photo_thumbnails.miniatura(texto, self.root))
+
+
+if __name__ == "__main__":
+    unittest.main()
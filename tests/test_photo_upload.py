@@ -0,0 +1,135 @@
+import base64
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from fastapi.testclient import TestClient
+
+
+os.environ.setdefault("ROTA_SECRET", "test-secret")
+os.environ["ROTA_DB"] = tempfile.NamedTemporaryFile(delete=False, suffix=".db").name
+
+import api_server  # noqa: E402
+
+
+class PhotoUploadTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.photos_dir = tempfile.mkdtemp()
+        self._old_photos = os.environ.get("ROTA_MOBILE_PHOTOS_DIR")
+        os.environ["ROTA_MOBILE_PHOTOS_DIR"] = self.photos_dir
+        api_server.DB_PATH = self.db_path
+        api_server.ensure_tables()
+        with sqlite3.connect(self.db_path) as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT id FROM companies ORDER BY id LIMIT 1")
+            self.company_id = int(cur.fetchone()[0])
+        self.motorista = {"id": 5, "nome": "MOTORISTA UM", "codigo": "MOT-01", "company_id": self.company_id}
+        api_server.app.dependency_overrides[api_server.get_current_motorista] = lambda: self.motorista
+        self.client = TestClient(api_server.app)
+        self.foto = b"\xff\xd8" + os.urandom(300_000)
+        self.sha = hashlib.sha256(self.foto).hexdigest()
+
+    def tearDown(self):
+        api_server.app.dependency_overrides.clear()
+        if self._old_photos is None:
+            os.environ.pop("ROTA_MOBILE_PHOTOS_DIR", None)
+        else:
+            os.environ["ROTA_MOBILE_PHOTOS_DIR"] = self._old_photos
+        shutil.rmtree(self.photos_dir, ignore_errors=True)
+        try:
+            os.unlink(self.db_path)
+        except OSError:
+            pass
+
+    def _registrar(self, foto):
+        with api_server.get_conn() as conn:
+            ref = api_server._store_mobile_photo(
+                conn.cursor(), "PG-001", foto, "DESPESA", "DESPESA", company_id=self.company_id
+            )
+            conn.commit()
+        return ref
+
+    def test_resumable_upload_then_reference_and_range_download(self):
+        inicio = self.client.post("/fotos/uploads", json={"tamanho_bytes": len(self.foto), "sha256": self.sha})
+        self.assertEqual(inicio.status_code, 200, inicio.text)
+        upload_id = inicio.json()["upload_id"]
+
+        parcial = self.client.put(f"/fotos/uploads/{upload_id}", content=self.foto[:100_000], headers={"Upload-Offset": "0"})
+        self.assertFalse(parcial.json()["concluido"])
+        # offset errado (bloco reenviado) e recusado com o recebido atual
+        errado = self.client.put(f"/fotos/uploads/{upload_id}", content=self.foto[:10], headers={"Upload-Offset": "0"})
+        self.assertEqual(errado.status_code, 409)
+        self.assertEqual(errado.json()["detail"]["recebido_bytes"], 100_000)
+
+        status = self.client.get(f"/fotos/uploads/{upload_id}").json()
+        fim = self.client.put(
+            f"/fotos/uploads/{upload_id}",
+            content=self.foto[status["recebido_bytes"]:],
+            headers={"Content-Range": f"bytes {status['recebido_bytes']}-{len(self.foto) - 1}/{len(self.foto)}"},
+        )
+        self.assertTrue(fim.json()["concluido"])
+        self.assertEqual(fim.json()["sha256"], self.sha)
+
+        ref = self._registrar({"sha256": self.sha, "mime_type": "image/jpeg"})
+        self.assertEqual(ref["tamanho_bytes"], len(self.foto))
+        self.assertEqual(ref["url"], f"/fotos/{self.sha}")
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(conn.execute("SELECT sha256, company_id FROM rota_fotos").fetchone(), (self.sha, self.company_id))
+
+        inteiro = self.client.get(f"/fotos/{self.sha}")
+        self.assertEqual(inteiro.content, self.foto)
+        faixa = self.client.get(f"/fotos/{self.sha}", headers={"Range": "bytes=10-19"})
+        self.assertEqual(faixa.status_code, 206)
+        self.assertEqual(faixa.content, self.foto[10:20])
+        self.assertEqual(faixa.headers["content-range"], f"bytes 10-19/{len(self.foto)}")
+        self.assertEqual(self.client.get(f"/fotos/{self.sha}", headers={"If-None-Match": f'"{self.sha}"'}).status_code, 304)
+
+        # retry com o mesmo conteudo: nada a enviar
+        again = self.client.post("/fotos/uploads", json={"tamanho_bytes": len(self.foto), "sha256": self.sha}).json()
+        self.assertTrue(again["concluido"])
+        self.assertEqual(again["upload_id"], "")
+
+    def test_multipart_and_legacy_base64_share_the_content_store(self):
+        out = self.client.post("/fotos/upload", files={"arquivo": ("a.jpg", self.foto, "image/jpeg")}).json()
+        self.assertEqual(out["sha256"], self.sha)
+        self.assertEqual(self.client.get(f"/fotos/{self.sha}").content, self.foto)
+
+        ref = self._registrar({"imagem_base64": base64.b64encode(self.foto).decode()})
+        self.assertEqual(ref["sha256"], self.sha)
+        objetos = [name for _root, _dirs, files in os.walk(os.path.join(self.photos_dir, "objetos")) for name in files]
+        self.assertEqual(objetos, [self.sha])
+
+        outra_empresa = dict(self.motorista, company_id=self.company_id + 99)
+        api_server.app.dependency_overrides[api_server.get_current_motorista] = lambda: outra_empresa
+        self.assertEqual(self.client.get(f"/fotos/{self.sha}").status_code, 404)
+
+    def test_sha_reference_needs_an_upload_by_the_same_company(self):
+        out = self.client.post("/fotos/upload", files={"arquivo": ("a.jpg", self.foto, "image/jpeg")}).json()
+        self.assertEqual(out["sha256"], self.sha)
+
+        outra_empresa = dict(self.motorista, company_id=self.company_id + 99)
+        api_server.app.dependency_overrides[api_server.get_current_motorista] = lambda: outra_empresa
+        # conhecer o sha256 nao basta: a outra empresa precisa enviar os bytes
+        inicio = self.client.post("/fotos/uploads", json={"tamanho_bytes": len(self.foto), "sha256": self.sha}).json()
+        self.assertFalse(inicio["concluido"])
+        self.assertTrue(inicio["upload_id"])
+        with api_server.get_conn() as conn:
+            ref = api_server._store_mobile_photo(
+                conn.cursor(), "PG-002", {"sha256": self.sha}, "DESPESA", "DESPESA", company_id=outra_empresa["company_id"]
+            )
+            conn.commit()
+        self.assertEqual((ref["sha256"], ref["storage_path"], ref["url"]), ("", "", ""))
+        self.assertEqual(self.client.get(f"/fotos/{self.sha}").status_code, 404)
+
+        fim = self.client.put(f"/fotos/uploads/{inicio['upload_id']}", content=self.foto, headers={"Upload-Offset": "0"}).json()
+        self.assertTrue(fim["concluido"])
+        self.assertEqual(self.client.get(f"/fotos/{self.sha}").content, self.foto)
+
+
+if __name__ == "__main__":
+    unittest.main()
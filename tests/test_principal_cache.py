@@ -0,0 +1,99 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+
+os.environ.setdefault("ROTA_SECRET", "test-secret")
+os.environ["ROTA_DB"] = tempfile.NamedTemporaryFile(delete=False, suffix=".db").name
+
+import api_server  # noqa: E402
+from app.services.principal_cache import PrincipalCache  # noqa: E402
+
+
+class PrincipalCacheTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        api_server.DB_PATH = self.db_path
+        api_server.ensure_tables()
+        api_server.PRINCIPALS.invalidate()
+        with sqlite3.connect(self.db_path) as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT id FROM companies ORDER BY id LIMIT 1")
+            self.company_id = int(cur.fetchone()[0])
+            cur.execute(
+                "INSERT INTO motoristas (nome, codigo, senha, acesso_liberado, company_id) VALUES ('MOTORISTA UM', 'MOT-01', '1', 1, ?)",
+                (self.company_id,),
+            )
+        token = api_server.create_token("MOT-01", "motorista", company_id=self.company_id)
+        self.credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+    def tearDown(self):
+        api_server.PRINCIPALS.invalidate()
+        try:
+            os.unlink(self.db_path)
+        except OSError:
+            pass
+
+    def test_hit_skips_token_verification_and_db(self):
+        first = api_server.get_current_motorista(self.credentials)
+        with mock.patch.object(api_server, "verify_token") as verify, mock.patch.object(api_server, "get_conn") as get_conn:
+            second = api_server.get_current_motorista(self.credentials)
+        verify.assert_not_called()
+        get_conn.assert_not_called()
+        self.assertEqual(first, second)
+
+        # copia: o handler nao altera a entrada em cache
+        second["nome"] = "OUTRO"
+        self.assertEqual(api_server.get_current_motorista(self.credentials)["nome"], "MOTORISTA UM")
+
+    def test_blocking_driver_takes_effect_immediately(self):
+        api_server.get_current_motorista(self.credentials)
+        api_server.admin_set_acesso_motorista("mot-01", api_server.MotoristaAcessoIn(liberado=False), _ok=True)
+
+        with self.assertRaises(HTTPException) as ctx:
+            api_server.get_current_motorista(self.credentials)
+        self.assertEqual(ctx.exception.status_code, 403)
+
+    def test_entry_never_outlives_token_exp(self):
+        cache = PrincipalCache(ttl_seconds=60)
+        cache.put("db", "motorista", "tok", {"codigo": "MOT-01"}, codigo="MOT-01", exp=time.time() - 1)
+        self.assertIsNone(cache.get("db", "motorista", "tok"))
+
+        cache.put("db", "vendedor", "tok", {"codigo": "V1"}, codigo="v1")
+        cache.invalidate("motorista", "V1")
+        self.assertIsNotNone(cache.get("db", "vendedor", "tok"))
+        cache.invalidate("vendedor", "V1")
+        self.assertIsNone(cache.get("db", "vendedor", "tok"))
+
+    def test_put_after_invalidation_is_skipped(self):
+        cache = PrincipalCache(ttl_seconds=60)
+        geracao = cache.generation()
+        # bloqueio chega entre a leitura do cadastro e o put
+        cache.invalidate("motorista", "MOT-01")
+        cache.put("db", "motorista", "tok", {"codigo": "MOT-01"}, codigo="MOT-01", generation=geracao)
+        self.assertIsNone(cache.get("db", "motorista", "tok"))
+        cache.put("db", "motorista", "tok", {"codigo": "MOT-01"}, codigo="MOT-01", generation=cache.generation())
+        self.assertIsNotNone(cache.get("db", "motorista", "tok"))
+
+    def test_block_during_login_lookup_is_not_undone(self):
+        original = api_server.get_conn
+
+        def get_conn_com_bloqueio():
+            # o admin bloqueia depois que a dependencia ja comecou a autenticar
+            api_server.PRINCIPALS.invalidate("motorista", "MOT-01")
+            return original()
+
+        with mock.patch.object(api_server, "get_conn", side_effect=get_conn_com_bloqueio):
+            api_server.get_current_motorista(self.credentials)
+        self.assertIsNone(api_server.PRINCIPALS.get(api_server.DB_PATH, "motorista", self.credentials.credentials))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from backend.config.database import Base, _ensure_backend_columns
+from backend.models.cadastro import ProdutoDB
+from backend.services import produto_resolver
+from backend.services.produto_resolver import ProdutoRef, resolve_produto_ids, resolve_produto_refs
+
+
+class ProdutoResolverTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{Path(self.db_path).as_posix()}")
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.statements = []
+        event.listen(self.engine.sync_engine, "before_cursor_execute", self._count)
+        produto_resolver.clear_catalog_cache()
+
+    def tearDown(self):
+        produto_resolver.clear_catalog_cache()
+        asyncio.run(self.engine.dispose())
+        try:
+            os.unlink(self.db_path)
+        except OSError:
+            pass
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    async def _bootstrap(self):
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(_ensure_backend_columns)
+        async with self.sessions() as db:
+            db.add_all(
+                [
+                    ProdutoDB(codigo="FRANGO", nome="FRANGO RESFRIADO"),
+                    ProdutoDB(codigo="FRANGO-004", nome="FRANGO CONGELADO"),
+                    ProdutoDB(codigo="P-10", nome="PEITO"),
+                ]
+            )
+            await db.commit()
+
+    def _legacy(self, sql, params=()):
+        # escrita feita fora da sessao, como a API legada
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(sql, params)
+
+    def test_batch_creates_missing_products_with_next_free_suffix(self):
+        async def run():
+            await self._bootstrap()
+            async with self.sessions() as db:
+                primeiro = await resolve_produto_ids(db, ["frango", " Frango ", "ovo", "peito", "", None], descricao="teste")
+                await db.commit()
+                # o commit mudou a versao: recarrega uma vez e depois serve do cache
+                repetido = await resolve_produto_ids(db, ["FRANGO", "OVO", "PEITO"], descricao="teste")
+                self.statements.clear()
+                await resolve_produto_ids(db, ["FRANGO", "OVO", "PEITO"], descricao="teste")
+                consultas = len(self.statements)
+                produtos = {
+                    item.nome: (item.id, item.codigo, item.descricao)
+                    for item in (await db.execute(select(ProdutoDB))).scalars()
+                }
+                return primeiro, repetido, consultas, produtos
+
+        primeiro, repetido, consultas, produtos = asyncio.run(run())
+        self.assertEqual(set(primeiro), {"FRANGO", "OVO", "PEITO"})
+        self.assertEqual(produtos["FRANGO"][1:], ("FRANGO-005", "teste"))
+        self.assertEqual(produtos["OVO"][1], "OVO")
+        self.assertEqual(primeiro["PEITO"], produtos["PEITO"][0])
+        self.assertEqual(repetido, primeiro)
+        # so a leitura da versao
+        self.assertEqual(consultas, 1)
+
+    def test_explicit_code_wins_and_repeated_names_share_the_new_product(self):
+        async def run():
+            await self._bootstrap()
+            async with self.sessions() as db:
+                refs = [
+                    ProdutoRef(nome="Peito Especial", codigo="p 10"),
+                    ProdutoRef(nome="Coxa", codigo="cx-1", unidade="un"),
+                    ProdutoRef(nome="Coxa", codigo="cx-2"),
+                ]
+                resolved = await resolve_produto_refs(db, refs, descricao="compras", categoria=lambda nome: "GERAL")
+                await db.commit()
+                coxa = (await db.execute(select(ProdutoDB).where(ProdutoDB.nome == "COXA"))).scalar_one()
+                peito = (await db.execute(select(ProdutoDB.id).where(ProdutoDB.codigo == "P-10"))).scalar_one()
+                return resolved, coxa, peito
+
+        resolved, coxa, peito = asyncio.run(run())
+        self.assertEqual(resolved[("PEITO ESPECIAL", "P-10")], peito)
+        self.assertEqual(resolved[("COXA", "CX-1")], coxa.id)
+        self.assertEqual(resolved[("COXA", "CX-2")], coxa.id)
+        self.assertEqual((coxa.codigo, coxa.unidade, coxa.categoria), ("CX-1", "UN", "GERAL"))
+
+    def test_cache_follows_outside_writes_and_ignores_rolled_back_rows(self):
+        async def run():
+            await self._bootstrap()
+            async with self.sessions() as db:
+                antes = await resolve_produto_ids(db, ["PEITO"], descricao="teste")
+                await db.commit()
+                self._legacy("UPDATE produtos SET nome='PEITO DESOSSADO' WHERE codigo='P-10'")
+                self._legacy("INSERT INTO produtos (codigo, nome) VALUES ('ASA', 'ASA')")
+                depois = await resolve_produto_ids(db, ["PEITO", "ASA"], descricao="teste")
+                await db.rollback()
+                descartado = await resolve_produto_ids(db, ["PEITO"], descricao="teste")
+                await db.commit()
+                nomes = {
+                    item.id: item.nome
+                    for item in (await db.execute(select(ProdutoDB).execution_options(populate_existing=True))).scalars()
+                }
+                return antes, depois, descartado, nomes
+
+        antes, depois, descartado, nomes = asyncio.run(run())
+        self.assertEqual(nomes[antes["PEITO"]], "PEITO DESOSSADO")
+        self.assertNotEqual(depois["PEITO"], antes["PEITO"])
+        self.assertEqual(nomes[depois["ASA"]], "ASA")
+        # o PEITO criado antes do rollback nao fica no cache compartilhado
+        self.assertEqual(nomes[descartado["PEITO"]], "PEITO")
+
+
+if __name__ == "__main__":
+    unittest.main()
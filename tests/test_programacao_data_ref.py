@@ -0,0 +1,112 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from backend.api.v1.endpoints import relatorios
+from backend.config.database import Base, _ensure_backend_columns
+from backend.models.programacao import ProgramacaoDB
+from backend.services.programacao_data_ref import data_ref_iso, data_ref_range
+
+
+class ProgramacaoDataRefTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{Path(self.db_path).as_posix()}")
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    def tearDown(self):
+        asyncio.run(self.engine.dispose())
+        try:
+            os.unlink(self.db_path)
+        except OSError:
+            pass
+
+    def test_parsing_and_ranges(self):
+        self.assertEqual(data_ref_iso("", "05/03/26 10:00:00", "2020-01-01"), "2026-03-05")
+        self.assertEqual(data_ref_iso("2026-03-05T08:00:00"), "2026-03-05")
+        self.assertEqual(data_ref_iso("sem data", "2026-01-01"), "")
+        self.assertEqual(data_ref_range("05/03/2026"), ("2026-03-05", "2026-03-06"))
+        self.assertEqual(data_ref_range("12/2026"), ("2026-12-01", "2027-01-01"))
+        self.assertEqual(data_ref_range("2026-02"), ("2026-02-01", "2026-03-01"))
+        self.assertEqual(data_ref_range("2026"), ("2026-01-01", "2027-01-01"))
+        self.assertIsNone(data_ref_range("PG-001"))
+
+    def test_column_is_maintained_and_filters_in_sql(self):
+        async def run():
+            async with self.engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                await conn.run_sync(_ensure_backend_columns)
+            async with self.sessions() as db:
+                db.add_all(
+                    [
+                        ProgramacaoDB(codigo_programacao="PG-1", motorista="A", veiculo="V", data_saida="05/03/2026"),
+                        ProgramacaoDB(codigo_programacao="PG-2", motorista="A", veiculo="V", data_criacao="2026-04-01 09:00:00"),
+                        ProgramacaoDB(codigo_programacao="PG-3", motorista="A", veiculo="V", data="31/03/26"),
+                        ProgramacaoDB(
+                            codigo_programacao="PG-5", motorista="A", veiculo="V", data_criacao="2026-02-27", data_saida="2026-03-02"
+                        ),
+                    ]
+                )
+                await db.commit()
+                stored = {
+                    codigo: (centro, relatorio)
+                    for codigo, centro, relatorio in await db.execute(
+                        text("SELECT codigo_programacao, data_ref_iso, relatorio_data_ref_iso FROM programacoes")
+                    )
+                }
+                self.assertEqual(
+                    stored,
+                    {
+                        "PG-1": ("2026-03-05", "2026-03-05"),
+                        "PG-2": ("2026-04-01", "2026-04-01"),
+                        "PG-3": ("2026-03-31", "2026-03-31"),
+                        "PG-5": ("2026-03-02", "2026-02-27"),
+                    },
+                )
+
+                # escrita fora do ORM (API legada): o trigger invalida e a consulta recalcula
+                await db.execute(text("UPDATE programacoes SET data_saida='2026-04-10' WHERE codigo_programacao='PG-1'"))
+                await db.execute(
+                    text("INSERT INTO programacoes (codigo_programacao, motorista, veiculo, data_saida) VALUES ('PG-4', 'A', 'V', '2026-03-20')")
+                )
+                await db.commit()
+                pending = (await db.execute(text("SELECT COUNT(*) FROM programacoes WHERE data_ref_iso IS NULL"))).scalar()
+                self.assertEqual(pending, 2)
+
+                marco = await relatorios.programacao_rows(db, data_like="03/2026")
+                self.assertEqual([row.codigo_programacao for row in marco], ["PG-4", "PG-3"])
+                dia = await relatorios.programacao_rows(db, data_like="10/04/2026")
+                self.assertEqual([row.codigo_programacao for row in dia], ["PG-1"])
+                self.assertTrue(relatorios.matches_data_ref(dia[0], "2026-04"))
+                # relatorio usa data_criacao antes de data_saida, a mesma data exibida na linha
+                fevereiro = await relatorios.programacao_rows(db, data_like="02/2026")
+                self.assertEqual([row.codigo_programacao for row in fevereiro], ["PG-5"])
+                self.assertEqual(relatorios.data_ref(fevereiro[0]), "2026-02-27")
+
+        asyncio.run(run())
+
+    def test_rows_from_before_the_report_column_are_recomputed(self):
+        async def run():
+            async with self.engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                await conn.run_sync(_ensure_backend_columns)
+                await conn.execute(
+                    text(
+                        "INSERT INTO programacoes (codigo_programacao, motorista, veiculo, data_criacao, data_saida, data_ref_iso) "
+                        "VALUES ('PG-1', 'A', 'V', '2026-02-27', '2026-03-02', '2026-03-02')"
+                    )
+                )
+                await conn.run_sync(_ensure_backend_columns)
+                return (await conn.execute(text("SELECT data_ref_iso, relatorio_data_ref_iso FROM programacoes"))).one()
+
+        self.assertEqual(tuple(asyncio.run(run())), ("2026-03-02", "2026-02-27"))
+
+
+if __name__ == "__main__":
+    unittest.main()
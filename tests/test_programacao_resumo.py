@@ -0,0 +1,140 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+
+os.environ.setdefault("ROTA_SECRET", "test-secret")
+os.environ["ROTA_DB"] = tempfile.NamedTemporaryFile(delete=False, suffix=".db").name
+
+import api_server  # noqa: E402
+
+
+class ProgramacaoResumoTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        api_server.DB_PATH = self.db_path
+        api_server.ensure_tables()
+        with sqlite3.connect(self.db_path) as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT id FROM companies ORDER BY id LIMIT 1")
+            self.company_id = int(cur.fetchone()[0])
+            for codigo in ("PG-001", "PG-002"):
+                cur.execute(
+                    """
+                    INSERT INTO programacoes (
+                        codigo_programacao, status, caixas_carregadas, nf_kg_carregado, nf_caixas, nf_preco, company_id
+                    )
+                    VALUES (?, 'EM_ROTA', 20, 200, 20, 5, ?)
+                    """,
+                    (codigo, self.company_id),
+                )
+            cur.executemany(
+                """
+                INSERT INTO programacao_itens (codigo_programacao, cod_cliente, pedido, qnt_caixas, status_pedido, company_id)
+                VALUES ('PG-001', ?, ?, ?, 'PENDENTE', ?)
+                """,
+                [("C1", "P1", 8, self.company_id), ("C2", "P2", 12, self.company_id)],
+            )
+            cur.execute(
+                """
+                INSERT INTO transferencias (
+                    id, codigo_origem, codigo_destino, cod_cliente, pedido, qtd_caixas, qtd_convertida, status, company_id
+                )
+                VALUES ('T1', 'PG-001', 'pg-002', 'C1', 'P1', 4, 4, 'CONVERTIDA', ?)
+                """,
+                (self.company_id,),
+            )
+        api_server.rebuild_programacao_resumo()
+
+    def tearDown(self):
+        try:
+            os.unlink(self.db_path)
+        except OSError:
+            pass
+
+    def _resumo(self, codigo):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM programacao_resumo WHERE codigo_programacao_key=?", (codigo,)).fetchone()
+            return dict(row) if row else None
+
+    def _saldo_lido(self, codigo):
+        with api_server.get_conn() as conn:
+            row = conn.execute(
+                f"SELECT {api_server._caixas_saldo_subquery(conn, 'p')} FROM programacoes p WHERE p.codigo_programacao=?",
+                (codigo,),
+            ).fetchone()
+            return int(row["caixas_saldo"])
+
+    def test_rebuild_matches_direct_calculation(self):
+        with api_server.get_conn() as conn:
+            cur = conn.cursor()
+            calc = api_server._transferencias_resumo_lote_calc(cur, ["PG-001", "PG-002"])
+            saldo = conn.execute(
+                f"SELECT {api_server._caixas_saldo_calc_expr(conn, 'p')} FROM programacoes p WHERE p.codigo_programacao='PG-001'"
+            ).fetchone()[0]
+        origem, destino = self._resumo("PG-001"), self._resumo("PG-002")
+        self.assertEqual(origem["caixas_saldo"], int(saldo))
+        self.assertEqual(origem["transferencias_saida"], calc["PG-001"]["transferencias_saida"])
+        self.assertEqual(destino["transferencias_entrada"], calc["PG-002"]["transferencias_entrada"])
+        # 4 caixas de 10 kg (200 kg / 20 cx) a R$ 5/kg
+        self.assertAlmostEqual(destino["kg_transferido_convertido"], 40.0)
+        self.assertAlmostEqual(origem["compra_transferida_saida"], 200.0)
+        self.assertAlmostEqual(destino["compra_transferida_entrada"], 200.0)
+
+    def test_write_invalidates_row_and_refresh_restores_it(self):
+        antes = self._saldo_lido("PG-001")
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE programacao_itens SET alteracao_tipo='TRANSBORDO' WHERE pedido='P2'")
+
+        # trigger removeu a linha: a leitura cai no calculo direto e ja ve o transbordo
+        self.assertIsNone(self._resumo("PG-001"))
+        self.assertNotEqual(self._saldo_lido("PG-001"), antes)
+        self.assertIsNotNone(self._resumo("PG-002"))
+
+        with api_server.get_conn() as conn:
+            self.assertEqual(api_server._refresh_programacao_resumo(conn), 1)
+            pendentes = conn.execute("SELECT COUNT(*) FROM programacao_resumo_pendente").fetchone()[0]
+        self.assertEqual(pendentes, 0)
+        self.assertEqual(self._resumo("PG-001")["caixas_saldo"], self._saldo_lido("PG-001"))
+
+    def test_write_during_refresh_keeps_the_route_pending(self):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE programacao_itens SET alteracao_tipo='TRANSBORDO' WHERE pedido='P2'")
+        concorrente = []
+
+        def escrita_concorrente():
+            # outro request grava a mesma rota depois das leituras do refresh
+            with sqlite3.connect(self.db_path, timeout=5) as conn:
+                conn.execute("UPDATE programacao_itens SET qnt_caixas=3 WHERE pedido='P1'")
+
+        original = api_server.transferencias_totais
+
+        def totais_com_escrita(*args, **kwargs):
+            thread = threading.Thread(target=escrita_concorrente)
+            thread.start()
+            concorrente.append(thread)
+            thread.join(0.3)
+            return original(*args, **kwargs)
+
+        with mock.patch.object(api_server, "transferencias_totais", side_effect=totais_com_escrita):
+            with api_server.get_conn() as conn:
+                api_server._refresh_programacao_resumo(conn)
+        for thread in concorrente:
+            thread.join()
+
+        # a marca feita pela escrita concorrente sobrevive; o proximo refresh ve o valor novo
+        with sqlite3.connect(self.db_path) as conn:
+            pendentes = [r[0] for r in conn.execute("SELECT codigo_programacao_key FROM programacao_resumo_pendente")]
+        self.assertIn("PG-001", pendentes)
+        with api_server.get_conn() as conn:
+            api_server._refresh_programacao_resumo(conn)
+        self.assertEqual(self._resumo("PG-001")["caixas_saldo"], self._saldo_lido("PG-001"))
+
+
+if __name__ == "__main__":
+    unittest.main()
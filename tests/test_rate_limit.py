@@ -0,0 +1,143 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from backend.config.settings import settings
+
+from backend.middleware.rate_limit import (
+    MemoryRateLimitBackend,
+    RateLimitBackend,
+    RateLimitMiddleware,
+    RateLimitRule,
+    SQLiteRateLimitBackend,
+    parse_rate_limit_groups,
+)
+
+
+class RateLimitBackendTests(unittest.TestCase):
+    def test_gcra_allows_burst_then_refills(self):
+        backend = MemoryRateLimitBackend()
+        results = [backend.hit("k", 3, 3.0, 100.0)[0] for _ in range(4)]
+        self.assertEqual(results, [True, True, True, False])
+        allowed, retry_after = backend.hit("k", 3, 3.0, 100.0)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(retry_after, 1.0)
+        self.assertTrue(backend.hit("k", 3, 3.0, 101.0)[0])
+
+    def test_memory_backend_evicts_least_recently_used_keys(self):
+        backend = MemoryRateLimitBackend(max_keys=2)
+        for key in ("a", "b", "a", "c"):
+            backend.hit(key, 10, 60, 1.0)
+        self.assertEqual(list(backend._tats), ["a", "c"])
+
+    def test_sqlite_backend_shares_quota_between_instances(self):
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        worker_a, worker_b = SQLiteRateLimitBackend(path), SQLiteRateLimitBackend(path)
+        try:
+            self.assertTrue(worker_a.hit("ip", 2, 60, 10.0)[0])
+            self.assertTrue(worker_b.hit("ip", 2, 60, 10.0)[0])
+            self.assertFalse(worker_a.hit("ip", 2, 60, 10.0)[0])
+        finally:
+            worker_a.close()
+            worker_b.close()
+            os.unlink(path)
+
+    def test_keys_are_spent_only_when_all_allow(self):
+        for backend in (MemoryRateLimitBackend(), None):
+            fd, path = tempfile.mkstemp(suffix=".db")
+            os.close(fd)
+            backend = backend or SQLiteRateLimitBackend(path)
+            try:
+                self.assertTrue(backend.hit_many([("ip", 2), ("co", 1)], 60, 10.0)[0])
+                allowed, retry_after = backend.hit_many([("ip", 2), ("co", 1)], 60, 10.0)
+                self.assertFalse(allowed)
+                self.assertAlmostEqual(retry_after, 60.0)
+                # o bloqueio pelo tenant nao gastou a cota do IP
+                self.assertTrue(backend.hit("ip", 2, 60, 10.0)[0])
+                self.assertFalse(backend.hit("ip", 2, 60, 10.0)[0])
+            finally:
+                backend.close()
+                os.unlink(path)
+
+    def test_backend_base_class_is_abstract(self):
+        with self.assertRaises(TypeError):
+            RateLimitBackend()
+
+    def test_parse_groups(self):
+        rules = parse_rate_limit_groups("/api/v1/auth=20/60, /api/v1/relatorios=30//90, invalido", 60)
+        self.assertEqual(
+            rules,
+            [RateLimitRule("/api/v1/auth", 20, 60.0), RateLimitRule("/api/v1/relatorios", 30, 60.0, 90)],
+        )
+
+
+class RateLimitMiddlewareTests(unittest.TestCase):
+    def _client(self, rules):
+        app = FastAPI()
+
+        @app.get("/api/v1/auth/ping")
+        def auth_ping():
+            return {"ok": True}
+
+        @app.get("/api/v1/other")
+        def other():
+            return {"ok": True}
+
+        app.add_middleware(RateLimitMiddleware, backend=MemoryRateLimitBackend(), rules=rules)
+        return TestClient(app)
+
+    def test_route_group_limit_is_separate_from_default(self):
+        client = self._client([RateLimitRule("/api/v1/auth", 1, 60)])
+        self.assertEqual(client.get("/api/v1/auth/ping").status_code, 200)
+        blocked = client.get("/api/v1/auth/ping")
+        self.assertEqual(blocked.status_code, 429)
+        self.assertGreaterEqual(int(blocked.headers["Retry-After"]), 1)
+        self.assertEqual(client.get("/api/v1/other").status_code, 200)
+
+    def test_tenant_limit_applies_across_ips(self):
+        client = self._client([RateLimitRule("/api/v1/other", 100, 60, tenant_limit=1)])
+        token = jwt.encode({"company_id": 7}, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+        headers = {"Authorization": f"Bearer {token}"}
+        self.assertEqual(client.get("/api/v1/other", headers={**headers, "X-Real-IP": "1.1.1.1"}).status_code, 200)
+        self.assertEqual(client.get("/api/v1/other", headers={**headers, "X-Real-IP": "2.2.2.2"}).status_code, 429)
+        self.assertEqual(client.get("/api/v1/other", headers={"X-Real-IP": "2.2.2.2"}).status_code, 200)
+
+    def test_tenant_rejection_keeps_the_ip_budget(self):
+        client = self._client([RateLimitRule("/api/v1/other", 1, 60, tenant_limit=1)])
+        token = jwt.encode({"company_id": 8}, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+        headers = {"Authorization": f"Bearer {token}"}
+        self.assertEqual(client.get("/api/v1/other", headers={**headers, "X-Real-IP": "1.1.1.1"}).status_code, 200)
+        self.assertEqual(client.get("/api/v1/other", headers={**headers, "X-Real-IP": "2.2.2.2"}).status_code, 429)
+        self.assertEqual(client.get("/api/v1/other", headers={"X-Real-IP": "2.2.2.2"}).status_code, 200)
+
+    def test_blocking_backend_runs_in_the_threadpool(self):
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        backend = SQLiteRateLimitBackend(path)
+        threads = []
+        original = backend.hit_many
+        backend.hit_many = lambda *args: threads.append(threading.get_ident()) or original(*args)
+        app = FastAPI()
+
+        @app.get("/api/v1/other")
+        async def other():
+            return {"loop": threading.get_ident()}
+
+        app.add_middleware(RateLimitMiddleware, backend=backend, rules=[RateLimitRule("/api/v1/other", 5, 60)])
+        try:
+            loop_thread = TestClient(app).get("/api/v1/other").json()["loop"]
+            self.assertEqual(len(threads), 1)
+            self.assertNotEqual(threads[0], loop_thread)
+        finally:
+            backend.close()
+            os.unlink(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
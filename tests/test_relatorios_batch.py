@@ -0,0 +1,101 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from backend.api.v1.endpoints import relatorios
+from backend.config.database import Base
+from backend.models.cadastro import AjudanteDB
+from backend.models.programacao import ProgramacaoDB, ProgramacaoItemControleDB, ProgramacaoItemDB
+from backend.models.recebimento import RecebimentoDB
+
+
+class RelatoriosBatchTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{Path(self.db_path).as_posix()}")
+        self.queries = 0
+
+        @event.listens_for(self.engine.sync_engine, "before_cursor_execute")
+        def _count(*_args):
+            self.queries += 1
+
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        asyncio.run(self._seed())
+
+    def tearDown(self):
+        asyncio.run(self.engine.dispose())
+        try:
+            os.unlink(self.db_path)
+        except OSError:
+            pass
+
+    async def _seed(self):
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with self.sessions() as db:
+            db.add_all([AjudanteDB(nome="Ana", sobrenome="Lima"), AjudanteDB(nome="Beto", sobrenome="")])
+            for r in range(8):
+                codigo = f"pg-{r}" if r % 2 else f"PG-{r}"
+                db.add(ProgramacaoDB(codigo_programacao=codigo, motorista=f"MOT {r % 2}", veiculo="V1", equipe="1|2"))
+                for c in range(3):
+                    db.add(ProgramacaoItemDB(codigo_programacao=codigo, cod_cliente=f"C{c}", nome_cliente=f"CLI {2 - c}", pedido=f"P{c}"))
+                    db.add(
+                        ProgramacaoItemControleDB(
+                            codigo_programacao=codigo, cod_cliente=f"C{c}", pedido=f"P{c}", mortalidade_aves=c, media_aplicada=2.0
+                        )
+                    )
+                    db.add(
+                        RecebimentoDB(
+                            codigo_programacao=codigo, cod_cliente=f"C{c}", nome_cliente="X", valor=c, data_registro=f"2026-01-0{c + 1}"
+                        )
+                    )
+            await db.commit()
+
+    def test_batch_matches_single_route_helpers(self):
+        async def run():
+            async with self.sessions() as db:
+                codigos = [f"PG-{r}" for r in range(8)] + ["PG-404"]
+                batch = await relatorios.load_relatorio_batch(
+                    db, codigos, itens=True, controles=True, recebimentos=True, despesas=True, ajudantes=True
+                )
+                for codigo in codigos:
+                    self.assertEqual(
+                        [row.id for row in batch.itens.get(codigo, [])],
+                        [row.id for row in await relatorios.itens_for(db, codigo)],
+                    )
+                    self.assertEqual(
+                        [row.id for row in batch.recebimentos.get(codigo, [])],
+                        [row.id for row in await relatorios.recebimentos_for(db, codigo)],
+                    )
+                    self.assertEqual(
+                        sorted(row.id for row in batch.controles.get(codigo, [])),
+                        sorted(row.id for row in await relatorios.controles_for(db, codigo)),
+                    )
+                self.assertNotIn("PG-404", batch.itens)
+                self.assertEqual(batch.equipe("1|2"), await relatorios.resolve_equipe_nomes(db, "1|2"))
+                self.assertEqual(batch.equipe("1|2"), "ANA LIMA / BETO")
+
+        asyncio.run(run())
+
+    def test_mortalidade_report_query_count_does_not_grow_with_routes(self):
+        async def run():
+            async with self.sessions() as db:
+                self.queries = 0
+                report = await relatorios.build_mortalidade_report(db, codigo_like="", motorista_like="", data_like="")
+                return report, self.queries
+
+        report, queries = asyncio.run(run())
+        self.assertEqual(len(report.rows), 8)
+        self.assertTrue(all(row["mortalidade_total"] == 3 for row in report.rows))
+        # programacoes + itens + controles + rota_fotos, independente do numero de rotas
+        self.assertLessEqual(queries, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+
+os.environ.setdefault("ROTA_SECRET", "test-secret")
+os.environ["ROTA_DB"] = tempfile.NamedTemporaryFile(delete=False, suffix=".db").name
+
+import api_server  # noqa: E402
+
+
+class RotasAtivasLoteTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        api_server.DB_PATH = self.db_path
+        api_server.ensure_tables()
+        with sqlite3.connect(self.db_path) as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT id FROM companies ORDER BY id LIMIT 1")
+            self.company_id = int(cur.fetchone()[0])
+            cur.execute("INSERT INTO ajudantes (id, nome, sobrenome, company_id) VALUES (7, 'JOSE SILVA', '', ?)", (self.company_id,))
+            cur.execute("INSERT INTO ajudantes (id, nome, sobrenome, company_id) VALUES (8, 'PEDRO LIMA', '', ?)", (self.company_id,))
+            cur.execute("INSERT INTO equipes (codigo, ajudante1, ajudante2, company_id) VALUES ('EQ-01', '7', '8', ?)", (self.company_id,))
+            for idx in range(1, 13):
+                codigo = f"PG-{idx:03d}"
+                veiculo = f"ABC{idx % 3}D00"
+                finalizada = idx <= 3
+                cur.execute(
+                    """
+                    INSERT INTO programacoes (
+                        codigo_programacao, motorista, veiculo, equipe, status, data_criacao,
+                        km_inicial, km_final, data_chegada, company_id
+                    )
+                    VALUES (?, 'MOTORISTA', ?, ?, ?, ?, 0, ?, ?, ?)
+                    """,
+                    (
+                        codigo,
+                        veiculo,
+                        "EQ-01" if idx % 2 else "7 / 8",
+                        "FINALIZADA" if finalizada else "ATIVA",
+                        f"2026-01-{idx:02d}",
+                        1000.0 * idx if finalizada else 0,
+                        f"2026-01-{idx:02d}" if finalizada else "",
+                        self.company_id,
+                    ),
+                )
+            cur.execute(
+                """
+                INSERT INTO transferencias (id, codigo_origem, codigo_destino, cod_cliente, pedido, qtd_caixas, status, company_id)
+                VALUES ('T1', 'PG-010', 'pg-011', 'C1', '', 5, 'PENDENTE', ?),
+                       ('T2', 'PG-011', 'PG-012', 'C2', '', 3, 'ACEITA', ?),
+                       ('T3', 'PG-012', 'PG-010', 'C3', '', 9, 'CANCELADA', ?)
+                """,
+                (self.company_id, self.company_id, self.company_id),
+            )
+            cur.execute(
+                "INSERT INTO rota_substituicoes (codigo_programacao, status, motivo, company_id) VALUES ('PG-009', 'PENDENTE_ACEITE', 'PANE', ?)",
+                (self.company_id,),
+            )
+
+    def tearDown(self):
+        try:
+            os.unlink(self.db_path)
+        except OSError:
+            pass
+
+    def _rows(self, conn):
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT p.codigo_programacao, p.status, p.status_operacional, p.motorista, p.veiculo,
+                   p.equipe, e.ajudante1, e.ajudante2, p.km_inicial, p.data_criacao
+            FROM programacoes p
+            LEFT JOIN equipes e ON UPPER(TRIM(e.codigo)) = UPPER(TRIM(p.equipe))
+            WHERE """ + api_server._rotas_not_finalizadas_clause(conn, "p") + """
+            ORDER BY p.id DESC
+            """
+        )
+        return cur.fetchall()
+
+    def test_lote_matches_per_row_enrichment(self):
+        with api_server.get_conn() as conn:
+            cur = conn.cursor()
+            rows = self._rows(conn)
+            expected = []
+            for r in rows:
+                d = api_server._decorate_rota_row(api_server.row_to_dict(r), cur)
+                codigo = str(d.get("codigo_programacao") or "").strip()
+                pend = api_server._has_pending_substituicao(cur, codigo, company_id=self.company_id)
+                d["substituicao_pendente"] = 1 if pend else 0
+                d["status_operacional"] = api_server._status_operacional_especial(d, pend_substituicao=pend)
+                d = api_server._attach_ultimo_km_veiculo(cur, d)
+                d.update(api_server._transferencias_resumo(cur, codigo, company_id=self.company_id))
+                expected.append(d)
+
+            got = api_server._enriquecer_rotas_ativas(cur, rows, company_id=self.company_id)
+
+        self.assertEqual(len(got), 9)
+        self.assertEqual(got, expected)
+        by_codigo = {d["codigo_programacao"]: d for d in got}
+        self.assertEqual(by_codigo["PG-009"]["status_operacional"], "EM_TRANSFERENCIA")
+        self.assertEqual(by_codigo["PG-004"]["equipe"], "JOSE / PEDRO")
+        self.assertEqual(by_codigo["PG-011"]["transferencias_saida"], 3)
+        self.assertEqual(by_codigo["PG-011"]["transferencias_pendentes"], 5)
+        self.assertEqual(by_codigo["PG-010"]["transferencias_entrada"], 0)
+
+    def test_lote_statement_count_does_not_grow_with_routes(self):
+        statements = []
+        with api_server.get_conn() as conn:
+            rows = self._rows(conn)
+            conn.set_trace_callback(statements.append)
+            api_server._enriquecer_rotas_ativas(conn.cursor(), rows, company_id=self.company_id)
+            conn.set_trace_callback(None)
+        self.assertLessEqual(len(statements), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
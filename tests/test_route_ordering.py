@@ -0,0 +1,67 @@
+import random
+import unittest
+
+import numpy as np
+
+from backend.services.route_ordering import (
+    haversine_matrix,
+    improve_tour,
+    nearest_neighbour,
+    order_route,
+    path_cost,
+)
+
+
+def parada(cod, lat, lon, **extra):
+    return {"cod_cliente": cod, "nome_cliente": f"CLIENTE {cod}", "cidade": "RECIFE", "lat": lat, "lon": lon, **extra}
+
+
+class RouteOrderingTests(unittest.TestCase):
+    def test_haversine_matrix_matches_point_formula(self):
+        from math import asin, cos, radians, sin, sqrt
+
+        lat = np.array([-8.05, -8.10, -7.95])
+        lon = np.array([-34.90, -34.95, -34.85])
+        matriz = haversine_matrix(lat, lon)
+        for i in range(3):
+            for j in range(3):
+                x = sin(radians(lat[j] - lat[i]) / 2) ** 2 + cos(radians(lat[i])) * cos(radians(lat[j])) * sin(radians(lon[j] - lon[i]) / 2) ** 2
+                self.assertAlmostEqual(matriz[i, j], 2 * 6371.0 * asin(sqrt(x)), places=9)
+
+    def test_local_search_never_worsens_nearest_neighbour(self):
+        rng = random.Random(3)
+        for n in (5, 40, 120):
+            lat = np.array([-8.0 + rng.uniform(-0.2, 0.2) for _ in range(n)])
+            lon = np.array([-34.9 + rng.uniform(-0.2, 0.2) for _ in range(n)])
+            cost = haversine_matrix(lat, lon)
+            inicial = nearest_neighbour(cost)
+            melhorado = improve_tour(cost, inicial, time_budget=5.0)
+            self.assertEqual(melhorado[0], 0)
+            self.assertEqual(sorted(melhorado), list(range(n)))
+            self.assertLessEqual(path_cost(cost, melhorado), path_cost(cost, inicial) + 1e-9)
+
+    def test_groups_client_items_keeps_start_and_puts_items_without_gps_last(self):
+        items = [
+            parada("B", -8.00, -34.91, bairro="Z", produto="1"),
+            parada("SEM", None, None, endereco="RUA B"),
+            parada("A", -8.00, -34.90, bairro="A"),
+            parada("C", -8.00, -34.92, bairro="Z"),
+            parada("B", -8.00, -34.91, bairro="Z", produto="2"),
+            parada("SEM2", "", "", endereco="RUA A"),
+        ]
+        ordem = order_route(items, {})
+        self.assertEqual(
+            [(item["cod_cliente"], item.get("produto")) for item in ordem],
+            [("A", None), ("B", "1"), ("B", "2"), ("C", None), ("SEM2", None), ("SEM", None)],
+        )
+
+    def test_history_affinity_can_override_the_shorter_leg(self):
+        # A inicia; C esta mais longe que B, mas as rotas anteriores iam de A para C
+        items = [parada("A", -8.0, -34.900, bairro="A"), parada("B", -8.0, -34.909, bairro="Z"), parada("C", -8.0, -34.9135, bairro="Z")]
+        self.assertEqual([item["cod_cliente"] for item in order_route(items, {})], ["A", "B", "C"])
+        historico = {("A", "C"): 6, ("C", "A"): 6}
+        self.assertEqual([item["cod_cliente"] for item in order_route(items, historico)], ["A", "C", "B"])
+
+
+if __name__ == "__main__":
+    unittest.main()
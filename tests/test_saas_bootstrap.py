@@ -3,9 +3,11 @@ import sqlite3
 import tempfile
 import unittest
 
-from app.db.connection import configure_connection
+from app.db.connection import configure_connection, get_db
+from app.db.schema_state import reset_schema_flags
+from app.repositories.base_repository import ensure_saas_ready
 from app.services import audit_service, company_service, payment_service, plan_service, subscription_service
-from db_bootstrap import ensure_core_schema
+from db_bootstrap import SAAS_SCHEMA_VERSION, ensure_core_schema, get_runtime_metadata
 from tests._contract_test_helpers import ContractTestCase
 
 
@@ -93,6 +95,33 @@ class SaasBootstrapTests(ContractTestCase):
         self.assert_contract(audit)
         self.assertTrue(audit["ok"])
 
+    def test_schema_version_is_stamped_and_repository_calls_skip_ddl(self):
+        with sqlite3.connect(self.db_path) as conn:
+            self.assertEqual(get_runtime_metadata(conn.cursor(), "saas_schema_version"), str(SAAS_SCHEMA_VERSION))
+
+        reset_schema_flags()
+        with get_db() as conn:
+            ensure_saas_ready(conn)
+
+        statements = []
+        with get_db() as conn:
+            conn.set_trace_callback(statements.append)
+            ensure_saas_ready(conn)
+            ensure_saas_ready(conn)
+        self.assertFalse([sql for sql in statements if "CREATE" in sql.upper() or "PRAGMA TABLE_INFO" in sql.upper()])
+
+    def test_replaced_database_file_is_bootstrapped_again(self):
+        with get_db() as conn:
+            ensure_saas_ready(conn)
+        # restore: arquivo novo (sem schema SaaS) substitui o banco no mesmo caminho
+        fd, novo = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        os.replace(novo, self.db_path)
+        with get_db() as conn:
+            ensure_saas_ready(conn)
+        self.assertEqual(self._count("companies"), 1)
+        self.assertGreaterEqual(self._count("plans"), 4)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,67 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from app.db.schema_catalog import SchemaCatalog, catalog_for, invalidate
+
+
+class SchemaCatalogTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("CREATE TABLE programacoes (id INTEGER PRIMARY KEY, codigo_programacao TEXT, Local_Rota TEXT)")
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        invalidate(self.db_path)
+        try:
+            os.unlink(self.db_path)
+        except OSError:
+            pass
+
+    def test_columns_are_cached_until_schema_version_changes(self):
+        catalog = SchemaCatalog(self.db_path)
+        self.assertTrue(catalog.sync(self.conn))
+        self.assertFalse(catalog.sync(self.conn))
+        self.assertEqual(catalog.columns(self.conn, "PROGRAMACOES"), {"id", "codigo_programacao", "local_rota"})
+        self.assertTrue(catalog.has_column(self.conn, "programacoes", "local_rota"))
+        self.assertEqual(catalog.loads, 1)
+
+        self.conn.execute("ALTER TABLE programacoes ADD COLUMN kg_carregado REAL")
+        self.assertTrue(catalog.has_column(self.conn, "programacoes", "kg_carregado"))
+        self.assertFalse(catalog.has_column(self.conn, "programacoes", "inexistente"))
+        self.assertEqual(catalog.loads, 2)
+
+    def test_new_table_is_found_after_reload(self):
+        catalog = SchemaCatalog(self.db_path)
+        catalog.sync(self.conn)
+        self.assertFalse(catalog.has_table(self.conn, "rota_gps_pings"))
+        self.conn.execute("CREATE TABLE rota_gps_pings (id INTEGER PRIMARY KEY, lat REAL)")
+        self.assertTrue(catalog.has_table(self.conn, "rota_gps_pings"))
+        self.assertEqual(catalog.columns(self.conn, "rota_gps_pings"), {"id", "lat"})
+
+    def test_fragments_are_dropped_on_schema_change(self):
+        catalog = catalog_for(self.db_path)
+        self.assertIs(catalog, catalog_for(self.db_path))
+        catalog.sync(self.conn)
+        calls = []
+
+        def build():
+            calls.append(1)
+            return "COALESCE(p.local_rota, '-')"
+
+        self.assertEqual(catalog.fragment(("local_rota",), build), "COALESCE(p.local_rota, '-')")
+        catalog.fragment(("local_rota",), build)
+        self.assertEqual(len(calls), 1)
+
+        self.conn.execute("ALTER TABLE programacoes ADD COLUMN tipo_rota TEXT")
+        catalog.sync(self.conn)
+        catalog.fragment(("local_rota",), build)
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app.db.sqlite_pool import RequestConnectionMiddleware, SQLitePool, pooled_connection
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode = WAL")
+    return conn
+
+
+class SQLitePoolTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.pool = SQLitePool(self.db_path, _connect, size=2, timeout=0.01)
+        with pooled_connection(self.pool) as conn:
+            conn.execute("CREATE TABLE t (v INTEGER)")
+
+    def tearDown(self):
+        self.pool.close_all()
+        try:
+            os.unlink(self.db_path)
+        except OSError:
+            pass
+
+    def test_connections_are_reused_and_counted(self):
+        with pooled_connection(self.pool) as first:
+            pass
+        with pooled_connection(self.pool) as second:
+            pass
+        self.assertIs(first, second)
+        stats = self.pool.stats()
+        self.assertEqual((stats["open"], stats["checkouts"], stats["waits"]), (1, 3, 0))
+
+    def test_nested_block_uses_savepoint(self):
+        with pooled_connection(self.pool) as outer:
+            outer.execute("INSERT INTO t VALUES (1)")
+            with self.assertRaises(RuntimeError):
+                with pooled_connection(self.pool) as inner:
+                    self.assertIs(inner, outer)
+                    inner.execute("INSERT INTO t VALUES (2)")
+                    raise RuntimeError("falha")
+        with pooled_connection(self.pool) as conn:
+            self.assertEqual(conn.execute("SELECT v FROM t").fetchall(), [(1,)])
+
+    def test_exhausted_pool_waits_then_opens_overflow(self):
+        held = [self.pool.acquire(), self.pool.acquire()]
+        extra = self.pool.acquire()
+        self.assertEqual((self.pool.waits, self.pool.overflow), (1, 1))
+        for conn in held + [extra]:
+            self.pool.release(conn)
+        self.assertEqual(self.pool.stats()["idle"], 2)
+
+    def test_replaced_database_file_drops_old_connections(self):
+        with pooled_connection(self.pool) as old:
+            pass
+        os.unlink(self.db_path)
+        with pooled_connection(self.pool) as new:
+            self.assertIsNot(new, old)
+            self.assertEqual(new.execute("SELECT COUNT(*) FROM sqlite_master WHERE name='t'").fetchone()[0], 0)
+
+
+class RequestConnectionScopeTests(unittest.TestCase):
+    def test_dependency_and_handler_share_connection(self):
+        fd, db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        pool = SQLitePool(db_path, _connect)
+        app = FastAPI()
+
+        def auth():
+            with pooled_connection(pool) as conn:
+                return id(conn)
+
+        @app.get("/x")
+        def handler(auth_conn: int = Depends(auth)):
+            with pooled_connection(pool) as conn:
+                return {"same": id(conn) == auth_conn}
+
+        app.add_middleware(RequestConnectionMiddleware)
+        try:
+            client = TestClient(app)
+            self.assertEqual(client.get("/x").json(), {"same": True})
+            client.get("/x")
+            self.assertEqual((pool.stats()["checkouts"], pool.stats()["open"]), (2, 1))
+        finally:
+            pool.close_all()
+            os.unlink(db_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+
+os.environ.setdefault("ROTA_SECRET", "test-secret")
+os.environ["ROTA_DB"] = tempfile.NamedTemporaryFile(delete=False, suffix=".db").name
+
+import api_server  # noqa: E402
+
+
+class StartupReconcileTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        api_server.DB_PATH = self.db_path
+        api_server.ensure_tables()
+        with sqlite3.connect(self.db_path) as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT id FROM companies ORDER BY id LIMIT 1")
+            self.company_id = int(cur.fetchone()[0])
+            cur.execute(
+                """
+                INSERT INTO programacoes (codigo_programacao, status, status_operacional, company_id)
+                VALUES ('PG-001', 'ATIVA', 'FINALIZADA', ?)
+                """,
+                (self.company_id,),
+            )
+
+    def tearDown(self):
+        try:
+            os.unlink(self.db_path)
+        except OSError:
+            pass
+
+    def _status_operacional(self, codigo):
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute("SELECT status_operacional FROM programacoes WHERE codigo_programacao=?", (codigo,)).fetchone()[0]
+
+    def test_first_run_is_full_then_only_changed_rows(self):
+        out = api_server.run_startup_reconcilers()
+        self.assertEqual(out["status_operacional_legado"], 1)
+        self.assertIsNone(self._status_operacional("PG-001"))
+
+        # o proprio ajuste entra no log: a proxima passada reve so essa rota
+        with mock.patch.object(api_server, "sanitize_status_operacional_legado", return_value=0) as passada:
+            api_server.run_startup_reconcilers()
+        passada.assert_called_once_with(ids={"1"})
+
+        # sem mudancas desde o high-water mark: nenhuma passada roda
+        with mock.patch.object(api_server, "sanitize_status_operacional_legado") as passada:
+            api_server.run_startup_reconcilers()
+        passada.assert_not_called()
+
+        with sqlite3.connect(self.db_path) as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "INSERT INTO programacoes (codigo_programacao, status, status_operacional, company_id) VALUES ('PG-002', 'ATIVA', 'CANCELADA', ?)",
+                (self.company_id,),
+            )
+            novo_id = cur.lastrowid
+        with mock.patch.object(api_server, "sanitize_status_operacional_legado", return_value=0) as passada:
+            api_server.run_startup_reconcilers()
+        passada.assert_called_once_with(ids={str(novo_id)})
+
+        self.assertEqual(api_server.sanitize_status_operacional_legado(ids=[str(novo_id)]), 1)
+        self.assertIsNone(self._status_operacional("PG-002"))
+
+    def test_log_is_pruned_after_every_pass_catches_up(self):
+        api_server.run_startup_reconcilers()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE programacoes SET status='EM_ROTA' WHERE codigo_programacao='PG-001'")
+            self.assertGreater(conn.execute("SELECT COUNT(*) FROM reconcile_log").fetchone()[0], 0)
+        api_server.run_startup_reconcilers()
+        with sqlite3.connect(self.db_path) as conn:
+            restantes = conn.execute("SELECT COUNT(*) FROM reconcile_log").fetchone()[0]
+            marks = conn.execute("SELECT COUNT(*) FROM runtime_metadata WHERE key LIKE 'reconcile_hwm:%'").fetchone()[0]
+        self.assertEqual(marks, len(api_server._STARTUP_RECONCILERS))
+        self.assertEqual(restantes, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
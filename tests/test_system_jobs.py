@@ -0,0 +1,75 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from backend.services import jobs
+from backend.services.jobs import JOB_CONCLUIDO, JOB_ERRO, JOB_PENDENTE, JobRunner, JobStore, job_handler
+
+
+@job_handler("teste_ok")
+def _handler_ok(progress, params):
+    progress(50, "metade")
+    return {"eco": params["valor"]}, "/tmp/artefato.zip"
+
+
+@job_handler("teste_erro")
+def _handler_erro(progress, params):
+    raise RuntimeError("falhou de proposito")
+
+
+class SystemJobsTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = JobStore(os.path.join(self.tmpdir.name, "jobs.db"))
+        self.runner = JobRunner(self.store, max_workers=1)
+
+    def tearDown(self):
+        self.runner.shutdown(wait=True)
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def _wait(self, job_id):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            job = self.store.get(job_id)
+            if job["status"] in {JOB_CONCLUIDO, JOB_ERRO}:
+                return job
+            time.sleep(0.02)
+        self.fail("job nao terminou")
+
+    def test_job_runs_in_background_and_records_result(self):
+        job = self.runner.submit("teste_ok", {"valor": 7}, usuario="admin")
+        self.assertEqual(job["status"], JOB_PENDENTE)
+        self.assertEqual(job["parametros"], {"valor": 7})
+
+        done = self._wait(job["id"])
+        self.assertEqual(done["status"], JOB_CONCLUIDO)
+        self.assertEqual(done["progresso"], 100)
+        self.assertEqual(done["resultado"], {"eco": 7})
+        self.assertEqual(done["artefato"], "/tmp/artefato.zip")
+        self.assertEqual(done["usuario"], "admin")
+        self.assertIsNotNone(done["concluido_em"])
+        self.assertEqual([item["id"] for item in self.store.list()], [job["id"]])
+
+    def test_failures_and_unknown_types(self):
+        job = self.runner.submit("teste_erro")
+        done = self._wait(job["id"])
+        self.assertEqual(done["status"], JOB_ERRO)
+        self.assertEqual(done["mensagem"], "falhou de proposito")
+        with self.assertRaises(KeyError):
+            self.runner.submit("inexistente")
+
+    def test_jobs_of_dead_processes_are_marked_interrupted(self):
+        orfao = self.store.create("teste_ok", {})
+        self.store.update(orfao["id"], processo=999999999)
+        with mock.patch.object(jobs, "_process_alive", side_effect=lambda pid: int(pid) != 999999999):
+            self.assertEqual(self.store.fail_interrupted(), 1)
+        job = self.store.get(orfao["id"])
+        self.assertEqual(job["status"], JOB_ERRO)
+        self.assertIn("Interrompido", job["mensagem"])
+
+
+if __name__ == "__main__":
+    unittest.main()